@@ -6,6 +6,7 @@ RS256_ONLY  →  jwt.encode(payload, private_key, algorithm="RS256", headers={"k
 """
 import jwt as pyjwt
 import logging
+import uuid
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
@@ -31,7 +32,7 @@ def sign_access_token(
     """
     Create a signed JWT access token.
     Signing algorithm determined by AUTH_JWT_SIGNING_MODE.
-    Claims are kept identical to the existing system.
+    Claims are kept identical to the existing system, plus a unique ``jti``.
     """
     now = datetime.now(timezone.utc)
     payload = {
@@ -43,6 +44,8 @@ def sign_access_token(
         "aud": JWT_AUDIENCE,
         "iat": now,
         "exp": now + timedelta(hours=JWT_EXPIRATION_HOURS),
+        # Per-token id; keys the principal cache in core.dependencies
+        "jti": uuid.uuid4().hex,
     }
 
     if SIGNING_MODE == SigningMode.HS256_ONLY:
@@ -10,7 +10,7 @@ import logging
 logger = logging.getLogger("auth.routes")
 
 from app.core.database import get_database
-from core.security import verify_pin, hash_pin, compute_pin_index
+from core.security import compute_pin_index, hash_pin_async, verify_pins_async
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -50,7 +50,8 @@ async def login_with_pin(
     indexed_users = await db.users.find({"pin_index": idx}).to_list(length=10)
     
     # Verify bcrypt on the small candidate set (typically 1-2 users)
-    candidates = [u for u in indexed_users if verify_pin(pin, u.get("pin_hash", ""))]
+    matches = await verify_pins_async(pin, [u.get("pin_hash", "") for u in indexed_users])
+    candidates = [u for u, ok in zip(indexed_users, matches) if ok]
     
     # --- FALLBACK: if no pin_index matches, scan + backfill (one-time migration) ---
     if not candidates:
@@ -59,8 +60,9 @@ async def login_with_pin(
         ).to_list(length=200)
         
         candidates = []
-        for u in all_users:
-            if verify_pin(pin, u.get("pin_hash", "")):
+        matches = await verify_pins_async(pin, [u.get("pin_hash", "") for u in all_users])
+        for u, ok in zip(all_users, matches):
+            if ok:
                 candidates.append(u)
                 # Backfill pin_index for this user so future logins are instant
                 stored = u.get("pin_hash", "")
@@ -68,7 +70,7 @@ async def login_with_pin(
                 unset_fields = {}
                 # Also auto-upgrade legacy SHA256 hash to bcrypt
                 if len(stored) == 64 and all(c in '0123456789abcdef' for c in stored):
-                    update_fields["pin_hash"] = hash_pin(pin)
+                    update_fields["pin_hash"] = await hash_pin_async(pin)
                     unset_fields["pin"] = ""
                 update_op = {"$set": update_fields}
                 if unset_fields:
@@ -11,6 +11,7 @@ from typing import Optional, List, Any
 from datetime import datetime, timezone
 from pydantic import BaseModel
 from app.core.database import get_database
+from services.catalog_snapshot import bump_catalog_version
 import uuid
 import logging
 
@@ -437,6 +438,13 @@ async def update_menu(menu_id: str, menu: GenericCreate):
     return {"status": "updated", "id": menu_id}
 
 
+async def _bump_catalogs(db, before: Optional[dict], data: Optional[dict] = None):
+    """Bump the catalog of the venue a menu doc was in and, if it moved, the one it moved to."""
+    venues = {(before or {}).get("venue_id"), (data or {}).get("venue_id")}
+    for venue_id in venues - {None}:
+        await bump_catalog_version(db, venue_id)
+
+
 # --- Menu Categories CRUD ---
 @router.post("/menu/categories")
 async def create_category(cat: GenericCreate):
@@ -445,6 +453,7 @@ async def create_category(cat: GenericCreate):
     data["id"] = f"cat-{uuid.uuid4().hex[:8]}"
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.menu_categories.insert_one(data)
+    await bump_catalog_version(db, data.get("venue_id"))
     data.pop("_id", None)
     return data
 
@@ -452,15 +461,19 @@ async def create_category(cat: GenericCreate):
 @router.put("/menu/categories/{category_id}")
 async def update_category(category_id: str, cat: GenericCreate):
     db = get_database()
+    before = await db.menu_categories.find_one({"id": category_id}, {"_id": 0, "venue_id": 1})
     data = cat.dict()
     await db.menu_categories.update_one({"id": category_id}, {"$set": data})
+    await _bump_catalogs(db, before, data)
     return {"status": "updated", "id": category_id}
 
 
 @router.delete("/menu/categories/{category_id}")
 async def delete_category(category_id: str):
     db = get_database()
+    before = await db.menu_categories.find_one({"id": category_id}, {"_id": 0, "venue_id": 1})
     await db.menu_categories.delete_one({"id": category_id})
+    await _bump_catalogs(db, before)
     return {"status": "deleted", "id": category_id}
 
 
@@ -482,6 +495,7 @@ async def create_menu_item(item: GenericCreate):
     data["id"] = f"item-{uuid.uuid4().hex[:8]}"
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.menu_items.insert_one(data)
+    await bump_catalog_version(db, data.get("venue_id"))
     data.pop("_id", None)
     return data
 
@@ -489,15 +503,19 @@ async def create_menu_item(item: GenericCreate):
 @router.put("/menu/items/{item_id}")
 async def update_menu_item(item_id: str, item: GenericCreate):
     db = get_database()
+    before = await db.menu_items.find_one({"id": item_id}, {"_id": 0, "venue_id": 1})
     data = item.dict()
     await db.menu_items.update_one({"id": item_id}, {"$set": data})
+    await _bump_catalogs(db, before, data)
     return {"status": "updated", "id": item_id}
 
 
 @router.delete("/menu/items/{item_id}")
 async def delete_menu_item(item_id: str):
     db = get_database()
+    before = await db.menu_items.find_one({"id": item_id}, {"_id": 0, "venue_id": 1})
     await db.menu_items.delete_one({"id": item_id})
+    await _bump_catalogs(db, before)
     return {"status": "deleted", "id": item_id}
 
 
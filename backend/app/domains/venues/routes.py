@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from bson import ObjectId
 
 from app.core.database import get_database
+from services.catalog_snapshot import bump_catalog_version
 
 router = APIRouter(prefix="/api/venues", tags=["venues"])
 
@@ -247,18 +248,21 @@ async def _update_recipes(ids: List[str], updates: dict):
 @router.post("/{venue_id}/recipes/engineered/bulk-archive")
 async def bulk_archive(venue_id: str, request: BulkActionRequest):
     count = await _update_recipes(request.recipe_ids, {"active": False})
+    await bump_catalog_version(get_database(), venue_id)
     return {"status": "success", "archived": count}
 
 
 @router.post("/{venue_id}/recipes/engineered/bulk-delete")
 async def bulk_delete(venue_id: str, request: BulkActionRequest):
     count = await _update_recipes(request.recipe_ids, {"deleted": True})
+    await bump_catalog_version(get_database(), venue_id)
     return {"status": "success", "deleted": count}
 
 
 @router.post("/{venue_id}/recipes/engineered/bulk-restore")
 async def bulk_restore(venue_id: str, request: BulkActionRequest):
     count = await _update_recipes(request.recipe_ids, {"active": True})
+    await bump_catalog_version(get_database(), venue_id)
     return {"status": "success", "restored": count}
 
 
@@ -271,12 +275,14 @@ async def bulk_purge(venue_id: str, request: BulkActionRequest):
     if obj_ids:
         res2 = await db.recipes.delete_many({"_id": {"$in": obj_ids}})
         total += res2.deleted_count
+    await bump_catalog_version(db, venue_id)
     return {"status": "success", "purged": total}
 
 
 @router.post("/{venue_id}/recipes/engineered/bulk-restore-trash")
 async def bulk_restore_trash(venue_id: str, request: BulkActionRequest):
     count = await _update_recipes(request.recipe_ids, {"deleted": False})
+    await bump_catalog_version(get_database(), venue_id)
     return {"status": "success", "restored": count}
 
 
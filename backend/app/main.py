@@ -847,6 +847,10 @@ app.include_router(api_main)
 from app.domains.access_control.routes import router as access_control_router
 app.include_router(access_control_router)
 
+# Prometheus scrape endpoint (root level, like /health)
+from routes.hyperscale_routes import exposition_router as metrics_exposition_router
+app.include_router(metrics_exposition_router)
+
 # ==================== APP.DOMAINS MODULE ROUTERS ====================
 # These are domain-driven modules under app/domains/ that complement
 # the routes/ directory with additional or refactored implementations.
@@ -1147,6 +1151,18 @@ async def startup_event():
             from scripts.keep_alive import start_keep_alive
             start_keep_alive()
             logger.info("✓ Keep-alive pinger started (Render)")
+
+        # Metrics snapshots: dashboard charts + per-worker state for /metrics
+        from core.metrics_collector import metrics as _mc, SNAPSHOT_INTERVAL_SECONDS
+        async def _metrics_snapshot_loop():
+            while True:
+                try:
+                    _mc.take_snapshot()
+                except Exception as snap_err:
+                    logger.warning("Metrics snapshot error: %s", snap_err)
+                await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        asyncio.create_task(_metrics_snapshot_loop())
+        logger.info("✓ Metrics snapshot worker started")
         
     except Exception as e:
         logger.error(f"Startup error: {e}")
@@ -1163,6 +1179,10 @@ async def shutdown_event():
     
     event_bus.stop()
     logger.info("✓ Event bus stopped")
+
+    from core.events_outbox import flush_all_outboxes
+    await flush_all_outboxes()
+    logger.info("✓ Outbox buffers flushed")
     client.close()
     logger.info("✓ Database connection closed")
 
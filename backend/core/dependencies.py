@@ -2,6 +2,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from core.security import verify_jwt_token
 from core.database import get_database
+from core.principal_cache import principal_cache
 
 security = HTTPBearer()
 
@@ -15,18 +16,31 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail={"code": "INVALID_TOKEN", "message": "Invalid or expired token"}
         )
     
-    db = get_database()
-    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={"code": "USER_NOT_FOUND", "message": "User not found"}
-        )
-    
-    return user
+    user_id = payload["user_id"]
+    # Tokens issued before jti existed are told apart by their issue time
+    token_key = str(payload.get("jti") or payload.get("iat", ""))
+    principal = principal_cache.get(user_id, token_key)
+    if principal is None:
+        version = principal_cache.version(user_id)
+        db = get_database()
+        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail={"code": "USER_NOT_FOUND", "message": "User not found"}
+            )
+        principal = principal_cache.put(user_id, token_key, user, version)
+
+    # Shallow copy: handlers may add keys to current_user without touching the cache
+    return dict(principal.user)
 
 async def check_venue_access(user: dict, venue_id: str):
+    # Fast path: the venue set precomputed when get_current_user resolved this user
+    principal = principal_cache.for_user(user)
+    if principal is not None and principal.can_access_venue(venue_id):
+        return
+
     # 0. "all" is org-wide (payroll, reports) — allow if user has any venue access
     if venue_id == "all":
         return
@@ -1,15 +1,200 @@
-"""Events outbox for reliable event delivery"""
+"""Events outbox for reliable event delivery
+
+Emits are group-committed: documents go into a per-database in-process buffer
+and are written with one ``insert_many`` per flush, triggered when the buffer
+reaches ``OUTBOX_MAX_BATCH`` docs or ``OUTBOX_FLUSH_MS`` after the first emit.
+
+* ``emit()``           - sync, never blocks the caller (legacy call sites).
+* ``await publish()``  - waits for buffer space when ``OUTBOX_MAX_BUFFER`` is
+                         reached (backpressure).
+
+A failed batch is retried with backoff up to ``OUTBOX_MAX_RETRIES`` times and
+then dropped; ``flush_all_outboxes`` (shutdown) gives up after
+``OUTBOX_FLUSH_TIMEOUT_SECONDS``. Dropped events are logged and, when
+``OUTBOX_SPILL_FILE`` is set, appended to it as JSON lines for replay.
+"""
+import asyncio
+import json
+import logging
+import os
 from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FLUSH_MS = float(os.getenv("OUTBOX_FLUSH_MS", "5"))
+OUTBOX_MAX_BATCH = int(os.getenv("OUTBOX_MAX_BATCH", "500"))
+OUTBOX_MAX_BUFFER = int(os.getenv("OUTBOX_MAX_BUFFER", "10000"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "8"))
+OUTBOX_FLUSH_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_FLUSH_TIMEOUT_SECONDS", "10"))
+OUTBOX_SPILL_FILE = os.getenv("OUTBOX_SPILL_FILE", "")
+
+DUPLICATE_KEY = 11000
+
 
 def _iso():
     return datetime.now(timezone.utc).isoformat()
 
+
+def _only_duplicates(exc: Exception) -> bool:
+    """True when a (bulk) write failed solely on duplicate keys - emits are idempotent."""
+    if getattr(exc, "code", None) == DUPLICATE_KEY:
+        return True
+    details = getattr(exc, "details", None) or {}
+    errors = details.get("writeErrors") or []
+    return bool(errors) and all(e.get("code") == DUPLICATE_KEY for e in errors) \
+        and not details.get("writeConcernErrors")
+
+
+class OutboxWriter:
+    """Shared group-commit buffer for one outbox collection."""
+
+    def __init__(self, col, flush_ms: float = OUTBOX_FLUSH_MS,
+                 max_batch: int = OUTBOX_MAX_BATCH, max_buffer: int = OUTBOX_MAX_BUFFER,
+                 max_retries: int = OUTBOX_MAX_RETRIES):
+        self.col = col
+        self.flush_s = max(flush_ms, 0) / 1000.0
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self._buffer: List[dict] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self._space: Optional[asyncio.Event] = None
+        self.stats = {"emitted": 0, "flushes": 0, "failed_flushes": 0, "dropped": 0, "max_buffered": 0}
+
+    def add(self, doc: dict) -> None:
+        self._buffer.append(doc)
+        self.stats["emitted"] += 1
+        if len(self._buffer) > self.stats["max_buffered"]:
+            self.stats["max_buffered"] = len(self._buffer)
+        if len(self._buffer) > self.max_buffer:
+            logger.warning("Outbox buffer over capacity (%d docs); is the database reachable?", len(self._buffer))
+        self._schedule()
+
+    def _schedule(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (scripts): caller must await flush()
+
+        if len(self._buffer) >= self.max_batch or self.flush_s == 0:
+            self._kick()
+        elif self._timer is None and not self._draining():
+            self._timer = loop.call_later(self.flush_s, self._kick)
+
+    def _draining(self) -> bool:
+        return self._drain_task is not None and not self._drain_task.done()
+
+    def _kick(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._draining():
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self) -> None:
+        # Docs emitted while a batch is in flight ride along in the next batch
+        failures = 0
+        while self._buffer:
+            batch = self._buffer[:self.max_batch]
+            del self._buffer[:len(batch)]
+            try:
+                await self.col.insert_many(batch, ordered=False)
+                self.stats["flushes"] += 1
+            except asyncio.CancelledError:
+                self._buffer[:0] = batch  # flush deadline: left for the caller to spill
+                raise
+            except Exception as e:
+                if _only_duplicates(e):
+                    self.stats["flushes"] += 1
+                else:
+                    failures += 1
+                    self.stats["failed_flushes"] += 1
+                    if failures <= self.max_retries:
+                        logger.error("Outbox flush of %d events failed (attempt %d): %s", len(batch), failures, e)
+                        self._buffer[:0] = batch
+                        self._release_space()
+                        await asyncio.sleep(min(2 ** (failures - 1), 30))
+                        continue
+                    self._spill(batch, f"{failures} failed attempts, last: {e}")
+            failures = 0
+            self._release_space()
+
+    def _spill(self, docs: List[dict], reason: str) -> None:
+        """Give up on ``docs``: log them and append them to OUTBOX_SPILL_FILE when configured."""
+        self.stats["dropped"] += len(docs)
+        logger.error("Outbox dropped %d events (%s); first keys: %s",
+                     len(docs), reason, [d.get("key") for d in docs[:10]])
+        if not OUTBOX_SPILL_FILE:
+            return
+        try:
+            with open(OUTBOX_SPILL_FILE, "a") as f:
+                for doc in docs:
+                    f.write(json.dumps({k: v for k, v in doc.items() if k != "_id"}, default=str) + "\n")
+        except OSError as e:
+            logger.error("Outbox spill to %s failed: %s", OUTBOX_SPILL_FILE, e)
+
+    def _release_space(self) -> None:
+        if self._space is not None and len(self._buffer) < self.max_buffer:
+            self._space.set()
+
+    async def wait_for_space(self) -> None:
+        """Backpressure: block while the buffer is full."""
+        while len(self._buffer) >= self.max_buffer:
+            if self._space is None:
+                self._space = asyncio.Event()
+            self._space.clear()
+            self._kick()
+            await self._space.wait()
+
+    async def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Write everything buffered now (shutdown, scripts, tests). With ``timeout``
+        whatever is still unwritten when it expires is spilled instead.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            await asyncio.wait_for(self._flush_buffered(), timeout)
+        except asyncio.TimeoutError:
+            docs, self._buffer = self._buffer, []
+            if docs:
+                self._spill(docs, f"flush timed out after {timeout}s")
+            self._release_space()
+
+    async def _flush_buffered(self) -> None:
+        if self._draining():
+            await self._drain_task
+        await self._drain()
+
+
+# One writer per database: Outbox(db) is constructed per call at most call sites
+_writers: Dict[int, OutboxWriter] = {}
+
+
+def get_outbox_writer(db) -> OutboxWriter:
+    writer = _writers.get(id(db))
+    if writer is None:
+        writer = _writers[id(db)] = OutboxWriter(db.outbox_events)
+    return writer
+
+
+async def flush_all_outboxes(timeout: float = OUTBOX_FLUSH_TIMEOUT_SECONDS) -> None:
+    """Shutdown flush; never waits longer than ``timeout`` per writer, even with the database down."""
+    for writer in list(_writers.values()):
+        await writer.flush(timeout=timeout)
+
+
 class Outbox:
     def __init__(self, db):
         self.col = db.outbox_events
-    
-    def emit(self, venue_id: str, topic: str, key: str, payload: dict, schema_version: int = 1):
-        doc = {
+        self.writer = get_outbox_writer(db)
+
+    @staticmethod
+    def _doc(venue_id: str, topic: str, key: str, payload: dict, schema_version: int) -> dict:
+        return {
             "venue_id": venue_id,
             "topic": topic,
             "key": key,
@@ -18,7 +203,12 @@ class Outbox:
             "created_at": _iso(),
             "consumed_at": None
         }
-        try:
-            self.col.insert_one(doc)
-        except Exception:
-            return  # Idempotent; if duplicate key, skip
+
+    def emit(self, venue_id: str, topic: str, key: str, payload: dict, schema_version: int = 1):
+        """Buffer an event; it is written with the next group commit."""
+        self.writer.add(self._doc(venue_id, topic, key, payload, schema_version))
+
+    async def publish(self, venue_id: str, topic: str, key: str, payload: dict, schema_version: int = 1):
+        """Emit with backpressure: waits while the buffer is full."""
+        await self.writer.wait_for_space()
+        self.writer.add(self._doc(venue_id, topic, key, payload, schema_version))
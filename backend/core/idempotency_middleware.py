@@ -2,110 +2,233 @@
 Idempotency Middleware - Prevent Duplicate Operations
 
 Handles X-Idempotency-Key headers to ensure offline replay doesn't create duplicates.
+
+Raw ASGI: the response streams straight through to the client while its body
+is captured on the side. Concurrent requests with the same key (offline
+terminals reconnecting and replaying their queue) wait for the first one
+instead of running the handler again, and recently completed keys are served
+from a bounded in-process LRU before Mongo is asked. Stored keys expire via a
+TTL index on ``expires_at``.
 """
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from core.database import db
-from datetime import datetime, timezone, timedelta
+import asyncio
 import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from starlette.responses import Response
+
+from core.database import db
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024 * 1024)))
+
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
 
-class IdempotencyMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, ttl_hours=24):
-        super().__init__(app)
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _replayable(status_code) -> bool:
+    """Responses both tiers (LRU and Mongo) store and replay: any 2xx."""
+    return isinstance(status_code, int) and 200 <= status_code < 300
+
+
+def _expires_ts(record: dict) -> float:
+    expires_at = record.get("expires_at")
+    if isinstance(expires_at, datetime):
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)  # Motor returns naive UTC
+        return expires_at.timestamp()
+    if isinstance(expires_at, str):
+        return datetime.fromisoformat(expires_at).timestamp()
+    return float("inf")
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, ttl_hours=24, cache_size=IDEMPOTENCY_CACHE_SIZE, database=None):
+        self.app = app
         self.ttl_hours = ttl_hours
-        self.idempotent_methods = {'POST', 'PUT', 'PATCH', 'DELETE'}
+        self.idempotent_methods = IDEMPOTENT_METHODS
+        self.db = database if database is not None else db
+        self.cache_size = cache_size
+        # key -> stored record (successful responses only), most recent last
+        self._recent: "OrderedDict[str, dict]" = OrderedDict()
+        # key -> future resolved with the record (or None) of the execution in progress
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._indexes_ready = False
+
+    # ─── Record cache ────────────────────────────────────────────────
 
-    async def dispatch(self, request: Request, call_next):
+    def _remember(self, key: str, record: dict) -> None:
+        self._recent[key] = record
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def _cached(self, key: str) -> Optional[dict]:
+        record = self._recent.get(key)
+        if record is None:
+            return None
+        if _expires_ts(record) < time.time():
+            del self._recent[key]
+            return None
+        self._recent.move_to_end(key)
+        return record
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        self._indexes_ready = True
+        try:
+            await self.db.idempotency_keys.create_index("key", name="idx_idempotency_key")
+            await self.db.idempotency_keys.create_index(
+                "expires_at", expireAfterSeconds=0, name="ttl_idempotency_expires"
+            )
+        except Exception as e:
+            print(f"⚠️ Idempotency index setup failed: {e}")
+
+    async def _load(self, key: str) -> Optional[dict]:
+        record = self._cached(key)
+        if record is not None:
+            return record
+        await self._ensure_indexes()
+        existing = await self.db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+        if existing and _replayable(existing.get("status_code")) and _expires_ts(existing) >= time.time():
+            self._remember(key, existing)
+            return existing
+        if existing:
+            # Previous request failed - allow retry
+            print(f"🔄 Idempotent retry: {key} - previous attempt failed")
+        return None
+
+    # ─── ASGI ────────────────────────────────────────────────────────
+
+    async def __call__(self, scope, receive, send):
         # Only check idempotency for mutating operations
-        if request.method not in self.idempotent_methods:
-            return await call_next(request)
+        if scope["type"] != "http" or scope.get("method") not in self.idempotent_methods:
+            await self.app(scope, receive, send)
+            return
 
-        # Check for idempotency key header
-        idempotency_key = request.headers.get('X-Idempotency-Key')
-        
+        idempotency_key = _header(scope, b"x-idempotency-key")
         if not idempotency_key:
             # No key provided - proceed normally
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+
+        # Single-flight: a duplicate arriving mid-execution waits for the first
+        pending = self._inflight.get(idempotency_key)
+        if pending is not None:
+            record = await asyncio.shield(pending)
+            if record is not None:
+                await self._replay(record, scope, receive, send)
+                return
+            # First execution failed or was not cacheable: run this one normally
+
+        record = self._cached(idempotency_key)
+        if record is not None:
+            await self._replay(record, scope, receive, send)
+            return
 
-        # Check if this request was already processed
-        existing = await db.idempotency_keys.find_one(
-            {"key": idempotency_key},
-            {"_id": 0}
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[idempotency_key] = future
+        try:
+            record = await self._load(idempotency_key)
+            if record is not None:
+                future.set_result(record)
+                await self._replay(record, scope, receive, send)
+                return
+            record = await self._execute(idempotency_key, scope, receive, send)
+            future.set_result(record)
+        finally:
+            if not future.done():
+                future.set_result(None)
+            if self._inflight.get(idempotency_key) is future:
+                del self._inflight[idempotency_key]
+
+    async def _replay(self, record: dict, scope, receive, send) -> None:
+        print(f"♻️ Idempotent replay: {record.get('key')} - returning cached response")
+        response = Response(
+            content=json.dumps(record.get("response_body", {})),
+            status_code=record.get("status_code", 200),
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
         )
+        await response(scope, receive, send)
+
+    async def _execute(self, key: str, scope, receive, send) -> Optional[dict]:
+        """Run the app, passing messages through untouched while capturing a JSON 2xx body."""
+        state = {"status": 500, "capture": False, "size": 0}
+        chunks = []
+
+        async def send_capturing(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                content_type = ""
+                for name, value in message.get("headers") or []:
+                    if name.lower() == b"content-type":
+                        content_type = value.decode("latin-1")
+                # Only cache application/json responses; streaming/binary passes through
+                state["capture"] = _replayable(state["status"]) and "application/json" in content_type
+            elif message["type"] == "http.response.body" and state["capture"]:
+                body = message.get("body", b"")
+                state["size"] += len(body)
+                if state["size"] > IDEMPOTENCY_MAX_BODY_BYTES:
+                    state["capture"] = False
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+            await send(message)
+
+        await self.app(scope, receive, send_capturing)
+
+        if not state["capture"]:
+            return None
+        try:
+            response_body = json.loads(b"".join(chunks).decode())
+            now = datetime.now(timezone.utc)
+            record = {
+                "key": key,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status_code": state["status"],
+                "response_body": response_body,
+                "created_at": now.isoformat(),
+                # BSON date so the TTL index can expire it
+                "expires_at": now + timedelta(hours=self.ttl_hours),
+                "device_id": _header(scope, b"x-device-id"),
+                "offline_replay": _header(scope, b"x-offline-replay") == "true",
+            }
+            await self.db.idempotency_keys.insert_one(dict(record))
+            self._remember(key, record)
+            print(f"💾 Idempotency key cached: {key} for path {scope.get('path')}")
+            return record
+        except Exception as e:
+            print(f"⚠️ Failed to cache idempotency: {e}")
+            return None
 
-        if existing:
-            # Request already processed - return cached response
-            if existing.get("status_code") == 200 or existing.get("status_code") == 201:
-                print(f"♻️ Idempotent replay: {idempotency_key} - returning cached response")
-                
-                # Return cached successful response
-                return Response(
-                    content=json.dumps(existing.get("response_body", {})),
-                    status_code=existing.get("status_code", 200),
-                    headers={"Content-Type": "application/json"},
-                    media_type="application/json"
-                )
-            else:
-                # Previous request failed - allow retry
-                print(f"🔄 Idempotent retry: {idempotency_key} - previous attempt failed")
-
-        # Process the request
-        response = await call_next(request)
-
-        # Cache the response for successful operations
-        if 200 <= response.status_code < 300:
-            content_type = response.headers.get("Content-Type", "")
-            
-            # Only cache application/json responses. Streaming/binary will crash body_iterator consumption
-            if "application/json" in content_type:
-                try:
-                    # Read response body
-                    body = b""
-                    async for chunk in response.body_iterator:
-                        body += chunk
-
-                    response_body = json.loads(body.decode())
-
-                    # Store idempotency record
-                    await db.idempotency_keys.insert_one({
-                        "key": idempotency_key,
-                        "method": request.method,
-                        "path": str(request.url.path),
-                        "status_code": response.status_code,
-                        "response_body": response_body,
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "expires_at": (datetime.now(timezone.utc) + timedelta(hours=self.ttl_hours)).isoformat(),
-                        "device_id": request.headers.get('X-Device-Id'),
-                        "offline_replay": request.headers.get('X-Offline-Replay') == 'true'
-                    })
-
-                    print(f"💾 Idempotency key cached: {idempotency_key} for path {request.url.path}")
-
-                    # Recreate response with the body
-                    return Response(
-                        content=body,
-                        status_code=response.status_code,
-                        headers=dict(response.headers),
-                        media_type=response.media_type
-                    )
-                except Exception as e:
-                    print(f"⚠️ Failed to cache idempotency: {e}")
-                    # If we failed to cache, we still need to return the response, but body_iterator might be consumed.
-                    # Since we only try caching on application/json, returning the consumed body is necessary here.
-                    if 'body' in locals():
-                        return Response(content=body, status_code=response.status_code, headers=dict(response.headers), media_type=response.media_type)
-
-        return response
 
 async def cleanup_expired_idempotency_keys():
-    """Background task to clean up expired idempotency keys"""
-    now = datetime.now(timezone.utc).isoformat()
-    result = await db.idempotency_keys.delete_many({
-        "expires_at": {"$lt": now}
-    })
-    
+    """
+    Sweep expired keys. Keys written before the TTL index stored ``expires_at``
+    as an ISO string, which the TTL monitor ignores; new keys are BSON dates the
+    TTL index expires (the local mock has no TTL monitor, so sweep those too).
+    One range branch per type: $lt only matches values of its own type.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.idempotency_keys.delete_many({"$or": [
+        {"expires_at": {"$lt": now.isoformat()}},
+        {"expires_at": {"$lt": now}},
+    ]})
+
     if result.deleted_count > 0:
         print(f"🧹 Cleaned up {result.deleted_count} expired idempotency keys")
-    
+
     return result.deleted_count
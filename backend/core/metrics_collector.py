@@ -1,21 +1,31 @@
 """
 MetricsCollector — In-memory APM metrics for Hyperscale Dashboard
 
-Thread-safe request/latency/error tracking with circular buffers.
-No external dependencies (no Redis/Prometheus needed).
+Request latency is recorded into fixed log-linear histograms, one per
+(normalized route, status class). Each thread writes to its own shard, so the
+request path takes no lock; readers merge the shards. Histogram state is
+mergeable, so the snapshots of several uvicorn workers can be summed
+(see ``METRICS_SHARED_DIR``) and exported as Prometheus text on ``/metrics``.
 
 Usage:
     from core.metrics_collector import metrics
     metrics.record_request(latency_ms=142.5, status_code=200, path="/api/orders")
     snapshot = metrics.get_snapshot()
+    text = render_prometheus(merge_states([metrics.export_state()]))
+
+In-process caches publish their hit/miss counters with
+``register_cache_stats(name, fn)``; they travel with the histogram state.
+Point-in-time values (sizes, queue depth) are declared as ``gauges``: event
+counters are summed across workers, gauges are exported per worker.
 """
 
+import json
+import os
 import time
 import threading
 import logging
 from collections import deque
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Callable, Dict, FrozenSet, Iterable, List, Tuple
 
 try:
     import psutil
@@ -26,194 +36,385 @@ except ImportError:
 logger = logging.getLogger("metrics_collector")
 
 # ─── Configuration ─────────────────────────────────────────────────────────────
-LATENCY_BUFFER_SIZE = 2000       # Keep last 2000 request latencies for percentile calc
 RPS_WINDOW_SECONDS = 60          # Calculate RPS over last 60 seconds
 HISTORY_BUFFER_SIZE = 90         # Keep 90 time-series snapshots (30 min at 20s intervals)
 SNAPSHOT_INTERVAL_SECONDS = 20   # Background snapshot every 20s
+MAX_ROUTES = 500                 # Distinct routes tracked; the rest count as "other"
+
+# Workers write their histogram state here each snapshot; /metrics sums all of them
+METRICS_SHARED_DIR = os.getenv("METRICS_SHARED_DIR", "")
+SHARED_STATE_MAX_AGE_SECONDS = 300   # Ignore files of workers that stopped reporting
+
+
+def _log_linear_bounds() -> List[float]:
+    """Bucket upper bounds in ms: 0.1..0.9, 1..9, 10..90, ... 10000..90000, 100000."""
+    bounds = []
+    for exp in range(-1, 5):
+        for step in range(1, 10):
+            bounds.append(round(step * 10 ** exp, 3))
+    bounds.append(100000.0)
+    return bounds
+
+
+# Upper bounds (ms); the final implicit bucket is +Inf
+BUCKET_BOUNDS_MS: List[float] = _log_linear_bounds()
+_NUM_BUCKETS = len(BUCKET_BOUNDS_MS) + 1
+
+
+def bucket_index(latency_ms: float) -> int:
+    """Index of the first bucket whose upper bound is >= latency (no search: log + linear step)."""
+    if latency_ms <= BUCKET_BOUNDS_MS[0]:
+        return 0
+    if latency_ms > BUCKET_BOUNDS_MS[-1]:
+        return _NUM_BUCKETS - 1
+    exp = 0
+    scaled = latency_ms * 10  # decade 0 == 0.1..0.9 ms
+    while scaled > 10:
+        scaled /= 10
+        exp += 1
+    step = int(scaled) if scaled == int(scaled) else int(scaled) + 1
+    idx = exp * 9 + step - 1
+    # Float rounding at decade edges: settle on the exact bucket
+    while idx > 0 and latency_ms <= BUCKET_BOUNDS_MS[idx - 1]:
+        idx -= 1
+    while latency_ms > BUCKET_BOUNDS_MS[idx]:
+        idx += 1
+    return idx
+
+
+def _status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx" if 100 <= status_code < 600 else "other"
+
 
+# cache name -> (zero-arg callable returning integer stats, the keys that are gauges)
+_cache_stats_sources: Dict[str, Tuple[Callable[[], Dict[str, int]], FrozenSet[str]]] = {}
 
-@dataclass
-class RequestRecord:
-    """Single request measurement."""
-    timestamp: float
-    latency_ms: float
-    status_code: int
-    path: str
+
+def register_cache_stats(name: str, source: Callable[[], Dict[str, int]],
+                         gauges: Iterable[str] = ("entries",)) -> None:
+    """
+    Expose an in-process cache's stats in snapshots and on /metrics. Keys in
+    ``gauges`` are point-in-time values; every other key is an event counter.
+    """
+    _cache_stats_sources[name] = (source, frozenset(gauges))
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Every registered stat of this process, counters and gauges alike."""
+    stats = {}
+    for name, (source, _) in list(_cache_stats_sources.items()):
+        try:
+            stats[name] = {k: int(v) for k, v in source().items()}
+        except Exception as e:
+            logger.warning("Cache stats source %s failed: %s", name, e)
+    return stats
+
+
+def _split_cache_stats() -> Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]:
+    """(event counters, gauges) of this process's caches."""
+    counters: Dict[str, Dict[str, int]] = {}
+    gauges: Dict[str, Dict[str, int]] = {}
+    for name, stats in cache_stats().items():
+        gauge_keys = _cache_stats_sources[name][1]
+        counters[name] = {k: v for k, v in stats.items() if k not in gauge_keys}
+        gauges[name] = {k: v for k, v in stats.items() if k in gauge_keys}
+    return counters, gauges
+
+
+def histogram_percentile(counts: List[int], pct: float) -> float:
+    """Percentile (ms) from bucket counts, interpolating linearly inside the bucket."""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = total * pct / 100
+    seen = 0
+    for i, c in enumerate(counts):
+        if c and seen + c >= rank:
+            lower = BUCKET_BOUNDS_MS[i - 1] if i > 0 else 0.0
+            upper = BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else BUCKET_BOUNDS_MS[-1]
+            return lower + (upper - lower) * max(0.0, rank - seen) / c
+        seen += c
+    return BUCKET_BOUNDS_MS[-1]
+
+
+class _Series:
+    """One histogram: bucket counts + latency sum."""
+    __slots__ = ("counts", "sum")
+
+    def __init__(self) -> None:
+        self.counts = [0] * _NUM_BUCKETS
+        self.sum = 0.0
+
+
+class _Shard:
+    """Per-thread counters; only the owning thread writes."""
+
+    def __init__(self) -> None:
+        self.series: Dict[Tuple[str, str], _Series] = {}
+        # Per-second request counts for RPS, ring indexed by second % window
+        self.rps_sec = [0] * RPS_WINDOW_SECONDS
+        self.rps_count = [0] * RPS_WINDOW_SECONDS
+
+
+def _copy_items(d: dict) -> list:
+    # Another thread may add a key mid-copy; retry instead of locking the writer
+    while True:
+        try:
+            return list(d.items())
+        except RuntimeError:
+            continue
 
 
 class MetricsCollector:
     """
     Collects real-time application metrics in-memory.
-    
-    All methods are thread-safe via a single lock.
-    Designed for single-instance deployment (Render).
+
+    ``record_request`` is lock-free (thread-local shards); snapshots merge the
+    shards. Designed for single-instance deployment (Render), with optional
+    multi-worker aggregation through ``METRICS_SHARED_DIR``.
     """
-    
+
     def __init__(self) -> None:
-        self._lock = threading.Lock()
+        self._lock = threading.Lock()          # shard registry + history only
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
         self._start_time = time.monotonic()
         self._boot_time = time.time()
-        
-        # Request tracking
-        self._total_requests: int = 0
-        self._total_errors_4xx: int = 0
-        self._total_errors_5xx: int = 0
-        
-        # Circular buffer for latency percentiles
-        self._latency_buffer: deque = deque(maxlen=LATENCY_BUFFER_SIZE)
-        
-        # Sliding window for RPS calculation
-        self._request_timestamps: deque = deque(maxlen=10000)
-        
+
+        # Route normalization cache (path -> route); bounded by MAX_ROUTES * 4
+        self._route_cache: Dict[str, str] = {}
+        self._routes: set = set()
+
         # Time-series history for charts
         self._latency_history: deque = deque(maxlen=HISTORY_BUFFER_SIZE)
         self._rps_history: deque = deque(maxlen=HISTORY_BUFFER_SIZE)
         self._error_history: deque = deque(maxlen=HISTORY_BUFFER_SIZE)
-        
-        # Path-level stats (top endpoints)
-        self._path_counts: Dict[str, int] = {}
-        self._path_latency_sum: Dict[str, float] = {}
+        # (time, merged bucket counts) at each snapshot, for windowed percentiles
+        self._baselines: deque = deque(maxlen=HISTORY_BUFFER_SIZE)
+
+    # ─── Write path ──────────────────────────────────────────────────────────
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _route(self, path: str) -> str:
+        route = self._route_cache.get(path)
+        if route is None:
+            route = self._normalize_path(path)
+            if route not in self._routes:
+                if len(self._routes) >= MAX_ROUTES:
+                    route = "other"
+                else:
+                    self._routes.add(route)
+            if len(self._route_cache) < MAX_ROUTES * 4:
+                self._route_cache[path] = route
+        return route
 
     def record_request(self, latency_ms: float, status_code: int, path: str = "") -> None:
         """Record a completed HTTP request."""
-        now = time.time()
+        shard = self._shard()
+        key = (self._route(path), _status_class(status_code))
+        series = shard.series.get(key)
+        if series is None:
+            series = shard.series[key] = _Series()
+        series.counts[bucket_index(latency_ms)] += 1
+        series.sum += latency_ms
+
+        sec = int(time.time())
+        slot = sec % RPS_WINDOW_SECONDS
+        if shard.rps_sec[slot] != sec:
+            shard.rps_sec[slot] = sec
+            shard.rps_count[slot] = 0
+        shard.rps_count[slot] += 1
+
+    # ─── Merge / export ──────────────────────────────────────────────────────
+
+    def export_state(self) -> Dict:
+        """JSON-serializable, mergeable histogram state of this process."""
         with self._lock:
-            self._total_requests += 1
-            self._latency_buffer.append(latency_ms)
-            self._request_timestamps.append(now)
-            
-            if 400 <= status_code < 500:
-                self._total_errors_4xx += 1
-            elif status_code >= 500:
-                self._total_errors_5xx += 1
-            
-            # Normalize path (strip IDs for grouping)
-            clean_path = self._normalize_path(path)
-            self._path_counts[clean_path] = self._path_counts.get(clean_path, 0) + 1
-            self._path_latency_sum[clean_path] = self._path_latency_sum.get(clean_path, 0) + latency_ms
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, str], _Series] = {}
+        rps: Dict[int, int] = {}
+        counters, gauges = _split_cache_stats()
+        for shard in shards:
+            for key, series in _copy_items(shard.series):
+                target = merged.get(key)
+                if target is None:
+                    target = merged[key] = _Series()
+                counts = list(series.counts)
+                for i, c in enumerate(counts):
+                    target.counts[i] += c
+                target.sum += series.sum
+            for sec, count in zip(list(shard.rps_sec), list(shard.rps_count)):
+                if count:
+                    rps[sec] = rps.get(sec, 0) + count
+        return {
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "boot_time": self._boot_time,
+            "bounds_ms": BUCKET_BOUNDS_MS,
+            "series": [
+                {"route": route, "status": status, "counts": s.counts, "sum": s.sum}
+                for (route, status), s in merged.items()
+            ],
+            "rps": {str(sec): c for sec, c in rps.items()},
+            "caches": counters,
+            "cache_gauges": gauges,
+        }
+
+    def write_shared_state(self, directory: str = "") -> None:
+        """Publish this worker's state for cross-worker aggregation (atomic rename)."""
+        directory = directory or METRICS_SHARED_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.export_state(), f)
+        os.replace(tmp, path)
+
+    def collect_states(self, directory: str = "") -> List[Dict]:
+        """This worker's live state plus the latest state of every other worker."""
+        states = [self.export_state()]
+        directory = directory or METRICS_SHARED_DIR
+        if not directory or not os.path.isdir(directory):
+            return states
+        now = time.time()
+        own = f"metrics-{os.getpid()}.json"
+        for name in os.listdir(directory):
+            if not name.startswith("metrics-") or not name.endswith(".json") or name == own:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > SHARED_STATE_MAX_AGE_SECONDS:
+                    continue
+                with open(path) as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping metrics state %s: %s", name, e)
+        return states
+
+    # ─── Snapshots ───────────────────────────────────────────────────────────
 
     def take_snapshot(self) -> None:
         """Take a point-in-time snapshot for time-series charts."""
+        state = merge_states([self.export_state()])
+        now = time.time()
+        totals = _total_counts(state)
+        errors_5xx = sum(sum(s["counts"]) for s in state["series"] if s["status"] == "5xx")
+        total = sum(totals)
+
         with self._lock:
-            now = time.time()
-            
-            # Calculate current RPS
-            cutoff = now - RPS_WINDOW_SECONDS
-            recent = [t for t in self._request_timestamps if t > cutoff]
-            rps = len(recent) / RPS_WINDOW_SECONDS if recent else 0
-            
-            # Calculate current percentiles
-            latencies = sorted(self._latency_buffer) if self._latency_buffer else [0]
-            p50 = self._percentile(latencies, 50)
-            p95 = self._percentile(latencies, 95)
-            p99 = self._percentile(latencies, 99)
-            
-            # Error rate (last window)
-            total_recent = len(recent) if recent else 1
-            # Count 5xx in last window — approximate from rate
-            error_rate = (self._total_errors_5xx / max(1, self._total_requests)) * 100
-            
-            # Store snapshots
+            # Percentiles over the interval since the previous snapshot
+            prev = self._baselines[-1][1] if self._baselines else [0] * _NUM_BUCKETS
+            window = [c - p for c, p in zip(totals, prev)]
+            self._baselines.append((now, totals))
+
             label = time.strftime("%H:%M:%S", time.gmtime(now))
             self._latency_history.append({
                 "time": label,
-                "p50": round(p50, 1),
-                "p95": round(p95, 1),
-                "p99": round(p99, 1),
+                "p50": round(histogram_percentile(window, 50), 1),
+                "p95": round(histogram_percentile(window, 95), 1),
+                "p99": round(histogram_percentile(window, 99), 1),
             })
             self._rps_history.append({
                 "time": label,
-                "value": round(rps, 2),
+                "value": round(_rps(state, now), 2),
             })
             self._error_history.append({
                 "time": label,
-                "value": round(error_rate, 4),
+                "value": round((errors_5xx / max(1, total)) * 100, 4),
             })
 
+        try:
+            self.write_shared_state()
+        except OSError as e:
+            logger.warning("Metrics shared state write failed: %s", e)
+
+    def _window_counts(self, totals: List[int], now: float) -> List[int]:
+        """Bucket counts of roughly the last RPS_WINDOW_SECONDS (lifetime before the first snapshot)."""
+        with self._lock:
+            baseline = None
+            for ts, counts in self._baselines:
+                if now - ts >= RPS_WINDOW_SECONDS:
+                    baseline = counts
+                else:
+                    break
+        if baseline is None:
+            return totals
+        return [c - b for c, b in zip(totals, baseline)]
+
     def get_snapshot(self) -> Dict:
         """Get current metrics snapshot for the Hyperscale Dashboard API."""
+        state = merge_states([self.export_state()])
+        now = time.time()
+
+        totals = _total_counts(state)
+        window = self._window_counts(totals, now)
+        p50 = histogram_percentile(window, 50)
+        p95 = histogram_percentile(window, 95)
+        p99 = histogram_percentile(window, 99)
+
+        total_requests = sum(totals)
+        total_4xx = sum(sum(s["counts"]) for s in state["series"] if s["status"] == "4xx")
+        total_5xx = sum(sum(s["counts"]) for s in state["series"] if s["status"] == "5xx")
+        total = max(1, total_requests)
+
+        # Process metrics
+        process_info = self._get_process_info()
+
+        # Uptime
+        uptime_seconds = time.monotonic() - self._start_time
+
         with self._lock:
-            now = time.time()
-            
-            # Current RPS
-            cutoff = now - RPS_WINDOW_SECONDS
-            recent = [t for t in self._request_timestamps if t > cutoff]
-            rps = len(recent) / RPS_WINDOW_SECONDS if recent else 0
-            
-            # Percentiles
-            latencies = sorted(self._latency_buffer) if self._latency_buffer else [0]
-            p50 = self._percentile(latencies, 50)
-            p95 = self._percentile(latencies, 95)
-            p99 = self._percentile(latencies, 99)
-            
-            # Error rates
-            total = max(1, self._total_requests)
-            error_rate_5xx = self._total_errors_5xx / total
-            error_rate_4xx = self._total_errors_4xx / total
-            
+            latency_history = list(self._latency_history)
+            rps_history = list(self._rps_history)
+            error_history = list(self._error_history)
+
+        return {
+            # Live metrics
+            "p99_latency_ms": round(p99, 1),
+            "p95_latency_ms": round(p95, 1),
+            "p50_latency_ms": round(p50, 1),
+            "rps": round(_rps(state, now), 2),
+            "error_rate_5xx": round(total_5xx / total, 6),
+            "error_rate_4xx": round(total_4xx / total, 6),
+            "total_requests": total_requests,
+            "total_errors_5xx": total_5xx,
+            "total_errors_4xx": total_4xx,
+
+            # In-process cache counters and gauges (this worker)
+            "caches": cache_stats(),
+
             # Process metrics
-            process_info = self._get_process_info()
-            
+            "memory_usage_mb": process_info["memory_mb"],
+            "cpu_percent": process_info["cpu_percent"],
+            "thread_count": process_info["thread_count"],
+
             # Uptime
-            uptime_seconds = time.monotonic() - self._start_time
-            
+            "uptime_seconds": round(uptime_seconds),
+            "boot_time": self._boot_time,
+
+            # Time-series history (for charts)
+            "latency_history": latency_history,
+            "rps_history": rps_history,
+            "error_history": error_history,
+
             # Top endpoints
-            top_endpoints = sorted(
-                [
-                    {
-                        "path": p,
-                        "count": c,
-                        "avg_latency_ms": round(self._path_latency_sum.get(p, 0) / max(1, c), 1)
-                    }
-                    for p, c in self._path_counts.items()
-                ],
-                key=lambda x: x["count"],
-                reverse=True
-            )[:10]
-            
-            return {
-                # Live metrics
-                "p99_latency_ms": round(p99, 1),
-                "p95_latency_ms": round(p95, 1),
-                "p50_latency_ms": round(p50, 1),
-                "rps": round(rps, 2),
-                "error_rate_5xx": round(error_rate_5xx, 6),
-                "error_rate_4xx": round(error_rate_4xx, 6),
-                "total_requests": self._total_requests,
-                "total_errors_5xx": self._total_errors_5xx,
-                "total_errors_4xx": self._total_errors_4xx,
-                
-                # Process metrics
-                "memory_usage_mb": process_info["memory_mb"],
-                "cpu_percent": process_info["cpu_percent"],
-                "thread_count": process_info["thread_count"],
-                
-                # Uptime
-                "uptime_seconds": round(uptime_seconds),
-                "boot_time": self._boot_time,
-                
-                # Time-series history (for charts)
-                "latency_history": list(self._latency_history),
-                "rps_history": list(self._rps_history),
-                "error_history": list(self._error_history),
-                
-                # Top endpoints
-                "top_endpoints": top_endpoints,
-                
-                # Infrastructure (single instance)
-                "region": "us-east-1 (Washington D.C.)",
-                "instance_count": 1,
-                "has_redis": False,
-                "has_cdn": True,
-            }
-
-    def _percentile(self, sorted_data: List[float], pct: int) -> float:
-        """Calculate percentile from sorted list."""
-        if not sorted_data:
-            return 0.0
-        idx = int(len(sorted_data) * pct / 100)
-        idx = min(idx, len(sorted_data) - 1)
-        return sorted_data[idx]
+            "top_endpoints": top_routes(state, 10),
+
+            # Infrastructure (single instance)
+            "region": "us-east-1 (Washington D.C.)",
+            "instance_count": 1,
+            "has_redis": False,
+            "has_cdn": True,
+        }
 
     def _normalize_path(self, path: str) -> str:
         """Normalize API paths by replacing IDs with :id."""
@@ -246,9 +447,8 @@ class MetricsCollector:
                 }
             except Exception:
                 pass
-        
+
         # Fallback without psutil
-        import os
         return {
             "memory_mb": 0,
             "cpu_percent": 0,
@@ -256,5 +456,133 @@ class MetricsCollector:
         }
 
 
+# ─── Mergeable state helpers ───────────────────────────────────────────────────
+
+def merge_states(states: Iterable[Dict]) -> Dict:
+    """Sum the histogram states of several workers into one."""
+    series: Dict[Tuple[str, str], Dict] = {}
+    rps: Dict[str, int] = {}
+    caches: Dict[str, Dict[str, int]] = {}
+    # pid -> cache -> gauge: point-in-time values are never summed
+    gauges: Dict[str, Dict[str, Dict[str, int]]] = {}
+    workers = 0
+    for state in states:
+        if state.get("bounds_ms") != BUCKET_BOUNDS_MS:
+            logger.warning("Skipping metrics state of pid %s: bucket layout differs", state.get("pid"))
+            continue
+        workers += 1
+        for s in state["series"]:
+            key = (s["route"], s["status"])
+            target = series.get(key)
+            if target is None:
+                target = series[key] = {"route": s["route"], "status": s["status"],
+                                        "counts": [0] * _NUM_BUCKETS, "sum": 0.0}
+            for i, c in enumerate(s["counts"]):
+                target["counts"][i] += c
+            target["sum"] += s["sum"]
+        for sec, count in state.get("rps", {}).items():
+            rps[sec] = rps.get(sec, 0) + count
+        for name, counters in state.get("caches", {}).items():
+            target = caches.setdefault(name, {})
+            for k, v in counters.items():
+                target[k] = target.get(k, 0) + v
+        if state.get("cache_gauges"):
+            gauges[str(state.get("pid", workers))] = state["cache_gauges"]
+    return {"bounds_ms": BUCKET_BOUNDS_MS, "series": list(series.values()), "rps": rps,
+            "caches": caches, "cache_gauges": gauges, "workers": workers}
+
+
+def _total_counts(state: Dict) -> List[int]:
+    totals = [0] * _NUM_BUCKETS
+    for s in state["series"]:
+        for i, c in enumerate(s["counts"]):
+            totals[i] += c
+    return totals
+
+
+def _rps(state: Dict, now: float) -> float:
+    cutoff = now - RPS_WINDOW_SECONDS
+    return sum(c for sec, c in state["rps"].items() if int(sec) > cutoff) / RPS_WINDOW_SECONDS
+
+
+def top_routes(state: Dict, limit: int = 10) -> List[Dict]:
+    """Busiest routes (all status classes) with per-route percentiles."""
+    routes: Dict[str, Dict] = {}
+    for s in state["series"]:
+        r = routes.setdefault(s["route"], {"counts": [0] * _NUM_BUCKETS, "sum": 0.0})
+        for i, c in enumerate(s["counts"]):
+            r["counts"][i] += c
+        r["sum"] += s["sum"]
+    out = []
+    for route, r in routes.items():
+        count = sum(r["counts"])
+        out.append({
+            "path": route,
+            "count": count,
+            "avg_latency_ms": round(r["sum"] / max(1, count), 1),
+            "p50_latency_ms": round(histogram_percentile(r["counts"], 50), 1),
+            "p99_latency_ms": round(histogram_percentile(r["counts"], 99), 1),
+        })
+    out.sort(key=lambda x: x["count"], reverse=True)
+    return out[:limit]
+
+
+# Exposition keeps the 1-2-5 bounds of each decade (cumulative counts stay exact)
+_EXPORTED_BUCKETS = {
+    i for i in range(len(BUCKET_BOUNDS_MS) - 1) if i % 9 + 1 in (1, 2, 5)
+} | {len(BUCKET_BOUNDS_MS) - 1, _NUM_BUCKETS - 1}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(state: Dict) -> str:
+    """Prometheus text exposition (format 0.0.4) of a (merged) state."""
+    lines = [
+        "# HELP http_request_duration_seconds HTTP request latency by route and status class.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    bounds = [f"{b / 1000:g}" for b in BUCKET_BOUNDS_MS] + ["+Inf"]
+    for s in sorted(state["series"], key=lambda x: (x["route"], x["status"])):
+        labels = f'route="{_label(s["route"])}",status="{s["status"]}"'
+        cumulative = 0
+        for i, (le, c) in enumerate(zip(bounds, s["counts"])):
+            cumulative += c
+            if i in _EXPORTED_BUCKETS:
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {s['sum'] / 1000:.6f}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+    lines += [
+        "# HELP http_requests_per_second Requests per second over the last minute.",
+        "# TYPE http_requests_per_second gauge",
+        f"http_requests_per_second {_rps(state, time.time()):.4f}",
+        "# HELP metrics_workers_reporting Worker processes included in this exposition.",
+        "# TYPE metrics_workers_reporting gauge",
+        f"metrics_workers_reporting {state.get('workers', 1)}",
+    ]
+    caches = state.get("caches") or {}
+    if caches:
+        lines += [
+            "# HELP app_cache_events_total In-process cache events (hit, miss, invalidation, ...) by cache.",
+            "# TYPE app_cache_events_total counter",
+        ]
+        for name in sorted(caches):
+            for event, value in sorted(caches[name].items()):
+                lines.append(f'app_cache_events_total{{cache="{_label(name)}",event="{_label(event)}"}} {value}')
+    gauges = state.get("cache_gauges") or {}
+    if gauges:
+        lines += [
+            "# HELP app_cache_gauge In-process cache point-in-time values (entries, bytes, queue depth, ...) by worker.",
+            "# TYPE app_cache_gauge gauge",
+        ]
+        for pid in sorted(gauges):
+            for name in sorted(gauges[pid]):
+                for key, value in sorted(gauges[pid][name].items()):
+                    lines.append(f'app_cache_gauge{{cache="{_label(name)}",stat="{_label(key)}",'
+                                 f'pid="{_label(pid)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
 # ─── Singleton ─────────────────────────────────────────────────────────────────
 metrics = MetricsCollector()
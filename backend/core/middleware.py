@@ -31,10 +31,12 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
         finally:
             latency_ms = (_time.monotonic() - start) * 1000
             try:
+                # Matched route template keeps histogram cardinality bounded
+                route = request.scope.get("route")
                 _metrics_collector.record_request(
                     latency_ms=latency_ms,
                     status_code=status_code,
-                    path=str(request.url.path),
+                    path=getattr(route, "path", None) or str(request.url.path),
                 )
             except Exception:
                 pass  # Never let metrics recording crash the request
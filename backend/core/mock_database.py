@@ -1,12 +1,27 @@
 import hashlib
-from datetime import datetime, timezone
 import asyncio
 import json
+import operator
 import os
 import re
+import uuid
+
+from bson import ObjectId
+
+from .mock_journal import MockJournal, OP_INSERT, OP_UPDATE, OP_DELETE
+from .mock_indexes import CollectionIndexes
 
 DB_FILE = "local_db.json"
 
+_RANGE_OPS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+# "journal" (default): append-only WAL + periodic snapshot/compaction.
+# "snapshot": legacy full JSON rewrite on every write.
+MOCK_DB_STORAGE = os.getenv("MOCK_DB_STORAGE", "journal").lower()
+MOCK_DB_GROUP_COMMIT_MS = float(os.getenv("MOCK_DB_GROUP_COMMIT_MS", "5"))
+MOCK_DB_SNAPSHOT_EVERY = int(os.getenv("MOCK_DB_SNAPSHOT_EVERY", "2000"))
+MOCK_DB_SNAPSHOT_INTERVAL_S = float(os.getenv("MOCK_DB_SNAPSHOT_INTERVAL_S", "300"))
+
 class MockCursor:
     def __init__(self, data):
         self.data = data
@@ -57,7 +72,9 @@ class MockClient:
         return self._db
         
     def close(self):
-        pass
+        # Graceful shutdown: compact the journal into a fresh snapshot
+        self._db.checkpoint()
+        self._db.close()
 
 class MockCollection:
     def __init__(self, name, db_instance):
@@ -67,9 +84,38 @@ class MockCollection:
         if name not in self.db_instance.data_store:
             self.db_instance.data_store[name] = []
         self.data = self.db_instance.data_store[name]
+        self.indexes = self.db_instance.get_indexes(name)
+
+    async def create_index(self, keys, name=None, **kwargs):
+        """Motor-compatible; unique/sparse are accepted but not enforced by the mock."""
+        self.indexes.create(keys)
+        if name:
+            return name
+        return "_".join(f"{k}_{d}" for k, d in (keys if not isinstance(keys, str) else [(keys, 1)]))
+
+    def explain(self, query):
+        """Which access path the planner would take for this query."""
+        plan = self.indexes.plan(query)
+        return {"collection": self.name, "index": plan["index"], "estimate": plan["estimate"]}
+
+    def _iter_matches(self, query):
+        candidates = self.indexes.candidates(query) if query else None
+        source = self.data if candidates is None else candidates
+        for item in source:
+            if self._matches_query(item, query):
+                yield item
         
     def _matches_query(self, item, query):
         for k, v in query.items():
+            if k == "$or":
+                if not any(self._matches_query(item, sub) for sub in v):
+                    return False
+                continue
+            if isinstance(v, dict) and "$exists" in v:
+                if bool(v["$exists"]) != (k in item):
+                    return False
+                if k not in item:
+                    continue
             if k not in item:
                 return False
             
@@ -77,18 +123,18 @@ class MockCollection:
             
             if isinstance(v, dict):
                 for op, op_val in v.items():
-                    if op == "$gt":
-                        if not (item_val > op_val): return False
-                    elif op == "$gte":
-                        if not (item_val >= op_val): return False
-                    elif op == "$lt":
-                        if not (item_val < op_val): return False
-                    elif op == "$lte":
-                        if not (item_val <= op_val): return False
+                    if op in _RANGE_OPS:
+                        # Like Mongo's type bracketing: values of another type never match
+                        try:
+                            if not _RANGE_OPS[op](item_val, op_val): return False
+                        except TypeError:
+                            return False
                     elif op == "$in":
                         if item_val not in op_val: return False
                     elif op == "$ne":
                          if item_val == op_val: return False
+                    elif op == "$exists":
+                        continue
                     elif op == "$regex":
                         try:
                             if not re.search(op_val, str(item_val)): return False
@@ -100,56 +146,97 @@ class MockCollection:
         return True
 
     async def find_one(self, query, projection=None, sort=None, **kwargs):
-        data_to_search = self.data
-        if sort:
-            for key, direction in sort:
-                reverse = direction == -1
-                data_to_search = sorted(data_to_search, key=lambda x: x.get(key), reverse=reverse)
-        
-        for item in data_to_search:
-            if self._matches_query(item, query):
-                return item
-        return None
+        if not sort:
+            return next(self._iter_matches(query), None)
+
+        matches = list(self._iter_matches(query))
+        for key, direction in sort:
+            reverse = direction == -1
+            matches = sorted(matches, key=lambda x: x.get(key), reverse=reverse)
+        return matches[0] if matches else None
         
-    def find(self, query, projection=None):
-        results = []
-        for item in self.data:
-            if self._matches_query(item, query):
-                results.append(item)
-        return MockCursor(results)
+    def find(self, query=None, projection=None, **kwargs):
+        return MockCursor(list(self._iter_matches(query or {})))
         
-    async def insert_one(self, doc):
+    async def insert_one(self, doc, **kwargs):
         if "_id" not in doc:
-            doc["_id"] = str(len(self.data) + 1000 + int(datetime.utcnow().timestamp()))
+            # Unique and increasing like Mongo's own ids: journal replay is keyed on _id,
+            # and incremental backups page unstamped docs by _id
+            doc["_id"] = str(ObjectId())
         
         self.data.append(doc)
-        self.db_instance.save_db()
+        self.indexes.add(doc)
+        self.db_instance.record_write(self.name, OP_INSERT, doc)
         return type('obj', (object,), {'inserted_id': doc["_id"]})
         
+    async def insert_many(self, docs, ordered=True, **kwargs):
+        ids = []
+        for doc in docs:
+            res = await self.insert_one(doc)
+            ids.append(res.inserted_id)
+        return type('obj', (object,), {'inserted_ids': ids})
+
     async def count_documents(self, query):
-        count = 0
-        for item in self.data:
-            if self._matches_query(item, query):
-                count += 1
-        return count
+        if not query:
+            return len(self.data)
+        return sum(1 for _ in self._iter_matches(query))
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self.data)
+
+    def _apply_update(self, item, update):
+        # Indexed field values may change: unindex, mutate, re-index in place
+        ordinal = self.indexes.remove(item)
+        if "$set" in update:
+            item.update(update["$set"])
+        if "$inc" in update:
+            for k, v in update["$inc"].items():
+                if k in item:
+                    item[k] = item[k] + v
+                else:
+                    item[k] = v
+        if "$push" in update:
+             for k, v in update["$push"].items():
+                if k not in item: item[k] = []
+                item[k].append(v)
+        if "$addToSet" in update:
+            for k, v in update["$addToSet"].items():
+                values = item.setdefault(k, [])
+                if v not in values:
+                    values.append(v)
+        if "$max" in update:
+            for k, v in update["$max"].items():
+                if k not in item or item[k] < v:
+                    item[k] = v
+        if "$unset" in update:
+            for k in update["$unset"]:
+                item.pop(k, None)
+        self.indexes.add(item, ordinal)
+
+        self.db_instance.record_write(self.name, OP_UPDATE, item)
+
+    async def update_many(self, query, update, **kwargs):
+        items = list(self._iter_matches(query))
+        for item in items:
+            self._apply_update(item, update)
+        return type('obj', (object,), {'matched_count': len(items), 'modified_count': len(items), 'upserted_id': None})
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False, projection=None, **kwargs):
+        item = await self.find_one(query)
+        if item:
+            before = dict(item)
+            self._apply_update(item, update)
+            return item if return_document else before
+        if not upsert:
+            return None
+        await self.update_one(query, update, upsert=True)
+        return await self.find_one(query) if return_document else None
 
     async def update_one(self, query, update, upsert=False, **kwargs):
         item = await self.find_one(query)
         if item:
-            if "$set" in update:
-                item.update(update["$set"])
-            if "$inc" in update:
-                for k, v in update["$inc"].items():
-                    if k in item:
-                        item[k] = item[k] + v
-                    else:
-                        item[k] = v
-            if "$push" in update:
-                 for k, v in update["$push"].items():
-                    if k not in item: item[k] = []
-                    item[k].append(v)
-            
-            self.db_instance.save_db()
+            # Indexed field values may change: unindex, mutate, re-index in place
+            self._apply_update(item, update)
             return type('obj', (object,), {'modified_count': 1, 'upserted_id': None})
             
         elif upsert:
@@ -159,6 +246,10 @@ class MockCollection:
             if "$inc" in update:
                 for k, v in update["$inc"].items():
                     new_doc[k] = v
+            if "$max" in update:
+                new_doc.update(update["$max"])
+            if "$setOnInsert" in update:
+                new_doc.update(update["$setOnInsert"])
             
             # Helper to remove operators
             clean_doc = {k:v for k,v in new_doc.items() if not k.startswith('$')}
@@ -168,37 +259,167 @@ class MockCollection:
             
         return type('obj', (object,), {'modified_count': 0, 'upserted_id': None})
         
+    async def replace_one(self, query, replacement, upsert=False, **kwargs):
+        item = await self.find_one(query)
+        if item:
+            ordinal = self.indexes.remove(item)
+            doc_id = item.get("_id")
+            item.clear()
+            item.update(replacement)
+            if doc_id is not None:
+                item["_id"] = doc_id
+            self.indexes.add(item, ordinal)
+            self.db_instance.record_write(self.name, OP_UPDATE, item)
+            return type('obj', (object,), {'matched_count': 1, 'modified_count': 1, 'upserted_id': None})
+        if upsert:
+            doc = dict(replacement)
+            if "_id" in query and "_id" not in doc:
+                doc["_id"] = query["_id"]
+            res = await self.insert_one(doc)
+            return type('obj', (object,), {'matched_count': 0, 'modified_count': 0, 'upserted_id': res.inserted_id})
+        return type('obj', (object,), {'matched_count': 0, 'modified_count': 0, 'upserted_id': None})
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        """pymongo request objects (InsertOne / UpdateOne / UpdateMany / ReplaceOne / DeleteOne), applied in order."""
+        counts = {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "deleted_count": 0, "upserted_count": 0}
+        for req in requests:
+            kind = type(req).__name__
+            if kind == "InsertOne":
+                await self.insert_one(req._doc)
+                counts["inserted_count"] += 1
+                continue
+            if kind == "DeleteOne":
+                res = await self.delete_one(req._filter)
+                counts["deleted_count"] += res.deleted_count
+                continue
+            if kind == "ReplaceOne":
+                res = await self.replace_one(req._filter, req._doc, upsert=req._upsert)
+            elif kind == "UpdateOne":
+                res = await self.update_one(req._filter, req._doc, upsert=req._upsert)
+            elif kind == "UpdateMany":
+                res = await self.update_many(req._filter, req._doc)
+            else:
+                raise TypeError(f"Unsupported bulk_write request: {kind}")
+            if res.upserted_id is not None:
+                counts["upserted_count"] += 1
+            else:
+                counts["matched_count"] += getattr(res, "matched_count", res.modified_count)
+                counts["modified_count"] += res.modified_count
+        return type('obj', (object,), counts)
+
+    async def delete_many(self, query):
+        items = list(self._iter_matches(query))
+        doomed = {id(item) for item in items}
+        # One pass by identity (list.remove would be O(n) per doc and match by equality)
+        self.data[:] = [d for d in self.data if id(d) not in doomed]
+        for item in items:
+            self.indexes.remove(item)
+            self.db_instance.record_write(self.name, OP_DELETE, item)
+        return type('obj', (object,), {'deleted_count': len(items)})
+
     async def delete_one(self, query):
         item = await self.find_one(query)
         if item:
             self.data.remove(item)
-            self.db_instance.save_db()
+            self.indexes.remove(item)
+            self.db_instance.record_write(self.name, OP_DELETE, item)
             return type('obj', (object,), {'deleted_count': 1})
         return type('obj', (object,), {'deleted_count': 0})
 
 class MockDatabase:
-    def __init__(self):
+    def __init__(self, db_file=DB_FILE, storage=MOCK_DB_STORAGE):
+        self.db_file = db_file
         self.data_store = {}
+        self._indexes = {}
+        self.journal = None
+        if storage == "journal":
+            self.journal = MockJournal(
+                db_file,
+                group_commit_ms=MOCK_DB_GROUP_COMMIT_MS,
+                snapshot_every=MOCK_DB_SNAPSHOT_EVERY,
+                snapshot_interval_s=MOCK_DB_SNAPSHOT_INTERVAL_S,
+            )
         self.load_db()
 
     def load_db(self):
-        if os.path.exists(DB_FILE):
+        self._indexes = {}
+        if self.journal:
+            self._load_journaled()
+            return
+        if os.path.exists(self.db_file):
             try:
-                with open(DB_FILE, 'r') as f:
+                with open(self.db_file, 'r') as f:
                     self.data_store = json.load(f)
-                print(f"[DB] Loaded persistent data from {DB_FILE}")
+                print(f"[DB] Loaded persistent data from {self.db_file}")
             except Exception as e:
-                print(f"[DB] Failed to load {DB_FILE}: {e}. Starting fresh.")
+                print(f"[DB] Failed to load {self.db_file}: {e}. Starting fresh.")
                 self.seed_defaults()
         else:
             self.seed_defaults()
             self.save_db()
 
+    def _load_journaled(self):
+        try:
+            data_store = self.journal.recover()
+        except Exception as e:
+            print(f"[DB] Journal recovery from {self.db_file} failed: {e}. Starting fresh.")
+            data_store = None
+
+        if data_store is None:
+            self.seed_defaults()
+            self.journal.attach(self.data_store)
+            self.journal.snapshot(self.data_store)
+        else:
+            self.data_store = data_store
+            self.journal.attach(self.data_store)
+            print(f"[DB] Loaded persistent data from {self.db_file} (+{self.journal.stats['replayed']} journal ops)")
+
+            # Journal replay is keyed on _id; backfill legacy docs and persist the ids
+            missing = 0
+            for docs in self.data_store.values():
+                for doc in docs:
+                    if isinstance(doc, dict) and "_id" not in doc:
+                        doc["_id"] = uuid.uuid4().hex
+                        missing += 1
+            if missing:
+                self.journal.snapshot(self.data_store)
+
+    def get_indexes(self, name):
+        """Indexes live on the database: MockCollection handles are created per attribute access."""
+        indexes = self._indexes.get(name)
+        if indexes is None:
+            indexes = self._indexes[name] = CollectionIndexes(name, self.data_store[name])
+        return indexes
+
+    def record_write(self, collection, op, doc):
+        """Persist a single document mutation (WAL append or legacy full save)."""
+        if not self.journal:
+            self.save_db()
+            return
+        if "_id" not in doc:
+            # Seeded / imported docs may lack _id; the journal keys replay on it
+            doc["_id"] = uuid.uuid4().hex
+        self.journal.append(collection, op, doc["_id"], None if op == OP_DELETE else doc)
+
+    def checkpoint(self):
+        """Force a snapshot + WAL compaction (e.g. on graceful shutdown)."""
+        if self.journal:
+            self.journal.snapshot(self.data_store)
+        else:
+            self.save_db()
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
     def save_db(self):
+        if self.journal:
+            self.checkpoint()
+            return
         try:
             # Basic JSON dump (wont handle Date objects well, but for a mock string/int/dict is usually fine)
             # In a real app we'd need a custom encoder
-            with open(DB_FILE, 'w') as f:
+            with open(self.db_file, 'w') as f:
                 json.dump(self.data_store, f, indent=2, default=str)
         except Exception as e:
             print(f"[DB] Save failed: {e}")
@@ -241,6 +462,9 @@ class MockDatabase:
             "categories": []
         }
 
+    async def list_collection_names(self):
+        return list(self.data_store.keys())
+
     def __getattr__(self, name):
         return MockCollection(name, self)
 
@@ -0,0 +1,289 @@
+"""
+Mock Indexes - Secondary indexes and a tiny query planner for MockCollection.
+
+Two index kinds are maintained per collection:
+
+* ``HashIndex``  - value -> {ordinals}; serves equality and ``$in``.
+* ``RangeIndex`` - sorted (value, ordinal) pairs per type family; serves
+  ``$gt/$gte/$lt/$lte`` (ISO timestamp strings, datetimes, numbers).
+
+Every document gets a stable insertion ordinal so index lookups can return
+matches in natural (insertion) order, exactly like a full scan would. The
+values a doc was indexed under are kept per ordinal and unindexed from, so a
+doc mutated in place by a caller is still removed cleanly.
+The planner estimates the candidate count of each usable predicate and picks
+the most selective one; candidates are still re-checked with the full query,
+so an index can only ever narrow the scan, never change the result.
+"""
+import bisect
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Indexed on every collection (the app looks almost everything up by these)
+AUTO_HASH_FIELDS = ("id", "venue_id")
+
+# Fields that are compared with $gte/$lt windows (ISO strings or datetimes)
+TIMESTAMP_FIELDS = ("created_at", "updated_at", "timestamp", "ts", "date", "start_time", "end_time")
+
+# Mirrors create_indexes.py so the local/offline mode has the same access paths
+DECLARED_INDEXES: Dict[str, List[Any]] = {
+    "users": ["email", "pin_hash", "pin_index"],
+    "orders": [[("venue_id", 1), ("created_at", -1)]],
+    "audit_logs": [[("venue_id", 1), ("timestamp", -1)]],
+    "shifts": [[("user_id", 1), ("start_time", 1), ("end_time", 1)]],
+    "login_attempts": [[("device_id", 1), ("timestamp", -1)]],
+    "logs": [[("venue_id", 1), ("ts", -1)]],
+    "menu_items": [[("venue_id", 1), ("is_active", 1), ("name", 1)], [("venue_id", 1), ("category", 1)]],
+    "recipes": [[("venue_id", 1), ("active", 1), ("name", 1)], [("venue_id", 1), ("category", 1), ("deleted_at", 1)]],
+    "clocking_entries": [[("venue_id", 1), ("employee_id", 1), ("date", -1)], [("venue_id", 1), ("status", 1), ("date", -1)]],
+    "employees": [[("venue_id", 1), ("status", 1)]],
+    "reservations": [[("venue_id", 1), ("date", 1), ("status", 1)]],
+    "ai_conversations": [[("venue_id", 1), ("created_at", -1)]],
+    "stock_ledger": [[("venue_id", 1), ("item_id", 1), ("seq", 1)]],
+    "rm_stock_on_hand": [[("venue_id", 1), ("sku_id", 1)]],
+    "rm_stock_on_hand_checkpoints": [[("venue_id", 1), ("sku_id", 1), ("seq", -1)]],
+}
+
+_RANGE_OPS = ("$gt", "$gte", "$lt", "$lte")
+_INF = float("inf")
+
+
+def normalize_keys(keys: Any) -> List[Tuple[str, int]]:
+    """Accept the pymongo create_index key formats: "field" or [("field", dir), ...]."""
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    return [(k, d) for k, d in keys]
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+def _family(value: Any) -> Optional[str]:
+    """Type family for range ordering; values of different families never compare."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return "num"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, datetime):
+        return "dt_aware" if value.tzinfo else "dt_naive"
+    return None
+
+
+class HashIndex:
+    def __init__(self, field: str):
+        self.field = field
+        self.buckets: Dict[Any, Set[int]] = {}
+        # Unhashable values (lists/dicts) are always candidates
+        self.unhashable: Set[int] = set()
+
+    def add(self, ordinal: int, keys: dict) -> None:
+        if self.field not in keys:
+            return
+        value = keys[self.field]
+        if _hashable(value):
+            self.buckets.setdefault(value, set()).add(ordinal)
+        else:
+            self.unhashable.add(ordinal)
+
+    def remove(self, ordinal: int, keys: dict) -> None:
+        if self.field not in keys:
+            return
+        value = keys[self.field]
+        if _hashable(value):
+            bucket = self.buckets.get(value)
+            if bucket is not None:
+                bucket.discard(ordinal)
+                if not bucket:
+                    del self.buckets[value]
+        else:
+            self.unhashable.discard(ordinal)
+
+    def lookup(self, values: Iterable[Any]) -> Optional[Set[int]]:
+        out: Set[int] = set(self.unhashable)
+        for v in values:
+            if not _hashable(v):
+                return None
+            bucket = self.buckets.get(v)
+            if bucket:
+                out.update(bucket)
+        return out
+
+
+class RangeIndex:
+    def __init__(self, field: str):
+        self.field = field
+        self.entries: Dict[str, List[Tuple[Any, int]]] = {}
+
+    def add(self, ordinal: int, keys: dict) -> None:
+        value = keys.get(self.field)
+        fam = _family(value)
+        if fam is not None:
+            bisect.insort(self.entries.setdefault(fam, []), (value, ordinal))
+
+    def remove(self, ordinal: int, keys: dict) -> None:
+        value = keys.get(self.field)
+        fam = _family(value)
+        if fam is None:
+            return
+        entries = self.entries.get(fam, [])
+        i = bisect.bisect_left(entries, (value, ordinal))
+        if i < len(entries) and entries[i] == (value, ordinal):
+            del entries[i]
+
+    def bounds(self, ops: Dict[str, Any]) -> Optional[Tuple[List[Tuple[Any, int]], int, int]]:
+        fam = None
+        for op in _RANGE_OPS:
+            if op in ops:
+                f = _family(ops[op])
+                if f is None or (fam is not None and f != fam):
+                    return None
+                fam = f
+        if fam is None:
+            return None
+        entries = self.entries.get(fam, [])
+        lo, hi = 0, len(entries)
+        if "$gte" in ops:
+            lo = max(lo, bisect.bisect_left(entries, (ops["$gte"],)))
+        if "$gt" in ops:
+            lo = max(lo, bisect.bisect_right(entries, (ops["$gt"], _INF)))
+        if "$lte" in ops:
+            hi = min(hi, bisect.bisect_right(entries, (ops["$lte"], _INF)))
+        if "$lt" in ops:
+            hi = min(hi, bisect.bisect_left(entries, (ops["$lt"],)))
+        return entries, lo, max(lo, hi)
+
+
+class CollectionIndexes:
+    """All indexes + ordinals for one collection, shared by every MockCollection handle."""
+
+    def __init__(self, name: str, data: List[dict]):
+        self.name = name
+        self.hash: Dict[str, HashIndex] = {}
+        self.range: Dict[str, RangeIndex] = {}
+        self._ord_of: Dict[int, int] = {}
+        self._by_ord: Dict[int, dict] = {}
+        # ordinal -> {field: value} the doc was indexed under
+        self._keys: Dict[int, Dict[str, Any]] = {}
+        self._next_ord = 0
+        self.stats = {"index_scans": 0, "full_scans": 0}
+
+        for field in AUTO_HASH_FIELDS:
+            self.hash[field] = HashIndex(field)
+        for keys in DECLARED_INDEXES.get(name, []):
+            self._declare(normalize_keys(keys))
+
+        for doc in data:
+            self.add(doc)
+
+    # ─── Declaration ─────────────────────────────────────────────────
+
+    def _declare(self, keys: List[Tuple[str, int]]) -> bool:
+        created = False
+        for field, direction in keys:
+            if "." in field:
+                continue  # dotted paths are not supported by _matches_query either
+            if field not in self.hash:
+                self.hash[field] = HashIndex(field)
+                created = True
+            if (field in TIMESTAMP_FIELDS or direction == -1) and field not in self.range:
+                self.range[field] = RangeIndex(field)
+                created = True
+        return created
+
+    def create(self, keys: Any) -> None:
+        if self._declare(normalize_keys(keys)):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        for idx in self.hash.values():
+            idx.buckets.clear()
+            idx.unhashable.clear()
+        for idx in self.range.values():
+            idx.entries.clear()
+        self._keys.clear()
+        for ordinal, doc in self._by_ord.items():
+            self._index(ordinal, doc)
+
+    # ─── Maintenance ─────────────────────────────────────────────────
+
+    def _index(self, ordinal: int, doc: dict) -> None:
+        fields = set(self.hash) | set(self.range)
+        keys = self._keys[ordinal] = {f: doc[f] for f in fields if f in doc}
+        for idx in self.hash.values():
+            idx.add(ordinal, keys)
+        for idx in self.range.values():
+            idx.add(ordinal, keys)
+
+    def add(self, doc: dict, ordinal: Optional[int] = None) -> None:
+        if ordinal is None:
+            ordinal = self._next_ord
+            self._next_ord += 1
+        self._ord_of[id(doc)] = ordinal
+        self._by_ord[ordinal] = doc
+        self._index(ordinal, doc)
+
+    def remove(self, doc: dict) -> Optional[int]:
+        """Unindex a doc; returns its ordinal so an in-place update can re-add it."""
+        ordinal = self._ord_of.pop(id(doc), None)
+        if ordinal is None:
+            return None
+        self._by_ord.pop(ordinal, None)
+        # Unindex from the indexed values: the doc itself may have been changed in place
+        keys = self._keys.pop(ordinal, {})
+        for idx in self.hash.values():
+            idx.remove(ordinal, keys)
+        for idx in self.range.values():
+            idx.remove(ordinal, keys)
+        return ordinal
+
+    # ─── Planning ────────────────────────────────────────────────────
+
+    def plan(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the most selective index; {"index": None} means full scan."""
+        best: Dict[str, Any] = {"index": None, "estimate": len(self._by_ord)}
+        for field, cond in query.items():
+            if field.startswith("$"):
+                continue
+            if isinstance(cond, dict):
+                if "$in" in cond and field in self.hash and isinstance(cond["$in"], (list, tuple, set)):
+                    idx = self.hash[field]
+                    if all(_hashable(v) for v in cond["$in"]):
+                        est = len(idx.unhashable) + sum(len(idx.buckets.get(v, ())) for v in cond["$in"])
+                        if est < best["estimate"]:
+                            best = {"index": f"hash:{field}", "field": field, "values": list(cond["$in"]), "estimate": est}
+                if field in self.range and any(op in cond for op in _RANGE_OPS):
+                    try:
+                        b = self.range[field].bounds(cond)
+                    except TypeError:
+                        b = None
+                    if b is not None:
+                        entries, lo, hi = b
+                        if hi - lo < best["estimate"]:
+                            best = {"index": f"range:{field}", "field": field, "slice": (entries, lo, hi), "estimate": hi - lo}
+            elif field in self.hash and _hashable(cond):
+                idx = self.hash[field]
+                est = len(idx.unhashable) + len(idx.buckets.get(cond, ()))
+                if est < best["estimate"]:
+                    best = {"index": f"hash:{field}", "field": field, "values": [cond], "estimate": est}
+        return best
+
+    def candidates(self, query: Dict[str, Any]) -> Optional[List[dict]]:
+        """Docs that may match, in insertion order; None means scan the whole collection."""
+        plan = self.plan(query)
+        if plan["index"] is None:
+            self.stats["full_scans"] += 1
+            return None
+        self.stats["index_scans"] += 1
+        if "slice" in plan:
+            entries, lo, hi = plan["slice"]
+            ords = sorted(o for _, o in entries[lo:hi])
+            return [self._by_ord[o] for o in ords]
+        found = self.hash[plan["field"]].lookup(plan["values"]) or set()
+        return [self._by_ord[o] for o in sorted(found)]
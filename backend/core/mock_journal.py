@@ -0,0 +1,295 @@
+"""
+Mock Journal - Append-only write-ahead log for the local MockDatabase.
+
+Instead of re-serialising the whole ``data_store`` on every write, each
+mutation is appended to ``<db>.wal`` as a single JSON line.  Writes that land
+inside the same group-commit window share one ``write`` + ``fsync``.  Every
+``snapshot_every`` operations (or ``snapshot_interval_s`` seconds) the WAL is
+rotated, the in-memory store is written to the snapshot file, and the rotated
+segment is discarded (compaction).
+
+Record format (one JSON object per line):
+    {"seq": 42, "c": "orders", "op": "i"|"u"|"d", "_id": "...", "doc": {...}}
+
+Recovery (``recover``) loads the snapshot, then replays every segment record
+with ``seq`` greater than the snapshot's ``seq``.  A torn trailing line from a
+crash mid-write is ignored.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+META_KEY = "__journal__"
+
+OP_INSERT = "i"
+OP_UPDATE = "u"
+OP_DELETE = "d"
+
+
+def _fsync_file(f) -> None:
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+class MockJournal:
+    def __init__(
+        self,
+        db_file: str,
+        group_commit_ms: float = 5.0,
+        snapshot_every: int = 2000,
+        snapshot_interval_s: float = 300.0,
+    ):
+        self.db_file = db_file
+        self.wal_file = os.path.splitext(db_file)[0] + ".wal"
+        self.group_commit_s = max(group_commit_ms, 0) / 1000.0
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval_s = snapshot_interval_s
+
+        self.seq = 0
+        self._buffer: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._wal = None
+        self._ops_since_snapshot = 0
+        self._last_snapshot_at = time.monotonic()
+        self._snapshot_running = False
+        self._data_store_ref: Optional[Dict[str, list]] = None
+        # Background and explicit snapshots may overlap; never let an older one win
+        self._snapshot_lock = threading.Lock()
+        self._written_seq = -1
+
+        # Stats for /health style introspection
+        self.stats = {"appends": 0, "flushes": 0, "snapshots": 0, "replayed": 0}
+
+    # ─── Recovery ────────────────────────────────────────────────────
+
+    def recover(self) -> Optional[Dict[str, list]]:
+        """
+        Rebuild the data store from snapshot + WAL segments.
+        Returns None when neither a snapshot nor a WAL exists (fresh install).
+        """
+        segments = self._segment_files()
+        if not os.path.exists(self.db_file) and not segments:
+            return None
+
+        data_store: Dict[str, list] = {}
+        snap_seq = 0
+        if os.path.exists(self.db_file):
+            with open(self.db_file, "r") as f:
+                data_store = json.load(f)
+            meta = data_store.pop(META_KEY, None) or {}
+            snap_seq = int(meta.get("seq", 0))
+
+        # Index documents by _id per collection so replay is O(records)
+        by_id: Dict[str, Dict[Any, int]] = {}
+        for name, docs in data_store.items():
+            by_id[name] = {d.get("_id"): i for i, d in enumerate(docs) if "_id" in d}
+
+        max_seq = snap_seq
+        replayed = 0
+        for path in segments:
+            for rec in self._read_records(path):
+                seq = rec.get("seq", 0)
+                if seq <= snap_seq:
+                    continue
+                self._apply(data_store, by_id, rec)
+                max_seq = max(max_seq, seq)
+                replayed += 1
+
+        # Deletes leave None holes to keep positions stable during replay
+        for name in list(data_store.keys()):
+            data_store[name] = [d for d in data_store[name] if d is not None]
+
+        self.seq = max_seq
+        self._ops_since_snapshot = replayed
+        self.stats["replayed"] = replayed
+        if replayed:
+            logger.info("[DB] Journal replayed %d ops (seq %d -> %d)", replayed, snap_seq, max_seq)
+        return data_store
+
+    def _segment_files(self) -> List[str]:
+        """Rotated segments first (oldest seq first), then the live WAL."""
+        rotated = glob.glob(self.wal_file + ".*")
+
+        def _rot_seq(p: str) -> int:
+            try:
+                return int(p.rsplit(".", 1)[1])
+            except ValueError:
+                return 0
+
+        files = sorted(rotated, key=_rot_seq)
+        if os.path.exists(self.wal_file):
+            files.append(self.wal_file)
+        return files
+
+    @staticmethod
+    def _read_records(path: str):
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn tail write from a crash - everything after is untrusted
+                    logger.warning("[DB] Ignoring torn journal record in %s", path)
+                    return
+
+    @staticmethod
+    def _apply(data_store: Dict[str, list], by_id: Dict[str, Dict[Any, int]], rec: Dict[str, Any]) -> None:
+        name = rec["c"]
+        docs = data_store.setdefault(name, [])
+        ids = by_id.setdefault(name, {})
+        op = rec["op"]
+        doc_id = rec.get("_id")
+
+        if op == OP_INSERT:
+            ids[doc_id] = len(docs)
+            docs.append(rec["doc"])
+        elif op == OP_UPDATE:
+            pos = ids.get(doc_id)
+            if pos is None:
+                ids[doc_id] = len(docs)
+                docs.append(rec["doc"])
+            else:
+                docs[pos] = rec["doc"]
+        elif op == OP_DELETE:
+            pos = ids.pop(doc_id, None)
+            if pos is not None:
+                docs[pos] = None
+
+    # ─── Append path ─────────────────────────────────────────────────
+
+    def append(self, collection: str, op: str, doc_id: Any, doc: Optional[dict]) -> None:
+        """Queue one operation; it is durable after the next group commit."""
+        self.seq += 1
+        rec = {"seq": self.seq, "c": collection, "op": op, "_id": doc_id}
+        if doc is not None:
+            rec["doc"] = doc
+        # Serialise now: the caller may keep mutating the live document
+        self._buffer.append(json.dumps(rec, default=str))
+        self._ops_since_snapshot += 1
+        self.stats["appends"] += 1
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None or self.group_commit_s == 0:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.group_commit_s, self.flush)
+
+    def flush(self) -> None:
+        """Write buffered records with a single fsync."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffer:
+            return
+
+        payload = "\n".join(self._buffer) + "\n"
+        self._buffer.clear()
+        try:
+            if self._wal is None:
+                self._wal = open(self.wal_file, "a")
+            self._wal.write(payload)
+            _fsync_file(self._wal)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            logger.error("[DB] Journal flush failed: %s", e)
+
+        if self._snapshot_due():
+            self.snapshot_async()
+
+    # ─── Snapshot + compaction ───────────────────────────────────────
+
+    def _snapshot_due(self) -> bool:
+        if self._snapshot_running or self._ops_since_snapshot == 0:
+            return False
+        if self._ops_since_snapshot >= self.snapshot_every:
+            return True
+        return time.monotonic() - self._last_snapshot_at >= self.snapshot_interval_s
+
+    def _rotate(self, data_store: Dict[str, list]) -> Tuple[int, str, Optional[str]]:
+        """
+        Flush + rotate the live WAL and serialise the store at the current seq.
+        Runs on the caller's thread so the store is not mutated mid-dump.
+        """
+        self.flush()
+        rotated = None
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if os.path.exists(self.wal_file):
+            rotated = f"{self.wal_file}.{self.seq}"
+            os.replace(self.wal_file, rotated)
+
+        payload = dict(data_store)
+        payload[META_KEY] = {"seq": self.seq, "written_at": time.time()}
+        body = json.dumps(payload, default=str)
+        self._ops_since_snapshot = 0
+        self._last_snapshot_at = time.monotonic()
+        return self.seq, body, rotated
+
+    def _write_snapshot(self, seq: int, body: str, rotated: Optional[str]) -> None:
+        with self._snapshot_lock:
+            if seq > self._written_seq:
+                tmp = f"{self.db_file}.{seq}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(body)
+                    _fsync_file(f)
+                os.replace(tmp, self.db_file)
+                self._written_seq = seq
+                self.stats["snapshots"] += 1
+            # A snapshot at >= seq is durable - the rotated segment is now redundant
+            if rotated and os.path.exists(rotated):
+                os.remove(rotated)
+
+    def snapshot(self, data_store: Dict[str, list]) -> None:
+        """Synchronous snapshot + compaction (startup, shutdown, explicit checkpoint)."""
+        self._write_snapshot(*self._rotate(data_store))
+
+    def snapshot_async(self) -> None:
+        """Snapshot with the file write + fsync pushed to the default executor."""
+        if self._data_store_ref is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.snapshot(self._data_store_ref)
+            return
+
+        self._snapshot_running = True
+        seq, body, rotated = self._rotate(self._data_store_ref)
+
+        def _done(fut):
+            self._snapshot_running = False
+            if fut.exception():
+                logger.error("[DB] Background snapshot failed: %s", fut.exception())
+
+        loop.run_in_executor(None, self._write_snapshot, seq, body, rotated).add_done_callback(_done)
+
+    def attach(self, data_store: Dict[str, list]) -> None:
+        """Bind the live store so background snapshots can serialise it."""
+        self._data_store_ref = data_store
+
+    def close(self) -> None:
+        self.flush()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
@@ -0,0 +1,135 @@
+"""
+Principal cache - authenticated user resolution without a users query per request.
+
+Entries are keyed by (user_id, token jti) and hold the user document together
+with what is derived from it on every request: the venue access set and the
+role's default permission bitset. Writes to a user (role, allowed_venue_ids,
+status, ...) call ``invalidate_principal(user_id)``; role/permission model
+changes call ``invalidate_principal()`` to drop everything. Other workers see a
+change within ``PRINCIPAL_CACHE_TTL_SECONDS``.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from services.permission_service import has_permission, permission_bits
+
+# Cross-worker staleness bound; local writes invalidate immediately
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+GLOBAL_VENUE_IDS = {"system", "GLOBAL"}
+SUPERUSER_ROLES = {"product_owner", "PRODUCT_OWNER"}
+
+
+class Principal:
+    """A user document plus its precomputed access checks."""
+    __slots__ = ("user", "all_venues", "venue_ids", "permission_bits", "version", "loaded_at")
+
+    def __init__(self, user: dict, version: Tuple[int, int]):
+        self.user = user
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.all_venues = user.get("venue_id") in GLOBAL_VENUE_IDS or user.get("role") in SUPERUSER_ROLES
+        venues = set(user.get("allowed_venue_ids") or [])
+        if user.get("venue_id"):
+            venues.add(user["venue_id"])
+        self.venue_ids: FrozenSet[str] = frozenset(venues)
+        self.permission_bits = permission_bits(user.get("role") or "")
+
+    def can_access_venue(self, venue_id: str) -> bool:
+        return venue_id == "all" or self.all_venues or venue_id in self.venue_ids
+
+    def has_permission(self, key: str, venue_settings: dict = None) -> bool:
+        """Role defaults from the precomputed bits; venue overrides are memoized per (role, overrides)."""
+        bits = self.permission_bits
+        if venue_settings:
+            bits = permission_bits(self.user.get("role") or "", venue_settings)
+        return has_permission(bits, key)
+
+    def describes(self, user: dict) -> bool:
+        """True when ``user`` is (a shallow copy of) the document this principal was built from."""
+        return (
+            user.get("allowed_venue_ids") is self.user.get("allowed_venue_ids")
+            and user.get("venue_id") == self.user.get("venue_id")
+            and user.get("role") == self.user.get("role")
+        )
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # (user_id, jti) -> principal, most recently used last
+        self._entries: "OrderedDict[Tuple[str, str], Principal]" = OrderedDict()
+        # user_id -> latest principal, for check_venue_access on a user dict
+        self._by_user: Dict[str, Principal] = {}
+        # Bumped by invalidate(); an entry built under an older version is stale
+        self._generation = 0
+        self._user_versions: Dict[str, int] = {}
+
+    def version(self, user_id: str) -> Tuple[int, int]:
+        return self._generation, self._user_versions.get(user_id, 0)
+
+    def _fresh(self, principal: Principal, user_id: str) -> bool:
+        return (
+            principal.version == self.version(user_id)
+            and time.monotonic() - principal.loaded_at < self.ttl_seconds
+        )
+
+    def get(self, user_id: str, jti: str) -> Optional[Principal]:
+        key = (user_id, jti)
+        principal = self._entries.get(key)
+        if principal is None:
+            return None
+        if not self._fresh(principal, user_id):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return principal
+
+    def put(self, user_id: str, jti: str, user: dict, version: Tuple[int, int]) -> Principal:
+        """Cache a freshly loaded user; ``version`` is the one read before the load."""
+        principal = Principal(user, version)
+        # An invalidation that raced the load bumped the version; don't cache the stale doc
+        if version != self.version(user_id):
+            return principal
+        self._entries[(user_id, jti)] = principal
+        self._entries.move_to_end((user_id, jti))
+        self._by_user[user_id] = principal
+        while len(self._entries) > self.max_size:
+            (old_user_id, _), old = self._entries.popitem(last=False)
+            if self._by_user.get(old_user_id) is old:
+                del self._by_user[old_user_id]
+        return principal
+
+    def for_user(self, user: dict) -> Optional[Principal]:
+        """The cached principal a route's ``current_user`` came from, if still current."""
+        user_id = user.get("id")
+        principal = self._by_user.get(user_id) if user_id else None
+        if principal is None or not self._fresh(principal, user_id) or not principal.describes(user):
+            return None
+        return principal
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        if user_id is None:
+            self._generation += 1
+            self._entries.clear()
+            self._by_user.clear()
+            return
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        self._by_user.pop(user_id, None)
+        for key in [k for k in self._entries if k[0] == user_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "users": len(self._by_user), "generation": self._generation}
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_principal(user_id: Optional[str] = None) -> None:
+    """Called on every user/role write; no user_id drops all cached principals."""
+    principal_cache.invalidate(user_id)
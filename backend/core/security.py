@@ -1,12 +1,26 @@
+import asyncio
 import hashlib
 import hmac
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
-from typing import Optional
+from typing import Callable, List, Optional, TypeVar
+
+from core.errors import ApiError
+from core.metrics_collector import BUCKET_BOUNDS_MS, bucket_index, histogram_percentile, register_cache_stats
 
 logger = logging.getLogger("core.security")
 
+# PBKDF2 / bcrypt release the GIL: a few threads hash in parallel while the
+# event loop keeps serving. Leave cores for the loop and the other workers.
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, max(1, (os.cpu_count() or 2) // 2)))))
+# Jobs allowed to wait for a hashing thread before logins are shed with 503
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "256"))
+
+T = TypeVar("T")
+
 def compute_pin_index(pin: str) -> str:
     """Fast SHA256 index for PIN lookup. NOT for security — only for DB query."""
     return hashlib.sha256(f"restin:pin:{pin}".encode()).hexdigest()
@@ -49,6 +63,108 @@ def verify_password(password: str, stored_hash: str) -> bool:
     except (ValueError, AttributeError):
         return False
 
+
+class HashPoolBusy(ApiError):
+    def __init__(self):
+        super().__init__("AUTH_BUSY", "Too many logins in progress, please retry", 503)
+
+
+class _HashPool:
+    """
+    Dedicated bounded executor for password / PIN hashing. Tracks how long
+    jobs wait for a thread (queue time) and how long they run.
+    """
+
+    def __init__(self, workers: int = HASH_POOL_WORKERS, max_queue: int = HASH_POOL_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.queue_counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.stats = {"jobs": 0, "rejected": 0, "queue_ms_total": 0, "run_ms_total": 0, "max_pending": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        return self._executor
+
+    @staticmethod
+    def _timed(fn: Callable[..., T], submitted: float, args: tuple):
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, (started - submitted) * 1000, (time.perf_counter() - started) * 1000
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._pending >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            logger.warning("Hash pool saturated (%d pending): shedding request", self._pending)
+            raise HashPoolBusy()
+        self._pending += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self._pending)
+        try:
+            result, queue_ms, run_ms = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._timed, fn, time.perf_counter(), args
+            )
+        finally:
+            self._pending -= 1
+        self.stats["jobs"] += 1
+        self.stats["queue_ms_total"] += int(queue_ms)
+        self.stats["run_ms_total"] += int(run_ms)
+        self.queue_counts[bucket_index(queue_ms)] += 1
+        return result
+
+    def snapshot(self) -> dict:
+        return dict(
+            self.stats,
+            pending=self._pending,
+            queue_p50_ms=int(histogram_percentile(self.queue_counts, 50)),
+            queue_p99_ms=int(histogram_percentile(self.queue_counts, 99)),
+        )
+
+
+hash_pool = _HashPool()
+register_cache_stats("hash_pool", hash_pool.snapshot,
+                     gauges=("pending", "max_pending", "queue_p50_ms", "queue_p99_ms"))
+
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(password: str, stored_hash: str) -> bool:
+    return await hash_pool.run(verify_password, password, stored_hash)
+
+
+async def hash_pin_async(pin: str) -> str:
+    return await hash_pool.run(hash_pin, pin)
+
+
+async def verify_pin_async(pin: str, stored_hash: str) -> bool:
+    return await hash_pool.run(verify_pin, pin, stored_hash)
+
+
+def _verify_pin_many(pin: str, stored_hashes: List[str], first_match: bool = False) -> List[bool]:
+    matches = [False] * len(stored_hashes)
+    for i, stored_hash in enumerate(stored_hashes):
+        if verify_pin(pin, stored_hash):
+            matches[i] = True
+            if first_match:
+                break  # the remaining hashes are never checked
+    return matches
+
+
+async def verify_pins_async(pin: str, stored_hashes: List[str], first_match: bool = False) -> List[bool]:
+    """
+    Check one PIN against several candidates in a single pool job. With
+    ``first_match`` the job stops at the first hit (all later entries False),
+    bounding the bcrypt work an unauthenticated login can cost.
+    """
+    if not stored_hashes:
+        return []
+    return await hash_pool.run(_verify_pin_many, pin, stored_hashes, first_match)
+
+
 def compute_hash(data: dict, prev_hash: str) -> str:
     payload = f"{prev_hash}:{str(data)}"
     return hashlib.sha256(payload.encode()).hexdigest()
@@ -3,9 +3,13 @@ Security Middleware - Rate Limiting and Device Pairing
 """
 
 from fastapi import Request, HTTPException
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict
+from collections import OrderedDict
+from typing import Optional, Tuple
+import math
+import os
 import time
 import logging
 
@@ -22,111 +26,205 @@ _SENSITIVE_PATHS = {
     "/api/billing": 60,
 }
 
+_EXEMPT_PATHS = ("/health", "/api/health")
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, requests_per_minute=1000):
-        super().__init__(app)
+RATE_LIMIT_WINDOW_SECONDS = 60
+# "memory" (per worker) or "mongo" (shared by all workers through the rate_limits collection)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+def _weighted_count(prev: int, cur: int, elapsed: float, window: int) -> float:
+    """Sliding-window-counter estimate: the previous window's share still inside the window + current."""
+    return prev * (1 - elapsed / window) + cur
+
+
+class MemoryRateLimitBackend:
+    """
+    Sliding window counter per key: [window index, current count, previous count].
+    Constant memory per key; idle keys fall off the LRU end past ``max_keys``.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: int = RATE_LIMIT_WINDOW_SECONDS,
+                  now: Optional[float] = None) -> Tuple[bool, int, int]:
+        """Count one request if allowed. Returns (allowed, remaining, seconds until reset)."""
+        now = time.time() if now is None else now
+        idx, elapsed = divmod(now, window)
+        idx = int(idx)
+
+        entry = self._keys.get(key)
+        if entry is None:
+            entry = self._keys[key] = [idx, 0, 0]
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+            if entry[0] != idx:
+                # Roll forward; anything older than the previous window no longer counts
+                entry[2] = entry[1] if entry[0] == idx - 1 else 0
+                entry[0], entry[1] = idx, 0
+
+        reset = max(1, math.ceil(window - elapsed))
+        estimate = _weighted_count(entry[2], entry[1], elapsed, window)
+        if estimate + 1 > limit:
+            return False, 0, reset
+        entry[1] += 1
+        return True, max(0, int(limit - estimate - 1)), reset
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class MongoRateLimitBackend:
+    """
+    Shared sliding window counter: one ``$inc`` per request on a per-window doc
+    ({_id: "<key>:<window>", count, expires_at}); closed windows are cached
+    locally since they no longer change. Needs a TTL index on ``expires_at``.
+    """
+
+    def __init__(self, db, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.col = db.rate_limits
+        self.max_keys = max_keys
+        self._closed: "OrderedDict[str, int]" = OrderedDict()
+
+    async def _closed_count(self, doc_id: str) -> int:
+        count = self._closed.get(doc_id)
+        if count is None:
+            doc = await self.col.find_one({"_id": doc_id})
+            count = doc.get("count", 0) if doc else 0
+            self._closed[doc_id] = count
+            if len(self._closed) > self.max_keys:
+                self._closed.popitem(last=False)
+        return count
+
+    async def hit(self, key: str, limit: int, window: int = RATE_LIMIT_WINDOW_SECONDS,
+                  now: Optional[float] = None) -> Tuple[bool, int, int]:
+        now = time.time() if now is None else now
+        idx, elapsed = divmod(now, window)
+        idx = int(idx)
+        doc_id = f"{key}:{idx}"
+        expires_at = datetime.fromtimestamp((idx + 2) * window, tz=timezone.utc)
+
+        doc = await self.col.find_one_and_update(
+            {"_id": doc_id},
+            {"$inc": {"count": 1}, "$set": {"expires_at": expires_at}},
+            upsert=True,
+            return_document=True
+        )
+        cur = doc.get("count", 1) if doc else 1
+        prev = await self._closed_count(f"{key}:{idx - 1}")
+
+        reset = max(1, math.ceil(window - elapsed))
+        estimate = _weighted_count(prev, cur, elapsed, window)
+        if estimate > limit:
+            # Rejected requests do not consume quota
+            await self.col.update_one({"_id": doc_id}, {"$inc": {"count": -1}})
+            return False, 0, reset
+        return True, max(0, int(limit - estimate)), reset
+
+
+def create_rate_limit_backend(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "mongo":
+        from core.database import get_database
+        return MongoRateLimitBackend(get_database())
+    return MemoryRateLimitBackend()
+
+
+class RateLimitMiddleware:
+    """
+    Per-client rate limiting as raw ASGI (no BaseHTTPMiddleware task/stream overhead).
+
+    Every client (X-Device-Id, else peer address) gets a global per-minute
+    budget; sensitive path prefixes get a stricter budget of their own.
+    Responses carry ``RateLimit-Limit/Remaining/Reset`` (plus the legacy
+    ``X-RateLimit-*``) for the stricter of the two.
+    """
+
+    def __init__(self, app, requests_per_minute=1000, backend=None):
+        self.app = app
         self.requests_per_minute = requests_per_minute
-        self.requests = defaultdict(list)       # Global per-IP tracking
-        self.path_requests = defaultdict(list)   # Per-path sensitive tracking
-        self.cleanup_interval = 60
-        self.last_cleanup = time.time()
+        self.backend = backend or create_rate_limit_backend()
+        self._fallback = MemoryRateLimitBackend()
 
-    def _get_path_limit(self, path: str) -> int:
-        """Check if path matches a sensitive endpoint and return its limit."""
+    def _get_path_limit(self, path: str) -> Tuple[Optional[str], int]:
+        """Sensitive prefix matching the path and its limit (None = global limit only)."""
         for sensitive_path, limit in _SENSITIVE_PATHS.items():
             if path.startswith(sensitive_path):
-                return limit
-        return self.requests_per_minute
+                return sensitive_path, limit
+        return None, self.requests_per_minute
 
-    async def dispatch(self, request: Request, call_next):
-        # Skip rate limiting for health checks and CORS preflight
-        if request.url.path in ['/health', '/api/health']:
-            return await call_next(request)
-        if request.method == 'OPTIONS':
-            return await call_next(request)
+    async def _hit(self, key: str, limit: int) -> Tuple[bool, int, int]:
+        try:
+            return await self.backend.hit(key, limit)
+        except Exception as e:
+            # Shared store unavailable: keep limiting per worker rather than failing requests
+            _rl_logger.warning("Rate limit backend error, using local counters: %s", e)
+            return await self._fallback.hit(key, limit)
+
+    @staticmethod
+    def _client_id(scope) -> str:
+        for name, value in scope.get("headers") or []:
+            if name == b"x-device-id" and value:
+                return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
 
-        # Get client identifier
-        client_host = request.client.host if request.client else "unknown"
-        client_id = request.headers.get('X-Device-Id') or client_host
-        path = request.url.path
+    async def __call__(self, scope, receive, send):
+        # Skip rate limiting for non-HTTP, health checks and CORS preflight
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" or scope.get("path") in _EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-        # Cleanup old entries periodically
-        current_time = time.time()
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            self.cleanup_old_requests()
-            self.last_cleanup = current_time
+        client_id = self._client_id(scope)
+        path = scope.get("path", "")
 
-        now = time.time()
-        minute_ago = now - 60
+        # 1. SENSITIVE PATH rate limit first, so requests it rejects never spend global quota
+        sensitive_path, path_limit = self._get_path_limit(path)
+        allowed = True
+        if sensitive_path and path_limit < self.requests_per_minute:
+            allowed, remaining, reset = await self._hit(f"{client_id}:{sensitive_path}", path_limit)
+            limit = path_limit
+            detail = f"Too many requests to {path}. Max {path_limit} per minute."
+            if not allowed:
+                _rl_logger.warning("Sensitive path rate limit hit: client=%s, path=%s", client_id, path)
+        else:
+            sensitive_path = None
 
-        # 1. Check GLOBAL rate limit per client
-        self.requests[client_id] = [
-            req_time for req_time in self.requests[client_id]
-            if req_time > minute_ago
+        # 2. GLOBAL rate limit per client (reported unless a stricter path limit already applies)
+        if allowed:
+            global_allowed, global_remaining, global_reset = await self._hit(client_id, self.requests_per_minute)
+            if not global_allowed or not sensitive_path:
+                allowed, remaining, reset = global_allowed, global_remaining, global_reset
+                limit = self.requests_per_minute
+                detail = f"Rate limit exceeded. Max {self.requests_per_minute} requests per minute."
+            if not global_allowed:
+                _rl_logger.warning("Global rate limit hit: client=%s", client_id)
+
+        headers = [
+            (b"ratelimit-limit", str(limit).encode()),
+            (b"ratelimit-remaining", str(remaining).encode()),
+            (b"ratelimit-reset", str(reset).encode()),
+            (b"ratelimit-policy", f"{limit};w={RATE_LIMIT_WINDOW_SECONDS}".encode()),
+            (b"x-ratelimit-limit", str(limit).encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
         ]
 
-        if len(self.requests[client_id]) >= self.requests_per_minute:
-            _rl_logger.warning("Global rate limit hit: client=%s, count=%d", client_id, len(self.requests[client_id]))
-            raise HTTPException(
-                status_code=429,
-                detail=f"Rate limit exceeded. Max {self.requests_per_minute} requests per minute."
-            )
-
-        # 2. Check SENSITIVE PATH rate limit
-        path_limit = self._get_path_limit(path)
-        effective_limit = path_limit
-
-        if path_limit < self.requests_per_minute:
-            path_key = f"{client_id}:{path}"
-            self.path_requests[path_key] = [
-                req_time for req_time in self.path_requests[path_key]
-                if req_time > minute_ago
-            ]
-
-            if len(self.path_requests[path_key]) >= path_limit:
-                _rl_logger.warning("Sensitive path rate limit hit: client=%s, path=%s, count=%d",
-                                   client_id, path, len(self.path_requests[path_key]))
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Too many requests to {path}. Max {path_limit} per minute."
-                )
-            self.path_requests[path_key].append(now)
-
-        # Record global request
-        self.requests[client_id].append(now)
-
-        # Process request
-        response = await call_next(request)
-        
-        # Add rate limit headers
-        response.headers['X-RateLimit-Limit'] = str(effective_limit)
-        response.headers['X-RateLimit-Remaining'] = str(
-            effective_limit - len(self.requests[client_id]) if effective_limit == self.requests_per_minute
-            else max(0, effective_limit - len(self.path_requests.get(f"{client_id}:{path}", [])))
-        )
-        
-        return response
-
-    def cleanup_old_requests(self):
-        """Remove old request records"""
-        minute_ago = time.time() - 60
-        for client_id in list(self.requests.keys()):
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if req_time > minute_ago
-            ]
-            if not self.requests[client_id]:
-                del self.requests[client_id]
-        
-        # Also cleanup path-specific tracking
-        for path_key in list(self.path_requests.keys()):
-            self.path_requests[path_key] = [
-                req_time for req_time in self.path_requests[path_key]
-                if req_time > minute_ago
-            ]
-            if not self.path_requests[path_key]:
-                del self.path_requests[path_key]
+        if not allowed:
+            response = JSONResponse(status_code=429, content={"detail": detail})
+            response.raw_headers.extend(headers + [(b"retry-after", str(reset).encode())])
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or []) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
 class DevicePairingMiddleware(BaseHTTPMiddleware):
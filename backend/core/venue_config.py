@@ -1,5 +1,28 @@
-"""Venue configuration with defaults"""
+"""Venue configuration with defaults
+
+Merged configs are cached in-process (read-through) with the merged
+``features``/``rules`` frozen, so every caller shares one copy. ``upsert``
+invalidates locally and stamps the doc with a global change sequence; other
+workers poll that sequence at most every ``VENUE_CONFIG_CHANGE_POLL_SECONDS``
+and drop just the venues that changed. The doc is written (flagged
+``change_pending``) before the sequence moves, so a poll that lands between
+the bump and the stamp still sees it. Writes that bypass the repo are picked
+up within ``VENUE_CONFIG_CACHE_TTL_SECONDS``.
+"""
+import os
+import time
+from typing import Dict, Optional, Tuple
+
 from core.database import db
+from core.metrics_collector import register_cache_stats
+
+VENUE_CONFIG_CACHE_TTL_SECONDS = float(os.getenv("VENUE_CONFIG_CACHE_TTL_SECONDS", "60"))
+VENUE_CONFIG_CHANGE_POLL_SECONDS = float(os.getenv("VENUE_CONFIG_CHANGE_POLL_SECONDS", "2"))
+
+# cache_invalidations doc holding the venue_config change sequence
+CHANGE_SEQ_ID = "venue_config"
+# Changed venues read per round trip while polling
+CHANGE_POLL_PAGE = 1000
 
 DEFAULTS = {
     "features": {
@@ -67,28 +90,164 @@ DEFAULTS = {
     }
 }
 
+
+class FrozenDict(dict):
+    """A dict that refuses mutation; still JSON-serializable and a ``dict`` for isinstance checks."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("venue config is shared and read-only; copy it with thaw(...) first")
+
+    __setitem__ = __delitem__ = _readonly
+    update = setdefault = pop = popitem = clear = _readonly
+
+    def __ior__(self, other):
+        self._readonly()
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Mutable deep copy of a frozen config (dicts and lists all the way down)."""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+class _VenueConfigCache:
+    """venue_id -> (frozen features, frozen rules); versioned like the KDS routing cache."""
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[FrozenDict, FrozenDict, int, float]] = {}
+        self.versions: Dict[str, int] = {}
+        self.change_seq: Optional[int] = None
+        self.last_poll = 0.0
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "remote_invalidations": 0}
+
+    def lookup(self, venue_id: str):
+        entry = self.entries.get(venue_id)
+        if (entry and entry[2] == self.versions.get(venue_id, 0)
+                and time.monotonic() - entry[3] < VENUE_CONFIG_CACHE_TTL_SECONDS):
+            self.stats["hits"] += 1
+            return entry
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, venue_id: str, features: dict, rules: dict, version: int):
+        entry = (_freeze(features), _freeze(rules), version, time.monotonic())
+        # A write that raced the load bumped the version; don't cache the stale config
+        if self.versions.get(venue_id, 0) == version:
+            self.entries[venue_id] = entry
+        return entry
+
+    def invalidate(self, venue_id: Optional[str] = None):
+        venues = [venue_id] if venue_id else list(self.entries.keys())
+        for v in venues:
+            self.versions[v] = self.versions.get(v, 0) + 1
+            self.entries.pop(v, None)
+        self.stats["invalidations"] += len(venues)
+
+
+_cache = _VenueConfigCache()
+register_cache_stats("venue_config", lambda: dict(_cache.stats, entries=len(_cache.entries)))
+
+
+def invalidate_venue_config(venue_id: Optional[str] = None):
+    """Drop this worker's cached config (all venues when venue_id is None)."""
+    _cache.invalidate(venue_id)
+
+
 class VenueConfigRepo:
     def __init__(self, db):
+        self.db = db
         self.col = db.venue_config
-    
+
+    async def _poll_changes(self):
+        """Pick up upserts made by other workers (one small read per poll interval)."""
+        now = time.monotonic()
+        if now - _cache.last_poll < VENUE_CONFIG_CHANGE_POLL_SECONDS:
+            return
+        _cache.last_poll = now
+        try:
+            marker = await self.db.cache_invalidations.find_one({"_id": CHANGE_SEQ_ID})
+        except Exception as e:
+            print(f"⚠️ Venue config change poll failed: {e}")
+            return
+        seq = (marker or {}).get("seq", 0)
+        if _cache.change_seq is None:
+            # First poll of this worker: anything cached before it may predate a change
+            _cache.invalidate()
+        elif seq > _cache.change_seq:
+            # Upserts between their sequence bump and their stamp are still pending
+            changed = await self.col.find(
+                {"change_pending": True}, {"_id": 0, "venue_id": 1}
+            ).to_list(None)
+            after = _cache.change_seq
+            while True:
+                page = await self.col.find(
+                    {"change_seq": {"$gt": after}}, {"_id": 0, "venue_id": 1, "change_seq": 1}
+                ).sort("change_seq", 1).to_list(CHANGE_POLL_PAGE)
+                changed.extend(page)
+                if len(page) < CHANGE_POLL_PAGE:
+                    break
+                after = page[-1]["change_seq"]
+            for doc in changed:
+                _cache.invalidate(doc["venue_id"])
+            _cache.stats["remote_invalidations"] += len(changed)
+        _cache.change_seq = seq
+
     async def get(self, venue_id: str):
-        doc = await self.col.find_one({"venue_id": venue_id}) or {}
+        await self._poll_changes()
+        entry = _cache.lookup(venue_id)
+        if entry is None:
+            version = _cache.versions.get(venue_id, 0)
+            doc = await self.col.find_one({"venue_id": venue_id}) or {}
+            entry = _cache.store(
+                venue_id,
+                {**DEFAULTS["features"], **doc.get("features", {})},
+                {**DEFAULTS["rules"], **doc.get("rules", {})},
+                version
+            )
+        # Fresh outer dict per call; features/rules are shared and frozen
         return {
             "venue_id": venue_id,
-            "features": {**DEFAULTS["features"], **doc.get("features", {})},
-            "rules": {**DEFAULTS["rules"], **doc.get("rules", {})}
+            "features": entry[0],
+            "rules": entry[1]
         }
     
     async def upsert(self, venue_id: str, features: dict = None, rules: dict = None, user_id: str = None):
+        # Doc first: once the sequence moves, a poll finds it pending or stamped
         await self.col.update_one(
             {"venue_id": venue_id},
             {"$set": {
                 "features": features or {},
                 "rules": rules or {},
-                "updated_by": user_id
+                "updated_by": user_id,
+                "change_pending": True
             }},
             upsert=True
         )
+        marker = await self.db.cache_invalidations.find_one_and_update(
+            {"_id": CHANGE_SEQ_ID},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=True
+        )
+        await self.col.update_one(
+            {"venue_id": venue_id},
+            {"$set": {"change_seq": marker["seq"]}, "$unset": {"change_pending": ""}}
+        )
+        invalidate_venue_config(venue_id)
         return await self.get(venue_id)
 
 async def get_venue_config(venue_id: str) -> dict:
@@ -97,6 +97,36 @@ async def main():
     )
     print("  [OK] ai_conversations (1 index)")
 
+    # ─── Performance: Stock on hand ────────────────────────────────────
+    await db.stock_ledger.create_index(
+        [("venue_id", 1), ("item_id", 1), ("seq", 1)],
+        name="idx_ledger_venue_item_seq"
+    )
+    await db.rm_stock_on_hand.create_index(
+        [("venue_id", 1), ("sku_id", 1)],
+        unique=True,
+        name="idx_soh_venue_sku"
+    )
+    await db.rm_stock_on_hand_checkpoints.create_index(
+        [("venue_id", 1), ("sku_id", 1), ("seq", -1)],
+        name="idx_soh_ckpt_venue_sku_seq"
+    )
+    print("  [OK] stock on hand (3 indexes)")
+
+    # ─── Idempotency keys (expire via TTL; expires_at is a BSON date) ───
+    await db.idempotency_keys.create_index("key", name="idx_idempotency_key")
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0, name="ttl_idempotency_expires")
+    print("  [OK] idempotency_keys (2 indexes)")
+
+    # ─── Shared rate limit windows (RATE_LIMIT_BACKEND=mongo) ──────────
+    await db.rate_limits.create_index("expires_at", expireAfterSeconds=0, name="ttl_rate_limits")
+    print("  [OK] rate_limits (TTL)")
+
+    # ─── Shared AI result cache (AI_RESULT_CACHE_MONGO=true) ───────────
+    await db.ai_result_cache.create_index("key", unique=True, name="idx_ai_result_key")
+    await db.ai_result_cache.create_index("expires_at", expireAfterSeconds=0, name="ttl_ai_result_expires")
+    print("  [OK] ai_result_cache (2 indexes)")
+
     print(f"\n[DONE] All indexes created successfully!")
 
 asyncio.run(main())
@@ -9,6 +9,7 @@ import logging
 
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
+from core.principal_cache import invalidate_principal
 from services.audit_service import create_audit_log
 
 logger = logging.getLogger("google.workspace.routes")
@@ -335,6 +336,7 @@ def create_workspace_routes():
                         "$addToSet": {"linked_emails": new_user.primary_email},
                     }
                 )
+                invalidate_principal(employee_id)
 
             await create_audit_log(
                 venue_id, current_user["id"], current_user.get("name", ""),
@@ -34,7 +34,7 @@ class DeliveryOrderService:
         
         # Emit event for processing
         outbox = Outbox(db)
-        outbox.emit(venue_id, "integrations.delivery_order.received", f"DELORD:{delivery_order.id}", {
+        await outbox.publish(venue_id, "integrations.delivery_order.received", f"DELORD:{delivery_order.id}", {
             "delivery_order_id": delivery_order.id,
             "connector_key": connector_key
         })
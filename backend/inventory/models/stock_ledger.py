@@ -18,6 +18,7 @@ class StockLedgerEntry(BaseModel):
     occurred_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     actor_user_id: str
     request_id: Optional[str] = None
+    seq: Optional[int] = None  # per-item movement number in rm_stock_on_hand
 
 class StockLedgerEntryCreate(BaseModel):
     venue_id: str
@@ -38,11 +38,11 @@ def create_inventory_routes():
         items = await item_service.list_items(venue_id, q)
         
         # Enrich with current stock
+        stock = await ledger_service.get_current_stock_many([item.id for item in items], venue_id)
         enriched = []
         for item in items:
-            stock = await ledger_service.get_current_stock(item.id, venue_id)
             item_dict = item.model_dump()
-            item_dict["current_stock"] = stock
+            item_dict["current_stock"] = stock.get(item.id, 0.0)
             enriched.append(item_dict)
         
         return {"ok": True, "items": enriched}
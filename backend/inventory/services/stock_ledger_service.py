@@ -1,19 +1,81 @@
+import os
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from inventory.models import StockLedgerEntry, StockLedgerEntryCreate
 
+# A checkpoint (balance as of movement seq N) is written every N movements per item,
+# so verify/rebuild only replays the ledger tail instead of the full history.
+STOCK_CHECKPOINT_EVERY = int(os.getenv("STOCK_CHECKPOINT_EVERY", "500"))
+
+
+def _iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ledger_time(row: dict) -> datetime:
+    """
+    Row timestamp as an aware datetime. Legacy writers stored ``created_at`` as a
+    datetime (WASTE rows) or an ISO string, naive or not; all of them must sort together.
+    """
+    value = row.get("occurred_at") or row.get("created_at")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            value = None
+    if not isinstance(value, datetime):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _ledger_action(entry: dict) -> str:
+    action = entry.get("action", "")
+    return str(getattr(action, "value", action)).lower()  # LedgerAction before serialisation
+
+
+def is_absolute_entry(entry: dict) -> bool:
+    """A legacy ADJUST row sets the balance to its quantity instead of moving it."""
+    return entry.get("qty_delta") is None and _ledger_action(entry) == "adjust"
+
+
+def apply_ledger_entry(balance: float, entry: dict) -> float:
+    """Balance after one ledger row; understands both ledger shapes (qty_delta and action/quantity)."""
+    if entry.get("qty_delta") is not None:
+        return balance + entry["qty_delta"]
+    action = _ledger_action(entry)
+    qty = entry.get("quantity") or 0
+    if action == "in":
+        return balance + qty
+    if action in ("out", "waste"):
+        return balance - qty
+    if action == "adjust":
+        return qty
+    return balance
+
+
 class StockLedgerService:
-    """Append-only ledger for all stock movements"""
-    
+    """
+    Append-only ledger for all stock movements.
+
+    Stock on hand is kept in ``rm_stock_on_hand`` ({venue_id, sku_id} -> balance)
+    and moved atomically by every ledger write (``record_movement`` for qty_delta
+    rows, ``append_entry`` for the action/quantity rows of the older writers); the
+    doc's ``movements`` counter numbers the ledger rows (``seq``) so a checkpoint
+    plus the rows after it always reproduce the balance.
+    """
+
     def __init__(self, db):
         self.db = db
         self.col = db.stock_ledger
+        self.balances = db.rm_stock_on_hand
+        self.checkpoints = db.rm_stock_on_hand_checkpoints
 
     async def record_movement(
         self,
         data: StockLedgerEntryCreate,
         actor_id: str,
-        request_id: Optional[str] = None
+        request_id: Optional[str] = None,
+        session=None
     ) -> StockLedgerEntry:
         entry = StockLedgerEntry(
             venue_id=data.venue_id,
@@ -26,19 +88,184 @@ class StockLedgerService:
             actor_user_id=actor_id,
             request_id=request_id
         )
-        
-        await self.col.insert_one(entry.model_dump())
+
+        row = await self.append_entry(entry.model_dump(), session=session)
+        entry.seq = row["seq"]
         return entry
 
+    async def append_entry(self, row: dict, session=None) -> dict:
+        """
+        Insert one ledger row of either shape and move its balance with it.
+
+        Every writer of ``stock_ledger`` goes through here so rm_stock_on_hand
+        never drifts from the ledger; ``row`` gets its ``seq`` set in place.
+        """
+        venue_id, item_id = row["venue_id"], row["item_id"]
+        before = await self._move_balance(venue_id, item_id, row, session)
+        balance = apply_ledger_entry(before.get("balance", 0.0), row)
+        row["seq"] = before.get("movements", 0) + 1
+        try:
+            await self.col.insert_one(row, session=session)
+        except Exception:
+            if session is None:
+                # No transaction to roll back: undo the balance move (the seq stays a gap)
+                await self.balances.update_one(
+                    {"venue_id": venue_id, "sku_id": item_id},
+                    {"$inc": {"balance": before.get("balance", 0.0) - balance}}
+                )
+            raise
+
+        if STOCK_CHECKPOINT_EVERY and row["seq"] % STOCK_CHECKPOINT_EVERY == 0:
+            await self._write_checkpoint(venue_id, item_id, balance, row["seq"], session)
+        return row
+
+    # ─── Balance maintenance ─────────────────────────────────────────
+
+    async def _move_balance(self, venue_id: str, item_id: str, row: dict, session=None) -> dict:
+        """Apply one row to the balance doc atomically; returns the doc as it was before."""
+        update = {"$inc": {"movements": 1}, "$set": {"updated_at": _iso()}}
+        if is_absolute_entry(row):
+            update["$set"]["balance"] = apply_ledger_entry(0.0, row)
+        else:
+            update["$inc"]["balance"] = apply_ledger_entry(0.0, row)
+        key = {"venue_id": venue_id, "sku_id": item_id}
+        doc = await self.balances.find_one_and_update(key, update, return_document=False, session=session)
+        if doc is None:
+            # First movement since the read model was (re)built: seed it from the ledger
+            await self._seed_balances(venue_id, [item_id], session)
+            doc = await self.balances.find_one_and_update(key, update, return_document=False, session=session)
+        return doc
+
+    async def _replay(self, venue_id: str, item_id: str, after_seq: Optional[int] = None,
+                      start: float = 0.0, session=None) -> Tuple[float, int, int]:
+        """
+        Fold ledger rows through ``apply_ledger_entry`` into (balance, max seq, rows read).
+
+        With ``after_seq`` only the tail after a checkpoint is read, starting from
+        the checkpoint ``start`` balance; otherwise the whole history: rows written
+        before seq numbering in time order, then the numbered rows in seq order.
+        """
+        query = {"venue_id": venue_id, "item_id": item_id}
+        if after_seq is not None:
+            query["seq"] = {"$gt": after_seq}
+        rows = [row async for row in self.col.find(query, {"_id": 0}, session=session)]
+        rows.sort(key=lambda r: (r.get("seq") is not None, r.get("seq") or 0, _ledger_time(r)))
+        balance, max_seq = start, after_seq or 0
+        for row in rows:
+            balance = apply_ledger_entry(balance, row)
+            max_seq = max(max_seq, row.get("seq") or 0)
+        return balance, max_seq, len(rows)
+
+    async def _seed_balances(self, venue_id: str, item_ids: List[str], session=None) -> None:
+        for item_id in item_ids:
+            balance, max_seq, _ = await self._replay(venue_id, item_id, session=session)
+            # $setOnInsert: a concurrent seed or movement that got there first wins
+            await self.balances.update_one(
+                {"venue_id": venue_id, "sku_id": item_id},
+                {"$setOnInsert": {"balance": balance, "movements": max_seq, "updated_at": _iso()}},
+                upsert=True,
+                session=session
+            )
+            await self._write_checkpoint(venue_id, item_id, balance, max_seq, session)
+
+    async def _write_checkpoint(self, venue_id: str, item_id: str, balance: float, seq: int, session=None):
+        await self.checkpoints.update_one(
+            {"venue_id": venue_id, "sku_id": item_id, "seq": seq},
+            {"$set": {"balance": balance, "created_at": _iso()}},
+            upsert=True,
+            session=session
+        )
+
+    async def _last_checkpoint(self, venue_id: str, item_id: str) -> Optional[dict]:
+        return await self.checkpoints.find_one(
+            {"venue_id": venue_id, "sku_id": item_id},
+            sort=[("seq", -1)]
+        )
+
+    # ─── Reads ───────────────────────────────────────────────────────
+
     async def get_current_stock(self, item_id: str, venue_id: str) -> float:
-        """Calculate current theoretical stock from ledger"""
-        pipeline = [
-            {"$match": {"item_id": item_id, "venue_id": venue_id}},
-            {"$group": {"_id": None, "total": {"$sum": "$qty_delta"}}}
-        ]
-        
-        result = await self.col.aggregate(pipeline).to_list(1)
-        return result[0]["total"] if result else 0.0
+        """Current theoretical stock (one read of the maintained balance)"""
+        stock = await self.get_current_stock_many([item_id], venue_id)
+        return stock[item_id]
+
+    async def get_current_stock_many(self, item_ids: List[str], venue_id: str) -> Dict[str, float]:
+        """Current stock for many items with a single $in read; unseen items are seeded once."""
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            return {}
+        docs = await self.balances.find(
+            {"venue_id": venue_id, "sku_id": {"$in": item_ids}},
+            {"_id": 0, "sku_id": 1, "balance": 1}
+        ).to_list(len(item_ids))
+        stock = {d["sku_id"]: d.get("balance", 0.0) for d in docs}
+
+        missing = [i for i in item_ids if i not in stock]
+        if missing:
+            await self._seed_balances(venue_id, missing)
+            docs = await self.balances.find(
+                {"venue_id": venue_id, "sku_id": {"$in": missing}},
+                {"_id": 0, "sku_id": 1, "balance": 1}
+            ).to_list(len(missing))
+            stock.update({d["sku_id"]: d.get("balance", 0.0) for d in docs})
+        return {i: stock.get(i, 0.0) for i in item_ids}
+
+    # ─── Verify / rebuild ────────────────────────────────────────────
+
+    async def verify_balance(self, item_id: str, venue_id: str, full: bool = False) -> dict:
+        """
+        Recompute the balance from the last checkpoint (or the whole ledger when
+        ``full``) and compare it with rm_stock_on_hand.
+        """
+        doc = await self.balances.find_one({"venue_id": venue_id, "sku_id": item_id})
+        checkpoint = None if full else await self._last_checkpoint(venue_id, item_id)
+        if checkpoint is None:
+            expected, max_seq, replayed = await self._replay(venue_id, item_id)
+        else:
+            expected, max_seq, replayed = await self._replay(
+                venue_id, item_id, after_seq=checkpoint["seq"], start=checkpoint["balance"])
+
+        current = doc.get("balance") if doc else None
+        movements = doc.get("movements", 0) if doc else 0
+        return {
+            "venue_id": venue_id,
+            "item_id": item_id,
+            "balance": current,
+            "expected": expected,
+            "drift": None if current is None else round(current - expected, 9),
+            "ok": current is not None and abs(current - expected) < 1e-6,
+            "movements": movements,
+            "ledger_seq": max_seq,
+            "from_checkpoint": checkpoint["seq"] if checkpoint else None,
+            "replayed": replayed,
+            # A movement whose ledger insert is still in flight; re-run when idle
+            "in_flight": max_seq < movements,
+        }
+
+    async def rebuild_balance(self, item_id: str, venue_id: str, full: bool = False) -> dict:
+        """Verify and, on drift, overwrite the balance and write a fresh checkpoint."""
+        report = await self.verify_balance(item_id, venue_id, full=full)
+        if report["ok"] or report["in_flight"]:
+            report["rebuilt"] = False
+            return report
+
+        key = {"venue_id": venue_id, "sku_id": item_id}
+        seq = max(report["ledger_seq"], report["movements"])
+        if report["balance"] is None:
+            await self.balances.update_one(
+                key,
+                {"$setOnInsert": {"balance": report["expected"], "movements": seq, "updated_at": _iso()}},
+                upsert=True
+            )
+        else:
+            # Only if no movement landed since verify read the doc
+            await self.balances.update_one(
+                {**key, "movements": report["movements"]},
+                {"$set": {"balance": report["expected"], "updated_at": _iso()}}
+            )
+        await self._write_checkpoint(venue_id, item_id, report["expected"], seq)
+        report["rebuilt"] = True
+        return report
 
     async def get_item_ledger(
         self,
@@ -50,6 +277,6 @@ class StockLedgerService:
             {"item_id": item_id, "venue_id": venue_id},
             {"_id": 0}
         ).sort("occurred_at", -1).limit(limit)
-        
+
         docs = await cursor.to_list(limit)
         return [StockLedgerEntry(**doc) for doc in docs]
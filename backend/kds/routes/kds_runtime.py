@@ -6,7 +6,7 @@ from core.dependencies import get_current_user
 from core.feature_flags import require_feature
 from core.venue_config import get_venue_config
 from kds.models import KdsTicketState, TicketStatus, KdsItemState, ItemStatus
-from kds.services import KdsRuntimeService, KdsUndoService, KdsWaitTimeService
+from kds.services import KdsRuntimeService, KdsUndoService, KdsFeedService
 
 class BumpTicketRequest(BaseModel):
     new_status: TicketStatus
@@ -18,7 +18,7 @@ def create_kds_runtime_router():
     router = APIRouter(prefix="/kds/runtime", tags=["kds-runtime"])
     runtime_service = KdsRuntimeService(db)
     undo_service = KdsUndoService(db)
-    wait_time_service = KdsWaitTimeService()
+    feed_service = KdsFeedService(db)
 
     @router.get("/{station_key}/bootstrap")
     async def bootstrap_station(
@@ -64,32 +64,31 @@ def create_kds_runtime_router():
         require_feature(cfg, "KDS_ENABLED", "kds.runtime")
         
         if include_completed:
-            tickets = await runtime_service.get_completed_tickets(station_key, venue_id)
-        else:
+            return await feed_service.get_completed_tickets(venue_id, station_key)
+        if status == "COMPLETED":
             tickets = await runtime_service.get_tickets_by_station(station_key, venue_id, status)
+            return await feed_service.enhance([t.model_dump() for t in tickets])
         
-        # Enhance with wait time info
-        enhanced_tickets = []
-        for ticket in tickets:
-            ticket_dict = ticket.model_dump()
-            
-            # Add wait time calculation
-            wait_info = wait_time_service.calculate_wait_time(ticket.created_at)
-            ticket_dict["wait_time"] = wait_info
-            
-            # Get order details
-            order = await db.orders.find_one({"id": ticket.order_id}, {"_id": 0})
-            if order:
-                ticket_dict["order_details"] = {
-                    "table_name": order.get("table_name"),
-                    "server_name": order.get("server_name"),
-                    "guest_count": order.get("guest_count"),
-                    "items": order.get("items", [])
-                }
-            
-            enhanced_tickets.append(ticket_dict)
+        # Served from the station snapshot (orders joined once, wait times precomputed)
+        return await feed_service.get_tickets(venue_id, station_key, status)
+
+    @router.get("/{station_key}/feed")
+    async def get_ticket_feed(
+        station_key: str,
+        venue_id: str,
+        since_version: Optional[int] = None,
+        epoch: Optional[str] = None,
+        current_user: dict = Depends(get_current_user)
+    ):
+        """
+        Versioned ticket feed for polling screens.
+        Without since_version (or with a stale epoch/version) returns the full list;
+        otherwise only tickets upserted/removed since that version.
+        """
+        cfg = await get_venue_config(venue_id)
+        require_feature(cfg, "KDS_ENABLED", "kds.runtime")
         
-        return enhanced_tickets
+        return await feed_service.get_feed(venue_id, station_key, since_version, epoch)
 
     @router.post("/{station_key}/tickets/{ticket_id}/bump")
     async def bump_ticket(
@@ -3,6 +3,7 @@ from .kds_runtime_service import KdsRuntimeService
 from .kds_routing_service import KdsRoutingService
 from .kds_wait_time_service import KdsWaitTimeService
 from .kds_undo_service import KdsUndoService
+from .kds_feed_service import KdsFeedService
 
 __all__ = [
     "KdsStationService",
@@ -10,4 +11,5 @@ __all__ = [
     "KdsRoutingService",
     "KdsWaitTimeService",
     "KdsUndoService",
+    "KdsFeedService",
 ]
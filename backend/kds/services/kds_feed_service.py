@@ -0,0 +1,278 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from kds.models import KdsTicketState
+from .kds_wait_time_service import KdsWaitTimeService
+
+# Outbox topics that change what a station's ticket list shows
+TICKET_TOPICS = ["kds.ticket_created", "kds.ticket_status_changed", "kds.ticket_undone", "kds.station_reset"]
+
+SYNC_INTERVAL_SECONDS = 0.5      # min gap between outbox tail reads per venue
+FULL_REBUILD_SECONDS = 60        # bound staleness of order details / missed events
+OUTBOX_OVERLAP_SECONDS = 5       # re-read window for late group-committed events
+CHANGE_LOG_SIZE = 500            # deltas retained per station
+OUTBOX_TAIL_LIMIT = 1000
+
+ORDER_DETAIL_PROJECTION = {"_id": 0, "id": 1, "table_name": 1, "server_name": 1, "guest_count": 1, "items": 1}
+
+
+def _parse_ts(value: Optional[str]) -> float:
+    if not value:
+        return time.time()
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class StationSnapshot:
+    """Active (non-completed) tickets of one station plus a versioned change log."""
+
+    def __init__(self, venue_id: str, station_key: str):
+        self.venue_id = venue_id
+        self.station_key = station_key
+        # Versions are per snapshot; screens echo the epoch so a restart or a
+        # different worker answers with a full list instead of wrong deltas
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.tickets: Dict[str, dict] = {}
+        self.created_ts: Dict[str, float] = {}
+        self.changes: Deque[Tuple[int, str, str]] = deque(maxlen=CHANGE_LOG_SIZE)
+        self._sorted: Tuple[int, List[str]] = (-1, [])
+
+    def upsert(self, ticket: dict) -> None:
+        ticket_id = ticket["id"]
+        if self.tickets.get(ticket_id) == ticket:
+            return
+        self.version += 1
+        self.tickets[ticket_id] = ticket
+        self.created_ts[ticket_id] = _parse_ts(ticket.get("created_at"))
+        self.changes.append((self.version, "upsert", ticket_id))
+
+    def remove(self, ticket_id: str) -> None:
+        if ticket_id not in self.tickets:
+            return
+        self.version += 1
+        del self.tickets[ticket_id]
+        self.created_ts.pop(ticket_id, None)
+        self.changes.append((self.version, "remove", ticket_id))
+
+    def ordered_ids(self) -> List[str]:
+        if self._sorted[0] != self.version:
+            ids = sorted(self.tickets, key=lambda t: self.created_ts[t])
+            self._sorted = (self.version, ids)
+        return self._sorted[1]
+
+    def changes_since(self, since_version: int) -> Optional[List[Tuple[str, str]]]:
+        """Latest op per ticket after since_version; None when the log no longer reaches back."""
+        if since_version >= self.version:
+            return []
+        if since_version < 0 or not self.changes or self.changes[0][0] > since_version + 1:
+            return None
+        latest: Dict[str, str] = {}
+        for version, op, ticket_id in self.changes:
+            if version > since_version:
+                latest.pop(ticket_id, None)
+                latest[ticket_id] = op
+        return list(latest.items())
+
+
+class _VenueFeed:
+    def __init__(self):
+        self.stations: Dict[str, StationSnapshot] = {}
+        self.cursor = (datetime.now(timezone.utc) - timedelta(seconds=OUTBOX_OVERLAP_SECONDS)).isoformat()
+        self.seen: Deque[str] = deque(maxlen=5000)
+        self.seen_set: set = set()
+        self.last_sync = 0.0
+        self.last_full = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class KdsFeedService:
+    """
+    Per-station in-memory ticket feed for KDS screens.
+
+    A station snapshot is built once (one ticket query + one $in order fetch)
+    and then kept current by tailing kds.ticket_* events from outbox_events,
+    which also picks up bumps made by other workers. Screens poll with
+    ?since_version= and receive only the tickets that changed.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.ticket_col = db.kds_ticket_states
+        self._venues: Dict[str, _VenueFeed] = {}
+
+    # ─── Order join ──────────────────────────────────────────────────
+
+    async def attach_order_details(self, tickets: List[dict]) -> List[dict]:
+        """Join order details onto ticket dicts with a single $in query."""
+        order_ids = list({t["order_id"] for t in tickets if t.get("order_id")})
+        orders: Dict[str, dict] = {}
+        if order_ids:
+            docs = await self.db.orders.find(
+                {"id": {"$in": order_ids}}, ORDER_DETAIL_PROJECTION
+            ).to_list(len(order_ids))
+            orders = {o["id"]: o for o in docs}
+
+        for ticket in tickets:
+            order = orders.get(ticket.get("order_id"))
+            if order:
+                ticket["order_details"] = {
+                    "table_name": order.get("table_name"),
+                    "server_name": order.get("server_name"),
+                    "guest_count": order.get("guest_count"),
+                    "items": order.get("items", [])
+                }
+        return tickets
+
+    async def _load_tickets(self, query: Dict[str, Any]) -> List[dict]:
+        docs = await self.ticket_col.find(query, {"_id": 0}).sort("created_at", 1).to_list(1000)
+        tickets = [KdsTicketState(**doc).model_dump() for doc in docs]
+        return await self.attach_order_details(tickets)
+
+    # ─── Snapshot maintenance ────────────────────────────────────────
+
+    async def _rebuild_station(self, snap: StationSnapshot) -> None:
+        tickets = await self._load_tickets({
+            "station_key": snap.station_key,
+            "venue_id": snap.venue_id,
+            "status": {"$ne": "COMPLETED"}
+        })
+        fresh = {t["id"] for t in tickets}
+        for ticket_id in [t for t in snap.tickets if t not in fresh]:
+            snap.remove(ticket_id)
+        for ticket in tickets:
+            snap.upsert(ticket)
+
+    async def _refresh_tickets(self, feed: _VenueFeed, venue_id: str, ticket_ids: List[str]) -> None:
+        tickets = await self._load_tickets({"venue_id": venue_id, "id": {"$in": ticket_ids}})
+        by_id = {t["id"]: t for t in tickets}
+        for snap in feed.stations.values():
+            for ticket_id in ticket_ids:
+                ticket = by_id.get(ticket_id)
+                if ticket and ticket["station_key"] == snap.station_key and ticket["status"] != "COMPLETED":
+                    snap.upsert(ticket)
+                else:
+                    snap.remove(ticket_id)
+
+    async def _sync(self, venue_id: str, feed: _VenueFeed) -> None:
+        now = time.monotonic()
+        if now - feed.last_full >= FULL_REBUILD_SECONDS:
+            feed.last_full = now
+            feed.last_sync = now
+            feed.cursor = (datetime.now(timezone.utc) - timedelta(seconds=OUTBOX_OVERLAP_SECONDS)).isoformat()
+            for snap in feed.stations.values():
+                await self._rebuild_station(snap)
+            return
+        if now - feed.last_sync < SYNC_INTERVAL_SECONDS:
+            return
+        feed.last_sync = now
+
+        events = await self.db.outbox_events.find(
+            {"venue_id": venue_id, "topic": {"$in": TICKET_TOPICS}, "created_at": {"$gte": feed.cursor}},
+            {"topic": 1, "payload": 1, "created_at": 1}
+        ).sort("created_at", 1).to_list(OUTBOX_TAIL_LIMIT)
+
+        if len(events) >= OUTBOX_TAIL_LIMIT:
+            feed.last_full = 0.0
+            await self._sync(venue_id, feed)
+            return
+
+        ticket_ids: List[str] = []
+        reset_stations: set = set()
+        for event in events:
+            event_key = str(event.get("_id") or (event["topic"], event["created_at"], str(event.get("payload"))))
+            if event_key in feed.seen_set:
+                continue
+            if len(feed.seen) == feed.seen.maxlen:
+                feed.seen_set.discard(feed.seen[0])
+            feed.seen.append(event_key)
+            feed.seen_set.add(event_key)
+
+            payload = event.get("payload") or {}
+            if event["topic"] == "kds.station_reset":
+                reset_stations.add(payload.get("station_key"))
+            elif payload.get("ticket_id"):
+                ticket_ids.append(payload["ticket_id"])
+
+        if events:
+            last = datetime.fromisoformat(events[-1]["created_at"])
+            feed.cursor = (last - timedelta(seconds=OUTBOX_OVERLAP_SECONDS)).isoformat()
+
+        for station_key in reset_stations:
+            if station_key in feed.stations:
+                await self._rebuild_station(feed.stations[station_key])
+        if ticket_ids:
+            await self._refresh_tickets(feed, venue_id, list(dict.fromkeys(ticket_ids)))
+
+    async def get_snapshot(self, venue_id: str, station_key: str) -> StationSnapshot:
+        feed = self._venues.setdefault(venue_id, _VenueFeed())
+        async with feed.lock:
+            snap = feed.stations.get(station_key)
+            if snap is None:
+                snap = feed.stations[station_key] = StationSnapshot(venue_id, station_key)
+                await self._rebuild_station(snap)
+            else:
+                await self._sync(venue_id, feed)
+        return snap
+
+    # ─── Read API ────────────────────────────────────────────────────
+
+    @staticmethod
+    def _with_wait_time(snap: StationSnapshot, ticket_id: str, now: float) -> dict:
+        ticket = dict(snap.tickets[ticket_id])
+        ticket["wait_time"] = KdsWaitTimeService.calculate_wait_time_ts(snap.created_ts[ticket_id], now)
+        return ticket
+
+    async def get_tickets(self, venue_id: str, station_key: str, status: Optional[str] = None) -> List[dict]:
+        snap = await self.get_snapshot(venue_id, station_key)
+        now = time.time()
+        return [
+            self._with_wait_time(snap, t, now)
+            for t in snap.ordered_ids()
+            if not status or snap.tickets[t]["status"] == status
+        ]
+
+    async def get_feed(self, venue_id: str, station_key: str, since_version: Optional[int] = None,
+                       epoch: Optional[str] = None) -> Dict[str, Any]:
+        """Full ticket list, or only the changes since a version the screen already has."""
+        snap = await self.get_snapshot(venue_id, station_key)
+        now = time.time()
+        changes = None
+        if since_version is not None and (epoch is None or epoch == snap.epoch):
+            changes = snap.changes_since(since_version)
+
+        if changes is None:
+            return {
+                "epoch": snap.epoch,
+                "version": snap.version,
+                "full": True,
+                "tickets": [self._with_wait_time(snap, t, now) for t in snap.ordered_ids()],
+            }
+        return {
+            "epoch": snap.epoch,
+            "version": snap.version,
+            "full": False,
+            "upserts": [self._with_wait_time(snap, t, now) for t, op in changes if op == "upsert"],
+            "removed": [t for t, op in changes if op == "remove"],
+        }
+
+    async def get_completed_tickets(self, venue_id: str, station_key: str, hours: int = 4) -> List[dict]:
+        since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+        docs = await self.ticket_col.find({
+            "station_key": station_key,
+            "venue_id": venue_id,
+            "status": "COMPLETED",
+            "completed_at": {"$gte": since}
+        }, {"_id": 0}).sort("completed_at", -1).to_list(1000)
+        return await self.enhance([KdsTicketState(**doc).model_dump() for doc in docs])
+
+    async def enhance(self, tickets: List[dict]) -> List[dict]:
+        """Order details + wait time for ticket lists served outside the snapshot."""
+        await self.attach_order_details(tickets)
+        now = time.time()
+        for ticket in tickets:
+            ticket["wait_time"] = KdsWaitTimeService.calculate_wait_time_ts(_parse_ts(ticket["created_at"]), now)
+        return tickets
@@ -1,63 +1,113 @@
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
+
+# Cross-worker staleness bound; local writes invalidate immediately
+ROUTING_CACHE_TTL_SECONDS = 30
+
+DEFAULT_STATION_KEY = "KITCHEN"
+
+
+class CompiledRoutingTable:
+    """A venue's routing rules compiled into lookup maps (rule type -> value -> stations)."""
+
+    def __init__(self, stations: List[Dict[str, Any]], version: int):
+        self.version = version
+        self.compiled_at = time.monotonic()
+        # Station order as stored; matches are reported in this order
+        self.order: Dict[str, int] = {}
+        self.by_category: Dict[Any, set] = {}
+        self.by_item_id: Dict[Any, set] = {}
+        self.by_tag: Dict[Any, set] = {}
+        self.has_default = False
+
+        maps = {"category": self.by_category, "item_id": self.by_item_id, "tag": self.by_tag}
+        for station in stations:
+            key = station["station_key"]
+            self.order.setdefault(key, len(self.order))
+            if key == DEFAULT_STATION_KEY:
+                self.has_default = True
+            for rule in station.get("routing_rules", []) or []:
+                target = maps.get(rule.get("type"))
+                if target is None:
+                    continue
+                for value in rule.get("values", []) or []:
+                    try:
+                        target.setdefault(value, set()).add(key)
+                    except TypeError:
+                        continue  # unhashable rule value can never equal an item field
+
+    def stations_for(self, item: Dict[str, Any]) -> List[str]:
+        matched: set = set()
+        try:
+            matched |= self.by_category.get(item.get("category", ""), set())
+            matched |= self.by_item_id.get(item.get("menu_item_id", item.get("item_id", "")), set())
+        except TypeError:
+            pass
+        for tag in item.get("tags", []) or []:
+            try:
+                matched |= self.by_tag.get(tag, set())
+            except TypeError:
+                continue
+
+        if matched:
+            return sorted(matched, key=self.order.__getitem__)
+        # If no specific routing, send to default station (if exists)
+        return [DEFAULT_STATION_KEY] if self.has_default else []
+
+
+# venue_id -> compiled table; venue_id -> local write version
+_routing_cache: Dict[str, CompiledRoutingTable] = {}
+_routing_versions: Dict[str, int] = {}
+
+
+def invalidate_routing(venue_id: Optional[str] = None):
+    """Called by KdsStationService on every station/routing write."""
+    venues = [venue_id] if venue_id else list(_routing_cache.keys())
+    for v in venues:
+        _routing_versions[v] = _routing_versions.get(v, 0) + 1
+        _routing_cache.pop(v, None)
+
 
 class KdsRoutingService:
     """Service to determine which stations should receive which items"""
-    
+
     def __init__(self, db):
         self.db = db
         self.station_col = db.kds_stations
 
+    async def get_routing_table(self, venue_id: str) -> CompiledRoutingTable:
+        """Compiled routing table for the venue (one kds_stations query on a cold cache)."""
+        version = _routing_versions.get(venue_id, 0)
+        table = _routing_cache.get(venue_id)
+        if table and table.version == version and time.monotonic() - table.compiled_at < ROUTING_CACHE_TTL_SECONDS:
+            return table
+
+        stations = await self.station_col.find(
+            {"venue_id": venue_id, "enabled": True},
+            {"_id": 0}
+        ).to_list(100)
+        table = CompiledRoutingTable(stations, version)
+        # A write that raced the compile bumped the version; don't cache the stale table
+        if _routing_versions.get(venue_id, 0) == version:
+            _routing_cache[venue_id] = table
+        return table
+
     async def get_stations_for_item(self, venue_id: str, item: Dict[str, Any]) -> List[str]:
         """
         Determine which station(s) should receive this item based on routing rules.
         Returns list of station_keys.
         """
-        stations = await self.station_col.find(
-            {"venue_id": venue_id, "enabled": True},
-            {"_id": 0}
-        ).to_list(100)
-        
-        matched_stations = []
-        
-        for station in stations:
-            if self._item_matches_routing(item, station.get("routing_rules", [])):
-                matched_stations.append(station["station_key"])
-        
-        # If no specific routing, send to default station (if exists)
-        if not matched_stations:
-            default_station = await self.station_col.find_one(
-                {"venue_id": venue_id, "station_key": "KITCHEN", "enabled": True}
-            )
-            if default_station:
-                matched_stations.append("KITCHEN")
-        
-        return matched_stations
-
-    def _item_matches_routing(self, item: Dict[str, Any], routing_rules: List[Dict[str, Any]]) -> bool:
+        table = await self.get_routing_table(venue_id)
+        return table.stations_for(item)
+
+    async def route_order(self, venue_id: str, items: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Check if item matches any of the routing rules.
-        Routing rules format: [{"type": "category", "values": ["Appetizers", "Salads"]}]
+        Route a whole order in one call: station_key -> items for that station.
+        Warm path does no database I/O.
         """
-        if not routing_rules:
-            return False
-        
-        for rule in routing_rules:
-            rule_type = rule.get("type")
-            rule_values = rule.get("values", [])
-            
-            if rule_type == "category":
-                item_category = item.get("category", "")
-                if item_category in rule_values:
-                    return True
-            
-            elif rule_type == "item_id":
-                item_id = item.get("menu_item_id", item.get("item_id", ""))
-                if item_id in rule_values:
-                    return True
-            
-            elif rule_type == "tag":
-                item_tags = item.get("tags", [])
-                if any(tag in rule_values for tag in item_tags):
-                    return True
-        
-        return False
+        table = await self.get_routing_table(venue_id)
+        station_items: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            for station_key in table.stations_for(item):
+                station_items.setdefault(station_key, []).append(item)
+        return station_items
@@ -20,7 +20,7 @@ class KdsRuntimeService:
         ticket = KdsTicketState(**ticket_dict)
         await self.ticket_col.insert_one(ticket.model_dump())
         
-        self.outbox.emit(
+        await self.outbox.publish(
             venue_id=ticket.venue_id,
             topic="kds.ticket_created",
             key=ticket.order_id,
@@ -88,7 +88,7 @@ class KdsRuntimeService:
         if result.modified_count:
             ticket = await self.get_ticket(ticket_id, venue_id)
             if ticket:
-                self.outbox.emit(
+                await self.outbox.publish(
                     venue_id=venue_id,
                     topic="kds.ticket_status_changed",
                     key=ticket.order_id,
@@ -132,7 +132,7 @@ class KdsRuntimeService:
         if result.modified_count:
             item_doc = await self.item_col.find_one({"item_id": item_id, "venue_id": venue_id}, {"_id": 0})
             if item_doc:
-                self.outbox.emit(
+                await self.outbox.publish(
                     venue_id=venue_id,
                     topic="kds.item_status_changed",
                     key=item_doc["order_id"],
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 from typing import List, Optional
 from kds.models import KdsStation, KdsStationCreate, KdsStationUpdate
+from .kds_routing_service import invalidate_routing
 
 class KdsStationService:
     def __init__(self, db):
@@ -24,6 +25,7 @@ class KdsStationService:
         
         station = KdsStation(**station_dict)
         await self.col.insert_one(station.model_dump())
+        invalidate_routing(station.venue_id)
         return station
 
     async def get_station(self, station_key: str, venue_id: str) -> Optional[KdsStation]:
@@ -54,6 +56,7 @@ class KdsStationService:
             {"station_key": station_key, "venue_id": venue_id},
             {"$set": update_dict}
         )
+        invalidate_routing(venue_id)
         
         if result.modified_count:
             return await self.get_station(station_key, venue_id)
@@ -68,6 +71,7 @@ class KdsStationService:
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        invalidate_routing(venue_id)
 
     async def reset_station(self, station_key: str, venue_id: str, updated_by: str):
         # Archive completed tickets, clear all active tickets
@@ -85,7 +89,7 @@ class KdsStationService:
             }}
         )
         
-        outbox.emit(
+        await outbox.publish(
             venue_id=venue_id,
             topic="kds.station_reset",
             key=station_key,
@@ -59,7 +59,7 @@ class KdsUndoService:
             }}
         )
         
-        self.outbox.emit(
+        await self.outbox.publish(
             venue_id=venue_id,
             topic="kds.ticket_undone",
             key=ticket_doc["order_id"],
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timezone
 from typing import Optional, Dict
 
@@ -11,9 +12,15 @@ class KdsWaitTimeService:
         Returns: {"minutes": int, "visual_state": "normal"|"delayed"|"late"}
         """
         created = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
-        delta = now - created
-        minutes = int(delta.total_seconds() / 60)
+        return KdsWaitTimeService.calculate_wait_time_ts(created.timestamp(), time.time())
+
+    @staticmethod
+    def calculate_wait_time_ts(created_ts: float, now_ts: float) -> Dict[str, any]:
+        """
+        Same as calculate_wait_time, from an already-parsed epoch timestamp
+        (the KDS feed parses created_at once per ticket, not once per poll).
+        """
+        minutes = int((now_ts - created_ts) / 60)
         
         # Default thresholds
         delayed_threshold = 10
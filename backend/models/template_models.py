@@ -254,6 +254,7 @@ class RenderResponse(BaseModel):
     """Rendered template output"""
     html: Optional[str] = None
     escpos_commands: Optional[List[int]] = None
+    escpos_hex: Optional[str] = Field(default=None, description="Same bytes, hex-encoded for /print/raw")
     render_time_ms: float = 0
     is_reprint: bool = False
     reprint_count: int = 0
@@ -3,6 +3,7 @@ from typing import Optional, List
 from core.database import db
 from core.dependencies import get_current_user
 from core.venue_config import get_venue_config
+from services.catalog_snapshot import get_catalog
 from pos.service.feature_gate import require_pos_feature
 from pos.service.pos_session_service import PosSessionService
 from pos.service.pos_order_service import PosOrderService
@@ -102,7 +103,10 @@ def create_pos_runtime_router():
             except Exception:
                 pass  # Fall through to direct lookup
         
-        # Fallback: direct menu item lookup from database
+        # Fallback: the venue's live catalog snapshot, then the database
+        if not menu_item:
+            catalog = await get_catalog(db, data.venue_id)
+            menu_item = catalog.menu_item(data.menu_item_id)
         if not menu_item:
             menu_item_doc = await db.menu_items.find_one(
                 {"id": data.menu_item_id, "venue_id": data.venue_id},
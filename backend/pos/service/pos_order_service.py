@@ -1,6 +1,10 @@
 from datetime import datetime, timezone
 from typing import Optional, List
 from pos.models import PosOrder, PosOrderCreate, PosOrderItem, PosOrderItemCreate, OrderTotals
+from services.id_service import next_display_id, sequence_allocator
+
+# Venues whose counter has been lifted past legacy count-based display ids
+_numbering_adopted: set = set()
 
 class PosOrderService:
     def __init__(self, db):
@@ -9,8 +13,8 @@ class PosOrderService:
         self.items_col = db.pos_order_items
 
     async def create_order(self, data: PosOrderCreate, user_id: str) -> PosOrder:
-        order_count = await self.orders_col.count_documents({"venue_id": data.venue_id})
-        display_id = f"ORD-{order_count + 1:06d}"
+        await self._adopt_legacy_numbering(data.venue_id)
+        display_id = await next_display_id(self.db, data.venue_id, "order")
         
         order = PosOrder(
             display_id=display_id,
@@ -27,6 +31,27 @@ class PosOrderService:
         await self.orders_col.insert_one(order.model_dump())
         return order
 
+    async def _adopt_legacy_numbering(self, venue_id: str):
+        """
+        Orders used to be numbered from count_documents(); once per venue per
+        process, lift the counter above the highest number already issued.
+        """
+        if venue_id in _numbering_adopted:
+            return
+        last = await self.orders_col.find_one(
+            {"venue_id": venue_id, "display_id": {"$regex": "^ORD-"}},
+            {"_id": 0, "display_id": 1},
+            sort=[("display_id", -1)]
+        )
+        if last:
+            try:
+                floor = int(last["display_id"].split("-", 1)[1])
+            except (ValueError, IndexError):
+                floor = 0
+            if floor:
+                await sequence_allocator.ensure_floor(self.db, venue_id, "order", floor)
+        _numbering_adopted.add(venue_id)
+
     async def get_order(self, order_id: str, venue_id: str) -> Optional[PosOrder]:
         doc = await self.orders_col.find_one({"id": order_id, "venue_id": venue_id}, {"_id": 0})
         return PosOrder(**doc) if doc else None
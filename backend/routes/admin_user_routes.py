@@ -5,7 +5,8 @@ from datetime import datetime, timezone
 
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
-from core.security import hash_pin
+from core.principal_cache import invalidate_principal
+from core.security import hash_pin_async
 from models import UserRole
 from services.audit_service import create_audit_log
 import random
@@ -79,6 +80,7 @@ def create_admin_user_router():
             {"id": user_id, "venue_id": venue_id},
             {"$set": safe_update}
         )
+        invalidate_principal(user_id)
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -116,6 +118,7 @@ def create_admin_user_router():
             {"id": user_id, "venue_id": venue_id},
             {"$set": update_data}
         )
+        invalidate_principal(user_id)
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -150,7 +153,7 @@ def create_admin_user_router():
         # Generate unique PIN
         for _ in range(100):
             new_pin = f"{random.randint(0, 9999):04d}"
-            pin_hash = hash_pin(new_pin)
+            pin_hash = await hash_pin_async(new_pin)
             existing = await db.users.find_one(
                 {"venue_id": venue_id, "pin_hash": pin_hash},
                 {"_id": 1}
@@ -166,6 +169,7 @@ def create_admin_user_router():
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        invalidate_principal(user_id)
 
         await create_audit_log(
             venue_id, current_user["id"], current_user["name"],
@@ -216,6 +220,7 @@ def create_admin_user_router():
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        invalidate_principal(user_id)
 
         # Update employee with user link
         await db.employees.update_one(
@@ -260,6 +265,7 @@ def create_admin_user_router():
             {"id": user_id, "venue_id": venue_id},
             {"$unset": {"employee_id": ""}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
         )
+        invalidate_principal(user_id)
 
         return {"success": True, "message": "Employee link removed"}
 
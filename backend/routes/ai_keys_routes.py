@@ -294,8 +294,9 @@ async def get_routing_config(
     current_user: dict = Depends(get_current_user),
 ):
     """Get current fallback chains and task→chain mapping."""
-    from services.ai_router import get_available_chains, get_task_mapping
+    from services.ai_router import get_available_chains, get_task_mapping, get_provider_health
     return {
         "chains": get_available_chains(),
         "task_mapping": get_task_mapping(),
+        "provider_health": get_provider_health(),
     }
@@ -665,6 +665,7 @@ async def ai_complete(
             "tokens_out": response.tokens_out,
             "latency_ms": response.latency_ms,
             "cost_usd": response.cost_usd,
+            "cached": response.cached,
             "timestamp": datetime.now(timezone.utc).isoformat(),
         })
 
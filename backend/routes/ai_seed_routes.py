@@ -18,7 +18,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from fastapi import APIRouter, Depends
 from core.database import get_database
 from core.dependencies import get_current_user
-from services.ai_config_resolver import DEFAULT_SYSTEM_CONFIG
+from services.ai_config_resolver import DEFAULT_SYSTEM_CONFIG, invalidate_ai_config
 
 logger = logging.getLogger(__name__)
 
@@ -146,6 +146,7 @@ async def seed_free_model_config(current_user: dict = Depends(get_current_user))
         )
         venues_seeded_list.append({"id": venue_id, "name": venue.get("name", ""), "status": "seeded"})
 
+    invalidate_ai_config("system")
     logger.info("AI config seeded for %d venues (free models only)", len(venues_seeded_list))
 
     return {
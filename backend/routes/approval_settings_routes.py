@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from core.dependencies import get_current_user, get_database
-from core.venue_config import VenueConfigRepo, DEFAULTS
+from core.venue_config import VenueConfigRepo, DEFAULTS, thaw
 
 
 router = APIRouter(prefix="/config/venues", tags=["Approval Settings"])
@@ -82,8 +82,9 @@ async def update_approval_settings(
     # Merge with existing
     repo = VenueConfigRepo(db)
     cfg = await repo.get(venue_id)
-    existing_rules = cfg.get("rules", {})
-    existing_approval = existing_rules.get("approval", {**DEFAULT_APPROVAL})
+    # The cached config is frozen and shared: edit a private copy
+    existing_rules = thaw(cfg.get("rules", {}))
+    existing_approval = existing_rules.get("approval") or thaw(DEFAULT_APPROVAL)
 
     for key, value in update_data.items():
         existing_approval[key] = {**existing_approval.get(key, {}), **value}
@@ -94,7 +95,7 @@ async def update_approval_settings(
     user_id = current_user.get("userId") or current_user.get("id") or ""
     await repo.upsert(
         venue_id,
-        features=cfg.get("features"),
+        features=thaw(cfg.get("features")),
         rules=existing_rules,
         user_id=user_id
     )
@@ -10,8 +10,12 @@ import logging
 
 from core.database import db
 from core.config import JWT_SECRET, JWT_ALGORITHM
-from core.security import hash_pin, verify_pin, create_jwt_token, hash_password, verify_password, compute_pin_index
+from core.security import (
+    create_jwt_token, compute_pin_index, hash_password_async, hash_pin_async,
+    verify_password_async, verify_pin_async, verify_pins_async,
+)
 from core.dependencies import get_current_user, security
+from core.principal_cache import invalidate_principal
 from models import UserRole
 from services.auth_service import check_rate_limit, log_login_attempt
 from services.audit_service import create_audit_log
@@ -56,13 +60,14 @@ def create_auth_router():
         cached_uid = _pin_cache.get(idx)
         if cached_uid:
             u = await db.users.find_one({"id": cached_uid}, {"_id": 0})
-            if u and verify_pin(pin, u.get("pin_hash", "")):
+            if u and await verify_pin_async(pin, u.get("pin_hash", "")):
                 user = u
         
         # ── FAST PATH 2: DB index lookup ──
         if not user:
             indexed_users = await db.users.find({"pin_index": idx}).to_list(length=10)
-            candidates = [u for u in indexed_users if verify_pin(pin, u.get("pin_hash", ""))]
+            matches = await verify_pins_async(pin, [u.get("pin_hash", "") for u in indexed_users])
+            candidates = [u for u, ok in zip(indexed_users, matches) if ok]
             if candidates:
                 candidates.sort(key=lambda u: _role_sort_map.get(u.get("role", "staff"), 5))
                 user = candidates[0]
@@ -83,15 +88,16 @@ def create_auth_router():
                 ).to_list(200)
                 
                 candidates = []
-                for u in unmigrated_users:
-                    if verify_pin(pin, u.get("pin_hash", "")):
+                matches = await verify_pins_async(pin, [u.get("pin_hash", "") for u in unmigrated_users])
+                for u, ok in zip(unmigrated_users, matches):
+                    if ok:
                         candidates.append(u)
                         # Backfill pin_index for instant future logins
                         update_fields = {"pin_index": idx}
                         unset_fields = {}
                         stored = u.get("pin_hash", "")
                         if len(stored) == 64 and all(c in '0123456789abcdef' for c in stored):
-                            update_fields["pin_hash"] = hash_pin(pin)
+                            update_fields["pin_hash"] = await hash_pin_async(pin)
                             unset_fields["pin"] = ""
                         update_op = {"$set": update_fields}
                         if unset_fields:
@@ -241,7 +247,7 @@ def create_auth_router():
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         # Verify password
-        if not verify_password(password, user["password_hash"]):
+        if not await verify_password_async(password, user["password_hash"]):
             await log_login_attempt(rate_key, "***", app, False, "Wrong password")
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -369,8 +375,8 @@ def create_auth_router():
             "email": email,
             "username": email.split("@")[0] if "@" in email else email,
             "employee_id": "EMP-OWNER",
-            "pin_hash": hash_pin("1234"),
-            "password_hash": hash_password(password),
+            "pin_hash": await hash_pin_async("1234"),
+            "password_hash": await hash_password_async(password),
             "role": UserRole.OWNER,
             "is_super_owner": True,
             "mfa_enabled": False,
@@ -499,7 +505,8 @@ def create_auth_router():
             {"venue_id": venue_id, "pin_hash": {"$exists": True, "$ne": ""}},
             {"_id": 0}
         ).to_list(100)
-        user = next((u for u in venue_users if verify_pin(pin, u.get("pin_hash", ""))), None)
+        matches = await verify_pins_async(pin, [u.get("pin_hash", "") for u in venue_users], first_match=True)
+        user = next((u for u, ok in zip(venue_users, matches) if ok), None)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid PIN")
         
@@ -576,6 +583,7 @@ def create_auth_router():
             {"id": current_user["id"]},
             {"$set": {"mfa_secret": secret}}
         )
+        invalidate_principal(current_user["id"])
         
         return {"secret": secret, "qr_uri": provisioning_uri}
 
@@ -592,6 +600,7 @@ def create_auth_router():
             {"id": current_user["id"]},
             {"$set": {"mfa_enabled": True}}
         )
+        invalidate_principal(current_user["id"])
         
         await create_audit_log(
             current_user["venue_id"], current_user["id"], current_user["name"],
@@ -622,13 +631,14 @@ def create_auth_router():
             raise HTTPException(status_code=404, detail="User not found")
 
         stored_hash = user.get("pin_hash", "")
-        if stored_hash and not verify_pin(current_pin, stored_hash):
+        if stored_hash and not await verify_pin_async(current_pin, stored_hash):
             raise HTTPException(status_code=401, detail="Current PIN is incorrect")
 
         await db.users.update_one(
             {"id": user_id},
-            {"$set": {"pin_hash": hash_pin(new_pin), "pin_index": compute_pin_index(new_pin)}, "$unset": {"pin": ""}}
+            {"$set": {"pin_hash": await hash_pin_async(new_pin), "pin_index": compute_pin_index(new_pin)}, "$unset": {"pin": ""}}
         )
+        invalidate_principal(user_id)
         # Invalidate old cache entry (find and remove any entry pointing to this user)
         stale_keys = [k for k, v in _pin_cache.items() if v == user_id]
         for k in stale_keys:
@@ -662,7 +672,7 @@ def create_auth_router():
         if has_existing:
             if not current_password:
                 raise HTTPException(status_code=400, detail="Current password is required to change password")
-            if not verify_password(current_password, user["password_hash"]):
+            if not await verify_password_async(current_password, user["password_hash"]):
                 await create_audit_log(
                     user.get("venue_id", ""), user_id, user.get("name", ""),
                     "password_change_failed", "user", user_id,
@@ -671,8 +681,9 @@ def create_auth_router():
                 raise HTTPException(status_code=401, detail="Current password is incorrect")
 
         # Hash and save the new password
-        hashed = hash_password(new_password)
+        hashed = await hash_password_async(new_password)
         await db.users.update_one({"id": user_id}, {"$set": {"password_hash": hashed}})
+        invalidate_principal(user_id)
 
         action = "password_changed" if has_existing else "password_set"
         await create_audit_log(
@@ -705,8 +716,9 @@ def create_auth_router():
         if not target_user:
             raise HTTPException(status_code=404, detail="Target user not found")
 
-        hashed = hash_password(new_password)
+        hashed = await hash_password_async(new_password)
         await db.users.update_one({"id": target_user_id}, {"$set": {"password_hash": hashed}})
+        invalidate_principal(target_user_id)
 
         await create_audit_log(
             current_user.get("venue_id", ""), current_user["id"], current_user.get("name", ""),
@@ -743,7 +755,7 @@ def create_auth_router():
                     detail="No password set. Please set a password in your profile first."
                 )
 
-            if not verify_password(password, user["password_hash"]):
+            if not await verify_password_async(password, user["password_hash"]):
                 await create_audit_log(
                     user.get("venue_id", ""), user_id, user.get("name", ""),
                     "elevation_failed", "user", user_id,
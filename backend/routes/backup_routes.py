@@ -28,6 +28,22 @@ def create_backup_router():
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
+    @router.post("/incremental", dependencies=[Depends(require_owner)])
+    async def create_incremental_backup(
+        venue_id: str = None,
+        full: bool = None,
+        current_user: dict = Depends(get_current_user)
+    ):
+        """Export documents changed since the last backup (a new base when due or full=true)"""
+        try:
+            manifest = await backup_service.create_incremental_backup(venue_id, full=full)
+            return {
+                "success": True,
+                "backup": {k: v for k, v in manifest.items() if k != "collections"}
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
     @router.get("/list", dependencies=[Depends(require_owner)])
     async def list_backups(
         venue_id: str = None,
@@ -68,6 +84,18 @@ def create_backup_router():
             "total_backups": sum(stats_dict.values())
         }
     
+    @router.get("/audit/verify", dependencies=[Depends(require_owner)])
+    async def verify_audit_log(
+        full: bool = False,
+        current_user: dict = Depends(get_current_user)
+    ):
+        """Verify the audit log hash chain (incremental unless full=true)"""
+        result = await backup_service.verify_audit_log(full=full)
+        return {
+            "success": result["valid"],
+            "audit_log": result
+        }
+
     @router.post("/cleanup", dependencies=[Depends(require_owner)])
     async def cleanup_old_backups(current_user: dict = Depends(get_current_user)):
         """Manually trigger backup cleanup"""
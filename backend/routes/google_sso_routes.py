@@ -11,6 +11,7 @@ import logging
 from core.database import db
 from core.security import create_jwt_token
 from core.dependencies import get_current_user
+from core.principal_cache import invalidate_principal
 from services.audit_service import create_audit_log
 from utils.helpers import log_event
 
@@ -316,6 +317,7 @@ def create_google_sso_router():
                 "$addToSet": {"linked_emails": email},
             }
         )
+        invalidate_principal(current_user["id"])
 
         await create_audit_log(
             current_user.get("venue_id", ""), current_user["id"],
@@ -354,6 +356,7 @@ def create_google_sso_router():
                 "$set": {"identity_provider": "pin"},
             }
         )
+        invalidate_principal(current_user["id"])
 
         await create_audit_log(
             current_user.get("venue_id", ""), current_user["id"],
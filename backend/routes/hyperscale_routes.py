@@ -5,10 +5,14 @@ Provides real APM data for the Mission Control dashboard.
 Aggregates: MetricsCollector + DLQ stats + MongoDB health + EventBus status.
 """
 
-from fastapi import APIRouter, Depends
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from core.dependencies import get_current_user
 from core.database import get_database
-from core.metrics_collector import metrics
+from core.metrics_collector import metrics, merge_states, render_prometheus
 from services.observability_service import get_observability_service
 import logging
 import time
@@ -17,6 +21,23 @@ logger = logging.getLogger("hyperscale_routes")
 
 router = APIRouter(prefix="/system", tags=["hyperscale"])
 
+# Root-level Prometheus scrape endpoint (mounted on the app, not under /api)
+exposition_router = APIRouter(tags=["hyperscale"])
+
+# Bearer token for scrapers; unset = /metrics is disabled
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+@exposition_router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: str = Header(default="")):
+    """Prometheus text exposition, summed over all workers sharing METRICS_SHARED_DIR."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Metrics endpoint disabled (METRICS_TOKEN not set)")
+    if not hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    state = merge_states(metrics.collect_states())
+    return PlainTextResponse(render_prometheus(state), media_type="text/plain; version=0.0.4")
+
 
 @router.get("/hyperscale-metrics")
 async def get_hyperscale_metrics(current_user: dict = Depends(get_current_user)):
@@ -7,6 +7,7 @@ from core.dependencies import get_current_user, check_venue_access
 from core.role_guard import require_manager
 from core.search import parse_list_query
 from services.inventory_detail.item_detail_aggregate import item_detail_service
+from services.recipe_cost_graph import recost_for_inventory_change
 
 
 def create_inventory_items_router():
@@ -98,14 +99,14 @@ def create_inventory_items_router():
         data: dict = {},
         current_user: dict = Depends(get_current_user)
     ):
-        """Update inventory item (optional fields: min_stock, image_url, tags, category)"""
+        """Update inventory item (optional fields: min_stock, image_url, tags, category, cost)"""
         await check_venue_access(current_user, venue_id)
         
         # Only allow updating specific fields
         allowed_fields = [
             "min_stock", "image_url", "tags", "category", "pricing_basis",
             "preferred_supplier_id", "allergens", "nutrition", "description",
-            "storage_instructions", "shelf_life_days", "origin_country", "is_organic"
+            "storage_instructions", "shelf_life_days", "origin_country", "is_organic", "cost"
         ]
         update_data = {k: v for k, v in data.items() if k in allowed_fields}
         update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
@@ -118,6 +119,11 @@ def create_inventory_items_router():
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Item not found")
         
+        if "cost" in update_data and result.modified_count:
+            # Recost only the recipes that use this item, directly or via sub-recipes
+            recost = await recost_for_inventory_change(db, venue_id, [sku_id])
+            return {"ok": True, "message": "Item updated", "recipes_recosted": recost["changed"]}
+        
         return {"ok": True, "message": "Item updated"}
 
     @router.post("/inventory/items/bulk-image-update", dependencies=[Depends(require_manager)])
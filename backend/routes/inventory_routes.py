@@ -6,6 +6,7 @@ import uuid
 
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
+from inventory.services.stock_ledger_service import StockLedgerService
 from models import InventoryItem, InventoryItemCreate, LedgerAction, StockLedgerEntry, LedgerEntryCreate
 from models.waste_log import WasteLog, WasteLogCreate
 from services.audit_service import create_audit_log
@@ -134,7 +135,7 @@ def create_inventory_router():
             entry_hash=entry_hash
         )
         
-        await db.stock_ledger.insert_one(entry.model_dump())
+        await StockLedgerService(db).append_entry(entry.model_dump())
         
         stock_delta = quantity if action in [LedgerAction.IN] else -quantity
         if action == LedgerAction.ADJUST:
@@ -268,7 +269,7 @@ def create_inventory_router():
             prev_hash=prev_hash_src,
             entry_hash=entry_hash_src
         )
-        await db.stock_ledger.insert_one(entry_src.model_dump())
+        await StockLedgerService(db).append_entry(entry_src.model_dump())
         await db.inventory_items.update_one(
             {"id": item_id},
             {"$inc": {"current_stock": -quantity}}
@@ -298,7 +299,7 @@ def create_inventory_router():
             prev_hash=prev_hash_dest,
             entry_hash=entry_hash_dest
         )
-        await db.stock_ledger.insert_one(entry_dest.model_dump())
+        await StockLedgerService(db).append_entry(entry_dest.model_dump())
         await db.inventory_items.update_one(
             {"id": dest_item_id},
             {"$inc": {"current_stock": quantity}}
@@ -369,7 +370,7 @@ def create_inventory_router():
             }
             entry_hash = compute_hash(entry_data, prev_hash)
             
-            await db.stock_ledger.insert_one({
+            await StockLedgerService(db).append_entry({
                 "venue_id": data.venue_id,
                 "item_id": data.item_id,
                 "action": "WASTE",
@@ -10,6 +10,7 @@ import io
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
 from models import MenuItem, MenuCategory
+from services.catalog_snapshot import bump_catalog_version
 
 
 def parse_price(price_str: str) -> float:
@@ -142,6 +143,7 @@ def create_menu_import_router():
                 await db.menu_items.insert_one(item.model_dump())
                 items_created += 1
             
+            await bump_catalog_version(db, venue_id)
             return {
                 "message": "Menu imported successfully",
                 "categories_created": len(categories),
@@ -11,6 +11,7 @@ from models import (
     ModifierOption, ModifierOptionCreate, MenuItemModifier
 )
 from services.audit_service import create_audit_log
+from services.catalog_snapshot import bump_catalog_version
 
 
 def create_menu_router():
@@ -78,6 +79,7 @@ def create_menu_router():
         
         category = MenuCategory(**data.model_dump())
         await db.menu_categories.insert_one(category.model_dump())
+        await bump_catalog_version(db, data.venue_id)
         
         return category
 
@@ -89,6 +91,9 @@ def create_menu_router():
         
         await check_venue_access(current_user, category["venue_id"])
         await db.menu_categories.update_one({"id": category_id}, {"$set": data})
+        await bump_catalog_version(db, category["venue_id"])
+        if data.get("venue_id") not in (None, category["venue_id"]):
+            await bump_catalog_version(db, data["venue_id"])
         
         return {"message": "Category updated"}
 
@@ -103,6 +108,7 @@ def create_menu_router():
         # Delete category and its items
         await db.menu_items.delete_many({"category_id": category_id})
         await db.menu_categories.delete_one({"id": category_id})
+        await bump_catalog_version(db, category["venue_id"])
         
         return {"message": "Category deleted"}
 
@@ -144,6 +150,7 @@ def create_menu_router():
         
         item = MenuItem(**item_data)
         await db.menu_items.insert_one(item.model_dump())
+        await bump_catalog_version(db, data.venue_id)
         
         return item
 
@@ -160,6 +167,9 @@ def create_menu_router():
             data["price_cents"] = int(data["price"] * 100)
         
         await db.menu_items.update_one({"id": item_id}, {"$set": data})
+        await bump_catalog_version(db, item["venue_id"])
+        if data.get("venue_id") not in (None, item["venue_id"]):
+            await bump_catalog_version(db, data["venue_id"])
         
         await create_audit_log(
             item["venue_id"], current_user["id"], current_user["name"],
@@ -178,6 +188,7 @@ def create_menu_router():
         
         # Soft delete - just mark inactive
         await db.menu_items.update_one({"id": item_id}, {"$set": {"is_active": False}})
+        await bump_catalog_version(db, item["venue_id"])
         
         return {"message": "Item deleted"}
 
@@ -192,6 +203,7 @@ def create_menu_router():
         
         group = ModifierGroup(**group_data.model_dump())
         await db.modifier_groups.insert_one(group.model_dump())
+        await bump_catalog_version(db, group_data.venue_id)
         
         await system_cache.invalidate("menu_routes:")
         
@@ -221,6 +233,7 @@ def create_menu_router():
         
         option = ModifierOption(**option_data.model_dump())
         await db.modifier_options.insert_one(option.model_dump())
+        await bump_catalog_version(db, group["venue_id"])
         
         await system_cache.invalidate("menu_routes:")
         
@@ -248,6 +261,7 @@ def create_menu_router():
         
         link = MenuItemModifier(menu_item_id=item_id, modifier_group_id=group_id)
         await db.menu_item_modifiers.insert_one(link.model_dump())
+        await bump_catalog_version(db, item["venue_id"])
         
         await system_cache.invalidate("menu_routes:")
         
@@ -8,6 +8,7 @@ from core.dependencies import get_current_user, check_venue_access
 from models import Order, OrderCreate, OrderItem, OrderItemCreate, SendOrderRequest
 from services.id_service import ensure_ids
 from services.audit_service import create_audit_log
+from services.catalog_snapshot import get_catalog
 from services.order_service import process_send_order, transfer_order_to_table, close_order
 from services.kds_service import update_ticket_status, update_ticket_item_status, claim_ticket, release_ticket
 from utils.helpers import _json_fail
@@ -103,7 +104,8 @@ def create_order_router():
         if not menu_item_id:
             raise HTTPException(status_code=400, detail="menu_item_id or item_id required")
         
-        menu_item = await db.menu_items.find_one({"id": menu_item_id}, {"_id": 0})
+        catalog = await get_catalog(db, order["venue_id"])
+        menu_item = catalog.menu_item(menu_item_id) or await db.menu_items.find_one({"id": menu_item_id}, {"_id": 0})
         if not menu_item:
             raise HTTPException(status_code=404, detail="Menu item not found")
         
@@ -8,6 +8,7 @@ from core.database import db
 from core.dependencies import get_current_user
 from core.rate_limiter import strict_rate_limit
 from pos.service.pos_order_service import PosOrderService
+from services.catalog_snapshot import get_catalog
 from pos.service.pos_payment_service import pos_payment_service
 from pos.models import PosOrderCreate, PosOrderItemCreate, PosPaymentCreate
 from fastapi import Request
@@ -102,8 +103,9 @@ def create_orders_router():
         if not venue_id:
              raise HTTPException(status_code=400, detail="Could not resolve venue_id")
 
-        # Get menu item
-        menu_item = await db.menu_items.find_one(
+        # Get menu item (catalog snapshot first; items outside the venue's catalog still resolve)
+        catalog = await get_catalog(db, venue_id)
+        menu_item = catalog.menu_item(request.menu_item_id) or await db.menu_items.find_one(
             {"id": request.menu_item_id},
             {"_id": 0}
         )
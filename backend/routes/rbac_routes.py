@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 
 from core.database import db
 from core.dependencies import get_current_user
+from core.principal_cache import invalidate_principal
 from models.rbac import ActiveContext, RoleAssignment, AuditEvent, RolePermission
 from models.auth import User
 from services.audit_service import create_audit_log
@@ -139,6 +140,7 @@ def create_rbac_router():
              update_data["archived_at"] = None
 
         await db.users.update_one({"id": user_id}, {"$set": update_data})
+        invalidate_principal(user_id)
 
         # Audit
         await db.audit_events.insert_one(AuditEvent(
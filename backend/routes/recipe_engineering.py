@@ -14,7 +14,9 @@ import json as json_lib
 
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
-from models.recipe_engineering import RecipeEngineered, RecipeVersion, RecipeCostAnalysis, RecipeEngineeredRequest, RecipeChangeRecord
+from models.recipe_engineering import RecipeEngineered, RecipeVersion, RecipeEngineeredRequest, RecipeChangeRecord
+from services.catalog_snapshot import bump_catalog_version
+from services.recipe_cost_graph import load_cost_graph, recost_dependents, recost_venue, write_cost_changes
 
 
 class BulkRecipeRequest(BaseModel):
@@ -26,62 +28,11 @@ def create_recipe_engineering_router():
     
     # ── Auto-costing helper ──
     async def _calculate_recipe_cost(venue_id: str, ingredients: list, servings: float, sell_price: float = 0, labor_cost: float = None, overhead_cost: float = None, markup_percentage: float = None):
-        """Look up ingredient costs from inventory and sub-recipe costs, compute totals."""
-        total_cost = 0.0
-        costed_ingredients = []
-
-        for ing in ingredients:
-            ing_type = ing.get("type", "ingredient")
-            ing_name = ing.get("name", ing.get("item_name", ""))
-            net_qty = ing.get("net_qty", ing.get("quantity", 0))
-            waste_pct = ing.get("waste_pct", 0)
-            unit_cost = 0.0
-
-            if ing_type == "sub_recipe":
-                # Look up sub-recipe cost
-                sub = await db.recipes.find_one(
-                    {"venue_id": venue_id, "recipe_name": {"$regex": f"^{ing_name}$", "$options": "i"}, "active": True, "deleted_at": None},
-                    {"cost_analysis": 1, "id": 1, "_id": 0}
-                )
-                if sub and sub.get("cost_analysis"):
-                    unit_cost = sub["cost_analysis"].get("cost_per_serving", 0)
-            else:
-                # Look up ingredient cost from inventory
-                item = await db.inventory_items.find_one(
-                    {"venue_id": venue_id, "$or": [
-                        {"name": {"$regex": f"^{ing_name}$", "$options": "i"}},
-                        {"item_name": {"$regex": f"^{ing_name}$", "$options": "i"}}
-                    ]},
-                    {"cost": 1, "_id": 0}
-                )
-                if item:
-                    unit_cost = item.get("cost", 0) or 0
-
-            # Adjust for waste
-            effective_qty = net_qty * (1 + waste_pct / 100) if waste_pct > 0 else net_qty
-            line_cost = effective_qty * unit_cost
-
-            costed_ingredients.append({
-                **ing,
-                "unit_cost": unit_cost,
-                "total_cost": round(line_cost, 4),
-                "effective_qty": round(effective_qty, 4),
-            })
-            total_cost += line_cost
-
-        cost_per_serving = total_cost / servings if servings > 0 else 0
-        food_cost_pct = (total_cost / sell_price * 100) if sell_price > 0 else None
-        suggested = cost_per_serving * (1 + (markup_percentage or 0) / 100) if markup_percentage else None
-
-        return RecipeCostAnalysis(
-            total_cost=round(total_cost, 2),
-            cost_per_serving=round(cost_per_serving, 4),
-            ingredient_costs=costed_ingredients,
-            labor_cost=labor_cost,
-            overhead_cost=overhead_cost,
-            markup_percentage=markup_percentage,
-            suggested_price=round(suggested, 2) if suggested else None,
-            food_cost_pct=round(food_cost_pct, 2) if food_cost_pct else None,
+        """Cost ingredient lines against the venue's recipe cost graph (inventory prices and sub-recipe costs)."""
+        graph = await load_cost_graph(db, venue_id)
+        return graph.cost_ingredients(
+            ingredients, servings, sell_price,
+            labor_cost=labor_cost, overhead_cost=overhead_cost, markup_percentage=markup_percentage,
         )
 
     @router.post("/venues/{venue_id}/recipes/engineered")
@@ -181,6 +132,7 @@ def create_recipe_engineering_router():
         )
 
         await db.recipes.insert_one(recipe.model_dump())
+        await bump_catalog_version(db, venue_id)
         return recipe.model_dump()
     
     @router.get("/venues/{venue_id}/recipes/engineered")
@@ -343,6 +295,7 @@ def create_recipe_engineering_router():
             {"venue_id": venue_id, "id": {"$in": recipe_ids}},
             {"$set": {"active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
+        await bump_catalog_version(db, venue_id)
         return {"message": f"Archived {result.modified_count} recipes"}
 
     @router.post("/venues/{venue_id}/recipes/engineered/bulk-restore")
@@ -358,6 +311,7 @@ def create_recipe_engineering_router():
             {"venue_id": venue_id, "id": {"$in": recipe_ids}},
             {"$set": {"active": True, "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
+        await bump_catalog_version(db, venue_id)
         return {"message": f"Restored {result.modified_count} recipes"}
 
     @router.post("/venues/{venue_id}/recipes/engineered/bulk-delete")
@@ -396,6 +350,7 @@ def create_recipe_engineering_router():
                 }
             }}
         )
+        await bump_catalog_version(db, venue_id)
         return {"message": f"Moved {result.modified_count} recipes to trash"}
     
     # ===== TRASH MANAGEMENT ENDPOINTS =====
@@ -483,6 +438,7 @@ def create_recipe_engineering_router():
                 }
             }
         )
+        await bump_catalog_version(db, venue_id)
         return {"message": f"Restored {result.modified_count} recipes from trash"}
     
     @router.post("/venues/{venue_id}/recipes/engineered/bulk-purge")
@@ -502,6 +458,7 @@ def create_recipe_engineering_router():
             "id": {"$in": recipe_ids},
             "deleted_at": {"$ne": None}
         })
+        await bump_catalog_version(db, venue_id)
         
         return {"message": f"Permanently deleted {result.deleted_count} recipes"}
     
@@ -607,6 +564,9 @@ def create_recipe_engineering_router():
                 "$push": {"change_history": change_entry},
             }
         )
+        # Recipes using this one as a sub-recipe pick up its new cost
+        await recost_dependents(db, venue_id, [recipe_id])
+        await bump_catalog_version(db, venue_id)
 
         updated = await db.recipes.find_one(
             {"id": recipe_id, "venue_id": venue_id}, {"_id": 0}
@@ -808,6 +768,7 @@ def create_recipe_engineering_router():
                 }
             }}
         )
+        await bump_catalog_version(db, venue_id)
         return {"message": f"Restored {result.modified_count} recipes from trash"}
     
     @router.post("/venues/{venue_id}/recipes/engineered/bulk-purge")
@@ -828,6 +789,7 @@ def create_recipe_engineering_router():
         result = await db.recipes.delete_many(
             {"venue_id": venue_id, "id": {"$in": recipe_ids}, "deleted_at": {"$ne": None}}
         )
+        await bump_catalog_version(db, venue_id)
         
         # Log this critical action
         await db.audit_logs.insert_one({
@@ -900,43 +862,18 @@ def create_recipe_engineering_router():
         if not recipe:
             raise HTTPException(404, "Recipe not found")
 
-        # Recalculate with current prices
-        cost_analysis = await _calculate_recipe_cost(
-            venue_id=venue_id,
-            ingredients=recipe.get("ingredients", []),
-            servings=recipe.get("servings", 1),
-            sell_price=recipe.get("sell_price", 0),
-        )
-
-        # Collect inherited allergens from all ingredient items
-        inherited_allergens = set()
-        for ing in recipe.get("ingredients", []):
-            ing_name = ing.get("name", ing.get("item_name", ""))
-            if ing.get("type") == "sub_recipe":
-                sub = await db.recipes.find_one(
-                    {"venue_id": venue_id, "recipe_name": {"$regex": f"^{ing_name}$", "$options": "i"}},
-                    {"allergens": 1, "_id": 0}
-                )
-                if sub and sub.get("allergens"):
-                    for a, v in sub["allergens"].items():
-                        if v:
-                            inherited_allergens.add(a)
-            else:
-                item = await db.inventory_items.find_one(
-                    {"venue_id": venue_id, "$or": [
-                        {"name": {"$regex": f"^{ing_name}$", "$options": "i"}},
-                        {"item_name": {"$regex": f"^{ing_name}$", "$options": "i"}}
-                    ]},
-                    {"allergens": 1, "_id": 0}
-                )
-                if item and item.get("allergens"):
-                    inherited_allergens.update(item["allergens"])
+        # Recalculate with current prices, sub-recipes first
+        graph = await load_cost_graph(db, venue_id)
+        fresh = graph.recompute(graph.subtree(recipe_id) - {recipe_id})
+        cost_analysis = graph.cost_recipe(recipe, fresh)
+        inherited_allergens = graph.inherited_allergens(recipe)
 
         return {
             "recipe_id": recipe_id,
             "recipe_name": recipe.get("recipe_name"),
             "cost_analysis": cost_analysis.model_dump(),
             "inherited_allergens": sorted(inherited_allergens),
+            "in_cycle": recipe_id in graph.cyclic,
             "sell_price": recipe.get("sell_price", 0),
             "target_margin": recipe.get("target_margin", 0),
         }
@@ -947,7 +884,7 @@ def create_recipe_engineering_router():
         recipe_id: str,
         current_user: dict = Depends(get_current_user)
     ):
-        """Recalculate recipe cost from current inventory prices."""
+        """Recalculate recipe cost from current inventory prices; its sub-recipes and dependents follow."""
         await check_venue_access(current_user, venue_id)
 
         recipe = await db.recipes.find_one(
@@ -957,12 +894,9 @@ def create_recipe_engineering_router():
         if not recipe:
             raise HTTPException(404, "Recipe not found")
 
-        cost_analysis = await _calculate_recipe_cost(
-            venue_id=venue_id,
-            ingredients=recipe.get("ingredients", []),
-            servings=recipe.get("servings", 1),
-            sell_price=recipe.get("sell_price", 0),
-        )
+        graph = await load_cost_graph(db, venue_id)
+        fresh = graph.recompute(graph.subtree(recipe_id) | graph.dependents([recipe_id]))
+        cost_analysis = fresh.pop(recipe_id, None) or graph.cost_recipe(recipe, fresh)
 
         now = datetime.now(timezone.utc).isoformat()
         await db.recipes.update_one(
@@ -972,10 +906,13 @@ def create_recipe_engineering_router():
                 "updated_at": now,
             }}
         )
+        propagated = await write_cost_changes(db, venue_id, graph, fresh)
+        await bump_catalog_version(db, venue_id)
 
         return {
             "message": "Cost recalculated",
             "cost_analysis": cost_analysis.model_dump(),
+            "propagated": propagated,
         }
 
     # ============== RECIPE EXPORT & IMPORT TEMPLATE ==============
@@ -1224,6 +1161,8 @@ def create_recipe_engineering_router():
             except Exception as e:
                 errors.append({"row": idx + 1, "error": str(e)})
 
+        if created:
+            await bump_catalog_version(db, venue_id)
         return {
             "message": f"Imported {created} recipes",
             "created": created,
@@ -1236,29 +1175,17 @@ def create_recipe_engineering_router():
         venue_id: str,
         current_user: dict = Depends(get_current_user)
     ):
-        """Recalculate costs for ALL active recipes from current inventory prices."""
+        """Recalculate costs for ALL active recipes from current inventory prices (dependency order, one bulk write)."""
         await check_venue_access(current_user, venue_id)
 
-        recipes = await db.recipes.find(
-            {"venue_id": venue_id, "active": True, "deleted_at": None},
-            {"id": 1, "ingredients": 1, "servings": 1, "sell_price": 1, "_id": 0}
-        ).to_list(5000)
-
-        now = datetime.now(timezone.utc).isoformat()
-        updated = 0
-        for r in recipes:
-            cost_analysis = await _calculate_recipe_cost(
-                venue_id=venue_id,
-                ingredients=r.get("ingredients", []),
-                servings=r.get("servings", 1),
-                sell_price=r.get("sell_price", 0),
-            )
-            await db.recipes.update_one(
-                {"id": r["id"], "venue_id": venue_id},
-                {"$set": {"cost_analysis": cost_analysis.model_dump(), "updated_at": now}}
-            )
-            updated += 1
-
-        return {"message": f"Recalculated costs for {updated} recipes", "updated": updated}
+        summary = await recost_venue(db, venue_id)
+        if summary["changed"]:
+            await bump_catalog_version(db, venue_id)
+        return {
+            "message": f"Recalculated costs for {summary['recomputed']} recipes",
+            "updated": summary["recomputed"],
+            "changed": summary["changed"],
+            "cycles": summary["cycles"],
+        }
 
     return router
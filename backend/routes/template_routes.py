@@ -344,7 +344,7 @@ def create_template_router():
     ):
         """
         Render a template with injected data.
-        Returns HTML (or ESCPOS commands in future).
+        Returns HTML, or ESC/POS bytes when output_format is "escpos".
         TEMPLATE_VIEW required.
         """
         template_id = data.get("template_id")
@@ -11,6 +11,7 @@ import io
 import base64
 import secrets
 from core.dependencies import get_current_user
+from core.principal_cache import invalidate_principal
 from core.database import db
 
 class Enable2FARequest(BaseModel):
@@ -63,6 +64,7 @@ def create_2fa_router():
                 "mfa_backup_codes": backup_codes
             }}
         )
+        invalidate_principal(user_id)
         
         return {
             "qrCode": f"data:image/png;base64,{qr_code_base64}",
@@ -95,6 +97,7 @@ def create_2fa_router():
             },
              "$unset": {"mfa_secret_temp": ""}}
         )
+        invalidate_principal(user_id)
         
         return {"verified": True}
     
@@ -122,6 +125,7 @@ def create_2fa_router():
             {"$set": {"mfa_enabled": False},
              "$unset": {"mfa_secret": "", "mfa_backup_codes": ""}}
         )
+        invalidate_principal(user_id)
         
         return {"success": True}
     
@@ -163,6 +167,7 @@ def create_2fa_router():
             {"id": user_id},
             {"$set": settings}
         )
+        invalidate_principal(user_id)
         
         return {"success": True}
     
@@ -182,6 +187,7 @@ def create_2fa_router():
             {"id": user_id},
             {"$set": safe_update}
         )
+        invalidate_principal(user_id)
         
         return {"success": True, "updated": list(safe_update.keys())}
     
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from core.database import db
-from core.security import hash_pin
+from core.security import hash_pin_async
+from core.principal_cache import invalidate_principal
 from models import UserRole
 from datetime import datetime, timezone
 import random
@@ -44,7 +45,7 @@ async def generate_unique_pin(venue_id: str) -> str:
     """Generate a unique 4-digit PIN for the given venue"""
     for _ in range(100):
         pin = f"{random.randint(0, 9999):04d}"
-        pin_hash = hash_pin(pin)
+        pin_hash = await hash_pin_async(pin)
         
         existing = await db.users.find_one({
             "venue_id": venue_id,
@@ -86,11 +87,12 @@ async def sync_users_endpoint():
         if existing_user:
             if "employee_id" not in existing_user:
                 await db.users.update_one({"id": existing_user["id"]}, {"$set": {"employee_id": emp_id}})
+                invalidate_principal(existing_user["id"])
                 users_updated += 1
         else:
             # Generate Unique PIN
             plain_pin = await generate_unique_pin(venue_id)
-            pin_hash = hash_pin(plain_pin)
+            pin_hash = await hash_pin_async(plain_pin)
             
             user_doc = {
                 "id": emp_id,
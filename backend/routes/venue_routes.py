@@ -4,11 +4,12 @@ from typing import List, Optional
 
 from core.database import db
 from core.dependencies import get_current_user, check_venue_access
-from core.security import hash_pin
+from core.security import hash_pin_async
 from core.cache_layer import cached, system_cache
 from core.pii_encryption import encrypt_sensitive_dict, decrypt_sensitive_dict
 from models import Venue, VenueCreate, Zone, ZoneCreate, Table, TableCreate, User, UserCreate, UserRole
 from services.audit_service import create_audit_log
+from services.id_service import invalidate_numbering_config
 from services.settings_service import DEFAULT_VENUE_SETTINGS
 
 
@@ -68,6 +69,8 @@ def create_venue_router():
         result = await db.venues.update_one({"id": venue_id}, {"$set": data})
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Venue not found")
+        if any(k == "settings" or k.startswith("settings.") for k in data):
+            invalidate_numbering_config(venue_id)
         
         await create_audit_log(
             venue_id, current_user["id"], current_user["name"],
@@ -112,6 +115,7 @@ def create_venue_router():
             {"id": venue_id},
             {"$set": {"settings": merged_settings}}
         )
+        invalidate_numbering_config(venue_id)
         
         await create_audit_log(
             venue_id, current_user["id"], current_user["name"],
@@ -308,7 +312,7 @@ def create_venue_router():
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         
         user_dict = data.model_dump()
-        user_dict["pin_hash"] = hash_pin(user_dict.pop("pin"))
+        user_dict["pin_hash"] = await hash_pin_async(user_dict.pop("pin"))
         
         # Encrypt internal PII contacts
         if "phone" in user_dict and user_dict["phone"]:
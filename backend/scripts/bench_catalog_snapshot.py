@@ -0,0 +1,92 @@
+"""
+Catalog snapshot sizing: build time, retained memory and lookup cost of
+services.catalog_snapshot for a multi-venue group, to size a worker for the
+largest groups (memory grows linearly with items + recipes per venue).
+
+Run: python -m scripts.bench_catalog_snapshot [--venues 12] [--items 400] [--lookups 100000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.mock_database import MockDatabase
+from services.catalog_snapshot import catalog_memory_report, get_catalog, warm_catalogs
+
+CATEGORIES = 12
+MODIFIER_GROUPS = 8
+
+
+async def _seed(raw, venues: int, items: int):
+    await raw.venues.delete_many({})
+    for v in range(venues):
+        venue_id = f"venue-{v}"
+        await raw.venues.insert_one({"id": venue_id})
+        await raw.menu_categories.insert_many([
+            {"id": f"{venue_id}-cat-{c}", "venue_id": venue_id, "name": f"Category {c}", "sort_order": c}
+            for c in range(CATEGORIES)])
+        await raw.modifier_groups.insert_many([
+            {"id": f"{venue_id}-mg-{g}", "venue_id": venue_id, "name": f"Group {g}", "selection_type": "single"}
+            for g in range(MODIFIER_GROUPS)])
+        await raw.modifier_options.insert_many([
+            {"id": f"{venue_id}-mo-{g}-{o}", "group_id": f"{venue_id}-mg-{g}", "name": f"Option {o}",
+             "price_adjustment": 0.5 * o, "sort_order": o}
+            for g in range(MODIFIER_GROUPS) for o in range(4)])
+        await raw.menu_items.insert_many([
+            {"id": f"{venue_id}-mi-{i}", "venue_id": venue_id, "category_id": f"{venue_id}-cat-{i % CATEGORIES}",
+             "name": f"Menu item number {i}", "description": "Slow-cooked, served with seasonal greens",
+             "price": 9.5 + i % 20, "price_cents": 950 + 100 * (i % 20), "prep_area": ["kitchen", "grill", "bar"][i % 3],
+             "prep_time_seconds": 600, "allergens": ["gluten", "dairy"], "is_active": True, "sort_order": i}
+            for i in range(items)])
+        await raw.menu_item_modifiers.insert_many([
+            {"menu_item_id": f"{venue_id}-mi-{i}", "modifier_group_id": f"{venue_id}-mg-{i % MODIFIER_GROUPS}"}
+            for i in range(0, items, 2)])
+        await raw.recipes.insert_many([
+            {"id": f"{venue_id}-r-{i}", "venue_id": venue_id, "menu_item_id": f"{venue_id}-mi-{i}",
+             "components": [{"item_id": f"sku-{(i + c) % 300}", "qty": 0.1 * (c + 1)} for c in range(6)]}
+            for i in range(items) if i % 5])
+        await raw.menu_item_inventory.insert_many([
+            {"menu_item_id": f"{venue_id}-mi-{i}", "inventory_item_id": f"sku-{i % 300}", "quantity": 1}
+            for i in range(0, items, 5)])
+
+
+async def _run(venues: int, items: int, lookups: int):
+    raw = MockDatabase(db_file=os.path.join(tempfile.mkdtemp(), "local_db.json"), storage="journal")
+    await _seed(raw, venues, items)
+
+    started = time.perf_counter()
+    warmed = await warm_catalogs(raw, max_venues=venues)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    report = catalog_memory_report()
+    print(f"📦 {len(warmed)} venues x {items} items warmed in {build_ms:.0f} ms "
+          f"({build_ms / max(len(warmed), 1):.1f} ms per venue)")
+    largest = report["venues"][0]
+    print(f"🧮 {report['total_bytes'] / 1e6:.2f} MB total, {report['bytes_per_item']} bytes per menu item; "
+          f"largest venue {largest['venue_id']}: {largest['bytes'] / 1e6:.2f} MB "
+          f"({largest['items']} items, {largest['recipes']} recipes, {largest['modifier_options']} options)")
+
+    catalog = await get_catalog(raw, "venue-0")
+    ids = [f"venue-0-mi-{i % items}" for i in range(lookups)]
+    started = time.perf_counter()
+    for menu_item_id in ids:
+        catalog.menu_item(menu_item_id)
+        catalog.recipe_for(menu_item_id)
+    lookup_ns = (time.perf_counter() - started) * 1e9 / lookups
+    print(f"⚡ item + recipe lookup {lookup_ns:.0f} ns (no database round trip)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--venues", type=int, default=12)
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(_run(args.venues, args.items, args.lookups))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Login-storm benchmark: p50/p99 latency of an unrelated endpoint while N
+credential logins (310k-iteration PBKDF2 each) hit the same worker at once.
+
+Runs in-process against a throwaway local database. --blocking hashes on the
+event loop thread (the old behaviour) for comparison.
+
+Run: python -m scripts.bench_login_storm [--logins 50] [--probes 200] [--blocking]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("JWT_SECRET", "bench-" + "x" * 64)
+
+import core.database
+from core.mock_database import MockDatabase
+
+# Point every get_database()/db import at a scratch store before the routes load
+core.database.db = MockDatabase(db_file=os.path.join(tempfile.mkdtemp(), "local_db.json"), storage="journal")
+
+import httpx
+from fastapi import FastAPI
+
+import routes.auth_routes as auth_routes
+from core.security import hash_password, hash_pool, verify_password
+
+USERS = 20
+PASSWORD = "correct horse battery"
+PROBE_INTERVAL_SECONDS = 0.01
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def _seed(db):
+    password_hash = hash_password(PASSWORD)
+    for i in range(USERS):
+        await db.users.insert_one({
+            "id": f"bench-{i}", "name": f"Bench {i}", "email": f"bench{i}@example.com",
+            "role": "manager", "venue_id": "bench-venue", "status": "active",
+            "password_hash": password_hash,
+        })
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth_routes.create_auth_router(), prefix="/api")
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run(logins: int, probes: int, blocking: bool):
+    if blocking:
+        async def verify_inline(password, stored_hash):
+            return verify_password(password, stored_hash)
+        auth_routes.verify_password_async = verify_inline
+
+    await _seed(core.database.db)
+    transport = httpx.ASGITransport(app=_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/ping")  # warm up
+
+        login_ms = []
+        ping_ms = []
+
+        async def login(i):
+            start = time.perf_counter()
+            r = await client.post("/api/auth/login/credentials", json={
+                "identifier": f"bench{i % USERS}@example.com", "password": PASSWORD,
+                "deviceId": f"bench-device-{i}",
+            })
+            login_ms.append((time.perf_counter() - start) * 1000)
+            return r.status_code
+
+        async def probe():
+            # Fixed-rate schedule, latency measured from the intended send time:
+            # a stalled event loop shows up even if it stalls between requests
+            t0 = time.perf_counter()
+            for i in range(probes):
+                intended = t0 + i * PROBE_INTERVAL_SECONDS
+                await asyncio.sleep(max(0.0, intended - time.perf_counter()))
+                await client.get("/api/ping")
+                ping_ms.append((time.perf_counter() - intended) * 1000)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(probe(), *[login(i) for i in range(logins)])
+        elapsed = time.perf_counter() - start
+
+    statuses = results[1:]
+    print(f"Mode: {'blocking (hash on event loop)' if blocking else f'hash pool ({hash_pool.workers} threads)'}")
+    print(f"Logins: {logins} in {elapsed:.2f}s — {statuses.count(200)} ok, {logins - statuses.count(200)} failed")
+    print(f"Login latency   p50 {_pct(login_ms, 50):8.1f} ms   p99 {_pct(login_ms, 99):8.1f} ms")
+    print(f"/api/ping       p50 {_pct(ping_ms, 50):8.1f} ms   p99 {_pct(ping_ms, 99):8.1f} ms   max {max(ping_ms):.1f} ms")
+    if not blocking:
+        print(f"Hash pool: {hash_pool.snapshot()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unrelated-endpoint latency during a login burst")
+    parser.add_argument("--logins", type=int, default=50, help="Concurrent credential logins")
+    parser.add_argument("--probes", type=int, default=200, help="/api/ping requests, one every 10 ms from the start of the burst")
+    parser.add_argument("--blocking", action="store_true", help="Hash on the event loop thread (baseline)")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.probes, args.blocking))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Send-order benchmark: latency and database round trips of process_send_order
+vs. item count, set-based pipeline against the legacy per-item one.
+
+Runs in-process against a throwaway local database wrapped in a proxy that
+adds --rtt-ms to every database call, standing in for the network hop to
+Mongo. --legacy reproduces the old round trips: a menu_items.find_one per
+item, a recipes.find_one per item plus an update per recipe component, and
+one insert per ticket and print job. The set-based path reads menu items and
+recipes from the venue catalog snapshot, built on the first send.
+
+Run: python -m scripts.bench_send_order [--items 4,12,24,48] [--sends 20] [--rtt-ms 1]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.mock_database import MockDatabase
+import services.order_service as order_service
+
+MENU_ITEMS = 20
+PREP_AREAS = ["grill", "cold", "bar", "kitchen"]
+REQUEST = SimpleNamespace(state=SimpleNamespace(request_id="bench"))
+USER = {"id": "bench-user"}
+
+_set_based = {
+    name: getattr(order_service, name)
+    for name in ("_group_items_by_prep_area", "_deduct_stock", "_create_kds_tickets", "_create_print_jobs")
+}
+
+
+class LatencyDB:
+    """Database proxy: every call costs one simulated round trip."""
+
+    client = None  # no transactions, like the local store
+
+    def __init__(self, raw, rtt_ms: float):
+        self.raw = raw
+        self.rtt = rtt_ms / 1000
+        self.round_trips = 0
+
+    async def tick(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    def __getattr__(self, name):
+        return _LatencyCollection(self, getattr(self.raw, name))
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class _LatencyCollection:
+    def __init__(self, db: LatencyDB, collection):
+        self._db = db
+        self._collection = collection
+
+    def __getattr__(self, method):
+        target = getattr(self._collection, method)
+        if method == "find":
+            return lambda *args, **kwargs: _LatencyCursor(self._db, target(*args, **kwargs))
+
+        async def call(*args, **kwargs):
+            await self._db.tick()
+            return await target(*args, **kwargs)
+        return call
+
+
+class _LatencyCursor:
+    def __init__(self, db: LatencyDB, cursor):
+        self._db = db
+        self._cursor = cursor
+
+    async def to_list(self, length):
+        await self._db.tick()
+        return await self._cursor.to_list(length)
+
+
+# ---------- legacy per-item pipeline (round-trip faithful) ----------
+
+async def legacy_group(db, items, round_seq, venue_id=None):
+    for item in items:
+        menu_item_id = item.get("menu_item_id") or item.get("item_id")
+        if item.get("status") == "pending" and menu_item_id:
+            await db.menu_items.find_one({"id": menu_item_id}, {"_id": 0})
+    return await _set_based["_group_items_by_prep_area"](db.raw, items, round_seq)
+
+
+async def legacy_deduct(db, items, venue_id, order_id, user_id, session=None):
+    for item in items:
+        menu_item_id = item.get("menu_item_id")
+        qty_sold = item.get("quantity", 1)
+        recipe = await db.recipes.find_one({"menu_item_id": menu_item_id, "venue_id": venue_id}, {"_id": 0})
+        if recipe:
+            for comp in recipe.get("components", []):
+                await db.inventory_items.update_one(
+                    {"id": comp.get("item_id"), "venue_id": venue_id},
+                    {"$inc": {"quantity": -comp.get("qty", 0) * qty_sold}})
+        else:
+            links = await db.menu_item_inventory.find({"menu_item_id": menu_item_id}, {"_id": 0}).to_list(100)
+            for link in links:
+                await db.inventory_items.update_one(
+                    {"id": link.get("inventory_item_id"), "venue_id": venue_id},
+                    {"$inc": {"quantity": -link.get("quantity", 1) * qty_sold}})
+    await db.inventory_transactions.insert_one({"venue_id": venue_id, "type": "SALES_DEDUCTION", "order_id": order_id})
+
+
+async def legacy_kds(db, prep_groups, *args, **kwargs):
+    ids = []
+    for key, group in prep_groups.items():
+        ids += await _set_based["_create_kds_tickets"](db.raw, {key: group}, *args, **kwargs)
+        await db.tick()  # one insert_one per ticket
+    return ids
+
+
+async def legacy_print(db, prep_groups, *args, **kwargs):
+    ids = []
+    for key, group in prep_groups.items():
+        ids += await _set_based["_create_print_jobs"](db.raw, {key: group}, *args, **kwargs)
+        await db.tick()  # one insert_one per print job
+    return ids
+
+
+def use_pipeline(legacy: bool):
+    if legacy:
+        order_service._group_items_by_prep_area = legacy_group
+        order_service._deduct_stock = legacy_deduct
+        order_service._create_kds_tickets = legacy_kds
+        order_service._create_print_jobs = legacy_print
+    else:
+        for name, fn in _set_based.items():
+            setattr(order_service, name, fn)
+
+
+# ---------- fixtures ----------
+
+async def _seed(raw):
+    await raw.venues.insert_one({"id": "bench-venue", "settings": {}})
+    for m in range(MENU_ITEMS):
+        await raw.menu_items.insert_one({"id": f"mi-{m}", "venue_id": "bench-venue",
+                                         "prep_area": PREP_AREAS[m % len(PREP_AREAS)], "prep_time_seconds": 600})
+        if m % 4 == 3:
+            await raw.menu_item_inventory.insert_one({"menu_item_id": f"mi-{m}", "inventory_item_id": f"sku-{m}",
+                                                      "quantity": 1})
+        else:
+            await raw.recipes.insert_one({"menu_item_id": f"mi-{m}", "venue_id": "bench-venue", "components": [
+                {"item_id": f"sku-{(m + c) % 30}", "qty": 0.1 * (c + 1)} for c in range(4)]})
+    for s in range(30):
+        await raw.inventory_items.insert_one({"id": f"sku-{s}", "venue_id": "bench-venue", "quantity": 1e9})
+
+
+async def _new_order(raw, n: int, seq: int) -> str:
+    order_id = f"bench-order-{seq}"
+    await raw.orders.insert_one({
+        "id": order_id, "venue_id": "bench-venue", "table_id": "t1", "table_name": "T1",
+        "items": [{"id": f"{order_id}-{i}", "menu_item_id": f"mi-{i % MENU_ITEMS}", "menu_item_name": f"Dish {i}",
+                   "quantity": 1 + i % 2, "course": 1 + i % 3, "seat_number": 1 + i % 12, "status": "pending"}
+                  for i in range(n)],
+    })
+    return order_id
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def _run(item_counts, sends, rtt_ms):
+    raw = MockDatabase(db_file=os.path.join(tempfile.mkdtemp(), "local_db.json"), storage="journal")
+    await _seed(raw)
+    db = LatencyDB(raw, rtt_ms)
+    seq = 0
+
+    print(f"📦 {sends} sends per point, simulated round trip {rtt_ms} ms")
+    print(f"{'items':>6} | {'legacy trips':>12} {'p50 ms':>8} {'p99 ms':>8} | {'set trips':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in item_counts:
+        row = []
+        for legacy in (True, False):
+            use_pipeline(legacy)
+            samples, trips = [], []
+            for _ in range(sends):
+                seq += 1
+                order_id = await _new_order(raw, n, seq)
+                db.round_trips = 0
+                started = time.perf_counter()
+                ok, result = await order_service.process_send_order(
+                    db, order_id, REQUEST, True, True, True, None, USER)
+                samples.append((time.perf_counter() - started) * 1000)
+                trips.append(db.round_trips)
+                assert ok, result
+            row.append((_pct(trips, 50), _pct(samples, 50), _pct(samples, 99)))
+        (lt, l50, l99), (st, s50, s99) = row
+        print(f"{n:>6} | {lt:>12} {l50:>8.2f} {l99:>8.2f} | {st:>9} {s50:>8.2f} {s99:>8.2f}")
+    use_pipeline(False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", default="4,12,24,48")
+    parser.add_argument("--sends", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(_run([int(n) for n in args.items.split(",")], args.sends, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Print-template render benchmark: a 60-line receipt rendered through the
+legacy path (filter/sort/group + regex injection per render) and through the
+compiled RenderPlan, to HTML and to ESC/POS, against the < 200ms target.
+
+Run: python -m scripts.bench_template_render [--renders 2000] [--items 35]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.template_render_service import (
+    evaluate_condition, get_render_plan, render_template, render_to_html,
+)
+
+TARGET_MS = 200.0
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def receipt_template(items: int):
+    def text(i, section, content, **props):
+        return {"id": f"t{i}", "type": "text", "section": section, "order": i,
+                "text_props": {"content": content, **props}}
+
+    blocks = [
+        text(1, "header", "{{venue.name}}", font_size=24, bold=True, alignment="center"),
+        text(2, "header", "{{venue.address}}", alignment="center"),
+        text(3, "header", "VAT {{venue.vat_number}}", alignment="center"),
+        text(4, "header", "{{order.date}}  Order #{{order.number}}  Table {{order.table}}"),
+        text(5, "header", "Server: {{order.server.name}}"),
+        {"id": "d1", "type": "divider", "section": "body", "order": 10, "divider_props": {"style": "dashed"}},
+        {"id": "items", "type": "table", "section": "body", "order": 11, "table_props": {
+            "data_source": "order.items",
+            "columns": [{"key": "name", "label": "Item"}, {"key": "qty", "label": "Qty", "align": "right"},
+                        {"key": "total", "label": "Total", "align": "right"}],
+            "totals_row": {"name": "Total", "total": "{{order.total}}"},
+        }},
+        {"id": "d2", "type": "divider", "section": "body", "order": 12},
+        text(13, "body", "Subtotal {{order.subtotal}}", alignment="right"),
+        text(14, "body", "VAT 18% {{order.tax}}", alignment="right"),
+        text(15, "body", "Service {{order.service_charge}}", alignment="right"),
+        text(16, "body", "TOTAL {{order.total}}", bold=True, font_size=16, alignment="right"),
+        text(17, "body", "Paid by {{payment.method}} {{payment.amount}}"),
+        {**text(18, "body", "Dine in - {{order.covers}} covers"),
+         "show_if": {"field": "order.type", "operator": "==", "value": "dine_in"}},
+        {**text(19, "body", "Takeaway"),
+         "show_if": {"field": "order.type", "operator": "==", "value": "takeaway"}},
+        {"id": "bc", "type": "barcode", "section": "footer", "order": 20,
+         "barcode_props": {"data_source": "order.number", "height": 60}},
+        {"id": "qr", "type": "qr", "section": "footer", "order": 21,
+         "qr_props": {"data_source": "order.payment_url", "label": "Scan to pay or review"}},
+        {"id": "fiscal", "type": "fiscal", "section": "footer", "order": 22, "fiscal_props": {}},
+        text(23, "footer", "Thank you for visiting {{venue.name}}!", alignment="center"),
+        text(24, "footer", "Prices include VAT. No service charge on takeaway.", alignment="center"),
+    ]
+    data = {
+        "venue": {"name": "Caviar & Bull", "address": "Corinthia, St George's Bay", "vat_number": "MT12345678"},
+        "order": {
+            "number": "100234", "table": "12", "date": "2026-10-16 21:04", "type": "dine_in", "covers": 4,
+            "server": {"name": "Maria"}, "payment_url": "https://pay.example.com/o/100234",
+            "items": [{"name": f"Dish {i} of the day", "qty": 1 + i % 3,
+                       "total": f"€{12.5 + i:.2f}"} for i in range(items)],
+            "subtotal": "€1,020.00", "tax": "€183.60", "service_charge": "€0.00", "total": "€1,203.60",
+        },
+        "payment": {"method": "Card", "amount": "€1,203.60"},
+        "fiscal": {"receipt_id": "FS-2026-000123", "qr_data": "MT|FS-2026-000123|1203.60"},
+    }
+    return {"blocks": blocks, "paper_profile": {"width": "80mm"}}, data
+
+
+def legacy_render(template, data):
+    """The pre-compilation pipeline: filter, sort and group on every render."""
+    visible = [b for b in template["blocks"] if evaluate_condition(b.get("show_if"), data)]
+    visible.sort(key=lambda b: b.get("order", 0))
+    sections = {"header": [], "body": [], "footer": []}
+    for block in visible:
+        sections.setdefault(block.get("section", "body"), []).append(block)
+    return render_to_html(sections, data, template["paper_profile"], False, 0)
+
+
+def _time(fn, renders):
+    samples = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--renders", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=35)
+    args = parser.parse_args()
+
+    template, data = receipt_template(args.items)
+    loop = asyncio.new_event_loop()
+
+    def render(fmt):
+        return loop.run_until_complete(render_template(None, template, data, output_format=fmt))
+
+    started = time.perf_counter()
+    get_render_plan(template["blocks"])
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    escpos = bytes(render("escpos")["escpos_commands"])
+    assert legacy_render(template, data)["html"] == render("html")["html"], "compiled HTML differs from legacy"
+
+    lines = escpos.count(b"\n")
+    print(f"🧾 {len(template['blocks'])} blocks, {args.items} items, "
+          f"{lines} printed lines, {len(escpos)} ESC/POS bytes; compile {compile_ms:.2f} ms")
+    results = {
+        "legacy html": _time(lambda: legacy_render(template, data), args.renders),
+        "compiled html": _time(lambda: render("html"), args.renders),
+        "compiled escpos": _time(lambda: render("escpos"), args.renders),
+    }
+    for name, samples in results.items():
+        p99 = _pct(samples, 99)
+        verdict = "✅" if p99 < TARGET_MS else "❌"
+        print(f"{verdict} {name:<16} p50 {_pct(samples, 50):7.3f} ms   p99 {p99:7.3f} ms   (target < {TARGET_MS:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Verify (and optionally repair) rm_stock_on_hand balances against the stock ledger.
+Replays only the ledger rows after each item's last checkpoint unless --full.
+
+Run: python -m scripts.rebuild_stock_on_hand --venue <venue_id> [--item <item_id>] [--full] [--fix]
+"""
+import argparse
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.database import get_database
+from inventory.services.stock_ledger_service import StockLedgerService
+
+
+async def rebuild(venue_id: str, item_id: str = None, full: bool = False, fix: bool = False):
+    db = get_database()
+    service = StockLedgerService(db)
+
+    if item_id:
+        item_ids = [item_id]
+    else:
+        item_ids = sorted({
+            row["item_id"]
+            async for row in db.stock_ledger.find({"venue_id": venue_id}, {"_id": 0, "item_id": 1})
+        })
+
+    drifted = 0
+    repaired = 0
+    for iid in item_ids:
+        if fix:
+            report = await service.rebuild_balance(iid, venue_id, full=full)
+        else:
+            report = await service.verify_balance(iid, venue_id, full=full)
+        if report["ok"]:
+            continue
+        drifted += 1
+        repaired += 1 if report.get("rebuilt") else 0
+        note = " (movement in flight, re-run)" if report["in_flight"] else ""
+        print(f"  ⚠️  {iid}: balance={report['balance']} expected={report['expected']}{note}")
+
+    print(f"\nDone: {len(item_ids)} items checked, {drifted} drifted, {repaired} repaired")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--venue", required=True)
+    parser.add_argument("--item")
+    parser.add_argument("--full", action="store_true", help="replay the whole ledger, ignore checkpoints")
+    parser.add_argument("--fix", action="store_true", help="overwrite drifted balances")
+    args = parser.parse_args()
+    print(f"🔧 Verifying stock on hand for {args.venue}...")
+    asyncio.run(rebuild(args.venue, args.item, args.full, args.fix))
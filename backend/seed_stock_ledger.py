@@ -27,6 +27,9 @@ async def seed_stock_ledger():
     inventory_items = await db.inventory_items.find({"venue_id": venue_id}, {"_id": 0}).to_list(100)
     
     await db.stock_ledger.delete_many({"venue_id": venue_id})
+    # Balances are re-seeded from the new rows on the next read
+    await db.rm_stock_on_hand.delete_many({"venue_id": venue_id})
+    await db.rm_stock_on_hand_checkpoints.delete_many({"venue_id": venue_id})
     
     ledger_entries = []
     
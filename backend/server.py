@@ -769,6 +769,10 @@ app.include_router(api_main)
 from app.domains.access_control.routes import router as access_control_router
 app.include_router(access_control_router)
 
+# Prometheus scrape endpoint (root level, like /health)
+from routes.hyperscale_routes import exposition_router as metrics_exposition_router
+app.include_router(metrics_exposition_router)
+
 
 
 # ==================== STARTUP/SHUTDOWN EVENTS ====================
@@ -811,7 +815,12 @@ async def startup_event():
         from workers.outbox_consumer import run_outbox_consumer
         asyncio.create_task(run_outbox_consumer())
         logger.info("✓ Outbox consumer started")
-        
+
+        # Warm menu/recipe catalog snapshots for trading venues (background, one venue at a time)
+        from services.catalog_snapshot import warm_catalogs
+        asyncio.create_task(warm_catalogs(db))
+        logger.info("✓ Catalog snapshot warmup started")
+
         # Start scheduled tasks
         from services.scheduled_tasks import get_scheduled_tasks
         tasks_service = get_scheduled_tasks(db)
@@ -851,6 +860,10 @@ async def shutdown_event():
     
     event_bus.stop()
     logger.info("✓ Event bus stopped")
+
+    from core.events_outbox import flush_all_outboxes
+    await flush_all_outboxes()
+    logger.info("✓ Outbox buffers flushed")
     client.close()
     logger.info("✓ Database connection closed")
 
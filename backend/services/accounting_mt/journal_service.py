@@ -49,6 +49,6 @@ async def post_sales_journal(event: dict):
     
     # Emit event
     outbox = Outbox(db)
-    outbox.emit(venue_id, "accounting.journal.posted", f"JE:{journal.id}", {"journal_id": journal.id})
+    await outbox.publish(venue_id, "accounting.journal.posted", f"JE:{journal.id}", {"journal_id": journal.id})
     
     print(f"📚 Accounting: Posted journal for order {order_id[:8]}")
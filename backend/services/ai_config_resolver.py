@@ -3,11 +3,22 @@ AI Config Resolver — 3-Level Cascade Configuration
 ===================================================
 Resolves AI config for a venue by merging: System → Group → Venue.
 Venue overrides Group, Group overrides System.
+
+Resolved configs are cached per (venue_id, group_id). ``save_config`` at any
+level invalidates what it affects (system: everything, group: its venues,
+venue: that venue); other workers pick changes up within
+``AI_CONFIG_CACHE_TTL_SECONDS``. Consumers such as the AI router attach their
+compiled state to the cached entry (``ResolvedAIConfig.compiled``) so it is
+rebuilt exactly when the config is.
 """
+import copy
 import logging
+import os
+import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from core.database import db
+from core.metrics_collector import register_cache_stats
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +80,52 @@ DEFAULT_SYSTEM_CONFIG = {
 }
 
 
+# Cross-worker staleness bound; local saves invalidate immediately
+AI_CONFIG_CACHE_TTL_SECONDS = float(os.getenv("AI_CONFIG_CACHE_TTL_SECONDS", "60"))
+
+
+class ResolvedAIConfig:
+    """A resolved cascade plus whatever consumers compiled from it."""
+    __slots__ = ("config", "version", "loaded_at", "compiled")
+
+    def __init__(self, config: dict, version: Tuple[int, int, int]):
+        self.config = config
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.compiled: Dict = {}
+
+
+# (venue_id, group_id) -> resolved config
+_resolved_cache: Dict[Tuple[str, str], ResolvedAIConfig] = {}
+# Bumped by save_config at each level
+_system_version = 0
+_group_versions: Dict[str, int] = {}
+_venue_versions: Dict[str, int] = {}
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+register_cache_stats("ai_config", lambda: dict(_cache_stats, entries=len(_resolved_cache)))
+
+
+def _version(venue_id: str, group_id: str) -> Tuple[int, int, int]:
+    return _system_version, _group_versions.get(group_id, 0), _venue_versions.get(venue_id, 0)
+
+
+def invalidate_ai_config(level: str = "system", level_id: str = "") -> None:
+    """Drop cached resolutions affected by a config change at ``level``."""
+    global _system_version
+    if level == "group":
+        _group_versions[level_id] = _group_versions.get(level_id, 0) + 1
+        stale = [k for k in _resolved_cache if k[1] == level_id]
+    elif level == "venue":
+        _venue_versions[level_id] = _venue_versions.get(level_id, 0) + 1
+        stale = [k for k in _resolved_cache if k[0] == level_id]
+    else:
+        _system_version += 1
+        stale = list(_resolved_cache)
+    for key in stale:
+        del _resolved_cache[key]
+    _cache_stats["invalidations"] += 1
+
+
 def _deep_merge(base: dict, override: dict) -> dict:
     """Deep merge override into base. Override values win."""
     result = base.copy()
@@ -106,19 +163,44 @@ async def save_config(level: str, level_id: str, data: dict, user_id: str = "")
         {"$set": update_data, "$setOnInsert": {"created_at": now}},
         upsert=True,
     )
+    invalidate_ai_config(level, level_id)
 
     logger.info("AI config saved: level=%s, id=%s, by=%s", level, level_id, user_id)
     return update_data
 
 
+async def get_resolved_config(venue_id: str, group_id: str = "") -> ResolvedAIConfig:
+    """Cached resolution; the returned entry is shared, so treat ``config`` as read-only."""
+    key = (venue_id, group_id)
+    version = _version(venue_id, group_id)
+    entry = _resolved_cache.get(key)
+    if entry and entry.version == version and time.monotonic() - entry.loaded_at < AI_CONFIG_CACHE_TTL_SECONDS:
+        _cache_stats["hits"] += 1
+        return entry
+
+    _cache_stats["misses"] += 1
+    entry = ResolvedAIConfig(await _resolve_uncached(venue_id, group_id), version)
+    # A save that raced the resolve bumped a version; don't cache the stale result
+    if _version(venue_id, group_id) == version:
+        _resolved_cache[key] = entry
+    return entry
+
+
 async def resolve_config(venue_id: str, group_id: str = "") -> dict:
     """
     Resolve final AI config for a venue by cascading:
       System → Group → Venue
-    Each level overrides the previous.
+    Each level overrides the previous. Returns a private copy of the cached resolution;
+    its ``resolved_at`` is when that resolution was built (the cache fill, up to
+    ``AI_CONFIG_CACHE_TTL_SECONDS`` ago), not when this call ran.
     """
-    # 1. Start with hardcoded defaults
-    resolved = DEFAULT_SYSTEM_CONFIG.copy()
+    entry = await get_resolved_config(venue_id, group_id)
+    return copy.deepcopy(entry.config)
+
+
+async def _resolve_uncached(venue_id: str, group_id: str = "") -> dict:
+    # 1. Start with hardcoded defaults (deep copy: the result is cached and shared)
+    resolved = copy.deepcopy(DEFAULT_SYSTEM_CONFIG)
 
     # 2. Merge system config from DB (if exists)
     system_cfg = await get_config("system", "")
@@ -140,6 +222,7 @@ async def resolve_config(venue_id: str, group_id: str = "") -> dict:
     # Clean metadata from resolved
     resolved.pop("_id", None)
     resolved["resolved_for"] = venue_id
+    # Cached with the rest of the resolution: this is the cache-fill time
     resolved["resolved_at"] = datetime.now(timezone.utc).isoformat()
 
     return resolved
@@ -41,6 +41,10 @@ class AIResponse:
     cost_usd: float = 0.0
     raw: dict = field(default_factory=dict)
     error: Optional[str] = None
+    # Result cache: served from cache, cost this answer saved, process-wide hit rate
+    cached: bool = False
+    cache_saved_usd: float = 0.0
+    cache_hit_rate: float = 0.0
 
 
 @dataclass
@@ -51,6 +55,9 @@ class EmbeddingResponse:
     model: str = ""
     dimensions: int = 0
     tokens_used: int = 0
+    # Result cache: vectors served from cache, process-wide hit rate
+    cached_count: int = 0
+    cache_hit_rate: float = 0.0
 
 
 @dataclass
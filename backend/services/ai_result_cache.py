@@ -0,0 +1,285 @@
+"""
+AI Result Cache — Content-Addressed Completion / Embedding Results
+==================================================================
+Identical requests (same task, system prompt, prompt, model, temperature)
+are answered from a bounded in-process LRU with TTL, optionally backed by a
+Mongo tier shared by all workers (``AI_RESULT_CACHE_MONGO``). Concurrent
+identical requests share one upstream call (single-flight). Only successful
+results are stored.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.metrics_collector import register_cache_stats
+
+logger = logging.getLogger(__name__)
+
+AI_RESULT_CACHE_SIZE = int(os.getenv("AI_RESULT_CACHE_SIZE", "5000"))
+AI_RESULT_CACHE_TTL_SECONDS = float(os.getenv("AI_RESULT_CACHE_TTL_SECONDS", "3600"))
+# Embeddings of the same text under the same model never change
+AI_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("AI_EMBEDDING_CACHE_TTL_SECONDS", str(7 * 86400)))
+AI_RESULT_CACHE_MONGO = os.getenv("AI_RESULT_CACHE_MONGO", "false").lower() == "true"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", (text or "").strip())
+
+
+def _digest(parts: list) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+def _expires_ts(doc: dict) -> float:
+    expires_at = doc["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)  # Motor returns naive UTC
+    return expires_at.timestamp()
+
+
+def completion_key(task_type: str, system_prompt: str, prompt: str, model: str,
+                   temperature: float, max_tokens: int, provider: str = "") -> str:
+    """Whitespace-insensitive hash of everything that shapes a completion."""
+    return _digest([
+        "completion", task_type, _normalize(system_prompt), _normalize(prompt),
+        model or "", round(float(temperature), 2), int(max_tokens), provider or "",
+    ])
+
+
+def embedding_key(model: str, text: str) -> str:
+    return _digest(["embedding", model, _normalize(text)])
+
+
+class AIResultCache:
+    def __init__(self, max_entries: int = AI_RESULT_CACHE_SIZE, ttl_seconds: float = AI_RESULT_CACHE_TTL_SECONDS,
+                 database=None, use_mongo: bool = AI_RESULT_CACHE_MONGO):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_mongo = use_mongo
+        self._db = database
+        # key -> (expires_at epoch seconds, payload), most recently used last
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # key -> future resolved with the payload (or None) of the upstream call in progress
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._indexes_ready = False
+        self.stats = {"hits": 0, "misses": 0, "joins": 0, "mongo_hits": 0,
+                      "saved_tokens": 0, "saved_micro_usd": 0}
+
+    @property
+    def db(self):
+        if self._db is None:
+            from core.database import db
+            self._db = db
+        return self._db
+
+    def hit_rate(self) -> float:
+        served = self.stats["hits"] + self.stats["joins"]
+        total = served + self.stats["misses"]
+        return served / total if total else 0.0
+
+    def record_saving(self, payload: dict) -> None:
+        self.stats["saved_tokens"] += int(payload.get("tokens_in", 0)) + int(payload.get("tokens_out", 0))
+        self.stats["saved_micro_usd"] += int(round(float(payload.get("cost_usd", 0.0)) * 1_000_000))
+
+    # ─── Memory tier ─────────────────────────────────────────────────
+
+    def get_local(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _remember(self, key: str, payload: dict, expires_at: float) -> None:
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ─── Mongo tier ──────────────────────────────────────────────────
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        self._indexes_ready = True
+        try:
+            await self.db.ai_result_cache.create_index("key", unique=True, name="idx_ai_result_key")
+            await self.db.ai_result_cache.create_index(
+                "expires_at", expireAfterSeconds=0, name="ttl_ai_result_expires"
+            )
+        except Exception as e:
+            logger.warning("AI result cache index setup failed: %s", e)
+
+    async def _get_shared(self, key: str) -> Optional[dict]:
+        if not self.use_mongo:
+            return None
+        try:
+            await self._ensure_indexes()
+            doc = await self.db.ai_result_cache.find_one({"key": key}, {"_id": 0})
+        except Exception as e:
+            logger.warning("AI result cache read failed: %s", e)
+            return None
+        if not doc:
+            return None
+        expires_at = _expires_ts(doc)
+        if expires_at < time.time():
+            return None
+        self._remember(key, doc["payload"], expires_at)
+        return doc["payload"]
+
+    async def _put_shared(self, key: str, payload: dict, ttl: float) -> None:
+        if not self.use_mongo:
+            return
+        try:
+            await self._ensure_indexes()
+            await self.db.ai_result_cache.update_one(
+                {"key": key},
+                {"$set": {"payload": payload,
+                          "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning("AI result cache write failed: %s", e)
+
+    # ─── Read-through with single-flight ─────────────────────────────
+
+    async def put(self, key: str, payload: dict, ttl: Optional[float] = None) -> None:
+        ttl = ttl or self.ttl_seconds
+        self._remember(key, payload, time.time() + ttl)
+        await self._put_shared(key, payload, ttl)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Optional[dict]]],
+        ttl: Optional[float] = None,
+    ) -> Tuple[Optional[dict], bool]:
+        """(payload, served_from_cache). ``compute`` returns None for results not worth caching."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            payload = await asyncio.shield(pending)
+            if payload is not None:
+                self.stats["joins"] += 1
+                self.record_saving(payload)
+                return payload, True
+            # The shared call failed: try on our own
+
+        payload = self.get_local(key)
+        if payload is not None:
+            self.stats["hits"] += 1
+            self.record_saving(payload)
+            return payload, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            payload = await self._get_shared(key)
+            if payload is not None:
+                self.stats["hits"] += 1
+                self.stats["mongo_hits"] += 1
+                self.record_saving(payload)
+                future.set_result(payload)
+                return payload, True
+
+            self.stats["misses"] += 1
+            payload = await compute()
+            if payload is not None:
+                await self.put(key, payload, ttl)
+            future.set_result(payload)
+            return payload, False
+        finally:
+            if not future.done():
+                future.set_result(None)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def get_many_or_compute(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, dict]]],
+        ttl: Optional[float] = None,
+    ) -> Tuple[Dict[str, dict], int]:
+        """
+        Batch form for per-item results (embeddings): (key -> payload, items served
+        from cache). Misses go to ``compute_many`` in one call; keys already in
+        flight elsewhere are awaited instead. Keys ``compute_many`` leaves out are
+        absent from the result.
+        """
+        results: Dict[str, dict] = {}
+        joining: Dict[str, asyncio.Future] = {}
+        for key in dict.fromkeys(keys):
+            payload = self.get_local(key)
+            if payload is not None:
+                results[key] = payload
+            elif key in self._inflight:
+                joining[key] = self._inflight[key]
+        self.stats["hits"] += len(results)
+        served = len(results)
+
+        own = [k for k in dict.fromkeys(keys) if k not in results and k not in joining]
+        loop = asyncio.get_running_loop()
+        futures = {k: loop.create_future() for k in own}
+        self._inflight.update(futures)
+        try:
+            if own and self.use_mongo:
+                try:
+                    await self._ensure_indexes()
+                    docs = await self.db.ai_result_cache.find(
+                        {"key": {"$in": own}, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0}
+                    ).to_list(len(own))
+                except Exception as e:
+                    logger.warning("AI result cache read failed: %s", e)
+                    docs = []
+                for doc in docs:
+                    results[doc["key"]] = doc["payload"]
+                    # Never keep a promoted entry past the document's own expiry
+                    expires_at = min(time.time() + (ttl or self.ttl_seconds), _expires_ts(doc))
+                    self._remember(doc["key"], doc["payload"], expires_at)
+                    futures[doc["key"]].set_result(doc["payload"])
+                self.stats["hits"] += len(docs)
+                self.stats["mongo_hits"] += len(docs)
+                served += len(docs)
+                own = [k for k in own if k not in results]
+
+            if own:
+                self.stats["misses"] += len(own)
+                computed = await compute_many(own)
+                for key in own:
+                    payload = computed.get(key)
+                    if payload is not None:
+                        results[key] = payload
+                        await self.put(key, payload, ttl)
+                    futures[key].set_result(payload)
+
+            for key, pending in joining.items():
+                payload = await asyncio.shield(pending)
+                if payload is not None:
+                    results[key] = payload
+                    self.stats["joins"] += 1
+                    served += 1
+        finally:
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_result(None)
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+        return results, served
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+result_cache = AIResultCache()
+register_cache_stats("ai_results", lambda: dict(result_cache.stats, entries=len(result_cache._entries)))
@@ -9,34 +9,69 @@ Routes AI requests to the best provider/model based on:
 
 Falls back through a chain if the primary provider fails.
 Tracks all usage for billing broker.
+
+Each provider has a circuit breaker fed by rolling (EWMA) latency and error
+rates; chains are re-ordered so open circuits and degraded providers go last.
+Latency-sensitive tasks (``AI_HEDGE_TASKS``) hedge: if the current provider
+has not answered within its observed p95, the next provider is started too,
+the first good answer wins and the loser is cancelled.
 """
+import asyncio
+import hashlib
 import os
 import logging
 import time
-from typing import Optional, Dict, List
+from collections import deque
+from typing import Deque, Optional, Dict, List, Tuple
 from datetime import datetime, timezone
 
 from services.ai_providers import (
     BaseAIProvider, AIResponse, EmbeddingResponse, TTSResponse, STTResponse, ImageResponse,
     get_provider, get_cost_estimate, PROVIDER_CLASSES,
 )
-from services.ai_config_resolver import resolve_config
+from services.ai_config_resolver import AI_CONFIG_CACHE_TTL_SECONDS, get_resolved_config
+from services.ai_result_cache import (
+    AI_EMBEDDING_CACHE_TTL_SECONDS, completion_key, embedding_key, result_cache,
+)
+from core.metrics_collector import BUCKET_BOUNDS_MS, bucket_index, histogram_percentile
 
 logger = logging.getLogger(__name__)
 
+# Consecutive failures that open a provider's circuit, and how long it stays open
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "30"))
+# ...or an EWMA error rate at/above this once the provider has enough samples
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+AI_BREAKER_MIN_SAMPLES = 10
+# EWMA latency above this demotes a provider behind its healthy peers
+AI_SLOW_PROVIDER_MS = float(os.getenv("AI_SLOW_PROVIDER_MS", "8000"))
+AI_PROVIDER_TIMEOUT_SECONDS = float(os.getenv("AI_PROVIDER_TIMEOUT_SECONDS", "60"))
+# Tasks hedged by default (comma-separated); route_completion(hedge=...) overrides
+AI_HEDGE_TASKS = {t.strip() for t in os.getenv("AI_HEDGE_TASKS", "voice,copilot").split(",") if t.strip()}
+AI_HEDGE_MIN_DELAY_MS = float(os.getenv("AI_HEDGE_MIN_DELAY_MS", "250"))
+AI_HEDGE_MAX_DELAY_MS = float(os.getenv("AI_HEDGE_MAX_DELAY_MS", "5000"))
+AI_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("AI_HEDGE_DEFAULT_DELAY_MS", "1500"))
+# Shadow learning fan-out after successful completions (off unless enabled)
+AI_SHADOW_FANOUT = os.getenv("AI_SHADOW_FANOUT", "false").lower() == "true"
+
+EWMA_ALPHA = 0.2
+
 
 # ─── Env Key Loader ─────────────────────────────────────────────
 # Auto-loads API keys from .env as fallback when no DB keys are stored.
 # This bridges the existing 5 Google keys to the new multi-provider router.
 
 _env_keys_cache: Optional[Dict[str, str]] = None
+# Re-read on the config TTL, so a key added to the environment reaches the recompiled chains
+_env_keys_loaded_at = 0.0
 _google_key_idx = 0  # Round-robin index for Google keys
 
 
 def _load_env_keys() -> Dict[str, str]:
     """Load API keys from environment variables (fallback when no DB keys)."""
-    global _env_keys_cache
-    if _env_keys_cache is not None:
+    global _env_keys_cache, _env_keys_loaded_at
+    if (_env_keys_cache is not None
+            and time.monotonic() - _env_keys_loaded_at < AI_CONFIG_CACHE_TTL_SECONDS):
         return _env_keys_cache
 
     keys: Dict[str, str] = {}
@@ -66,9 +101,10 @@ def _load_env_keys() -> Dict[str, str]:
             keys[provider] = val
 
     found = [p for p in keys if not p.startswith("_")]
-    if found:
+    if found and keys != _env_keys_cache:
         logger.info("ENV keys loaded for: %s", ", ".join(found))
     _env_keys_cache = keys
+    _env_keys_loaded_at = time.monotonic()
     return keys
 
 
@@ -155,36 +191,168 @@ TASK_TO_CHAIN = {
 # ─── In-Memory Rate Limiter ─────────────────────────────────────
 
 class RateLimiter:
-    """Simple in-memory rate limiter per provider."""
+    """Simple in-memory rate limiter per provider (sliding log, oldest first)."""
 
     def __init__(self):
-        self._windows: Dict[str, List[float]] = {}
+        self._windows: Dict[str, Deque[float]] = {}
+
+    def _window(self, provider: str, now: float) -> Deque[float]:
+        window = self._windows.get(provider)
+        if window is None:
+            window = self._windows[provider] = deque()
+        # Drop entries older than 60s; they sit at the left, so stop at the first fresh one
+        while window and now - window[0] >= 60:
+            window.popleft()
+        return window
 
     def can_proceed(self, provider: str, rpm_limit: int = 30) -> bool:
         now = time.monotonic()
-        key = provider
-        if key not in self._windows:
-            self._windows[key] = []
-
-        # Clean old entries (older than 60s)
-        self._windows[key] = [t for t in self._windows[key] if now - t < 60]
-
-        if len(self._windows[key]) >= rpm_limit:
+        window = self._window(provider, now)
+        if len(window) >= rpm_limit:
             return False
-
-        self._windows[key].append(now)
+        window.append(now)
         return True
 
     def record(self, provider: str):
         now = time.monotonic()
-        if provider not in self._windows:
-            self._windows[provider] = []
-        self._windows[provider].append(now)
+        self._window(provider, now).append(now)
 
 
 _rate_limiter = RateLimiter()
 
 
+# ─── Provider Health / Circuit Breakers ─────────────────────────
+
+class ProviderHealth:
+    """Rolling health of one provider: EWMA latency and error rate, latency histogram, circuit."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ewma_latency_ms: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.last_observed_at = 0.0
+        self.latency_counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= AI_BREAKER_COOLDOWN_SECONDS:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Closed: always. Half-open: one probe at a time. Open: never."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def _observe_latency(self, latency_ms: float) -> None:
+        self.last_observed_at = time.monotonic()
+        if self.ewma_latency_ms is None:
+            self.ewma_latency_ms = latency_ms
+        else:
+            self.ewma_latency_ms += EWMA_ALPHA * (latency_ms - self.ewma_latency_ms)
+
+    def record_success(self, latency_ms: float) -> None:
+        self.successes += 1
+        self._observe_latency(latency_ms)
+        self.latency_counts[bucket_index(latency_ms)] += 1
+        self.ewma_error_rate *= 1 - EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self, latency_ms: float) -> None:
+        self.failures += 1
+        self._observe_latency(latency_ms)
+        self.ewma_error_rate += EWMA_ALPHA * (1 - self.ewma_error_rate)
+        self.consecutive_failures += 1
+        erroring = (self.successes + self.failures >= AI_BREAKER_MIN_SAMPLES
+                    and self.ewma_error_rate >= AI_BREAKER_ERROR_RATE)
+        if self.probe_in_flight or erroring or self.consecutive_failures >= AI_BREAKER_FAILURES:
+            if self.opened_at is None or self.probe_in_flight:
+                logger.warning("Circuit opened: %s after %d consecutive failures", self.name, self.consecutive_failures)
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def release(self) -> None:
+        """Attempt abandoned (hedge loser): neither success nor failure."""
+        self.probe_in_flight = False
+
+    def p95_ms(self) -> Optional[float]:
+        if not self.successes:
+            return None
+        return histogram_percentile(self.latency_counts, 95)
+
+    def rank(self) -> int:
+        """
+        0 healthy (incl. half-open, so the probe happens in configured order),
+        1 recently slow, 2 circuit open. Slowness is forgotten after a cooldown
+        without samples, so a demoted provider gets re-measured.
+        """
+        if self.state == "open":
+            return 2
+        recently_seen = time.monotonic() - self.last_observed_at < AI_BREAKER_COOLDOWN_SECONDS
+        if recently_seen and (self.ewma_latency_ms or 0) > AI_SLOW_PROVIDER_MS:
+            return 1
+        return 0
+
+    def to_dict(self) -> dict:
+        p95 = self.p95_ms()
+        return {
+            "state": self.state,
+            "ewma_latency_ms": round(self.ewma_latency_ms, 1) if self.ewma_latency_ms is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 3),
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+_provider_health: Dict[str, ProviderHealth] = {}
+
+
+def _health_key(provider_name: str, provider: Optional[BaseAIProvider] = None) -> str:
+    """
+    Breaker state is per (provider, API key): one tenant's revoked or invalid
+    key must not open the circuit for every other tenant of that provider.
+    """
+    api_key = getattr(provider, "api_key", "") or ""
+    if not api_key:
+        return provider_name
+    return f"{provider_name}:{hashlib.sha256(api_key.encode()).hexdigest()[:8]}"
+
+
+def _health(provider_name: str, provider: Optional[BaseAIProvider] = None) -> ProviderHealth:
+    key = _health_key(provider_name, provider)
+    health = _provider_health.get(key)
+    if health is None:
+        health = _provider_health[key] = ProviderHealth(key)
+    return health
+
+
+def _order_by_health(chain: "ChainSteps") -> "ChainSteps":
+    """Healthy providers first, in configured (cost) order; sorted() is stable."""
+    return sorted(chain, key=lambda step: _health(step[0], step[2]).rank())
+
+
+def _hedge_delay_seconds(provider_name: str, provider: Optional[BaseAIProvider] = None) -> float:
+    p95 = _health(provider_name, provider).p95_ms()
+    delay_ms = AI_HEDGE_DEFAULT_DELAY_MS if p95 is None else p95
+    return min(max(delay_ms, AI_HEDGE_MIN_DELAY_MS), AI_HEDGE_MAX_DELAY_MS) / 1000
+
+
 # ─── Provider Instance Cache ────────────────────────────────────
 
 _provider_cache: Dict[str, BaseAIProvider] = {}
@@ -243,6 +411,56 @@ async def _get_provider_instance(
     return _provider_cache[cache_key]
 
 
+# ─── Compiled Chains ────────────────────────────────────────────
+# A chain compiles to (provider, model, instance-or-None) steps. Compiled steps
+# live on the cached config resolution, so a warm call does no config I/O and
+# a config save (which drops the resolution) recompiles them.
+
+ChainSteps = List[Tuple[str, str, Optional[BaseAIProvider]]]
+
+# Compiled chains for calls without a venue (env keys only), and when each was compiled
+_default_compiled: Dict[str, ChainSteps] = {}
+_default_compiled_at: Dict[str, float] = {}
+
+
+async def _compile_chain(chain_key: str, keys: Dict[str, str]) -> ChainSteps:
+    chain = DEFAULT_FALLBACK_CHAINS.get(chain_key, DEFAULT_FALLBACK_CHAINS["text"])
+    return [
+        (step["provider"], step["model"], await _get_provider_instance(step["provider"], keys))
+        for step in chain
+    ]
+
+
+async def _get_chain(
+    chain_key: str,
+    venue_id: str = "",
+    group_id: str = "",
+    api_keys: Optional[Dict[str, str]] = None,
+) -> ChainSteps:
+    """Fallback chain for a venue, compiled once per resolved config."""
+    if venue_id:
+        resolved = await get_resolved_config(venue_id, group_id)
+        config, compiled = resolved.config, resolved.compiled
+    else:
+        config, compiled = {}, _default_compiled
+
+    if api_keys:
+        # Caller-supplied keys: compile for this call only
+        return await _compile_chain(chain_key, api_keys)
+
+    steps = compiled.get(chain_key)
+    if steps is not None and not venue_id and any(step[2] is None for step in steps):
+        # Nothing invalidates the env-only chains: retry a provider whose key was
+        # missing on the same TTL a venue's resolution (and _load_env_keys) gets
+        if time.monotonic() - _default_compiled_at.get(chain_key, 0.0) >= AI_CONFIG_CACHE_TTL_SECONDS:
+            steps = None
+    if steps is None:
+        steps = compiled[chain_key] = await _compile_chain(chain_key, config.get("provider_keys", {}))
+        if not venue_id:
+            _default_compiled_at[chain_key] = time.monotonic()
+    return steps
+
+
 # ─── Core Router Functions ──────────────────────────────────────
 
 async def route_completion(
@@ -256,10 +474,14 @@ async def route_completion(
     api_keys: Optional[Dict[str, str]] = None,
     override_provider: str = "",
     override_model: str = "",
+    hedge: Optional[bool] = None,
+    use_cache: bool = True,
 ) -> AIResponse:
     """
     Route a text completion request through the fallback chain.
-    Returns the first successful response.
+    Returns the first successful response. ``hedge`` defaults to
+    ``task_type in AI_HEDGE_TASKS``. Identical requests are served from the
+    result cache unless ``use_cache`` is False.
     """
     # 0. Auto-inject system prompt rules
     from services.ai_system_prompts import build_system_prompt, GLOBAL_RULES
@@ -270,68 +492,95 @@ async def route_completion(
         # Custom prompt provided → prepend global rules so base behavior is enforced
         system_prompt = f"{GLOBAL_RULES}\n\n{system_prompt}"
 
-    # 1. Resolve tenant config
-    config = await resolve_config(venue_id, group_id) if venue_id else {}
-    routing = config.get("routing", {})
-    keys = api_keys or config.get("provider_keys", {})
+    upstream = dict(
+        prompt=prompt, task_type=task_type, system_prompt=system_prompt,
+        temperature=temperature, max_tokens=max_tokens, venue_id=venue_id, group_id=group_id,
+        api_keys=api_keys, override_provider=override_provider, override_model=override_model, hedge=hedge,
+    )
+    if not use_cache:
+        return await _route_completion_upstream(**upstream)
+
+    fresh: List[AIResponse] = []
 
-    # 2. Determine fallback chain
-    if override_provider and override_model:
-        chain = [{"provider": override_provider, "model": override_model}]
-    elif task_type in routing:
-        # Config has a specific model assigned — use it as primary
-        model_id = routing[task_type]
-        # Find provider from model registry
-        chain_key = TASK_TO_CHAIN.get(task_type, "text")
-        chain = DEFAULT_FALLBACK_CHAINS.get(chain_key, DEFAULT_FALLBACK_CHAINS["text"])
+    async def compute() -> Optional[dict]:
+        response = await _route_completion_upstream(**upstream)
+        fresh.append(response)
+        if response.error:
+            return None
+        return {
+            "text": response.text, "provider": response.provider, "model": response.model,
+            "tokens_in": response.tokens_in, "tokens_out": response.tokens_out,
+            "latency_ms": response.latency_ms, "cost_usd": response.cost_usd,
+        }
+
+    key = completion_key(task_type, system_prompt, prompt, override_model, temperature, max_tokens,
+                         provider=override_provider)
+    payload, cached = await result_cache.get_or_compute(key, compute)
+    if cached:
+        # Nothing was spent on this answer: usage logging must not bill it again
+        response = AIResponse(**{**payload, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0},
+                              cached=True, cache_saved_usd=payload.get("cost_usd", 0.0))
+        logger.info("AI cache hit: task=%s (%s/%s)", task_type, response.provider, response.model)
     else:
-        chain_key = TASK_TO_CHAIN.get(task_type, "text")
-        chain = DEFAULT_FALLBACK_CHAINS.get(chain_key, DEFAULT_FALLBACK_CHAINS["text"])
-
-    # 3. Try each provider in the chain
-    errors = []
-    for step in chain:
-        provider_name = step["provider"]
-        model = step["model"]
-
-        # Check rate limit
-        if not _rate_limiter.can_proceed(provider_name):
-            logger.warning("Rate limited: %s, skipping to next", provider_name)
-            errors.append(f"{provider_name}: rate limited")
-            continue
+        response = fresh[-1] if fresh else await _route_completion_upstream(**upstream)
+    response.cache_hit_rate = round(result_cache.hit_rate(), 4)
+    return response
 
-        # Get provider instance
-        provider = await _get_provider_instance(provider_name, keys)
-        if not provider:
-            errors.append(f"{provider_name}: no API key")
-            continue
 
-        # Try completion
-        logger.info("AI routing: task=%s → %s/%s", task_type, provider_name, model)
-        response = await provider.complete(
-            prompt=prompt,
-            model=model,
-            system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
+async def _route_completion_upstream(
+    prompt: str,
+    task_type: str,
+    system_prompt: str,
+    temperature: float,
+    max_tokens: int,
+    venue_id: str,
+    group_id: str,
+    api_keys: Optional[Dict[str, str]],
+    override_provider: str,
+    override_model: str,
+    hedge: Optional[bool],
+) -> AIResponse:
+    # 1. Determine fallback chain (compiled from the tenant config)
+    # Config routing currently selects the same chain as the task default
+    if override_provider and override_model:
+        keys = api_keys or {}
+        if venue_id and not keys:
+            keys = (await get_resolved_config(venue_id, group_id)).config.get("provider_keys", {})
+        provider = await _get_provider_instance(override_provider, keys)
+        chain = [(override_provider, override_model, provider)]
+    else:
+        chain = await _get_chain(TASK_TO_CHAIN.get(task_type, "text"), venue_id, group_id, api_keys)
+
+    # 2. Try providers (healthiest first), hedging latency-sensitive tasks
+    if hedge is None:
+        hedge = task_type in AI_HEDGE_TASKS
+    errors: List[str] = []
+    outcome = await _complete_through_chain(
+        _order_by_health(chain), task_type, hedge, errors,
+        prompt=prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens,
+    )
+    if outcome is None:
+        # All providers failed
+        logger.error("All providers failed for task=%s: %s", task_type, "; ".join(errors))
+        return AIResponse(
+            error=f"All providers failed: {'; '.join(errors)}",
+            provider="none",
+            model="none",
         )
 
-        if response.error:
-            errors.append(f"{provider_name}/{model}: {response.error}")
-            logger.warning("Provider failed: %s/%s — %s", provider_name, model, response.error)
-            continue
-
-        # Success — record usage
-        _rate_limiter.record(provider_name)
-        response.cost_usd = get_cost_estimate(provider_name, model, response.tokens_in, response.tokens_out)
-        logger.info(
-            "AI success: %s/%s — %d in, %d out, %.0fms, $%.6f",
-            provider_name, model,
-            response.tokens_in, response.tokens_out,
-            response.latency_ms, response.cost_usd,
-        )
+    provider_name, model, response = outcome
+    # Success — record usage
+    _rate_limiter.record(provider_name)
+    response.cost_usd = get_cost_estimate(provider_name, model, response.tokens_in, response.tokens_out)
+    logger.info(
+        "AI success: %s/%s — %d in, %d out, %.0fms, $%.6f",
+        provider_name, model,
+        response.tokens_in, response.tokens_out,
+        response.latency_ms, response.cost_usd,
+    )
 
-        # 🔮 Shadow Learning: fan out to free models in background
+    # 🔮 Shadow Learning: fan out to free models in background
+    if AI_SHADOW_FANOUT:
         try:
             from services.ai_shadow import shadow_fanout
             asyncio.create_task(shadow_fanout(
@@ -348,15 +597,112 @@ async def route_completion(
         except Exception as e:
             logger.debug("Shadow fanout skipped: %s", str(e)[:50])
 
-        return response
+    return response
+
+
+async def _attempt_completion(provider_name: str, model: str, provider: BaseAIProvider, **kwargs) -> AIResponse:
+    """One provider call, bounded by AI_PROVIDER_TIMEOUT_SECONDS and fed into its health."""
+    health = _health(provider_name, provider)
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            provider.complete(model=model, **kwargs), AI_PROVIDER_TIMEOUT_SECONDS
+        )
+    except asyncio.CancelledError:
+        health.release()
+        raise
+    except asyncio.TimeoutError:
+        response = AIResponse(error=f"timed out after {AI_PROVIDER_TIMEOUT_SECONDS:g}s",
+                              provider=provider_name, model=model)
+    except Exception as e:
+        response = AIResponse(error=str(e)[:200], provider=provider_name, model=model)
+
+    latency_ms = (time.monotonic() - started) * 1000
+    if response.error:
+        health.record_failure(latency_ms)
+    else:
+        health.record_success(latency_ms)
+    return response
 
-    # All providers failed
-    logger.error("All providers failed for task=%s: %s", task_type, "; ".join(errors))
-    return AIResponse(
-        error=f"All providers failed: {'; '.join(errors)}",
-        provider="none",
-        model="none",
-    )
+
+async def _complete_through_chain(
+    chain: "ChainSteps",
+    task_type: str,
+    hedge: bool,
+    errors: List[str],
+    **kwargs,
+) -> Optional[Tuple[str, str, AIResponse]]:
+    """
+    Walk the chain; without hedging one provider at a time. With hedging, a
+    provider that has not answered within its p95 gets the next one started
+    alongside it. Returns (provider, model, response) of the first good answer.
+    """
+    steps = iter(chain)
+    attempts: Dict[asyncio.Task, Tuple[str, str, BaseAIProvider]] = {}
+
+    def start_next() -> Optional[asyncio.Task]:
+        for provider_name, model, provider in steps:
+            # Check rate limit
+            if not _rate_limiter.can_proceed(provider_name):
+                logger.warning("Rate limited: %s, skipping to next", provider_name)
+                errors.append(f"{provider_name}: rate limited")
+                continue
+            if not provider:
+                errors.append(f"{provider_name}: no API key")
+                continue
+            if not _health(provider_name, provider).allow():
+                errors.append(f"{provider_name}: circuit open")
+                continue
+            logger.info("AI routing: task=%s → %s/%s", task_type, provider_name, model)
+            task = asyncio.ensure_future(_attempt_completion(provider_name, model, provider, **kwargs))
+            attempts[task] = (provider_name, model, provider)
+            return task
+        return None
+
+    first = start_next()
+    if first is None:
+        return None
+    pending = {first}
+    last_started = attempts[first]
+    exhausted = False
+    try:
+        while pending:
+            timeout = (_hedge_delay_seconds(last_started[0], last_started[2])
+                       if hedge and not exhausted else None)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Tail latency: fire the next provider alongside the slow one
+                task = start_next()
+                if task is None:
+                    exhausted = True
+                else:
+                    logger.info("AI hedge: task=%s, %s slow, also trying %s",
+                                task_type, last_started[0], attempts[task][0])
+                    pending.add(task)
+                    last_started = attempts[task]
+                continue
+
+            for task in done:
+                pending.discard(task)
+                provider_name, model, _ = attempts[task]
+                response = task.result()
+                if not response.error:
+                    return provider_name, model, response
+                errors.append(f"{provider_name}/{model}: {response.error}")
+                logger.warning("Provider failed: %s/%s — %s", provider_name, model, response.error)
+
+            if not pending and not exhausted:
+                task = start_next()
+                if task is None:
+                    exhausted = True
+                else:
+                    pending.add(task)
+                    last_started = attempts[task]
+        return None
+    finally:
+        # Losing hedges are cancelled; their providers are not charged a failure
+        for task in pending:
+            task.cancel()
 
 
 async def route_embedding(
@@ -364,24 +710,64 @@ async def route_embedding(
     venue_id: str = "",
     group_id: str = "",
     api_keys: Optional[Dict[str, str]] = None,
+    use_cache: bool = True,
 ) -> EmbeddingResponse:
-    """Route embedding request through fallback chain."""
-    config = await resolve_config(venue_id, group_id) if venue_id else {}
-    keys = api_keys or config.get("provider_keys", {})
-    chain = DEFAULT_FALLBACK_CHAINS.get("embedding", [])
+    """
+    Route embedding request through fallback chain.
+    Vectors are cached per text under the chain's primary model; only the
+    misses go upstream, in one batch.
+    """
+    chain = await _get_chain("embedding", venue_id, group_id, api_keys)
+    primary_model = next((model for _, model, provider in chain if provider), "")
+    if not use_cache or not primary_model or not texts:
+        return await _embed_through_chain(chain, texts)
+
+    keys = [embedding_key(primary_model, text) for text in texts]
+    text_for = dict(zip(keys, texts))
+    computed: List[str] = []
+    upstream: List[EmbeddingResponse] = []
+
+    async def compute_many(missing: List[str]) -> Dict[str, dict]:
+        result = await _embed_through_chain(chain, [text_for[k] for k in missing])
+        computed.extend(missing)
+        upstream.append(result)
+        if not result.vectors or result.model != primary_model:
+            return {}  # failed, or a fallback model whose vectors must not be cached
+        return {k: {"vector": v} for k, v in zip(missing, result.vectors)}
+
+    found, _ = await result_cache.get_many_or_compute(keys, compute_many, AI_EMBEDDING_CACHE_TTL_SECONDS)
+    if len(found) < len(text_for):
+        # Upstream failed or a fallback model answered: never mix its vectors with cached ones
+        if upstream and upstream[-1].vectors and computed == keys:
+            return upstream[-1]  # it already embedded exactly this batch
+        return await _embed_through_chain(chain, texts)
+
+    last = upstream[-1] if upstream else EmbeddingResponse(provider="cache")
+    vectors = [found[k]["vector"] for k in keys]
+    fresh = set(computed)
+    return EmbeddingResponse(
+        vectors=vectors,
+        provider=last.provider,
+        model=primary_model,
+        dimensions=len(vectors[0]),
+        tokens_used=last.tokens_used,
+        cached_count=sum(1 for k in keys if k not in fresh),
+        cache_hit_rate=round(result_cache.hit_rate(), 4),
+    )
+
 
-    for step in chain:
-        provider = await _get_provider_instance(step["provider"], keys)
+async def _embed_through_chain(chain: "ChainSteps", texts: List[str]) -> EmbeddingResponse:
+    for provider_name, model, provider in chain:
         if not provider:
             continue
         try:
-            result = await provider.embed(texts, step["model"])
+            result = await provider.embed(texts, model)
             if result.vectors:
                 return result
         except NotImplementedError:
             continue
         except Exception as e:
-            logger.warning("Embedding failed: %s — %s", step["provider"], str(e))
+            logger.warning("Embedding failed: %s — %s", provider_name, str(e))
 
     return EmbeddingResponse()
 
@@ -394,22 +780,19 @@ async def route_tts(
     api_keys: Optional[Dict[str, str]] = None,
 ) -> TTSResponse:
     """Route TTS request through fallback chain."""
-    config = await resolve_config(venue_id, group_id) if venue_id else {}
-    keys = api_keys or config.get("provider_keys", {})
-    chain = DEFAULT_FALLBACK_CHAINS.get("tts", [])
+    chain = await _get_chain("tts", venue_id, group_id, api_keys)
 
-    for step in chain:
-        provider = await _get_provider_instance(step["provider"], keys)
+    for provider_name, model, provider in chain:
         if not provider:
             continue
         try:
-            result = await provider.synthesize(text, step["model"], voice)
+            result = await provider.synthesize(text, model, voice)
             if result.audio_bytes:
                 return result
         except NotImplementedError:
             continue
         except Exception as e:
-            logger.warning("TTS failed: %s — %s", step["provider"], str(e))
+            logger.warning("TTS failed: %s — %s", provider_name, str(e))
 
     return TTSResponse()
 
@@ -421,22 +804,19 @@ async def route_stt(
     api_keys: Optional[Dict[str, str]] = None,
 ) -> STTResponse:
     """Route STT request through fallback chain."""
-    config = await resolve_config(venue_id, group_id) if venue_id else {}
-    keys = api_keys or config.get("provider_keys", {})
-    chain = DEFAULT_FALLBACK_CHAINS.get("stt", [])
+    chain = await _get_chain("stt", venue_id, group_id, api_keys)
 
-    for step in chain:
-        provider = await _get_provider_instance(step["provider"], keys)
+    for provider_name, model, provider in chain:
         if not provider:
             continue
         try:
-            result = await provider.transcribe(audio_bytes, step["model"])
+            result = await provider.transcribe(audio_bytes, model)
             if result.text:
                 return result
         except NotImplementedError:
             continue
         except Exception as e:
-            logger.warning("STT failed: %s — %s", step["provider"], str(e))
+            logger.warning("STT failed: %s — %s", provider_name, str(e))
 
     return STTResponse()
 
@@ -448,22 +828,19 @@ async def route_image(
     api_keys: Optional[Dict[str, str]] = None,
 ) -> ImageResponse:
     """Route image generation through fallback chain."""
-    config = await resolve_config(venue_id, group_id) if venue_id else {}
-    keys = api_keys or config.get("provider_keys", {})
-    chain = DEFAULT_FALLBACK_CHAINS.get("image", [])
+    chain = await _get_chain("image", venue_id, group_id, api_keys)
 
-    for step in chain:
-        provider = await _get_provider_instance(step["provider"], keys)
+    for provider_name, model, provider in chain:
         if not provider:
             continue
         try:
-            result = await provider.generate_image(prompt, step["model"])
+            result = await provider.generate_image(prompt, model)
             if result.url or result.base64:
                 return result
         except NotImplementedError:
             continue
         except Exception as e:
-            logger.warning("Image gen failed: %s — %s", step["provider"], str(e))
+            logger.warning("Image gen failed: %s — %s", provider_name, str(e))
 
     return ImageResponse()
 
@@ -484,3 +861,8 @@ def get_available_chains() -> Dict[str, list]:
 def get_task_mapping() -> Dict[str, str]:
     """Return task→chain mapping for UI."""
     return TASK_TO_CHAIN.copy()
+
+
+def get_provider_health() -> Dict[str, dict]:
+    """Circuit state and rolling latency/error rates per provider, for UI."""
+    return {name: health.to_dict() for name, health in _provider_health.items()}
@@ -16,12 +16,93 @@ Storage Layers:
 
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-import subprocess
+import gzip
 import json
 import os
 import hashlib
 import asyncio
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from bson import json_util
+from pymongo import ReplaceOne
+
+from services.segmented_audit_log import SegmentedAuditLog, entry_hash, get_audit_log
+
+# ============= INCREMENTAL BACKUP SETTINGS =============
+BACKUP_CHUNK_DOCS = int(os.environ.get('BACKUP_CHUNK_DOCS', '5000'))
+BACKUP_PARALLEL_COLLECTIONS = int(os.environ.get('BACKUP_PARALLEL_COLLECTIONS', '4'))
+# Re-read this far behind the previous mark: writes stamped just before the
+# last export but committed after it are not missed (restore is idempotent)
+BACKUP_WATERMARK_OVERLAP_SECONDS = float(os.environ.get('BACKUP_WATERMARK_OVERLAP_SECONDS', '5'))
+# Start a new base once the current chain's base is this old
+BACKUP_FULL_EVERY_DAYS = float(os.environ.get('BACKUP_FULL_EVERY_DAYS', '7'))
+# Backup bookkeeping is never exported
+BACKUP_SKIP_COLLECTIONS = {'backups', 'backup_verifications', 'backup_watermarks'}
+
+
+def _write_chunk(path: Path, lines: List[str]) -> Dict[str, Any]:
+    """gzip + fsync one chunk file; checksum is over the compressed bytes."""
+    body = gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6)
+    with open(path, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    return {"file": path.name, "docs": len(lines), "bytes": len(body),
+            "sha256": hashlib.sha256(body).hexdigest()}
+
+
+def _read_chunk(path: Path, expected_sha256: str) -> List[dict]:
+    with open(path, 'rb') as f:
+        body = f.read()
+    if hashlib.sha256(body).hexdigest() != expected_sha256:
+        raise ValueError(f"Chunk {path.name} checksum mismatch")
+    return [json_util.loads(line) for line in gzip.decompress(body).decode().splitlines() if line]
+
+
+def _file_sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _mark_max(current, value):
+    """Greater of two watermark values; values of another type never move the mark."""
+    if value is None:
+        return current
+    if current is None:
+        return value
+    try:
+        return value if value > current else current
+    except TypeError:
+        return current
+
+
+# Lower bounds for a type with no mark yet ("from the beginning"); $gt/$gte only
+# match values of the bound's own BSON type, so each type gets its own branch
+_STR_FLOOR = ""
+_DATE_FLOOR = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _split_updated_marks(mark: Optional[Dict[str, Any]]):
+    """(string mark, datetime mark) for updated_at; older watermarks kept one of either type."""
+    mark = mark or {}
+    str_mark, date_mark = mark.get("updated_at"), mark.get("updated_at_date")
+    if isinstance(str_mark, datetime):
+        str_mark, date_mark = None, _mark_max(date_mark, str_mark)
+    return str_mark, date_mark
+
+
+def _since(updated_at):
+    """Previous updated_at mark minus the overlap window (ISO strings or datetimes)."""
+    overlap = timedelta(seconds=BACKUP_WATERMARK_OVERLAP_SECONDS)
+    if isinstance(updated_at, datetime):
+        return updated_at - overlap
+    try:
+        return (datetime.fromisoformat(str(updated_at)) - overlap).isoformat()
+    except ValueError:
+        return updated_at
 
 class BackupService:
     def __init__(self, db, config: Optional[Dict[str, Any]] = None):
@@ -85,23 +166,27 @@ class BackupService:
                 # Venue-scoped backup
                 cmd.extend(['--query', json.dumps({"venue_id": venue_id})])
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await proc.communicate()
             
-            if result.returncode != 0:
-                raise Exception(f"mongodump failed: {result.stderr}")
+            if proc.returncode != 0:
+                raise Exception(f"mongodump failed: {stderr.decode(errors='replace')}")
 
-            # Create metadata
+            # Size + checksum walk every dump file: keep them off the event loop
+            loop = asyncio.get_running_loop()
             metadata = {
                 "snapshot_id": snapshot_id,
                 "timestamp": timestamp.isoformat(),
                 "venue_id": venue_id,
                 "type": "full_snapshot",
                 "status": "completed",
-                "size_bytes": self.get_directory_size(dump_path)
+                "size_bytes": await loop.run_in_executor(None, self.get_directory_size, dump_path)
             }
 
             # Calculate checksum (integrity verification)
-            metadata["checksum"] = self.calculate_directory_checksum(dump_path)
+            metadata["checksum"] = await loop.run_in_executor(None, self.calculate_directory_checksum, dump_path)
 
             # Save metadata
             with open(snapshot_dir / 'metadata.json', 'w') as f:
@@ -140,79 +225,286 @@ class BackupService:
             
             raise
 
+    # ============= INCREMENTAL BACKUP =============
+
+    async def create_incremental_backup(
+        self,
+        venue_id: str = None,
+        full: Optional[bool] = None,
+        collections: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Export only documents changed since the previous backup of this scope
+        (per-collection updated_at / _id high-water marks) into gzip JSONL chunks.
+        ``full=None`` starts a new base when there is none or it is older than
+        BACKUP_FULL_EVERY_DAYS. Deletions are picked up by the next base.
+        """
+        timestamp = datetime.now(timezone.utc)
+        scope = venue_id or "all"
+        state = await self.db.backup_watermarks.find_one({"id": scope}, {"_id": 0})
+        if full is None:
+            full = not state or (
+                timestamp - datetime.fromisoformat(state["base_started_at"])
+                > timedelta(days=BACKUP_FULL_EVERY_DAYS)
+            )
+        kind = "base" if full else "incremental"
+        backup_id = f"{kind}_{timestamp.strftime('%Y%m%d_%H%M%S_%f')}_{scope}"
+        backup_dir = self.local_backup_dir / backup_id
+        backup_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            names = collections or await self._backup_collection_names()
+            marks = {} if full else (state or {}).get("collections", {})
+            slots = asyncio.Semaphore(BACKUP_PARALLEL_COLLECTIONS)
+
+            async def _export(name):
+                async with slots:
+                    return name, await self._export_collection(name, venue_id, marks.get(name), backup_dir)
+
+            exported = dict(await asyncio.gather(*[_export(n) for n in names]))
+
+            manifest = {
+                "backup_id": backup_id,
+                "type": kind,
+                "scope": scope,
+                "venue_id": venue_id,
+                "parent_id": None if full else state["backup_id"],
+                "base_id": backup_id if full else state["base_id"],
+                "started_at": timestamp.isoformat(),
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "collections": exported,
+                "docs": sum(c["docs"] for c in exported.values()),
+                "size_bytes": sum(ch["bytes"] for c in exported.values() for ch in c["chunks"]),
+            }
+            with open(backup_dir / 'manifest.json', 'w') as f:
+                json.dump(manifest, f, indent=2, default=str)
+
+            # Marks only move once the chunks are durable
+            new_marks = {**((state or {}).get("collections", {}) if not full else {})}
+            for name, info in exported.items():
+                new_marks[name] = info["watermark"]
+            await self.db.backup_watermarks.update_one(
+                {"id": scope},
+                {"$set": {
+                    "backup_id": backup_id,
+                    "base_id": manifest["base_id"],
+                    "base_started_at": timestamp.isoformat() if full else state["base_started_at"],
+                    "collections": new_marks,
+                }},
+                upsert=True
+            )
+
+            await self.db.backups.insert_one({
+                "snapshot_id": backup_id,
+                "timestamp": timestamp.isoformat(),
+                "venue_id": venue_id,
+                "type": f"incremental_{kind}" if kind == "base" else "incremental",
+                "parent_id": manifest["parent_id"],
+                "base_id": manifest["base_id"],
+                "status": "completed",
+                "docs": manifest["docs"],
+                "size_bytes": manifest["size_bytes"],
+                "local_path": str(backup_dir),
+                "created_at": timestamp.isoformat()
+            })
+
+            if self.nas_enabled and self.nas_path:
+                await self.copy_to_nas(backup_dir, backup_id)
+            if self.cloud_backup_enabled and self.s3_bucket:
+                await self.upload_to_s3(backup_dir, backup_id)
+
+            print(f"✅ {kind.capitalize()} backup created: {backup_id} ({manifest['docs']} docs)")
+            return manifest
+
+        except Exception as e:
+            print(f"❌ Incremental backup failed: {e}")
+            await self.db.backups.insert_one({
+                "snapshot_id": backup_id,
+                "timestamp": timestamp.isoformat(),
+                "venue_id": venue_id,
+                "type": "incremental",
+                "status": "failed",
+                "error": str(e),
+                "created_at": timestamp.isoformat()
+            })
+            raise
+
+    async def _backup_collection_names(self) -> List[str]:
+        names = await self.db.list_collection_names()
+        return sorted(
+            n for n in names
+            if n not in BACKUP_SKIP_COLLECTIONS and not n.startswith('system.')
+        )
+
+    async def _export_collection(
+        self, name: str, venue_id: Optional[str], mark: Optional[Dict[str, Any]], backup_dir: Path
+    ) -> Dict[str, Any]:
+        """Stream changed documents through the cursor into fixed-size chunks."""
+        query: Dict[str, Any] = {}
+        str_mark, date_mark = _split_updated_marks(mark)
+        if mark:
+            # Every branch, always: a type or _id with no mark yet starts from the beginning
+            query["$or"] = [
+                {"updated_at": {"$gt": _since(str_mark)} if str_mark is not None else {"$gte": _STR_FLOOR}},
+                {"updated_at": {"$gt": _since(date_mark)} if date_mark is not None else {"$gte": _DATE_FLOOR}},
+                {"updated_at": {"$exists": False},
+                 **({"_id": {"$gt": mark["last_id"]}} if mark.get("last_id") is not None else {})},
+            ]
+        if venue_id:
+            query["venue_id"] = venue_id
+
+        loop = asyncio.get_running_loop()
+        chunks: List[Dict[str, Any]] = []
+        lines: List[str] = []
+        docs = 0
+        id_mark = (mark or {}).get("last_id")
+
+        async def _flush():
+            path = backup_dir / f"{name}.{len(chunks):05d}.jsonl.gz"
+            chunks.append(await loop.run_in_executor(None, _write_chunk, path, list(lines)))
+            lines.clear()
+
+        async for doc in self.db[name].find(query):
+            lines.append(json_util.dumps(doc))
+            docs += 1
+            if "updated_at" in doc:
+                if isinstance(doc["updated_at"], datetime):
+                    date_mark = _mark_max(date_mark, doc["updated_at"])
+                else:
+                    str_mark = _mark_max(str_mark, doc["updated_at"])
+            else:
+                id_mark = _mark_max(id_mark, doc.get("_id"))
+            if len(lines) >= BACKUP_CHUNK_DOCS:
+                await _flush()
+        if lines:
+            await _flush()
+
+        return {
+            "docs": docs,
+            "chunks": chunks,
+            "since": mark,
+            "watermark": {"updated_at": str_mark, "updated_at_date": date_mark, "last_id": id_mark},
+        }
+
+    def _load_manifest(self, backup_id: str) -> Dict[str, Any]:
+        manifest_file = self.local_backup_dir / backup_id / 'manifest.json'
+        if not manifest_file.exists():
+            raise FileNotFoundError(f"Backup manifest not found: {backup_id}")
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+
+    def backup_chain(self, backup_id: str) -> List[Dict[str, Any]]:
+        """Manifests from the base up to ``backup_id``, in replay order."""
+        chain = []
+        current = backup_id
+        while current:
+            manifest = self._load_manifest(current)
+            chain.append(manifest)
+            current = manifest.get("parent_id")
+        chain.reverse()
+        if chain[0]["type"] != "base":
+            raise ValueError(f"Backup chain of {backup_id} does not start with a base")
+        return chain
+
+    async def restore_incremental(
+        self,
+        backup_id: str,
+        target_db=None,
+        collections: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Replay base + increments up to ``backup_id`` into ``target_db``
+        (default: this service's database). Each chunk is checksum-verified
+        before it is applied; documents are upserted by _id, so replaying an
+        overlapping chunk twice is harmless.
+        """
+        target = target_db if target_db is not None else self.db
+        chain = self.backup_chain(backup_id)
+        loop = asyncio.get_running_loop()
+        restored: Dict[str, int] = {}
+
+        for manifest in chain:
+            backup_dir = self.local_backup_dir / manifest["backup_id"]
+            for name, info in manifest["collections"].items():
+                if collections and name not in collections:
+                    continue
+                for chunk in info["chunks"]:
+                    docs = await loop.run_in_executor(None, _read_chunk, backup_dir / chunk["file"], chunk["sha256"])
+                    if docs:
+                        await target[name].bulk_write(
+                            [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False
+                        )
+                    restored[name] = restored.get(name, 0) + len(docs)
+
+        print(f"♻️ Restored {sum(restored.values())} docs from {len(chain)} backups up to {backup_id}")
+        return {"backup_id": backup_id, "backups": [m["backup_id"] for m in chain], "restored": restored}
+
+    async def _verify_incremental(self, backup_dir: Path) -> Dict[str, Any]:
+        with open(backup_dir / 'manifest.json', 'r') as f:
+            manifest = json.load(f)
+        loop = asyncio.get_running_loop()
+        for name, info in manifest["collections"].items():
+            for chunk in info["chunks"]:
+                path = backup_dir / chunk["file"]
+                if not path.exists():
+                    return {"valid": False, "error": f"Chunk missing: {chunk['file']}"}
+                actual = await loop.run_in_executor(None, _file_sha256, path)
+                if actual != chunk["sha256"]:
+                    return {
+                        "valid": False,
+                        "error": "Checksum mismatch - backup corrupted",
+                        "chunk": chunk["file"],
+                        "expected": chunk["sha256"],
+                        "actual": actual
+                    }
+        return {"valid": True}
+
     # ============= CONTINUOUS BACKUP (Audit Log) =============
 
+    @property
+    def audit_log(self) -> SegmentedAuditLog:
+        """Shared per backup directory, so every BackupService sees the same tail."""
+        return get_audit_log(self.local_backup_dir / 'audit_log')
+
     async def append_audit_entry(self, entry: Dict[str, Any]):
         """Append-only audit log (immutable, never deleted)"""
-        audit_file = self.local_backup_dir / 'audit_log.jsonl'
-        
-        # Add hash chain for immutability
-        entry_with_hash = {
+        return await self.audit_log.append({
             **entry,
             "timestamp": datetime.now(timezone.utc).isoformat(),
-            "prev_hash": await self.get_last_audit_hash(),
-            "sequence": await self.get_next_audit_sequence()
-        }
-        
-        # Calculate this entry's hash
-        entry_with_hash["hash"] = self.calculate_entry_hash(entry_with_hash)
-
-        # Append to file (append-only)
-        with open(audit_file, 'a') as f:
-            f.write(json.dumps(entry_with_hash) + '\n')
-
-        return entry_with_hash
+        })
 
     async def get_last_audit_hash(self) -> Optional[str]:
         """Get hash of last audit entry for chain verification"""
-        audit_file = self.local_backup_dir / 'audit_log.jsonl'
-        
-        if not audit_file.exists():
-            return None
-
-        try:
-            with open(audit_file, 'r') as f:
-                lines = f.readlines()
-                if lines:
-                    last_entry = json.loads(lines[-1])
-                    return last_entry.get('hash')
-        except:
-            return None
-
-        return None
+        return self.audit_log.last_hash
 
     async def get_next_audit_sequence(self) -> int:
         """Get next sequence number for audit log"""
-        audit_file = self.local_backup_dir / 'audit_log.jsonl'
-        
-        if not audit_file.exists():
-            return 1
-
-        try:
-            with open(audit_file, 'r') as f:
-                lines = f.readlines()
-                if lines:
-                    last_entry = json.loads(lines[-1])
-                    return last_entry.get('sequence', 0) + 1
-        except:
-            return 1
-
-        return 1
+        return self.audit_log.next_seq
 
     def calculate_entry_hash(self, entry: Dict[str, Any]) -> str:
         """Calculate SHA-256 hash of audit entry"""
-        # Exclude hash field itself
-        entry_copy = {k: v for k, v in entry.items() if k != 'hash'}
-        entry_str = json.dumps(entry_copy, sort_keys=True)
-        return hashlib.sha256(entry_str.encode()).hexdigest()
+        return entry_hash(entry)
+
+    async def verify_audit_log(self, full: bool = False) -> Dict[str, Any]:
+        """Hash chain + Merkle checkpoints; only segments changed since the last clean run are re-read"""
+        return await self.audit_log.verify(full=full)
 
     # ============= RESTORE & VERIFICATION =============
 
     async def verify_backup(self, snapshot_id: str) -> Dict[str, Any]:
-        """Verify backup integrity via checksum"""
+        """Verify backup integrity via checksum, plus the audit log since its last verification"""
         snapshot_dir = self.local_backup_dir / snapshot_id
         metadata_file = snapshot_dir / 'metadata.json'
 
+        if (snapshot_dir / 'manifest.json').exists():
+            chunks = await self._verify_incremental(snapshot_dir)
+            if not chunks["valid"]:
+                return chunks
+            audit = await self.verify_audit_log()
+            if not audit["valid"]:
+                return {"valid": False, "error": "Audit log integrity check failed", "audit_log": audit}
+            return {"valid": True, "snapshot_id": snapshot_id, "audit_log": audit}
+
         if not metadata_file.exists():
             return {"valid": False, "error": "Metadata not found"}
 
@@ -221,7 +513,9 @@ class BackupService:
 
         # Recalculate checksum
         dump_path = snapshot_dir / 'mongodb_dump'
-        current_checksum = self.calculate_directory_checksum(dump_path)
+        current_checksum = await asyncio.get_running_loop().run_in_executor(
+            None, self.calculate_directory_checksum, dump_path
+        )
 
         if current_checksum != metadata.get('checksum'):
             return {
@@ -231,7 +525,11 @@ class BackupService:
                 "actual": current_checksum
             }
 
-        return {"valid": True, "snapshot_id": snapshot_id}
+        audit = await self.verify_audit_log()
+        if not audit["valid"]:
+            return {"valid": False, "error": "Audit log integrity check failed", "audit_log": audit}
+
+        return {"valid": True, "snapshot_id": snapshot_id, "audit_log": audit}
 
     async def test_restore(self, snapshot_id: str) -> Dict[str, Any]:
         """Test restore to temporary database (weekly verification)"""
@@ -283,7 +581,9 @@ class BackupService:
         nas_dest = self.nas_path / snapshot_id
         
         try:
-            subprocess.run(['cp', '-r', str(snapshot_dir), str(nas_dest)], check=True)
+            proc = await asyncio.create_subprocess_exec('cp', '-r', str(snapshot_dir), str(nas_dest))
+            if await proc.wait() != 0:
+                raise Exception(f"cp exited with {proc.returncode}")
             print(f"📀 Backup copied to NAS: {nas_dest}")
         except Exception as e:
             print(f"⚠️ NAS copy failed (non-critical): {e}")
@@ -0,0 +1,303 @@
+"""Per-venue catalog snapshots (menu, modifiers, recipes)
+
+A venue's menu items, categories, modifier groups/options, recipes and
+menu -> inventory links are loaded into one immutable ``VenueCatalog`` with
+the lookups the POS hot paths need prebuilt (by id, menu_item_id -> recipe,
+category, prep area). Every request shares the current snapshot; a rebuild
+builds the next one off to the side and swaps the reference, so a reader
+never sees a half-built catalog.
+
+Catalog writes call ``bump_catalog_version``, which increments the venue's
+counter in ``catalog_versions``. Workers compare their snapshot against that
+counter at most every ``CATALOG_VERSION_POLL_SECONDS``; writes that bypass
+the bump (imports, migrations) are picked up within ``CATALOG_MAX_AGE_SECONDS``.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.metrics_collector import register_cache_stats
+from core.venue_config import FrozenDict, _freeze
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", "2"))
+CATALOG_MAX_AGE_SECONDS = float(os.getenv("CATALOG_MAX_AGE_SECONDS", "300"))
+CATALOG_MAX_DOCS = int(os.getenv("CATALOG_MAX_DOCS", "20000"))
+CATALOG_WARM_MAX_VENUES = int(os.getenv("CATALOG_WARM_MAX_VENUES", "50"))
+
+DEFAULT_PREP_AREA = "kitchen"
+
+# Recipe fields only the editor needs; kept out of the snapshot
+_RECIPE_PROJECTION = {"_id": 0, "change_history": 0, "raw_import_data": 0}
+
+_EMPTY: Tuple = ()
+
+
+def _deep_sizeof(roots: Iterable) -> int:
+    """Approximate retained bytes; objects shared between indexes are counted once."""
+    seen = set()
+    stack = list(roots)
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+def _group(docs: Iterable[FrozenDict], key) -> Dict[str, Tuple[FrozenDict, ...]]:
+    grouped: Dict[str, List[FrozenDict]] = {}
+    for doc in docs:
+        grouped.setdefault(key(doc), []).append(doc)
+    return {k: tuple(v) for k, v in grouped.items()}
+
+
+def _display_order(doc) -> tuple:
+    return (doc.get("sort_order") or 0, doc.get("name") or "")
+
+
+class VenueCatalog:
+    """Immutable, fully indexed catalog of one venue at one catalog version.
+
+    Documents are ``FrozenDict``s and the indexes read-only mappings, so one
+    snapshot is safely shared by every concurrent request.
+    """
+
+    def __init__(self, venue_id: str, version: int, items: List[dict], categories: List[dict],
+                 modifier_groups: List[dict], modifier_options: List[dict], item_modifiers: List[dict],
+                 recipes: List[dict], inventory_links: List[dict]):
+        self.venue_id = venue_id
+        self.version = version
+        self.built_at = time.monotonic()
+
+        items = sorted((_freeze(d) for d in items if d.get("id")), key=_display_order)
+        categories = sorted((_freeze(d) for d in categories if d.get("id")), key=_display_order)
+        groups = [_freeze(d) for d in modifier_groups if d.get("id")]
+        options = sorted((_freeze(d) for d in modifier_options), key=_display_order)
+
+        items_by_id = {d["id"]: d for d in items}
+        groups_by_id = {d["id"]: d for d in groups}
+
+        recipes_by_menu_item: Dict[str, FrozenDict] = {}
+        for recipe in recipes:
+            menu_item_id = recipe.get("menu_item_id")
+            # First live recipe wins, like the old per-send find_one; trashed recipes never deduct
+            if menu_item_id and not recipe.get("deleted_at") and menu_item_id not in recipes_by_menu_item:
+                recipes_by_menu_item[menu_item_id] = _freeze(recipe)
+
+        links = [_freeze(d) for d in inventory_links if d.get("menu_item_id") in items_by_id]
+        item_groups: Dict[str, List[FrozenDict]] = {}
+        for link in item_modifiers:
+            group = groups_by_id.get(link.get("modifier_group_id"))
+            if group is not None and link.get("menu_item_id") in items_by_id:
+                item_groups.setdefault(link["menu_item_id"], []).append(group)
+
+        indexes = {
+            "items": items_by_id,
+            "categories": {d["id"]: d for d in categories},
+            "items_by_category": _group(items, lambda d: d.get("category_id")),
+            "items_by_prep_area": _group(items, lambda d: d.get("prep_area") or DEFAULT_PREP_AREA),
+            "recipes_by_menu_item": recipes_by_menu_item,
+            "links_by_menu_item": _group(links, lambda d: d["menu_item_id"]),
+            "modifier_groups": groups_by_id,
+            "options_by_group": _group(options, lambda d: d.get("group_id")),
+            "modifier_groups_by_item": {k: tuple(v) for k, v in item_groups.items()},
+        }
+        self.approx_bytes = _deep_sizeof(indexes.values())
+        for name, index in indexes.items():
+            setattr(self, name, MappingProxyType(index))
+
+    def menu_item(self, menu_item_id: Optional[str]) -> Optional[FrozenDict]:
+        return self.items.get(menu_item_id)
+
+    def recipe_for(self, menu_item_id: str) -> Optional[FrozenDict]:
+        return self.recipes_by_menu_item.get(menu_item_id)
+
+    def inventory_links(self, menu_item_id: str) -> Tuple[FrozenDict, ...]:
+        return self.links_by_menu_item.get(menu_item_id, _EMPTY)
+
+    def modifier_groups_for(self, menu_item_id: str) -> Tuple[FrozenDict, ...]:
+        return self.modifier_groups_by_item.get(menu_item_id, _EMPTY)
+
+    def modifier_options(self, group_id: str) -> Tuple[FrozenDict, ...]:
+        return self.options_by_group.get(group_id, _EMPTY)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "items": len(self.items),
+            "categories": len(self.categories),
+            "recipes": len(self.recipes_by_menu_item),
+            "modifier_groups": len(self.modifier_groups),
+            "modifier_options": sum(len(v) for v in self.options_by_group.values()),
+            "inventory_links": sum(len(v) for v in self.links_by_menu_item.values()),
+        }
+
+
+async def load_catalog(db, venue_id: str, version: int = 0) -> VenueCatalog:
+    """Read every catalog collection for a venue (two parallel rounds) and index it."""
+    def fetch(collection, query, projection=None):
+        return db[collection].find(query, projection or {"_id": 0}).to_list(CATALOG_MAX_DOCS)
+
+    items, categories, groups, recipes = await asyncio.gather(
+        fetch("menu_items", {"venue_id": venue_id}),
+        fetch("menu_categories", {"venue_id": venue_id}),
+        fetch("modifier_groups", {"venue_id": venue_id}),
+        fetch("recipes", {"venue_id": venue_id, "menu_item_id": {"$exists": True}}, _RECIPE_PROJECTION),
+    )
+    item_ids = [d["id"] for d in items if d.get("id")]
+    group_ids = [d["id"] for d in groups if d.get("id")]
+
+    async def none():
+        return []
+
+    options, item_modifiers, links = await asyncio.gather(
+        fetch("modifier_options", {"group_id": {"$in": group_ids}}) if group_ids else none(),
+        fetch("menu_item_modifiers", {"menu_item_id": {"$in": item_ids}}) if item_ids else none(),
+        fetch("menu_item_inventory", {"menu_item_id": {"$in": item_ids}}) if item_ids else none(),
+    )
+    if len(items) >= CATALOG_MAX_DOCS:
+        logger.warning("Catalog for venue %s truncated at %d menu items", venue_id, CATALOG_MAX_DOCS)
+    return VenueCatalog(venue_id, version, items, categories, groups, options, item_modifiers, recipes, links)
+
+
+class _CatalogCache:
+    """venue_id -> current VenueCatalog, plus when its version was last checked."""
+
+    def __init__(self):
+        self.entries: Dict[str, VenueCatalog] = {}
+        self.checked: Dict[str, float] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "misses": 0, "rebuilds": 0, "version_checks": 0, "bumps": 0,
+                      "last_rebuild_ms": 0}
+
+    def summary(self) -> Dict[str, int]:
+        catalogs = list(self.entries.values())
+        return dict(
+            self.stats,
+            venues=len(catalogs),
+            bytes=sum(c.approx_bytes for c in catalogs),
+            items=sum(len(c.items) for c in catalogs),
+            recipes=sum(len(c.recipes_by_menu_item) for c in catalogs),
+        )
+
+
+_cache = _CatalogCache()
+register_cache_stats("catalog", lambda: _cache.summary(),
+                     gauges=("venues", "bytes", "items", "recipes", "last_rebuild_ms"))
+
+
+async def _read_version(db, venue_id: str) -> int:
+    _cache.stats["version_checks"] += 1
+    doc = await db.catalog_versions.find_one({"venue_id": venue_id}, {"_id": 0, "version": 1})
+    return (doc or {}).get("version", 0)
+
+
+async def get_catalog(db, venue_id: str) -> VenueCatalog:
+    """The venue's current catalog snapshot; rebuilt (once, under a per-venue lock) when stale."""
+    now = time.monotonic()
+    catalog = _cache.entries.get(venue_id)
+    if catalog is not None and now - catalog.built_at < CATALOG_MAX_AGE_SECONDS:
+        if now - _cache.checked.get(venue_id, 0) < CATALOG_VERSION_POLL_SECONDS:
+            _cache.stats["hits"] += 1
+            return catalog
+        version = await _read_version(db, venue_id)
+        _cache.checked[venue_id] = now
+        if version == catalog.version:
+            _cache.stats["hits"] += 1
+            return catalog
+
+    _cache.stats["misses"] += 1
+    lock = _cache.locks.setdefault(venue_id, asyncio.Lock())
+    async with lock:
+        current = _cache.entries.get(venue_id)
+        if current is not None and current is not catalog:
+            # Another request rebuilt it while we waited (an invalidate leaves None: rebuild)
+            return current
+        started = time.perf_counter()
+        # Version first: a write racing the load leaves us one version behind, never ahead
+        version = await _read_version(db, venue_id)
+        fresh = await load_catalog(db, venue_id, version)
+        _cache.entries[venue_id] = fresh
+        _cache.checked[venue_id] = time.monotonic()
+        _cache.stats["rebuilds"] += 1
+        _cache.stats["last_rebuild_ms"] = int((time.perf_counter() - started) * 1000)
+        return fresh
+
+
+async def bump_catalog_version(db, venue_id: Optional[str]) -> Optional[int]:
+    """Call after any write to a venue's menu, modifiers or recipes."""
+    if not venue_id:
+        return None
+    # This worker re-checks on its next read whatever happens below
+    _cache.checked.pop(venue_id, None)
+    try:
+        doc = await db.catalog_versions.find_one_and_update(
+            {"venue_id": venue_id},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+            return_document=True
+        )
+    except Exception as e:
+        logger.warning("Catalog version bump failed for venue %s: %s", venue_id, e)
+        return None
+    _cache.stats["bumps"] += 1
+    return (doc or {}).get("version")
+
+
+def invalidate_catalog(venue_id: Optional[str] = None):
+    """Drop this worker's snapshot (all venues when venue_id is None)."""
+    venues = [venue_id] if venue_id else list(_cache.entries.keys())
+    for v in venues:
+        _cache.entries.pop(v, None)
+        _cache.checked.pop(v, None)
+
+
+async def warm_catalogs(db, max_venues: int = CATALOG_WARM_MAX_VENUES) -> List[str]:
+    """Build snapshots for venues with an open POS session, topped up from the venue list."""
+    sessions = await db.pos_sessions.find({"status": "OPEN"}, {"_id": 0, "venue_id": 1}).to_list(max_venues * 4)
+    venue_ids = list(dict.fromkeys(s["venue_id"] for s in sessions if s.get("venue_id")))
+    if len(venue_ids) < max_venues:
+        venues = await db.venues.find({}, {"_id": 0, "id": 1}).to_list(max_venues)
+        venue_ids.extend(v["id"] for v in venues if v.get("id") and v["id"] not in venue_ids)
+
+    warmed = []
+    # One venue at a time: warming must not compete with live traffic for the pool
+    for venue_id in venue_ids[:max_venues]:
+        try:
+            await get_catalog(db, venue_id)
+            warmed.append(venue_id)
+        except Exception as e:
+            logger.warning("Catalog warmup failed for venue %s: %s", venue_id, e)
+    return warmed
+
+
+def catalog_memory_report() -> Dict[str, object]:
+    """Per-venue footprint of this worker's snapshots, largest first."""
+    now = time.monotonic()
+    venues = [
+        dict(catalog.counts(), venue_id=venue_id, version=catalog.version, bytes=catalog.approx_bytes,
+             age_seconds=round(now - catalog.built_at, 1))
+        for venue_id, catalog in _cache.entries.items()
+    ]
+    venues.sort(key=lambda v: v["bytes"], reverse=True)
+    total_items = sum(v["items"] for v in venues)
+    total_bytes = sum(v["bytes"] for v in venues)
+    return {
+        "venues": venues,
+        "total_bytes": total_bytes,
+        "total_items": total_items,
+        "bytes_per_item": round(total_bytes / total_items) if total_items else 0,
+    }
@@ -1,12 +1,40 @@
 """
 🧊 Cold Storage Archival Service — Rule 26
-Auto-archive old data to cold storage collection.
+Auto-archive old data out of the hot database into compressed segments.
 Data Janitor: scheduled cleanup for performance.
+
+Segments (default, COLD_STORAGE_BACKEND=segments):
+    <COLD_STORAGE_DIR>/<collection>/<venue>/<YYYY-MM>/
+        part-00001.jsonl.gz   one per archival run that touched the month
+        manifest.json         per part: count, min/max date, zone maps
+
+Zone maps hold, per top-level field, the min/max of its scalar values and
+(for low-cardinality fields) the distinct values, so query_cold_storage can
+skip whole months, venues and parts without decompressing them.
+
+COLD_STORAGE_BACKEND=mongo keeps the old behaviour (``*_archive`` collections).
+
+Archived segments are the only copy once the hot docs are deleted, so there is
+no default COLD_STORAGE_DIR: until a durable path is configured, segment
+archival refuses to run and leaves the hot data in place.
 """
+import asyncio
+import gzip
+import hashlib
+import json
+import os
 from datetime import datetime, timezone, timedelta
-from typing import Optional
-from bson import ObjectId
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId, json_util
 
+COLD_STORAGE_BACKEND = os.getenv("COLD_STORAGE_BACKEND", "segments").lower()
+COLD_STORAGE_DIR = os.getenv("COLD_STORAGE_DIR", "")
+COLD_STORAGE_BATCH = int(os.getenv("COLD_STORAGE_BATCH", "5000"))
+ZONE_MAP_MAX_DISTINCT = 32
+
+NO_VENUE = "_global"
 
 # Collections and their retention periods (days)
 ARCHIVAL_RULES = {
@@ -20,16 +48,211 @@ ARCHIVAL_RULES = {
 }
 
 
+# ============= SEGMENT FILES =============
+
+def _iso(value: Any) -> Optional[str]:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value if isinstance(value, str) else None
+
+
+def _month(date_value: Any) -> str:
+    iso = _iso(date_value)
+    return iso[:7] if iso and len(iso) >= 7 else "unknown"
+
+
+def _scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool)) and not (isinstance(value, float) and value != value)
+
+
+def _family(value: Any) -> str:
+    """Values are only compared within a family (numbers with numbers, strings with strings)."""
+    if isinstance(value, bool):
+        return "bool"
+    return "num" if isinstance(value, (int, float)) else "str"
+
+
+def build_zone_maps(docs: List[dict]) -> Dict[str, dict]:
+    """Per top-level field: min/max per type family and, when few, the distinct values."""
+    zones: Dict[str, dict] = {}
+    for doc in docs:
+        for field, value in doc.items():
+            zone = zones.setdefault(field, {"ranges": {}, "values": set(), "overflow": False, "other": False})
+            if not _scalar(value):
+                zone["other"] = True
+                continue
+            fam = _family(value)
+            lo_hi = zone["ranges"].get(fam)
+            zone["ranges"][fam] = [value, value] if lo_hi is None else [min(lo_hi[0], value), max(lo_hi[1], value)]
+            if not zone["overflow"]:
+                zone["values"].add(value)
+                if len(zone["values"]) > ZONE_MAP_MAX_DISTINCT:
+                    zone["overflow"] = True
+                    zone["values"] = set()
+    return {
+        field: {
+            "ranges": zone["ranges"],
+            "values": None if zone["overflow"] else sorted(zone["values"], key=lambda v: (_family(v), v)),
+            "other": zone["other"],
+        }
+        for field, zone in zones.items()
+    }
+
+
+def _zone_may_match(zone: Optional[dict], cond: Any) -> bool:
+    """False only when no document of the part can satisfy ``cond``."""
+    if zone is None:
+        # Field absent from every doc of the part: decide as _matches would for a missing value
+        return _matches({}, {"field": cond})
+    if zone["other"]:
+        return True  # some values were not summarised
+    if not isinstance(cond, dict):
+        cond = {"$eq": cond}
+    for op, val in cond.items():
+        if op == "$eq":
+            if not _scalar(val):
+                return True
+            if zone["values"] is not None and val not in zone["values"]:
+                return False
+            lo_hi = zone["ranges"].get(_family(val))
+            if lo_hi is None or not (lo_hi[0] <= val <= lo_hi[1]):
+                return False
+        elif op == "$in":
+            if not any(_zone_may_match(zone, {"$eq": v}) for v in val):
+                return False
+        elif op in ("$gt", "$gte", "$lt", "$lte") and _scalar(val):
+            lo_hi = zone["ranges"].get(_family(val))
+            if lo_hi is None:
+                return False
+            lo, hi = lo_hi
+            if (op == "$gt" and hi <= val) or (op == "$gte" and hi < val) \
+                    or (op == "$lt" and lo >= val) or (op == "$lte" and lo > val):
+                return False
+    return True
+
+
+def _matches(doc: dict, filters: Dict[str, Any]) -> bool:
+    for field, cond in filters.items():
+        value = doc.get(field)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, val in cond.items():
+            try:
+                if op == "$eq" and value != val:
+                    return False
+                if op == "$ne" and value == val:
+                    return False
+                if op == "$in" and value not in val:
+                    return False
+                if op == "$nin" and value in val:
+                    return False
+                if op == "$exists" and (field in doc) != bool(val):
+                    return False
+                if op == "$gt" and not (value is not None and value > val):
+                    return False
+                if op == "$gte" and not (value is not None and value >= val):
+                    return False
+                if op == "$lt" and not (value is not None and value < val):
+                    return False
+                if op == "$lte" and not (value is not None and value <= val):
+                    return False
+            except TypeError:
+                return False
+    return True
+
+
+def _cold_root(root: Optional[str]) -> Optional[Path]:
+    """Configured segment root, or None when cold storage has no durable path yet."""
+    root = root or COLD_STORAGE_DIR
+    return Path(root) if root else None
+
+
+def _restored(manifest: Dict[str, Any], part: Dict[str, Any]) -> set:
+    """
+    Ids restored out of ``part``. Tombstones are per part: a restored doc that is
+    archived again lands in a new part and must be visible there. Parts written
+    before per-part tombstones fall back to the old segment-wide list.
+    """
+    return set(part.get("restored_ids", manifest.get("restored_ids", [])))
+
+
+def _segment_dir(root: Path, collection_name: str, venue_id: str, month: str) -> Path:
+    return root / collection_name / (venue_id or NO_VENUE) / month
+
+
+def _load_manifest(segment_dir: Path) -> Dict[str, Any]:
+    try:
+        with open(segment_dir / "manifest.json", "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"parts": []}
+
+
+def _save_manifest(segment_dir: Path, manifest: Dict[str, Any]) -> None:
+    parts = manifest["parts"]
+    manifest["count"] = sum(p["count"] for p in parts)
+    manifest["min_date"] = min((p["min_date"] for p in parts if p["min_date"]), default=None)
+    manifest["max_date"] = max((p["max_date"] for p in parts if p["max_date"]), default=None)
+    tmp = segment_dir / "manifest.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, segment_dir / "manifest.json")
+
+
+def _write_part(segment_dir: Path, docs: List[dict], date_field: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Write one compressed part and register it in the segment manifest (runs in the executor)."""
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(segment_dir)
+    manifest.update(meta)
+    name = f"part-{len(manifest['parts']) + 1:05d}.jsonl.gz"
+    body = gzip.compress("".join(json_util.dumps(d) + "\n" for d in docs).encode(), compresslevel=6)
+    with open(segment_dir / name, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    dates = [d for d in (_iso(doc.get(date_field)) for doc in docs) if d]
+    part = {
+        "file": name,
+        "count": len(docs),
+        "bytes": len(body),
+        "sha256": hashlib.sha256(body).hexdigest(),
+        "min_date": min(dates, default=None),
+        "max_date": max(dates, default=None),
+        "zone_maps": build_zone_maps(docs),
+        "restored_ids": [],
+        "written_at": datetime.now(timezone.utc).isoformat(),
+    }
+    manifest["parts"].append(part)
+    _save_manifest(segment_dir, manifest)
+    return part
+
+
+def _read_part(segment_dir: Path, part: Dict[str, Any]) -> List[dict]:
+    with open(segment_dir / part["file"], "rb") as f:
+        body = f.read()
+    return [json_util.loads(line) for line in gzip.decompress(body).decode().splitlines() if line]
+
+
+# ============= ARCHIVAL =============
+
 async def archive_old_data(
     db,
     collection_name: str,
     date_field: str = "created_at",
     retention_days: Optional[int] = None,
-    batch_size: int = 500,
+    batch_size: int = COLD_STORAGE_BATCH,
     venue_id: str = "",
+    backend: str = COLD_STORAGE_BACKEND,
+    root: Optional[str] = None,
 ) -> dict:
     """
-    Move old documents from a hot collection to its cold archive.
+    Move old documents out of a hot collection into cold storage.
     Returns stats about the operation.
     """
     rule = ARCHIVAL_RULES.get(collection_name)
@@ -45,9 +268,15 @@ async def archive_old_data(
 
     source = db[collection_name]
     archive = db[rule["archive_collection"]]
+    cold_root = _cold_root(root)
+    if backend != "mongo" and cold_root is None:
+        # Fail closed: never delete hot data of record into an unconfigured (or ephemeral) path
+        return {"error": "COLD_STORAGE_DIR is not set; configure a durable path for cold storage segments"}
+    loop = asyncio.get_running_loop()
 
     total_archived = 0
     total_deleted = 0
+    segments_written = set()
 
     while True:
         # Fetch a batch
@@ -61,8 +290,20 @@ async def archive_old_data(
         if not batch:
             break
 
-        # Insert into archive
-        await archive.insert_many(batch)
+        if backend == "mongo":
+            # Insert into archive
+            await archive.insert_many(batch)
+        else:
+            # One part per (venue, month) touched by the batch; durable before the delete
+            groups: Dict[tuple, List[dict]] = {}
+            for doc in batch:
+                groups.setdefault((doc.get("venue_id") or "", _month(doc.get(date_field))), []).append(doc)
+            for (doc_venue, month), docs in groups.items():
+                segment_dir = _segment_dir(cold_root, collection_name, doc_venue, month)
+                meta = {"collection": collection_name, "venue_id": doc_venue, "month": month,
+                        "date_field": date_field}
+                await loop.run_in_executor(None, _write_part, segment_dir, docs, date_field, meta)
+                segments_written.add(str(segment_dir))
         total_archived += len(batch)
 
         # Delete from source
@@ -70,7 +311,7 @@ async def archive_old_data(
         result = await source.delete_many({"_id": {"$in": ids}})
         total_deleted += result.deleted_count
 
-    return {
+    stats = {
         "collection": collection_name,
         "archive_collection": rule["archive_collection"],
         "retention_days": days,
@@ -79,6 +320,10 @@ async def archive_old_data(
         "documents_deleted": total_deleted,
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
+    if backend != "mongo":
+        stats["archive_collection"] = None
+        stats["segments_written"] = len(segments_written)
+    return stats
 
 
 async def run_full_archival(db, venue_id: str = "") -> list:
@@ -96,19 +341,147 @@ async def run_full_archival(db, venue_id: str = "") -> list:
     return results
 
 
-async def get_archival_stats(db) -> list:
-    """Get stats for all archival collections."""
+# ============= QUERY-THROUGH =============
+
+def _segment_dirs(root: Path, collection_name: str, venue_id: str,
+                  start: Optional[str], end: Optional[str], stats: Dict[str, int]) -> List[Path]:
+    """Segments of the collection, pruned by venue and by month from the directory names."""
+    base = root / collection_name
+    if not base.exists():
+        return []
+    venues = [base / venue_id] if venue_id else sorted(p for p in base.iterdir() if p.is_dir())
+    found = []
+    for venue_dir in venues:
+        if not venue_dir.is_dir():
+            continue
+        for month_dir in sorted(p for p in venue_dir.iterdir() if p.is_dir()):
+            month = month_dir.name
+            if month != "unknown" and ((start and month < start[:7]) or (end and month > end[:7])):
+                stats["segments_pruned"] += 1
+                continue
+            found.append(month_dir)
+    return found
+
+
+def _part_may_match(part: Dict[str, Any], start: Optional[str], end: Optional[str],
+                    filters: Dict[str, Any]) -> bool:
+    if start and part["max_date"] and part["max_date"] < start:
+        return False
+    if end and part["min_date"] and part["min_date"] >= end:
+        return False
+    zones = part.get("zone_maps", {})
+    return all(_zone_may_match(zones.get(field), cond) for field, cond in filters.items())
+
+
+async def iter_cold_documents(
+    collection_name: str,
+    venue_id: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    root: Optional[str] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Stream archived documents of ``collection_name`` with ``start <= date < end``
+    (ISO strings, on the archived date field) matching ``filters`` (equality,
+    $in, $ne, $nin, $exists and range operators on top-level fields). Only parts whose
+    manifest and zone maps can match are decompressed.
+    """
+    filters = filters or {}
+    stats = stats if stats is not None else {}
+    for key in ("segments_scanned", "segments_pruned", "parts_scanned", "parts_pruned"):
+        stats.setdefault(key, 0)
+    loop = asyncio.get_running_loop()
+
+    cold_root = _cold_root(root)
+    if cold_root is None:
+        return
+    for segment_dir in _segment_dirs(cold_root, collection_name, venue_id, start, end, stats):
+        manifest = await loop.run_in_executor(None, _load_manifest, segment_dir)
+        if not manifest["parts"] or (start and manifest.get("max_date") and manifest["max_date"] < start) \
+                or (end and manifest.get("min_date") and manifest["min_date"] >= end):
+            stats["segments_pruned"] += 1
+            continue
+        stats["segments_scanned"] += 1
+        date_field = manifest.get("date_field", "created_at")
+        seen = set()  # a run interrupted between write and delete archives a doc twice
+        for part in manifest["parts"]:
+            if not _part_may_match(part, start, end, filters):
+                stats["parts_pruned"] += 1
+                continue
+            stats["parts_scanned"] += 1
+            restored = _restored(manifest, part)
+            for doc in await loop.run_in_executor(None, _read_part, segment_dir, part):
+                doc_id = str(doc.get("_id"))
+                if doc_id in restored or doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                date = _iso(doc.get(date_field))
+                if start and (date is None or date < start):
+                    continue
+                if end and (date is None or date >= end):
+                    continue
+                if _matches(doc, filters):
+                    yield doc
+
+
+async def query_cold_storage(
+    collection_name: str,
+    venue_id: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    root: Optional[str] = None,
+) -> dict:
+    """Collect ``iter_cold_documents`` results, with pruning stats."""
+    stats: Dict[str, int] = {}
+    documents = []
+    async for doc in iter_cold_documents(collection_name, venue_id, start, end, filters, root, stats):
+        documents.append(doc)
+        if limit and len(documents) >= limit:
+            break
+    return {"collection": collection_name, "documents": documents, "count": len(documents), **stats}
+
+
+# ============= STATS & RESTORE =============
+
+def _cold_totals(root: Path, collection_name: str) -> Dict[str, int]:
+    totals = {"cold_count": 0, "cold_bytes": 0, "segments": 0}
+    if root is None:
+        return totals
+    base = root / collection_name
+    if not base.exists():
+        return totals
+    for manifest_file in base.glob("*/*/manifest.json"):
+        manifest = _load_manifest(manifest_file.parent)
+        parts = manifest["parts"]
+        totals["segments"] += 1
+        totals["cold_count"] += manifest.get("count", 0) - sum(len(p.get("restored_ids", [])) for p in parts)
+        if any("restored_ids" not in p for p in parts):
+            totals["cold_count"] -= len(manifest.get("restored_ids", []))
+        totals["cold_bytes"] += sum(p["bytes"] for p in parts)
+    return totals
+
+
+async def get_archival_stats(db, root: Optional[str] = None) -> list:
+    """Get stats for all archival collections (metadata-only counts: no collection scans)."""
+    loop = asyncio.get_running_loop()
+    cold_root = _cold_root(root)
     stats = []
     for collection_name, rule in ARCHIVAL_RULES.items():
-        hot_count = await db[collection_name].count_documents({})
-        cold_count = await db[rule["archive_collection"]].count_documents({})
-        stats.append({
+        hot_count = await db[collection_name].estimated_document_count()
+        entry = {
             "collection": collection_name,
             "hot_count": hot_count,
-            "cold_count": cold_count,
             "retention_days": rule["retention_days"],
             "archive_collection": rule["archive_collection"],
-        })
+        }
+        entry.update(await loop.run_in_executor(None, _cold_totals, cold_root, collection_name))
+        if COLD_STORAGE_BACKEND == "mongo":
+            entry["cold_count"] += await db[rule["archive_collection"]].estimated_document_count()
+        stats.append(entry)
     return stats
 
 
@@ -117,7 +490,7 @@ async def restore_from_archive(
     archive_collection: str,
     document_id: str,
 ) -> Optional[dict]:
-    """Restore a single document from cold storage back to its original collection."""
+    """Restore a single document from a ``*_archive`` collection back to its original collection."""
     doc = await db[archive_collection].find_one({"_id": ObjectId(document_id)})
     if not doc:
         return None
@@ -133,3 +506,47 @@ async def restore_from_archive(
 
     doc["_id"] = str(doc["_id"])
     return doc
+
+
+async def restore_from_segments(
+    db,
+    collection_name: str,
+    document_id: str,
+    venue_id: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    root: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Restore one archived document (by _id) from segment files to its hot
+    collection. Part files are immutable: the id is tombstoned on every part
+    holding a copy, so queries stop returning it while a later re-archive of the
+    same doc (a new part) stays visible.
+    """
+    cold_root = _cold_root(root)
+    if cold_root is None:
+        return None
+    loop = asyncio.get_running_loop()
+    stats = {"segments_scanned": 0, "segments_pruned": 0}
+    for segment_dir in _segment_dirs(cold_root, collection_name, venue_id, start, end, stats):
+        manifest = await loop.run_in_executor(None, _load_manifest, segment_dir)
+        found, holders = None, []
+        for part in manifest["parts"]:
+            if document_id in _restored(manifest, part):
+                continue
+            for doc in await loop.run_in_executor(None, _read_part, segment_dir, part):
+                if str(doc.get("_id")) == document_id:
+                    found = found or doc
+                    holders.append(part)
+                    break
+        if found is None:
+            continue
+        found.pop("archived_from", None)
+        found.pop("archived_at", None)
+        await db[collection_name].insert_one(found)
+        for part in holders:
+            part["restored_ids"] = sorted(_restored(manifest, part) | {document_id})
+        await loop.run_in_executor(None, _save_manifest, segment_dir, manifest)
+        found["_id"] = str(found["_id"])
+        return found
+    return None
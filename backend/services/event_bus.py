@@ -1,7 +1,11 @@
 """Event Bus - Publish/Subscribe system with MongoDB Outbox Pattern"""
 import asyncio
+import os
+import random
+import socket
+import time
 from typing import Dict, List, Callable, Any, Optional
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import json
 import uuid
 
@@ -9,12 +13,56 @@ from core.database import db
 from services.observability_service import get_observability_service
 
 
+# Dispatcher tuning (env-overridable)
+EVENT_BUS_BATCH_SIZE = int(os.getenv("EVENT_BUS_BATCH_SIZE", "50"))
+EVENT_BUS_WORKERS = int(os.getenv("EVENT_BUS_WORKERS", "16"))
+EVENT_BUS_LEASE_SECONDS = int(os.getenv("EVENT_BUS_LEASE_SECONDS", "60"))
+EVENT_BUS_POLL_INTERVAL = float(os.getenv("EVENT_BUS_POLL_INTERVAL", "1.0"))
+EVENT_BUS_ACK_INTERVAL = float(os.getenv("EVENT_BUS_ACK_INTERVAL", "0.05"))
+EVENT_BUS_BACKOFF_BASE = float(os.getenv("EVENT_BUS_BACKOFF_BASE", "2.0"))
+EVENT_BUS_BACKOFF_MAX = float(os.getenv("EVENT_BUS_BACKOFF_MAX", "300"))
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
 class EventBus:
-    """Centralized event bus with outbox pattern"""
+    """
+    Centralized event bus with outbox pattern.
+
+    Dispatch is lease based: a batch of PENDING events is claimed in one
+    update_many stamped with this process' owner token and a claim id, so two
+    dispatchers (or a change-stream notification racing the poller) can never
+    run the same event twice. Handlers run on a bounded worker pool with
+    optional per-event-type limits; completions are acknowledged in bulk.
+    Failed dispatches are retried with exponential backoff via next_attempt_at.
+    Leases of events still being handled are renewed every third of the lease,
+    so only a dead owner's events are reclaimed; a reclaim counts as a retry,
+    so an event that keeps killing its worker ends up in the DLQ.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: int = EVENT_BUS_BATCH_SIZE,
+        max_workers: int = EVENT_BUS_WORKERS,
+        lease_seconds: int = EVENT_BUS_LEASE_SECONDS,
+    ):
         self.subscribers: Dict[str, List[Callable]] = {}
         self.running = False
+
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.type_limits: Dict[str, int] = {}
+        self._type_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: set = set()
+        self._inflight_ids: set = set()
+        self._acks: List[str] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._last_reclaim = 0.0
+        self.stats = {"claimed": 0, "completed": 0, "retried": 0, "dead_lettered": 0, "ack_writes": 0}
     
     def subscribe(self, event_type: str, handler: Callable):
         """Subscribe to an event type"""
@@ -22,153 +70,322 @@ class EventBus:
             self.subscribers[event_type] = []
         self.subscribers[event_type].append(handler)
         return self
+
+    def set_concurrency_limit(self, event_type: str, limit: int):
+        """Cap how many events of one type run at once (on top of the global pool)."""
+        self.type_limits[event_type] = limit
+        self._type_semaphores.pop(event_type, None)
+        return self
     
     async def publish(self, event_type: str, data: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None):
         """
         Publish event to outbox (MongoDB)
         Uses outbox pattern for reliability
         """
+        now = datetime.now(timezone.utc).isoformat()
         event = {
             "id": str(uuid.uuid4()),
             "event_type": event_type,
             "data": data,
             "metadata": metadata or {},
             "status": "PENDING",
-            "published_at": datetime.now(timezone.utc).isoformat(),
+            "published_at": now,
+            "next_attempt_at": now,
             "retry_count": 0,
             "max_retries": 3
         }
         
         # Write to outbox collection
         await db.event_outbox.insert_one(event)
+        if self._wake is not None:
+            self._wake.set()
         
         return event["id"]
     
     async def process_pending_events(self):
-        """Process pending events from outbox (background worker)"""
-        # 1. Recovery on startup: Process any leftover PENDING events
+        """Run the outbox dispatcher (background worker)"""
+        self._wake = asyncio.Event()
+
+        # 1. Recovery on startup: legacy PENDING rows predate next_attempt_at
         try:
-            pending_events = await db.event_outbox.find(
-                {"status": "PENDING"},
-                {"_id": 0}
-            ).limit(1000).to_list(1000)
-            
-            for event in pending_events:
-                asyncio.create_task(self._process_event(event))
-                
-            if pending_events:
-                print(f"♻️ EventBus: Recovered {len(pending_events)} pending events on startup")
+            res = await db.event_outbox.update_many(
+                {"status": "PENDING", "next_attempt_at": {"$exists": False}},
+                {"$set": {"next_attempt_at": datetime.now(timezone.utc).isoformat()}}
+            )
+            if getattr(res, "modified_count", 0):
+                print(f"♻️ EventBus: Recovered {res.modified_count} pending events on startup")
         except Exception as e:
             print(f"Error recovering pending events: {e}")
 
-        # 2. Main processing loop
+        # 2. Change streams (if supported) only wake the dispatcher; claiming stays lease based
         has_watch = hasattr(db.event_outbox, 'watch')
-        print(f"📡 EventBus: Change Streams supported = {has_watch}")
-        
+        print(f"📡 EventBus: Change Streams supported = {has_watch} (owner={self.owner})")
+        watcher = asyncio.create_task(self._watch_inserts()) if has_watch else None
+        acker = asyncio.create_task(self._ack_loop())
+        renewer = asyncio.create_task(self._renew_loop())
+
+        try:
+            while self.running:
+                try:
+                    claimed = 0
+                    free = self.max_workers - len(self._inflight)
+                    if free > 0:
+                        events = await self._claim_batch(min(self.batch_size, free))
+                        claimed = len(events)
+                        for event in events:
+                            task = asyncio.create_task(self._process_event(event))
+                            self._inflight.add(task)
+                            task.add_done_callback(self._inflight.discard)
+
+                    if claimed == 0 or free <= 0:
+                        # Idle or saturated: wait for a publish/change-stream wake-up or the poll tick
+                        self._wake.clear()
+                        try:
+                            await asyncio.wait_for(self._wake.wait(), timeout=EVENT_BUS_POLL_INTERVAL)
+                        except asyncio.TimeoutError:
+                            pass
+                except Exception as e:
+                    # Sleep briefly to avoid tight crash loops if DB disconnects
+                    print(f"Error in EventBus dispatch loop: {e}")
+                    await asyncio.sleep(5)
+        finally:
+            if watcher:
+                watcher.cancel()
+            acker.cancel()
+            renewer.cancel()
+            await self._flush_acks()
+
+    async def _watch_inserts(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
         while self.running:
             try:
-                if has_watch:
-                    # Real-time change stream (MongoDB Replica Set / Atlas)
-                    pipeline = [{"$match": {"operationType": "insert"}}]
-                    try:
-                        async with db.event_outbox.watch(pipeline) as stream:
-                            async for change in stream:
-                                if not self.running:
-                                    break
-                                
-                                event = change.get("fullDocument")
-                                if event and event.get("status") == "PENDING":
-                                    asyncio.create_task(self._process_event(event))
-                    except Exception as watch_err:
-                        if "changeStream" in str(watch_err) or "40573" in str(watch_err):
-                            print("⚠️ EventBus: MongoDB Standalone detected. Falling back to interval polling.")
-                            has_watch = False
-                        else:
-                            raise watch_err
-                else:
-                    # Fallback to polling (Mock DB or Standalone)
-                    events = await db.event_outbox.find(
-                        {"status": "PENDING"},
-                        {"_id": 0}
-                    ).limit(10).to_list(10)
-                    
-                    for event in events:
-                        asyncio.create_task(self._process_event(event))
-                    
-                    await asyncio.sleep(1)
-                    
-            except Exception as e:
-                # Sleep briefly to avoid tight crash loops if DB disconnects
-                print(f"Error in EventBus watch/poll loop: {e}")
+                async with db.event_outbox.watch(pipeline) as stream:
+                    async for _change in stream:
+                        if not self.running:
+                            break
+                        self._wake.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as watch_err:
+                if "changeStream" in str(watch_err) or "40573" in str(watch_err):
+                    print("⚠️ EventBus: MongoDB Standalone detected. Falling back to interval polling.")
+                    return
+                print(f"Error in EventBus change stream: {watch_err}")
                 await asyncio.sleep(5)
-    
+
+    async def _claim_batch(self, limit: int) -> List[Dict]:
+        """Atomically claim up to `limit` due events for this owner."""
+        now = datetime.now(timezone.utc)
+        now_iso = _iso(now)
+        claim_id = uuid.uuid4().hex
+        lease = {
+            "status": "PROCESSING",
+            "lease_owner": self.owner,
+            "claim_id": claim_id,
+            "lease_expires_at": _iso(now + timedelta(seconds=self.lease_seconds)),
+            "processing_started_at": now_iso,
+        }
+
+        # Reclaim events whose owner died mid-flight (lease expired, never renewed).
+        # The dead attempt counts as a retry so a poison event reaches the DLQ.
+        # Bounded by the batch: after an outage one poll must not take every expired lease.
+        reclaimed = 0
+        if time.monotonic() - self._last_reclaim >= self.lease_seconds / 2:
+            expired = await db.event_outbox.find(
+                {"status": "PROCESSING", "lease_expires_at": {"$lt": now_iso}},
+                {"_id": 0, "id": 1}
+            ).sort("lease_expires_at", 1).limit(limit).to_list(limit)
+            if len(expired) < limit:
+                # Backlog drained: wait half a lease before looking again
+                self._last_reclaim = time.monotonic()
+            if expired:
+                result = await db.event_outbox.update_many(
+                    {"id": {"$in": [e["id"] for e in expired]},
+                     "status": "PROCESSING", "lease_expires_at": {"$lt": now_iso}},
+                    {"$set": lease, "$inc": {"retry_count": 1}}
+                )
+                reclaimed = result.modified_count
+
+        ids = []
+        room = limit - reclaimed
+        if room > 0:
+            due = await db.event_outbox.find(
+                {"status": "PENDING", "next_attempt_at": {"$lte": now_iso}},
+                {"_id": 0, "id": 1}
+            ).sort("next_attempt_at", 1).limit(room).to_list(room)
+            ids = [e["id"] for e in due]
+        if ids:
+            # Re-checking status in the filter makes each row's claim atomic
+            await db.event_outbox.update_many(
+                {"id": {"$in": ids}, "status": "PENDING"},
+                {"$set": lease}
+            )
+
+        if not ids and not reclaimed:
+            return []
+        claimed = await db.event_outbox.find(
+            {"claim_id": claim_id},
+            {"_id": 0}
+        ).to_list(None)
+        self.stats["claimed"] += len(claimed)
+
+        runnable = []
+        for event in claimed:
+            if event.get("retry_count", 0) >= event.get("max_retries", 3):
+                # Only a reclaim can push a claimed event to its limit
+                await self._dead_letter(event, "lease expired: worker died while handling the event")
+            else:
+                runnable.append(event)
+        return runnable
+
+    def _type_semaphore(self, event_type: str) -> Optional[asyncio.Semaphore]:
+        limit = self.type_limits.get(event_type)
+        if not limit:
+            return None
+        sem = self._type_semaphores.get(event_type)
+        if sem is None:
+            sem = self._type_semaphores[event_type] = asyncio.Semaphore(limit)
+        return sem
+
     async def _process_event(self, event: Dict):
-        """Process a single event"""
+        """Process a single claimed event"""
         event_type = event["event_type"]
         event_id = event["id"]
+        sem = self._type_semaphore(event_type)
+        self._inflight_ids.add(event_id)
         
         try:
-            # Mark as processing
-            await db.event_outbox.update_one(
-                {"id": event_id},
-                {"$set": {"status": "PROCESSING", "processing_started_at": datetime.now(timezone.utc).isoformat()}}
-            )
-            
-            # Execute all subscribers
-            if event_type in self.subscribers:
-                for handler in self.subscribers[event_type]:
-                    try:
-                        await handler(event)
-                    except Exception as handler_error:
-                        print(f"Handler error for {event_type}: {handler_error}")
-                        # Log handler error to observability
-                        import asyncio
-                        obs = get_observability_service(db)
-                        if obs:
-                            asyncio.create_task(obs.log_background_error(
-                                source_name=f"EventBus.Handler[{event_type}]",
-                                error_msg=str(handler_error),
-                                metadata={"event_id": event_id}
-                            ))
-                        # Continue with other handlers
-            
-            # Mark as completed
-            await db.event_outbox.update_one(
-                {"id": event_id},
-                {"$set": {
-                    "status": "COMPLETED",
-                    "completed_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
+            if sem is not None:
+                async with sem:
+                    await self._run_handlers(event)
+            else:
+                await self._run_handlers(event)
+            # Completion is acknowledged in the next bulk write
+            self._acks.append(event_id)
             
         except Exception as e:
-            # Mark as failed, increment retry
-            retry_count = event.get("retry_count", 0) + 1
-            max_retries = event.get("max_retries", 3)
-            
-            if retry_count >= max_retries:
-                # Move to dead letter queue
-                await self._move_to_dlq(event, str(e))
-                # Alert observability about DLQ insertion
+            await self._retry_or_dead_letter(event, e)
+        finally:
+            self._inflight_ids.discard(event_id)
+
+    async def _run_handlers(self, event: Dict):
+        event_type = event["event_type"]
+        event_id = event["id"]
+
+        # Execute all subscribers
+        for handler in self.subscribers.get(event_type, []):
+            try:
+                await handler(event)
+            except Exception as handler_error:
+                print(f"Handler error for {event_type}: {handler_error}")
+                # Log handler error to observability
                 obs = get_observability_service(db)
                 if obs:
-                    import asyncio
                     asyncio.create_task(obs.log_background_error(
-                        source_name="EventBus.DLQ",
-                        error_msg=f"Event {event_id} ({event_type}) moved to DLQ. Reason: {str(e)}",
-                        metadata={"event_id": event_id, "event_type": event_type}
+                        source_name=f"EventBus.Handler[{event_type}]",
+                        error_msg=str(handler_error),
+                        metadata={"event_id": event_id}
                     ))
-            else:
-                # Retry later
-                await db.event_outbox.update_one(
-                    {"id": event_id},
-                    {"$set": {
-                        "status": "PENDING",
-                        "retry_count": retry_count,
-                        "last_error": str(e),
-                        "last_retry_at": datetime.now(timezone.utc).isoformat()
-                    }}
-                )
+                # Continue with other handlers
+
+    def _backoff_seconds(self, retry_count: int) -> float:
+        delay = min(EVENT_BUS_BACKOFF_BASE * (2 ** (retry_count - 1)), EVENT_BUS_BACKOFF_MAX)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _retry_or_dead_letter(self, event: Dict, error: Exception):
+        event_id = event["id"]
+        retry_count = event.get("retry_count", 0) + 1
+        max_retries = event.get("max_retries", 3)
+
+        if retry_count >= max_retries:
+            await self._dead_letter(event, str(error))
+            return
+
+        # Retry later with exponential backoff
+        now = datetime.now(timezone.utc)
+        await db.event_outbox.update_one(
+            {"id": event_id, "lease_owner": self.owner},
+            {"$set": {
+                "status": "PENDING",
+                "retry_count": retry_count,
+                "last_error": str(error),
+                "last_retry_at": _iso(now),
+                "next_attempt_at": _iso(now + timedelta(seconds=self._backoff_seconds(retry_count))),
+                "lease_owner": None,
+                "lease_expires_at": None,
+            }}
+        )
+        self.stats["retried"] += 1
+
+    async def _dead_letter(self, event: Dict, error: str):
+        event_type = event["event_type"]
+        event_id = event["id"]
+        # Move to dead letter queue
+        await self._move_to_dlq(event, error)
+        self.stats["dead_lettered"] += 1
+        # Alert observability about DLQ insertion
+        obs = get_observability_service(db)
+        if obs:
+            asyncio.create_task(obs.log_background_error(
+                source_name="EventBus.DLQ",
+                error_msg=f"Event {event_id} ({event_type}) moved to DLQ. Reason: {error}",
+                metadata={"event_id": event_id, "event_type": event_type}
+            ))
+
+    async def _renew_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._renew_leases()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error renewing EventBus leases: {e}")
+
+    async def _renew_leases(self):
+        """Heartbeat: push out the lease of every event this owner still holds."""
+        ids = list(self._inflight_ids) + self._acks
+        if not ids:
+            return
+        expires = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        await db.event_outbox.update_many(
+            {"id": {"$in": ids}, "lease_owner": self.owner, "status": "PROCESSING"},
+            {"$set": {"lease_expires_at": _iso(expires)}}
+        )
+
+    async def _ack_loop(self):
+        while True:
+            await asyncio.sleep(EVENT_BUS_ACK_INTERVAL)
+            try:
+                await self._flush_acks()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error acknowledging EventBus events: {e}")
+
+    async def _flush_acks(self):
+        """Mark all finished events COMPLETED in a single write."""
+        if not self._acks:
+            return
+        ids, self._acks = self._acks, []
+        try:
+            await db.event_outbox.update_many(
+                {"id": {"$in": ids}, "lease_owner": self.owner},
+                {"$set": {
+                    "status": "COMPLETED",
+                    "completed_at": datetime.now(timezone.utc).isoformat(),
+                    "lease_expires_at": None,
+                }}
+            )
+        except Exception:
+            # Keep them for the next flush; the lease still protects against re-dispatch
+            self._acks = ids + self._acks
+            raise
+        self.stats["ack_writes"] += 1
+        self.stats["completed"] += len(ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "inflight": len(self._inflight), "pending_acks": len(self._acks), "owner": self.owner}
     
     async def _move_to_dlq(self, event: Dict, error: str):
         """Move failed event to Dead Letter Queue"""
@@ -186,6 +403,8 @@ class EventBus:
     def stop(self):
         """Stop the event processor"""
         self.running = False
+        if self._wake is not None:
+            self._wake.set()
 
 
 # Global event bus instance
@@ -1,6 +1,9 @@
 # Universal Numbering System (UNS) - Server Authoritative
 from __future__ import annotations
-from typing import Optional, Dict, Any
+import asyncio
+import os
+import time
+from typing import Optional, Dict, Any, List, Tuple
 from uuid import uuid4
 
 # Default entity prefixes
@@ -68,37 +71,153 @@ DEFAULT_CONFIG = {
     }
 }
 
+# Numbers reserved per counter round trip. Hot entities trade gaps after a
+# restart for one $inc per block instead of one per document.
+DEFAULT_BLOCK_SIZE = int(os.getenv("UNS_BLOCK_SIZE", "1"))
+HOT_BLOCK_SIZE = int(os.getenv("UNS_HOT_BLOCK_SIZE", "20"))
+BLOCK_SIZES = {
+    "order": HOT_BLOCK_SIZE,
+    "kds_ticket": HOT_BLOCK_SIZE,
+    "print_job": HOT_BLOCK_SIZE,
+    "stock_ledger": HOT_BLOCK_SIZE,
+}
+
+CONFIG_TTL_SECONDS = 60
+_config_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+
 async def get_numbering_config(db, venue_id: str, entity_type: str) -> Dict[str, Any]:
-    """Get numbering configuration for entity type"""
+    """Get numbering configuration for entity type (cached per process for CONFIG_TTL_SECONDS)"""
+    key = (venue_id, entity_type)
+    cached = _config_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
     venue = await db.venues.find_one({"id": venue_id}, {"_id": 0, "settings": 1})
     
     numbering = venue.get("settings", {}).get("numbering", DEFAULT_CONFIG) if venue else DEFAULT_CONFIG
     entity_config = numbering.get("entities", {}).get(entity_type, {})
     
-    return {
+    config = {
         "prefix": entity_config.get("prefix", ENTITY_PREFIX.get(entity_type, "ID").rstrip("-")),
         "separator": numbering.get("separator", "-"),
-        "width": entity_config.get("width", numbering.get("default_width", 5))
+        "width": entity_config.get("width", numbering.get("default_width", 5)),
+        "block": entity_config.get("block", BLOCK_SIZES.get(entity_type, DEFAULT_BLOCK_SIZE)),
     }
+    _config_cache[key] = (time.monotonic() + CONFIG_TTL_SECONDS, config)
+    return config
+
+
+def invalidate_numbering_config(venue_id: Optional[str] = None):
+    """Drop cached numbering config (call after editing venue settings.numbering)"""
+    for key in list(_config_cache.keys()):
+        if venue_id is None or key[0] == venue_id:
+            del _config_cache[key]
+
+
+class SequenceAllocator:
+    """
+    Atomic per-venue sequence allocator backed by the counters collection.
+
+    Each (venue_id, entity_type) reserves a block of numbers with a single
+    find_one_and_update + $inc and hands them out from memory. Numbers are
+    unique across workers; they are only monotonic within a process.
+    """
+
+    def __init__(self):
+        # (venue_id, entity_type) -> [next, last] of the reserved block
+        self._blocks: Dict[Tuple[str, str], List[int]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    def _take(self, key: Tuple[str, str]) -> Optional[int]:
+        block = self._blocks.get(key)
+        if block and block[0] <= block[1]:
+            seq = block[0]
+            block[0] += 1
+            return seq
+        return None
+
+    async def next(self, db, venue_id: str, entity_type: str, block_size: int = 1) -> int:
+        key = (venue_id, entity_type)
+        seq = self._take(key)
+        if seq is not None:
+            return seq
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another coroutine may have refilled while we waited
+            seq = self._take(key)
+            if seq is not None:
+                return seq
+
+            return await self._reserve(db, key, max(int(block_size), 1))
+
+    async def next_many(self, db, venue_id: str, entity_type: str, count: int, block_size: int = 1) -> List[int]:
+        """``count`` numbers for one batch with at most one counter round trip."""
+        key = (venue_id, entity_type)
+        seqs: List[int] = []
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            while len(seqs) < count:
+                seq = self._take(key)
+                if seq is None:
+                    break
+                seqs.append(seq)
+            missing = count - len(seqs)
+            if missing > 0:
+                # Reserve the shortfall (or a full block if larger) in one $inc
+                first = await self._reserve(db, key, max(int(block_size), missing))
+                seqs.append(first)
+                seqs.extend(self._take(key) for _ in range(missing - 1))
+        return seqs
+
+    async def _reserve(self, db, key: Tuple[str, str], size: int) -> int:
+        """Reserve ``size`` numbers; returns the first and keeps the rest as the block."""
+        venue_id, entity_type = key
+        result = await db.counters.find_one_and_update(
+            {"venue_id": venue_id, "entity_type": entity_type},
+            {"$inc": {"seq": size}},
+            upsert=True,
+            return_document=True,
+            projection={"_id": 0, "seq": 1}
+        )
+        last = int((result or {}).get("seq", size))
+        self._blocks[key] = [last - size + 2, last]
+        return last - size + 1
+
+    async def ensure_floor(self, db, venue_id: str, entity_type: str, floor: int):
+        """Make sure the counter never hands out numbers <= floor (adopting legacy data)."""
+        await db.counters.update_one(
+            {"venue_id": venue_id, "entity_type": entity_type},
+            {"$max": {"seq": int(floor)}},
+            upsert=True
+        )
+        block = self._blocks.get((venue_id, entity_type))
+        if block and block[0] <= floor:
+            self._blocks.pop((venue_id, entity_type), None)
+
+
+sequence_allocator = SequenceAllocator()
+
+
+def format_display_id(config: Dict[str, Any], seq: int) -> str:
+    # Format: PREFIX-00001
+    return f"{config['prefix']}{config['separator']}{str(seq).zfill(config['width'])}"
+
 
 async def next_display_id(db, venue_id: str, entity_type: str) -> str:
     """Generate next display_id using venue configuration"""
     config = await get_numbering_config(db, venue_id, entity_type)
-    
-    # Atomic counter
-    result = await db.counters.find_one_and_update(
-        {"venue_id": venue_id, "entity_type": entity_type},
-        {"$inc": {"seq": 1}},
-        upsert=True,
-        return_document=True,
-        projection={"_id": 0, "seq": 1}
-    )
-    
-    seq = int(result.get("seq", 1))
-    width = config["width"]
-    
-    # Format: PREFIX-00001
-    return f"{config['prefix']}{config['separator']}{str(seq).zfill(width)}"
+    seq = await sequence_allocator.next(db, venue_id, entity_type, config["block"])
+    return format_display_id(config, seq)
+
+async def next_display_ids(db, venue_id: str, entity_type: str, count: int) -> List[str]:
+    """Pre-allocate ``count`` display_ids for a batch insert (one counter round trip at most)"""
+    if count <= 0:
+        return []
+    config = await get_numbering_config(db, venue_id, entity_type)
+    seqs = await sequence_allocator.next_many(db, venue_id, entity_type, count, config["block"])
+    return [format_display_id(config, seq) for seq in seqs]
 
 async def ensure_ids(db, entity_type: str, doc: Dict[str, Any], venue_id: str) -> Dict[str, Any]:
     """Ensure entity has id and display_id (UNS)"""
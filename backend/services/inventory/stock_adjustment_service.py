@@ -7,6 +7,7 @@ from core.venue_config import VenueConfigRepo
 from core.events_outbox import Outbox
 from models.stock_adjustment import StockAdjustment
 from core.uns import IDService
+from inventory.services.stock_ledger_service import StockLedgerService
 
 
 class StockAdjustmentService:
@@ -76,7 +77,7 @@ class StockAdjustmentService:
                 entry_hash=entry_hash
             )
             
-            await db.stock_ledger.insert_one(entry.model_dump())
+            await StockLedgerService(db).append_entry(entry.model_dump())
             await db.idempotency_keys.insert_one({"venue_id": venue_id, "key": idempotency_key})
             
             # Update stock
@@ -98,7 +99,7 @@ class StockAdjustmentService:
         
         # Emit event
         outbox = Outbox(db)
-        outbox.emit(venue_id, "inventory.adjustment.locked", f"ADJ:{adjustment_id}", {
+        await outbox.publish(venue_id, "inventory.adjustment.locked", f"ADJ:{adjustment_id}", {
             "adjustment_id": adjustment_id,
             "venue_id": venue_id
         })
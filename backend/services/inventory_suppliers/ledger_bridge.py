@@ -2,6 +2,7 @@
 from datetime import datetime, timezone
 
 from core.database import db
+from inventory.services.stock_ledger_service import StockLedgerService
 from models import LedgerAction, StockLedgerEntry
 from services.event_bus import event_handler
 from utils.helpers import compute_hash
@@ -61,7 +62,7 @@ async def handle_pos_order_closed(event: dict):
                 entry_hash=entry_hash
             )
             
-            await db.stock_ledger.insert_one(entry.model_dump())
+            await StockLedgerService(db).append_entry(entry.model_dump())
             
             # Update current stock
             await db.inventory_items.update_one(
@@ -2,6 +2,7 @@
 from datetime import datetime, timezone
 
 from core.database import db
+from inventory.services.stock_ledger_service import StockLedgerService
 from models.receiving_grn import ReceivingGRN, GRNLine
 from services.id_service import ensure_ids
 from services.event_bus import event_bus
@@ -100,7 +101,7 @@ class ReceivingService:
                 entry_hash=entry_hash
             )
             
-            await db.stock_ledger.insert_one(entry.model_dump())
+            await StockLedgerService(db).append_entry(entry.model_dump())
             
             # Update current stock
             await db.inventory_items.update_one(
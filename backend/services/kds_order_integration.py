@@ -22,17 +22,8 @@ class KdsOrderIntegration:
         if not order:
             raise ValueError(f"Order {order_id} not found")
         
-        # Group items by station
-        station_items = {}
-        
-        for item in order.get("items", []):
-            # Get stations for this item
-            stations = await self.routing_service.get_stations_for_item(venue_id, item)
-            
-            for station_key in stations:
-                if station_key not in station_items:
-                    station_items[station_key] = []
-                station_items[station_key].append(item)
+        # Group items by station (compiled routing table, no per-item queries)
+        station_items = await self.routing_service.route_order(venue_id, order.get("items", []))
         
         # Create tickets for each station
         created_tickets = []
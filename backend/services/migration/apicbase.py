@@ -583,6 +583,11 @@ class ApicbaseAdapter(BaseMigrationAdapter):
                 print(f"Error processing item {item}: {e}")
                 errors += 1
         
+        if processed:
+            # Imported prices feed straight into recipe costs
+            from services.recipe_cost_graph import recost_venue
+            await recost_venue(db, self.venue_id)
+
         return {
             "status": "completed",
             "summary": f"Processed {processed} Inventory Items. {errors} errors.",
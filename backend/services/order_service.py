@@ -3,7 +3,9 @@ import uuid
 import logging
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional, Tuple
-from services.id_service import ensure_ids
+from pymongo import UpdateOne
+from services.catalog_snapshot import get_catalog
+from services.id_service import next_display_ids
 from utils.helpers import _rid, _step_log, calculate_risk_score
 
 logger = logging.getLogger(__name__)
@@ -71,7 +73,7 @@ async def process_send_order(
         table_id = order.get("table_id") or "NO_TABLE"
         table_name = order.get("table_name", "Unknown")
         
-        prep_groups = await _group_items_by_prep_area(db, items, round_seq)
+        prep_groups = await _group_items_by_prep_area(db, items, round_seq, venue_id)
         _step_log(request, "ROUTED", {"groups": len(prep_groups)})
         
         # Determine if we can use transactions
@@ -174,29 +176,45 @@ async def _commit_order_send(
     }
 
 
-async def _group_items_by_prep_area(db, items: List[dict], round_seq: int) -> Dict[str, dict]:
-    """Group items by prep area and course"""
+def _session_kw(session) -> Dict[str, Any]:
+    """Pass the transaction session only when there is one (MockDatabase has none)."""
+    return {"session": session} if session else {}
+
+
+async def _group_items_by_prep_area(
+    db, items: List[dict], round_seq: int, venue_id: Optional[str] = None
+) -> Dict[str, dict]:
+    """Group items by prep area and course (venue catalog snapshot; one $in read for any misses)"""
     now = datetime.now(timezone.utc).isoformat()
     prep_groups = {}
+
+    pending = [item for item in items if item.get("status") == "pending"]
+    menu_item_ids = {item.get("menu_item_id") or item.get("item_id") for item in pending} - {None, ""}
+    menu_items = {}
+    if venue_id and menu_item_ids:
+        catalog = await get_catalog(db, venue_id)
+        menu_items = {i: catalog.items[i] for i in menu_item_ids if i in catalog.items}
+    missing = menu_item_ids - menu_items.keys()
+    if missing:
+        cursor = db.menu_items.find(
+            {"id": {"$in": list(missing)}},
+            {"_id": 0, "id": 1, "prep_area": 1, "prep_time_seconds": 1}
+        )
+        for menu_item in await cursor.to_list(None):
+            menu_items.setdefault(menu_item["id"], menu_item)
     
-    for item in items:
-        if item.get("status") != "pending":
-            continue
-        
+    for item in pending:
         item["status"] = "sent"
         item["sent_at"] = now
         item["round_no"] = round_seq
         
         # Determine station
-        menu_item_id = item.get("menu_item_id") or item.get("item_id")
+        menu_item = menu_items.get(item.get("menu_item_id") or item.get("item_id"))
         prep_area = "kitchen"
         target_prep_seconds = 900  # Default 15 min
-        
-        if menu_item_id:
-            menu_item = await db.menu_items.find_one({"id": menu_item_id}, {"_id": 0})
-            if menu_item:
-                prep_area = menu_item.get("prep_area", "kitchen")
-                target_prep_seconds = menu_item.get("prep_time_seconds", 900)
+        if menu_item:
+            prep_area = menu_item.get("prep_area", "kitchen")
+            target_prep_seconds = menu_item.get("prep_time_seconds", 900)
         
         course = item.get("course", 1)
         key = f"{prep_area}_{course}"
@@ -228,10 +246,18 @@ async def _create_kds_tickets(
     table_id: str, table_name: str, round_seq: int, 
     round_label: str, settings: dict, now: str, session=None
 ) -> List[str]:
-    """Create KDS tickets for each prep group"""
-    ticket_ids = []
-    
-    for key, group in prep_groups.items():
+    """Create KDS tickets for each prep group (display_ids pre-allocated, one insert_many)"""
+    if not prep_groups:
+        return []
+
+    display_ids: List[Optional[str]] = [None] * len(prep_groups)
+    try:
+        display_ids = await next_display_ids(db, venue_id, "kds_ticket", len(prep_groups))
+    except Exception as e:
+        logger.warning(f"display_id allocation failed for kds_ticket: {e}")
+
+    ticket_docs = []
+    for group, display_id in zip(prep_groups.values(), display_ids):
         ticket_doc = {
             "id": str(uuid.uuid4()),
             "venue_id": venue_id,
@@ -249,132 +275,130 @@ async def _create_kds_tickets(
             "pass_approved": False,
             "created_at": now
         }
-        
-        try:
-            # ensure_ids performs find_one_and_update. We might skip session mapping here since it handles sequential IDs
-            ticket_doc = await ensure_ids(db, "kds_ticket", ticket_doc, venue_id)
-        except Exception as e:
-            logger.warning(f"ensure_ids failed for kds_ticket: {e}")
-        
-        if session:
-            await db.kds_tickets.insert_one(ticket_doc, session=session)
-        else:
-            await db.kds_tickets.insert_one(ticket_doc)
-            
-        ticket_ids.append(ticket_doc["id"])
-    
-    return ticket_ids
+        if display_id:
+            ticket_doc["display_id"] = display_id
+        ticket_docs.append(ticket_doc)
+
+    await db.kds_tickets.insert_many(ticket_docs, **_session_kw(session))
+    return [doc["id"] for doc in ticket_docs]
+
+
+def _print_job_content(group: dict, table_name: str, round_label: str) -> str:
+    lines = [
+        f"========== {round_label.upper()} ==========",
+        f"TABLE: {table_name}",
+        f"Course: {group['course']}",
+        "-" * 30,
+    ]
+    for item in group["items"]:
+        lines.append(f"{item.get('quantity', 1)}x {item.get('menu_item_name', 'Item')}")
+
+        # Modifiers
+        mods = item.get("modifiers", [])
+        if mods and isinstance(mods, list):
+            if isinstance(mods[0], dict):
+                lines.append(f"   MOD: {', '.join(m.get('name', str(m)) for m in mods)}")
+            else:
+                lines.append(f"   MOD: {', '.join(str(m) for m in mods)}")
+
+        if item.get("notes"):
+            lines.append(f"   NOTE: {item['notes']}")
+
+        lines.append(f"   Seat: {item.get('seat_no', 1)}")
+    lines.append("=" * 30)
+    return "\n".join(lines) + "\n"
 
 
 async def _create_print_jobs(
     db, prep_groups: dict, venue_id: str, order_id: str, 
     table_name: str, round_label: str, round_seq: int, now: str, session=None
 ) -> List[str]:
-    """Create print jobs for each prep group"""
-    print_job_ids = []
-    
-    for key, group in prep_groups.items():
-        content = f"========== {round_label.upper()} ==========\n"
-        content += f"TABLE: {table_name}\n"
-        content += f"Course: {group['course']}\n"
-        content += "-" * 30 + "\n"
-        
-        for item in group["items"]:
-            content += f"{item.get('quantity', 1)}x {item.get('menu_item_name', 'Item')}\n"
-            
-            # Modifiers
-            mods = item.get("modifiers", [])
-            if mods:
-                if isinstance(mods, list) and len(mods) > 0:
-                    if isinstance(mods[0], dict):
-                        mod_names = [m.get("name", str(m)) for m in mods]
-                        content += f"   MOD: {', '.join(mod_names)}\n"
-                    else:
-                        content += f"   MOD: {', '.join(str(m) for m in mods)}\n"
-            
-            if item.get("notes"):
-                content += f"   NOTE: {item['notes']}\n"
-            
-            content += f"   Seat: {item.get('seat_no', 1)}\n"
-        
-        content += "=" * 30 + "\n"
-        
-        print_job_doc = {
+    """Create print jobs for each prep group (one insert_many)"""
+    print_job_docs = [
+        {
             "id": str(uuid.uuid4()),
             "venue_id": venue_id,
             "order_id": order_id,
             "printer_zone": group["prep_area"],
-            "content": content,
+            "content": _print_job_content(group, table_name, round_label),
             "status": "pending",
             "idempotency_key": f"{order_id}_{key}_{round_seq}_{now}",
             "created_at": now
         }
-        
-        if session:
-            await db.print_jobs.insert_one(print_job_doc, session=session)
-        else:
-            await db.print_jobs.insert_one(print_job_doc)
-            
-        print_job_ids.append(print_job_doc["id"])
-    
-    return print_job_ids
+        for key, group in prep_groups.items()
+    ]
+    if not print_job_docs:
+        return []
+
+    await db.print_jobs.insert_many(print_job_docs, **_session_kw(session))
+    return [doc["id"] for doc in print_job_docs]
 
 
 async def _deduct_stock(db, items: List[dict], venue_id: str, order_id: str, user_id: str, session=None):
     """
     Deduct stock for order items based on Recipes.
     If no recipe exists, checks simple Menu-Inventory links.
+
+    Recipes and links come from the venue catalog snapshot; menu items the
+    snapshot doesn't know fall back to one $in read each for recipes and
+    links. The per-SKU totals are applied with a single bulk_write.
     """
+    sold: Dict[str, float] = {}
     for item in items:
         menu_item_id = item.get("menu_item_id")
-        qty_sold = item.get("quantity", 1)
-        
-        # 1. Try to find a Recipe
-        if session:
-            recipe = await db.recipes.find_one({"menu_item_id": menu_item_id, "venue_id": venue_id}, {"_id": 0}, session=session)
-        else:
-            recipe = await db.recipes.find_one({"menu_item_id": menu_item_id, "venue_id": venue_id}, {"_id": 0})
-        
-        if recipe:
-            # Deduct via Recipe Components
-            for comp in recipe.get("components", []):
-                inv_item_id = comp.get("item_id")
-                deduct_qty = comp.get("qty", 0) * qty_sold
-                
-                if session:
-                    await db.inventory_items.update_one(
-                        {"id": inv_item_id, "venue_id": venue_id},
-                        {"$inc": {"quantity": -deduct_qty}},
-                        session=session
-                    )
-                else:
-                    await db.inventory_items.update_one(
-                        {"id": inv_item_id, "venue_id": venue_id},
-                        {"$inc": {"quantity": -deduct_qty}}
-                    )
-        else:
-            # 2. Fallback: Check simple 1:1 links (menu_item_inventory)
-            if session:
-                cursor = db.menu_item_inventory.find({"menu_item_id": menu_item_id}, {"_id": 0}, session=session)
-            else:
-                cursor = db.menu_item_inventory.find({"menu_item_id": menu_item_id}, {"_id": 0})
-            links = await cursor.to_list(100)
-            
-            for link in links:
-                inv_item_id = link.get("inventory_item_id")
-                deduct_qty = link.get("quantity", 1) * qty_sold
-                
-                if session:
-                    await db.inventory_items.update_one(
-                        {"id": inv_item_id, "venue_id": venue_id},
-                        {"$inc": {"quantity": -deduct_qty}},
-                        session=session
-                    )
+        if menu_item_id:
+            sold[menu_item_id] = sold.get(menu_item_id, 0) + item.get("quantity", 1)
+
+    recipes: Dict[str, dict] = {}
+    links: List[dict] = []
+    uncatalogued = list(sold)
+    if sold:
+        catalog = await get_catalog(db, venue_id)
+        uncatalogued = [menu_item_id for menu_item_id in sold if menu_item_id not in catalog.items]
+        for menu_item_id in sold:
+            if menu_item_id in catalog.items:
+                recipe = catalog.recipe_for(menu_item_id)
+                if recipe:
+                    recipes[menu_item_id] = recipe
                 else:
-                    await db.inventory_items.update_one(
-                        {"id": inv_item_id, "venue_id": venue_id},
-                        {"$inc": {"quantity": -deduct_qty}}
-                    )
+                    links.extend(catalog.inventory_links(menu_item_id))
+
+    if uncatalogued:
+        # 1. Recipes for every menu item in the send
+        cursor = db.recipes.find(
+            {"menu_item_id": {"$in": uncatalogued}, "venue_id": venue_id},
+            {"_id": 0, "menu_item_id": 1, "components": 1},
+            **_session_kw(session)
+        )
+        for recipe in await cursor.to_list(None):
+            recipes.setdefault(recipe["menu_item_id"], recipe)
+
+        # 2. Fallback: simple 1:1 links (menu_item_inventory) for items without a recipe
+        unlinked = [menu_item_id for menu_item_id in uncatalogued if menu_item_id not in recipes]
+        if unlinked:
+            cursor = db.menu_item_inventory.find(
+                {"menu_item_id": {"$in": unlinked}}, {"_id": 0}, **_session_kw(session)
+            )
+            links.extend(await cursor.to_list(None))
+
+    deductions: Dict[str, float] = {}
+    for menu_item_id, recipe in recipes.items():
+        for comp in recipe.get("components", []):
+            inv_item_id = comp.get("item_id")
+            if inv_item_id:
+                deductions[inv_item_id] = deductions.get(inv_item_id, 0) + comp.get("qty", 0) * sold[menu_item_id]
+    for link in links:
+        inv_item_id = link.get("inventory_item_id")
+        if inv_item_id:
+            deductions[inv_item_id] = deductions.get(inv_item_id, 0) + link.get("quantity", 1) * sold[link["menu_item_id"]]
+
+    # 3. One aggregated decrement per SKU
+    requests = [
+        UpdateOne({"id": inv_item_id, "venue_id": venue_id}, {"$inc": {"quantity": -qty}})
+        for inv_item_id, qty in deductions.items() if qty
+    ]
+    if requests:
+        await db.inventory_items.bulk_write(requests, ordered=False, **_session_kw(session))
 
     # Log the stock deduction event
     inv_transaction = {
@@ -385,10 +409,7 @@ async def _deduct_stock(db, items: List[dict], venue_id: str, order_id: str, use
         "created_at": datetime.now(timezone.utc).isoformat(),
         "created_by": user_id
     }
-    if session:
-        await db.inventory_transactions.insert_one(inv_transaction, session=session)
-    else:
-        await db.inventory_transactions.insert_one(inv_transaction)
+    await db.inventory_transactions.insert_one(inv_transaction, **_session_kw(session))
 
 
 async def transfer_order_to_table(db, order_id: str, new_table_id: str, current_user: dict) -> Tuple[bool, Dict[str, Any]]:
@@ -103,27 +103,62 @@ ROLE_DEFAULT_PERMISSIONS = {
     "host": {"EMPLOYEES_VIEW_SELF", "SHIFTS_VIEW_SELF"}
 }
 
-def effective_permissions(user_role: str, venue_settings: dict = None) -> set:
+# Permission key -> bit; keys granted by venue overrides but unknown here get the next free bit
+PERMISSION_BITS = {key: 1 << i for i, key in enumerate(PERMISSION_KEYS)}
+
+# (role, deny, grant) -> resolved permissions; roles and overrides are few, requests are many
+_resolved_cache = {}
+
+
+def _permission_bit(key: str) -> int:
+    bit = PERMISSION_BITS.get(key)
+    if bit is None:
+        bit = PERMISSION_BITS[key] = 1 << len(PERMISSION_BITS)
+    return bit
+
+
+def _resolve(user_role: str, venue_settings: dict = None):
+    """(frozenset, bitset) of a role's permissions under the venue's overrides, memoized."""
+    deny = grant = ()
+    if venue_settings:
+        overrides = venue_settings.get("policy", {}).get("permissions_overrides", {}).get(user_role, {})
+        deny = tuple(sorted(set(overrides.get("deny", []))))
+        grant = tuple(sorted(set(overrides.get("grant", []))))
+
+    key = (user_role, deny, grant)
+    resolved = _resolved_cache.get(key)
+    if resolved is None:
+        # Get base permissions for role
+        perms = set(ROLE_DEFAULT_PERMISSIONS.get(user_role.lower(), set()))
+        # Apply deny first, then grant
+        perms -= set(deny)
+        perms |= set(grant)
+        bits = 0
+        for perm in perms:
+            bits |= _permission_bit(perm)
+        resolved = _resolved_cache[key] = (frozenset(perms), bits)
+    return resolved
+
+
+def effective_permissions(user_role: str, venue_settings: dict = None) -> frozenset:
     """
     Calculate effective permissions for a user role
     1. Start with role defaults
     2. Apply venue-specific overrides (deny first, then grant)
+    The result is shared between callers, hence immutable.
     """
-    # Get base permissions for role
-    base_perms = ROLE_DEFAULT_PERMISSIONS.get(user_role.lower(), set()).copy()
-    
-    # Apply venue overrides if present
-    if venue_settings:
-        overrides = venue_settings.get("policy", {}).get("permissions_overrides", {}).get(user_role, {})
-        deny = set(overrides.get("deny", []))
-        grant = set(overrides.get("grant", []))
-        
-        # Apply deny first
-        base_perms -= deny
-        # Then apply grant
-        base_perms |= grant
-    
-    return base_perms
+    return _resolve(user_role, venue_settings)[0]
+
+
+def permission_bits(user_role: str, venue_settings: dict = None) -> int:
+    """Effective permissions as a bitset over PERMISSION_BITS."""
+    return _resolve(user_role, venue_settings)[1]
+
+
+def has_permission(bits: int, key: str) -> bool:
+    bit = PERMISSION_BITS.get(key)
+    return bit is not None and bool(bits & bit)
+
 
 # ==================== TABLE SCHEMAS (Permission-gated columns) ====================
 TABLE_SCHEMAS = {
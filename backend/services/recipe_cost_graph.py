@@ -0,0 +1,328 @@
+"""Recipe cost graph
+
+A venue's recipes, their sub-recipes and the inventory items they consume form
+a graph keyed on normalized names (trimmed, whitespace-collapsed, casefolded):
+the same matching the old anchored case-insensitive ``$regex`` lookups did,
+resolved in memory from one read of each collection instead of an unindexed
+scan per ingredient line.
+
+Costs and inherited allergens are computed children-first (Tarjan SCC order),
+so a sub-recipe's fresh ``cost_per_serving`` feeds its parents in the same
+pass. Recipes on a sub-recipe cycle are reported and left alone; their parents
+use the cycle member's stored cost. ``recost_for_inventory_change`` recosts
+only the recipes that reach a changed inventory item, and only ``cost_analysis``
+docs that actually changed are written back, in one ``bulk_write``.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from models.recipe_engineering import RecipeCostAnalysis
+
+logger = logging.getLogger(__name__)
+
+_RECIPE_FIELDS = {
+    "_id": 0, "id": 1, "recipe_name": 1, "ingredients": 1, "servings": 1, "sell_price": 1,
+    "active": 1, "deleted_at": 1, "allergens": 1, "cost_analysis": 1,
+}
+_INVENTORY_FIELDS = {"_id": 0, "id": 1, "name": 1, "item_name": 1, "cost": 1, "allergens": 1}
+
+
+def normalize_name(name) -> str:
+    """Match key for recipe and inventory names ("  Tomato  Sauce" == "tomato sauce")."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def _ingredient_key(ing: dict) -> str:
+    return normalize_name(ing.get("name", ing.get("item_name", "")))
+
+
+def _allergen_set(value) -> Set[str]:
+    # Recipes store {"Celery": true, ...}; inventory items a plain list
+    if isinstance(value, dict):
+        return {k for k, v in value.items() if v}
+    if isinstance(value, (list, tuple, set)):
+        return {a for a in value if a}
+    return set()
+
+
+def _strongly_connected(nodes: Iterable[str], children: Dict[str, List[str]]) -> List[List[str]]:
+    """Iterative Tarjan: components come out children-first (reverse topological order)."""
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components: List[List[str]] = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(children.get(root, ())))]
+        while work:
+            node, pending = work[-1]
+            for child in pending:
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(children.get(child, ()))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+class RecipeCostGraph:
+    """Recipes -> sub-recipes -> inventory items for one venue, in dependency order."""
+
+    def __init__(self, recipes: List[dict], inventory_items: List[dict]):
+        self.recipes: Dict[str, dict] = {}
+        self.recipe_by_key: Dict[str, dict] = {}
+        for recipe in recipes:
+            if not recipe.get("id") or recipe.get("deleted_at"):
+                continue
+            self.recipes[recipe["id"]] = recipe
+            # Only active recipes are costed as sub-recipes; first one per name wins like find_one
+            if recipe.get("active", True):
+                self.recipe_by_key.setdefault(normalize_name(recipe.get("recipe_name")), recipe)
+
+        self.inventory_by_key: Dict[str, dict] = {}
+        self.inventory_by_id: Dict[str, dict] = {}
+        for item in inventory_items:
+            if item.get("id"):
+                self.inventory_by_id[item["id"]] = item
+            for field in ("name", "item_name"):
+                key = normalize_name(item.get(field))
+                if key:
+                    self.inventory_by_key.setdefault(key, item)
+
+        self.children: Dict[str, List[str]] = {}
+        self.parents: Dict[str, Set[str]] = {}
+        self.item_users: Dict[str, Set[str]] = {}
+        for recipe_id, recipe in self.recipes.items():
+            subs = []
+            for ing in recipe.get("ingredients") or []:
+                key = _ingredient_key(ing)
+                if ing.get("type", "ingredient") == "sub_recipe":
+                    sub = self.recipe_by_key.get(key)
+                    if sub is not None:
+                        subs.append(sub["id"])
+                        self.parents.setdefault(sub["id"], set()).add(recipe_id)
+                elif key:
+                    self.item_users.setdefault(key, set()).add(recipe_id)
+            self.children[recipe_id] = list(dict.fromkeys(subs))
+
+        self.order: List[str] = []
+        self.cyclic: Set[str] = set()
+        self.cycles: List[List[str]] = []
+        components = _strongly_connected(self.recipes, self.children)
+        for component in components:
+            if len(component) > 1 or component[0] in self.children[component[0]]:
+                self.cyclic.update(component)
+                self.cycles.append(sorted(self.recipes[r].get("recipe_name") or r for r in component))
+            self.order.extend(component)
+        if self.cycles:
+            logger.warning("Recipe cost graph has %d sub-recipe cycle(s): %s", len(self.cycles), self.cycles)
+
+        self.allergens = self._close_allergens(components)
+
+    def _close_allergens(self, components: List[List[str]]) -> Dict[str, FrozenSet[str]]:
+        """Own + everything inherited through sub-recipes; a cycle shares one set."""
+        closed: Dict[str, FrozenSet[str]] = {}
+        for component in components:
+            members = set(component)
+            found: Set[str] = set()
+            for recipe_id in component:
+                found |= _allergen_set(self.recipes[recipe_id].get("allergens"))
+                found |= self._inherited(self.recipes[recipe_id], closed, skip=members)
+            for recipe_id in component:
+                closed[recipe_id] = frozenset(found)
+        return closed
+
+    def _inherited(self, recipe: dict, closed: Dict[str, FrozenSet[str]], skip: Set[str] = frozenset()) -> Set[str]:
+        found: Set[str] = set()
+        for ing in recipe.get("ingredients") or []:
+            key = _ingredient_key(ing)
+            if ing.get("type", "ingredient") == "sub_recipe":
+                sub = self.recipe_by_key.get(key)
+                if sub is not None and sub["id"] not in skip:
+                    found |= closed.get(sub["id"], frozenset())
+            else:
+                found |= _allergen_set((self.inventory_by_key.get(key) or {}).get("allergens"))
+        return found
+
+    def inherited_allergens(self, recipe: dict) -> Set[str]:
+        """Allergens a recipe picks up from its ingredients and (transitively) its sub-recipes."""
+        return self._inherited(recipe, self.allergens)
+
+    # ---------- costing ----------
+
+    def unit_cost(self, ing: dict, fresh: Optional[Dict[str, RecipeCostAnalysis]] = None) -> float:
+        key = _ingredient_key(ing)
+        if ing.get("type", "ingredient") == "sub_recipe":
+            sub = self.recipe_by_key.get(key)
+            if sub is None:
+                return 0.0
+            if fresh and sub["id"] in fresh:
+                return fresh[sub["id"]].cost_per_serving
+            return (sub.get("cost_analysis") or {}).get("cost_per_serving", 0)
+        item = self.inventory_by_key.get(key)
+        return (item.get("cost", 0) or 0) if item else 0.0
+
+    def cost_ingredients(self, ingredients: list, servings: float, sell_price: float = 0,
+                         labor_cost: float = None, overhead_cost: float = None, markup_percentage: float = None,
+                         fresh: Optional[Dict[str, RecipeCostAnalysis]] = None) -> RecipeCostAnalysis:
+        total_cost = 0.0
+        costed_ingredients = []
+
+        for ing in ingredients:
+            net_qty = ing.get("net_qty", ing.get("quantity", 0))
+            waste_pct = ing.get("waste_pct", 0)
+            unit_cost = self.unit_cost(ing, fresh)
+
+            # Adjust for waste
+            effective_qty = net_qty * (1 + waste_pct / 100) if waste_pct > 0 else net_qty
+            line_cost = effective_qty * unit_cost
+
+            costed_ingredients.append({
+                **ing,
+                "unit_cost": unit_cost,
+                "total_cost": round(line_cost, 4),
+                "effective_qty": round(effective_qty, 4),
+            })
+            total_cost += line_cost
+
+        cost_per_serving = total_cost / servings if servings > 0 else 0
+        food_cost_pct = (total_cost / sell_price * 100) if sell_price > 0 else None
+        suggested = cost_per_serving * (1 + (markup_percentage or 0) / 100) if markup_percentage else None
+
+        return RecipeCostAnalysis(
+            total_cost=round(total_cost, 2),
+            cost_per_serving=round(cost_per_serving, 4),
+            ingredient_costs=costed_ingredients,
+            labor_cost=labor_cost,
+            overhead_cost=overhead_cost,
+            markup_percentage=markup_percentage,
+            suggested_price=round(suggested, 2) if suggested else None,
+            food_cost_pct=round(food_cost_pct, 2) if food_cost_pct else None,
+        )
+
+    def cost_recipe(self, recipe: dict, fresh: Optional[Dict[str, RecipeCostAnalysis]] = None) -> RecipeCostAnalysis:
+        # Labor/overhead/markup are only kept on the stored analysis; carry them over
+        stored = recipe.get("cost_analysis") or {}
+        return self.cost_ingredients(
+            recipe.get("ingredients") or [],
+            recipe.get("servings", 1),
+            recipe.get("sell_price", 0),
+            labor_cost=stored.get("labor_cost"),
+            overhead_cost=stored.get("overhead_cost"),
+            markup_percentage=stored.get("markup_percentage"),
+            fresh=fresh,
+        )
+
+    def recompute(self, targets: Optional[Iterable[str]] = None) -> Dict[str, RecipeCostAnalysis]:
+        """Cost ``targets`` (default: every recipe) children-first; cycle members are skipped."""
+        wanted = None if targets is None else set(targets)
+        fresh: Dict[str, RecipeCostAnalysis] = {}
+        for recipe_id in self.order:
+            if (wanted is None or recipe_id in wanted) and recipe_id not in self.cyclic:
+                fresh[recipe_id] = self.cost_recipe(self.recipes[recipe_id], fresh)
+        return fresh
+
+    # ---------- affected subtrees ----------
+
+    def _closure(self, start: Iterable[str], edges: Dict[str, Iterable[str]]) -> Set[str]:
+        seen: Set[str] = set()
+        frontier = [r for r in start if r in self.recipes]
+        while frontier:
+            recipe_id = frontier.pop()
+            if recipe_id in seen:
+                continue
+            seen.add(recipe_id)
+            frontier.extend(edges.get(recipe_id, ()))
+        return seen
+
+    def subtree(self, recipe_id: str) -> Set[str]:
+        """The recipe and every sub-recipe below it."""
+        return self._closure([recipe_id], self.children)
+
+    def dependents(self, recipe_ids: Iterable[str]) -> Set[str]:
+        """The recipes and everything that uses them, directly or through sub-recipes."""
+        return self._closure(recipe_ids, self.parents)
+
+    def affected_by_inventory(self, inventory_item_ids: Iterable[str]) -> Set[str]:
+        direct: Set[str] = set()
+        for item_id in inventory_item_ids:
+            item = self.inventory_by_id.get(item_id) or {}
+            for field in ("name", "item_name"):
+                direct |= self.item_users.get(normalize_name(item.get(field)), set())
+        return self.dependents(direct)
+
+
+async def load_cost_graph(db, venue_id: str) -> RecipeCostGraph:
+    """One read of the venue's recipes and one of its inventory items."""
+    recipes = await db.recipes.find({"venue_id": venue_id}, _RECIPE_FIELDS).to_list(None)
+    items = await db.inventory_items.find({"venue_id": venue_id}, _INVENTORY_FIELDS).to_list(None)
+    return RecipeCostGraph(recipes, items)
+
+
+async def write_cost_changes(db, venue_id: str, graph: RecipeCostGraph,
+                             fresh: Dict[str, RecipeCostAnalysis]) -> int:
+    """Bulk-write the cost_analysis docs that differ from what is stored; returns how many."""
+    now = datetime.now(timezone.utc).isoformat()
+    requests = []
+    for recipe_id, analysis in fresh.items():
+        doc = analysis.model_dump()
+        if doc != graph.recipes[recipe_id].get("cost_analysis"):
+            requests.append(UpdateOne(
+                {"id": recipe_id, "venue_id": venue_id},
+                {"$set": {"cost_analysis": doc, "updated_at": now}}
+            ))
+    if requests:
+        await db.recipes.bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+async def _recost(db, venue_id: str, graph: RecipeCostGraph, targets: Set[str]) -> Dict[str, object]:
+    active = {r for r in targets if graph.recipes[r].get("active", True)}
+    fresh = graph.recompute(active)
+    changed = await write_cost_changes(db, venue_id, graph, fresh)
+    return {"recomputed": len(fresh), "changed": changed, "cycles": graph.cycles}
+
+
+async def recost_venue(db, venue_id: str) -> Dict[str, object]:
+    """Recompute every active recipe of the venue in dependency order."""
+    graph = await load_cost_graph(db, venue_id)
+    return await _recost(db, venue_id, graph, set(graph.recipes))
+
+
+async def recost_for_inventory_change(db, venue_id: str, inventory_item_ids: Iterable[str]) -> Dict[str, object]:
+    """After inventory cost changes: recost only the recipes that (transitively) use those items."""
+    graph = await load_cost_graph(db, venue_id)
+    return await _recost(db, venue_id, graph, graph.affected_by_inventory(inventory_item_ids))
+
+
+async def recost_dependents(db, venue_id: str, recipe_ids: Iterable[str]) -> Dict[str, object]:
+    """After recipes were recosted: bring every recipe that uses them up to date."""
+    graph = await load_cost_graph(db, venue_id)
+    ids = list(recipe_ids)
+    return await _recost(db, venue_id, graph, graph.dependents(ids) - set(ids))
@@ -14,6 +14,7 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timezone
 import logging
+import os
 from services.updates_service import UpdatesService
 
 logger = logging.getLogger(__name__)
@@ -27,12 +28,12 @@ class ScheduledTasksService:
         """Start all scheduled tasks"""
         logger.info('🕐 Starting scheduled tasks...')
         
-        # Daily idempotency cleanup (2 AM)
+        # Daily legacy idempotency cleanup (2 AM); new keys expire via TTL index
         self.scheduler.add_job(
             self.cleanup_idempotency_keys,
             CronTrigger(hour=2, minute=0),
             id='cleanup_idempotency',
-            name='Cleanup expired idempotency keys',
+            name='Cleanup legacy idempotency keys',
             replace_existing=True
         )
         
@@ -191,10 +192,14 @@ class ScheduledTasksService:
     # ============= BACKUP JOBS =============
     
     async def create_daily_backup(self):
-        """Create daily full snapshot backup"""
+        """Create daily backup: full snapshot, or base + increments with BACKUP_MODE=incremental"""
         try:
             from services.backup_service import BackupService
             backup_service = BackupService(self.db)
+            if os.getenv("BACKUP_MODE", "snapshot").lower() == "incremental":
+                result = await backup_service.create_incremental_backup()
+                logger.info(f'💾 Daily {result["type"]} backup created: {result["backup_id"]} ({result["docs"]} docs)')
+                return result
             result = await backup_service.create_snapshot()
             logger.info(f'💾 Daily backup created: {result["snapshot_id"]}')
             return result
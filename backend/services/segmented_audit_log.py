@@ -0,0 +1,433 @@
+"""
+Segmented Audit Log - Append-only, hash-chained audit trail for BackupService
+
+Entries are chained (``prev_hash`` -> ``hash``) and numbered (``sequence``) as
+before, but appends no longer read the log: the tail (last hash, next
+sequence) lives in memory and advances only once an entry is written.
+
+Entries are appended to rolling segment files ``segment_<first_seq>.jsonl``;
+appends landing inside the same group-commit window share one ``write`` +
+``fsync`` and are acknowledged once durable.
+
+When a segment reaches ``AUDIT_SEGMENT_MAX_ENTRIES`` / ``AUDIT_SEGMENT_MAX_BYTES``
+it is sealed: its Merkle root over the entry hashes, file checksum and
+boundary hashes go to ``checkpoints.jsonl`` (one line per sealed segment).
+
+Recovery reads the checkpoint index and the last line of the live segment,
+never the history.  Verification re-checks only what changed since the last
+run: sealed segments once (or when their file changes), the live segment
+from the last verified offset.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUDIT_SEGMENT_MAX_ENTRIES = int(os.getenv("AUDIT_SEGMENT_MAX_ENTRIES", "10000"))
+AUDIT_SEGMENT_MAX_BYTES = int(os.getenv("AUDIT_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024)))
+AUDIT_FSYNC_MS = float(os.getenv("AUDIT_FSYNC_MS", "20"))
+
+SEGMENT_PREFIX = "segment_"
+CHECKPOINT_FILE = "checkpoints.jsonl"
+VERIFY_STATE_FILE = "verify_state.json"
+LEGACY_FILE = "audit_log.jsonl"
+
+
+def entry_hash(entry: Dict[str, Any]) -> str:
+    """SHA-256 of the entry without its own ``hash`` field (canonical JSON)."""
+    entry_copy = {k: v for k, v in entry.items() if k != 'hash'}
+    return hashlib.sha256(json.dumps(entry_copy, sort_keys=True).encode()).hexdigest()
+
+
+def merkle_root(hashes: List[str]) -> str:
+    """Binary SHA-256 Merkle root over hex leaf hashes; an odd node is promoted."""
+    if not hashes:
+        return hashlib.sha256(b"").hexdigest()
+    level = [bytes.fromhex(h) for h in hashes]
+    while len(level) > 1:
+        nxt = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+
+def _fsync_file(f) -> None:
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+def _read_last_line(path: Path) -> Optional[str]:
+    """Last complete line, read backwards from the end; a torn tail is cut off."""
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        tail = b""
+        while pos > 0 and tail.count(b"\n") < 2:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+        end = tail.rfind(b"\n")
+        if end != len(tail) - 1:
+            # Crash mid-write: the partial line was never acknowledged
+            cut = pos + end + 1
+            logger.warning("Audit log: truncating torn tail of %s at byte %d", path.name, cut)
+            f.truncate(cut)
+        if end == -1:
+            return None
+        return tail[tail.rfind(b"\n", 0, end) + 1:end].decode() or None
+
+
+def _scan_segment(path: Path, first_seq: int, prev_hash: Optional[str], offset: int = 0) -> Dict[str, Any]:
+    """
+    Check chain + hashes of ``path`` from byte ``offset``.  Returns the hashes
+    seen, the tail reached and the first problem found (if any).
+    """
+    hashes: List[str] = []
+    file_hash = hashlib.sha256()
+    expected_seq = first_seq
+    error = None
+    pos = offset
+    with open(path, "rb") as f:
+        if offset:
+            f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # unflushed tail
+            file_hash.update(raw)
+            entry = json.loads(raw)
+            if entry.get("sequence") != expected_seq:
+                error = f"{path.name}: sequence {entry.get('sequence')} where {expected_seq} expected"
+                break
+            if entry.get("prev_hash") != prev_hash:
+                error = f"{path.name}: chain broken at sequence {expected_seq}"
+                break
+            if entry_hash(entry) != entry.get("hash"):
+                error = f"{path.name}: entry {expected_seq} was modified"
+                break
+            hashes.append(entry["hash"])
+            prev_hash = entry["hash"]
+            expected_seq += 1
+            pos += len(raw)
+    return {"hashes": hashes, "last_hash": prev_hash, "next_seq": expected_seq,
+            "offset": pos, "file_sha256": file_hash.hexdigest(), "error": error}
+
+
+class SegmentedAuditLog:
+    def __init__(self, directory: Path, max_entries: int = AUDIT_SEGMENT_MAX_ENTRIES,
+                 max_bytes: int = AUDIT_SEGMENT_MAX_BYTES, fsync_ms: float = AUDIT_FSYNC_MS):
+        self.dir = Path(directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.group_commit_s = max(fsync_ms, 0) / 1000.0
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self.checkpoints: List[Dict[str, Any]] = []
+        self.last_hash: Optional[str] = None
+        self.next_seq = 1
+        # Live segment
+        self._seg_first_seq = 1
+        self._seg_prev_hash: Optional[str] = None
+        self._seg_entries = 0
+        self._seg_bytes = 0
+        self._seg_hashes: Optional[List[str]] = []    # None after recovery: read at seal time
+        self._seg_sha = hashlib.sha256()
+        self._seg_sha_valid = True
+        self._file = None
+
+        self._buffer: List[Tuple[bytes, str]] = []    # (line, hash) not yet written
+        self._buffer_bytes = 0
+        self._waiters: List[asyncio.Future] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._verified: Dict[str, Any] = {}
+        self.stats = {"appends": 0, "flushes": 0, "sealed": 0}
+        self._recover()
+
+    # ─── Recovery ────────────────────────────────────────────────────
+
+    def _segment_path(self, first_seq: int) -> Path:
+        return self.dir / f"{SEGMENT_PREFIX}{first_seq:012d}.jsonl"
+
+    def _recover(self) -> None:
+        cp_file = self.dir / CHECKPOINT_FILE
+        if cp_file.exists():
+            _read_last_line(cp_file)  # cut a torn record so later checkpoints append cleanly
+            with open(cp_file, "r") as f:
+                self.checkpoints = [json.loads(line) for line in f if line.strip()]
+
+        legacy = self.dir.parent / LEGACY_FILE
+        if not self.checkpoints and legacy.exists() and not any(self.dir.glob(f"{SEGMENT_PREFIX}*")):
+            self._adopt_legacy(legacy)
+
+        if self.checkpoints:
+            last_cp = self.checkpoints[-1]
+            self.last_hash = last_cp["last_hash"]
+            self.next_seq = last_cp["last_seq"] + 1
+        self._seg_first_seq = self.next_seq
+        self._seg_prev_hash = self.last_hash
+
+        live = self._segment_path(self._seg_first_seq)
+        if live.exists():
+            last_line = _read_last_line(live)
+            if last_line:
+                last = json.loads(last_line)
+                self.last_hash = last["hash"]
+                self.next_seq = last["sequence"] + 1
+            self._seg_entries = self.next_seq - self._seg_first_seq
+            self._seg_bytes = live.stat().st_size
+            if self._seg_entries:
+                self._seg_hashes = None
+                self._seg_sha_valid = False
+            logger.info("Audit log recovered: tail seq %d (%d sealed segments)",
+                        self.next_seq - 1, len(self.checkpoints))
+
+    def _adopt_legacy(self, legacy: Path) -> None:
+        """One-time move of the single-file log into the first (sealed) segment."""
+        scan = _scan_segment(legacy, 1, None)
+        if scan["error"] or not scan["hashes"]:
+            logger.error("Audit log: legacy %s not adopted: %s", legacy, scan["error"] or "empty")
+            return
+        target = self._segment_path(1)
+        os.replace(legacy, target)
+        self._write_checkpoint({
+            "segment": target.name, "first_seq": 1, "last_seq": scan["next_seq"] - 1,
+            "first_prev_hash": None, "last_hash": scan["last_hash"],
+            "merkle_root": merkle_root(scan["hashes"]), "entries": len(scan["hashes"]),
+            "bytes": target.stat().st_size, "file_sha256": scan["file_sha256"], "legacy": True,
+        })
+        print(f"📦 Legacy audit log adopted as {target.name} ({len(scan['hashes'])} entries)")
+
+    def _write_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        with open(self.dir / CHECKPOINT_FILE, "a") as f:
+            f.write(json.dumps(checkpoint, sort_keys=True) + "\n")
+            _fsync_file(f)
+        self.checkpoints.append(checkpoint)
+
+    # ─── Append path ─────────────────────────────────────────────────
+
+    def append_nowait(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Chain + buffer one entry; durable after the next group commit."""
+        if (self._seg_entries + len(self._buffer) >= self.max_entries
+                or self._seg_bytes + self._buffer_bytes >= self.max_bytes):
+            self._seal()
+        # Chain off the last buffered entry; the tail itself only moves once written
+        prev_hash = self._buffer[-1][1] if self._buffer else self.last_hash
+        record = {**entry, "prev_hash": prev_hash, "sequence": self.next_seq + len(self._buffer)}
+        record["hash"] = entry_hash(record)
+        line = (json.dumps(record) + "\n").encode()
+
+        self._buffer.append((line, record["hash"]))
+        self._buffer_bytes += len(line)
+        self.stats["appends"] += 1
+        return record
+
+    async def append(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        record = self.append_nowait(entry)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self.group_commit_s == 0:
+            self.flush()  # the waiter carries a failed write back to the caller
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.group_commit_s, self.flush)
+        await waiter
+        return record
+
+    def flush(self) -> None:
+        """Write buffered entries with a single fsync and release their waiters."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        waiters, self._waiters = self._waiters, []
+        error = None
+        if self._buffer:
+            buffered, self._buffer = self._buffer, []
+            self._buffer_bytes = 0
+            try:
+                if self._file is None:
+                    self._file = open(self._segment_path(self._seg_first_seq), "ab")
+                self._file.write(b"".join(line for line, _ in buffered))
+                _fsync_file(self._file)
+                self.stats["flushes"] += 1
+            except Exception as e:
+                logger.error("Audit log flush failed: %s", e)
+                error = e
+                self._discard_partial_write()
+            else:
+                self._advance_tail(buffered)
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if error:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(None)
+
+    def _advance_tail(self, written: List[Tuple[bytes, str]]) -> None:
+        for line, record_hash in written:
+            self._seg_entries += 1
+            self._seg_bytes += len(line)
+            if self._seg_hashes is not None:
+                self._seg_hashes.append(record_hash)
+            if self._seg_sha_valid:
+                self._seg_sha.update(line)
+        self.last_hash = written[-1][1]
+        self.next_seq += len(written)
+
+    def _discard_partial_write(self) -> None:
+        """Cut whatever part of a failed write reached the segment, so it ends at the tail again."""
+        path = self._segment_path(self._seg_first_seq)
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+        try:
+            if path.exists() and path.stat().st_size > self._seg_bytes:
+                os.truncate(path, self._seg_bytes)
+        except OSError as e:
+            logger.error("Audit log: could not cut failed write from %s: %s", path.name, e)
+
+    def _seal(self) -> None:
+        """Close the live segment and record its checkpoint; the next append opens a new one."""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._seg_entries == 0:
+            return
+        path = self._segment_path(self._seg_first_seq)
+        if self._seg_hashes is None or not self._seg_sha_valid:
+            scan = _scan_segment(path, self._seg_first_seq, self._seg_prev_hash)
+            if scan["error"]:
+                logger.error("Audit log: sealing damaged segment: %s", scan["error"])
+            hashes, file_sha = scan["hashes"], scan["file_sha256"]
+        else:
+            hashes, file_sha = self._seg_hashes, self._seg_sha.hexdigest()
+        self._write_checkpoint({
+            "segment": path.name, "first_seq": self._seg_first_seq, "last_seq": self.next_seq - 1,
+            "first_prev_hash": self._seg_prev_hash, "last_hash": self.last_hash,
+            "merkle_root": merkle_root(hashes), "entries": self._seg_entries,
+            "bytes": self._seg_bytes, "file_sha256": file_sha,
+        })
+        self.stats["sealed"] += 1
+        self._seg_first_seq = self.next_seq
+        self._seg_prev_hash = self.last_hash
+        self._seg_entries = 0
+        self._seg_bytes = 0
+        self._seg_hashes = []
+        self._seg_sha = hashlib.sha256()
+        self._seg_sha_valid = True
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ─── Verification ────────────────────────────────────────────────
+
+    def _load_verify_state(self) -> Dict[str, Any]:
+        if not self._verified:
+            try:
+                with open(self.dir / VERIFY_STATE_FILE, "r") as f:
+                    self._verified = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._verified = {}
+        self._verified.setdefault("sealed", {})
+        return self._verified
+
+    def _save_verify_state(self) -> None:
+        tmp = self.dir / f"{VERIFY_STATE_FILE}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._verified, f)
+        os.replace(tmp, self.dir / VERIFY_STATE_FILE)
+
+    def _verify_sync(self, full: bool) -> Dict[str, Any]:
+        state = {"sealed": {}} if full else self._load_verify_state()
+        if full:
+            self._verified = state
+        errors: List[str] = []
+        segments_checked = 0
+        entries_checked = 0
+
+        prev_last_hash: Optional[str] = None
+        prev_last_seq = 0
+        for cp in self.checkpoints:
+            # Index chaining is cheap: always check every boundary
+            if cp["first_prev_hash"] != prev_last_hash or cp["first_seq"] != prev_last_seq + 1:
+                errors.append(f"{cp['segment']}: does not continue the previous segment")
+            prev_last_hash, prev_last_seq = cp["last_hash"], cp["last_seq"]
+
+            path = self.dir / cp["segment"]
+            if not path.exists():
+                errors.append(f"{cp['segment']}: missing")
+                continue
+            stat = path.stat()
+            fingerprint = [stat.st_size, stat.st_mtime_ns]
+            if state["sealed"].get(cp["segment"]) == fingerprint:
+                continue  # sealed, unchanged since it last verified clean
+            scan = _scan_segment(path, cp["first_seq"], cp["first_prev_hash"])
+            segments_checked += 1
+            entries_checked += len(scan["hashes"])
+            if scan["error"]:
+                errors.append(scan["error"])
+            elif scan["file_sha256"] != cp["file_sha256"] or merkle_root(scan["hashes"]) != cp["merkle_root"]:
+                errors.append(f"{cp['segment']}: does not match its checkpoint")
+            elif scan["next_seq"] != cp["last_seq"] + 1:
+                errors.append(f"{cp['segment']}: truncated")
+            else:
+                state["sealed"][cp["segment"]] = fingerprint
+
+        live = self._segment_path(self._seg_first_seq)
+        live_state = state.get("live") or {}
+        if live_state.get("segment") != live.name:
+            live_state = {"segment": live.name, "offset": 0,
+                          "next_seq": self._seg_first_seq, "last_hash": self._seg_prev_hash}
+        if live.exists():
+            scan = _scan_segment(live, live_state["next_seq"], live_state["last_hash"], live_state["offset"])
+            segments_checked += 1
+            entries_checked += len(scan["hashes"])
+            if scan["error"]:
+                errors.append(scan["error"])
+            else:
+                live_state.update(offset=scan["offset"], next_seq=scan["next_seq"], last_hash=scan["last_hash"])
+        state["live"] = live_state
+
+        if not errors:
+            self._save_verify_state()
+        return {
+            "valid": not errors,
+            "errors": errors,
+            "sealed_segments": len(self.checkpoints),
+            "segments_checked": segments_checked,
+            "entries_checked": entries_checked,
+            "last_sequence": self.next_seq - 1,
+            "last_hash": self.last_hash,
+        }
+
+    async def verify(self, full: bool = False) -> Dict[str, Any]:
+        """Integrity of the whole chain; ``full`` ignores what earlier runs already verified."""
+        self.flush()
+        return await asyncio.get_running_loop().run_in_executor(None, self._verify_sync, full)
+
+
+# One tail state per directory: BackupService is instantiated per caller
+_logs: Dict[str, SegmentedAuditLog] = {}
+
+
+def get_audit_log(directory: Path) -> SegmentedAuditLog:
+    key = str(Path(directory).resolve())
+    log = _logs.get(key)
+    if log is None:
+        log = _logs[key] = SegmentedAuditLog(directory)
+    return log
@@ -6,13 +6,18 @@ Handles variable injection, HTML sanitization, conditional blocks,
 reprint detection, and ESCPOS command generation.
 Target: < 200ms render time.
 """
+import os
 import re
+import time
 import hashlib
 import html as html_module
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable
 import logging
 
+from core.metrics_collector import register_cache_stats
+
 logger = logging.getLogger("restin.template.render")
 
 # ==================== HTML SANITIZATION ====================
@@ -92,8 +97,10 @@ def evaluate_condition(condition: Optional[Dict], data: Dict[str, Any]) -> bool:
     field = condition.get("field", "")
     operator = condition.get("operator", "==")
     expected = condition.get("value")
-    actual = resolve_variable(field, data)
+    return _compare(operator, resolve_variable(field, data), expected)
+
 
+def _compare(operator: str, actual: Any, expected: Any) -> bool:
     try:
         if operator == "==":
             return actual == expected
@@ -357,13 +364,13 @@ async def render_template(
     
     Performance target: < 200ms
     """
-    import time
     start_time = time.monotonic()
     warnings: List[str] = []
 
     # 1. Resolve which version to render
     blocks = template_doc.get("blocks", [])
     paper = template_doc.get("paper_profile", {})
+    content_hash = None
 
     if version is not None:
         versions = template_doc.get("versions", [])
@@ -371,46 +378,38 @@ async def render_template(
         if target_version:
             blocks = target_version.get("blocks", blocks)
             paper = target_version.get("paper_profile", paper)
+            # Published versions are immutable and carry their hash
+            content_hash = target_version.get("content_hash")
         else:
             warnings.append(f"Version {version} not found, using current draft")
 
-    # 2. Reprint detection
+    # 2. Compiled plan: blocks pre-sorted and grouped, placeholders pre-parsed
+    plan = get_render_plan(blocks, content_hash)
+
+    # 3. Reprint detection
     is_reprint = False
     reprint_count = 0
     if order_id:
         is_reprint, reprint_count = await check_reprint(db, order_id, venue_id)
 
-    # 3. Filter blocks by condition and sort by order
-    visible_blocks = []
-    for block in blocks:
-        condition = block.get("show_if")
-        if evaluate_condition(condition, data):
-            visible_blocks.append(block)
-    visible_blocks.sort(key=lambda b: b.get("order", 0))
-
-    # 4. Group by section
-    sections = {"header": [], "body": [], "footer": []}
-    for block in visible_blocks:
-        section = block.get("section", "body")
-        sections.setdefault(section, []).append(block)
-
-    # 5. Render each block
+    # 4. Render visible blocks
     if output_format == "html":
-        result = render_to_html(sections, data, paper, is_reprint, reprint_count)
+        result, visible = plan.render_html(data, paper, is_reprint, reprint_count)
     else:
-        # ESCPOS rendering (placeholder — actual binary generation would use python-escpos)
-        result = {"html": render_to_html(sections, data, paper, is_reprint, reprint_count)["html"]}
-        warnings.append("ESCPOS output not yet implemented, returning HTML")
+        raw, visible, escpos_warnings = plan.render_escpos(data, paper, is_reprint, reprint_count)
+        result = {"escpos_commands": list(raw), "escpos_hex": raw.hex()}
+        warnings.extend(escpos_warnings)
 
     elapsed = (time.monotonic() - start_time) * 1000
 
     if debug:
         result["debug"] = {
             "total_blocks": len(blocks),
-            "visible_blocks": len(visible_blocks),
+            "visible_blocks": visible + plan.count_unrendered_visible(data),
             "variables_injected": list(data.keys()),
             "paper_profile": paper,
-            "version_used": version or "draft"
+            "version_used": version or "draft",
+            "content_hash": plan.content_hash
         }
 
     result["render_time_ms"] = round(elapsed, 2)
@@ -428,37 +427,12 @@ def render_to_html(
     is_reprint: bool,
     reprint_count: int
 ) -> Dict[str, str]:
-    """Render blocks to styled HTML document"""
-    width = paper.get("width", "80mm")
-    width_px = 576 if width == "80mm" else 384  # Approximate at 203dpi
-    margin_left = paper.get("margin_left", 4)
-    margin_right = paper.get("margin_right", 4)
-    margin_top = paper.get("margin_top", 2)
-
-    html_parts = [f"""<!DOCTYPE html>
-<html>
-<head>
-<meta charset="UTF-8">
-<style>
-  * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-  body {{
-    width: {width_px}px;
-    font-family: 'Courier New', monospace;
-    font-size: 12px;
-    color: #000;
-    background: #fff;
-    padding: {margin_top}mm {margin_right}mm 2mm {margin_left}mm;
-  }}
-  .section {{ margin-bottom: 4px; }}
-  .template-table {{ font-size: 11px; }}
-</style>
-</head>
-<body>"""]
+    """Render blocks to styled HTML document (uncompiled reference path; see RenderPlan)"""
+    html_parts = [_html_document_head(paper)]
 
     # Reprint watermark at top
     if is_reprint:
-        watermark = REPRINT_WATERMARK_HTML.replace("{print_count}", str(reprint_count))
-        watermark = watermark.replace("{timestamp}", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M"))
+        watermark = _reprint_watermark(reprint_count)
         html_parts.append(watermark)
 
     for section_name in ["header", "body", "footer"]:
@@ -486,8 +460,631 @@ def render_to_html(
     return {"html": "\n".join(html_parts)}
 
 
+def _html_document_head(paper: Dict) -> str:
+    width = paper.get("width", "80mm")
+    width_px = 576 if width == "80mm" else 384  # Approximate at 203dpi
+    margin_left = paper.get("margin_left", 4)
+    margin_right = paper.get("margin_right", 4)
+    margin_top = paper.get("margin_top", 2)
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<style>
+  * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+  body {{
+    width: {width_px}px;
+    font-family: 'Courier New', monospace;
+    font-size: 12px;
+    color: #000;
+    background: #fff;
+    padding: {margin_top}mm {margin_right}mm 2mm {margin_left}mm;
+  }}
+  .section {{ margin-bottom: 4px; }}
+  .template-table {{ font-size: 11px; }}
+</style>
+</head>
+<body>"""
+
+
+def _reprint_watermark(reprint_count: int) -> str:
+    watermark = REPRINT_WATERMARK_HTML.replace("{print_count}", str(reprint_count))
+    return watermark.replace("{timestamp}", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M"))
+
+
 def compute_content_hash(blocks: List[Dict]) -> str:
     """Compute SHA256 hash of blocks for version integrity"""
     import json
     content_str = json.dumps(blocks, sort_keys=True, default=str)
     return hashlib.sha256(content_str.encode()).hexdigest()
+
+
+# ==================== COMPILED RENDER PLANS ====================
+# A template version compiles once (per content hash) into a RenderPlan:
+# blocks pre-sorted and grouped by section, {{placeholders}} split into
+# literals + pre-resolved accessors, static markup pre-built. Rendering a
+# receipt then only walks the plan.
+
+TEMPLATE_PLAN_CACHE_SIZE = int(os.getenv("TEMPLATE_PLAN_CACHE_SIZE", "256"))
+
+_PLACEHOLDER_RE = re.compile(r'\{\{(.+?)\}\}')
+_TAG_RE = re.compile(r'<[^>]+>')
+# Authored strings containing these can form markup that sanitize_html would
+# rewrite; such blocks keep the per-render sanitize pass
+_MARKUP_CHARS = set('<"\'=')
+
+PLAN_SECTIONS = ("header", "body", "footer")
+
+
+def compile_accessor(path: str) -> Callable[[Dict[str, Any]], Any]:
+    """Pre-split a dotted path; the accessor behaves like resolve_variable(path, data)."""
+    parts = tuple((part, int(part) if part.isdigit() else None) for part in path.strip().split("."))
+
+    def access(data: Dict[str, Any]) -> Any:
+        current = data
+        for part, idx in parts:
+            if isinstance(current, dict):
+                current = current.get(part)
+            elif isinstance(current, list) and idx is not None:
+                current = current[idx] if idx < len(current) else None
+            else:
+                return ""
+            if current is None:
+                return ""
+        return current
+
+    return access
+
+
+def _plain(markup: str) -> str:
+    """Authored HTML fragment -> printer text (blocked elements dropped with their content)."""
+    return html_module.unescape(_TAG_RE.sub("", sanitize_html(markup)))
+
+
+class CompiledText:
+    """A string with {{placeholders}} split once into literals and accessors."""
+
+    __slots__ = ("pieces", "plain_pieces", "static")
+
+    def __init__(self, template_str: str):
+        pieces: List[Any] = []
+        for i, chunk in enumerate(_PLACEHOLDER_RE.split(template_str)):
+            if i % 2:
+                pieces.append(compile_accessor(chunk))
+            elif chunk:
+                pieces.append(chunk)
+        self.pieces = tuple(pieces)
+        self.plain_pieces = tuple(_plain(p) if isinstance(p, str) else p for p in pieces)
+        self.static = template_str if all(isinstance(p, str) for p in pieces) else None
+
+    def render(self, data: Dict[str, Any], plain: bool = False) -> str:
+        """Same output as inject_variables; plain=True for printer text (no tags, no escaping)."""
+        if self.static is not None and not plain:
+            return self.static
+        out = []
+        for piece in (self.plain_pieces if plain else self.pieces):
+            if isinstance(piece, str):
+                out.append(piece)
+                continue
+            value = piece(data)
+            if value is None or value == "":
+                continue
+            out.append(str(value) if plain else html_module.escape(str(value)))
+        return "".join(out)
+
+
+def compile_condition(condition: Optional[Dict]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """show_if -> predicate equivalent to evaluate_condition (None = always shown)."""
+    if not condition:
+        return None
+    access = compile_accessor(condition.get("field", ""))
+    operator = condition.get("operator", "==")
+    expected = condition.get("value")
+    return lambda data: _compare(operator, access(data), expected)
+
+
+def _has_markup(value: Any) -> bool:
+    if isinstance(value, str):
+        return not _MARKUP_CHARS.isdisjoint(value)
+    if isinstance(value, dict):
+        return any(_has_markup(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_markup(v) for v in value)
+    return False
+
+
+class CompiledBlock:
+    """One block of a plan: visibility predicate, HTML renderer and ESC/POS renderer."""
+
+    __slots__ = ("id", "condition", "html", "escpos", "sanitize")
+
+    def __init__(self, block: Dict, html: Callable, escpos: Callable):
+        self.id = block.get("id", "unknown")
+        self.condition = compile_condition(block.get("show_if"))
+        self.html = html
+        self.escpos = escpos
+        props = {k: v for k, v in block.items() if k.endswith("_props")}
+        self.sanitize = _has_markup(props)
+
+
+def _compile_text_block(block: Dict):
+    props = block.get("text_props", {})
+    text = CompiledText(props.get("variable") or props.get("content") or "")
+
+    styles = []
+    if props.get("font_size"):
+        styles.append(f"font-size: {props['font_size']}px")
+    if props.get("bold"):
+        styles.append("font-weight: bold")
+    if props.get("italic"):
+        styles.append("font-style: italic")
+    if props.get("underline"):
+        styles.append("text-decoration: underline")
+    if props.get("alignment"):
+        styles.append(f"text-align: {props['alignment']}")
+    open_tag = f'<div class="template-text" style="{"; ".join(styles)}">'
+
+    align = ESCPOS_ALIGN.get(props.get("alignment"), 0)
+    size = escpos_char_size(props.get("font_size"))
+    bold, underline = bool(props.get("bold")), bool(props.get("underline"))
+
+    def html(data):
+        return f"{open_tag}{text.render(data)}</div>"
+
+    def escpos(data, out):
+        out.text(text.render(data, plain=True), align=align, bold=bold, underline=underline, size=size)
+
+    return html, escpos
+
+
+def _compile_image_block(block: Dict):
+    static = render_image_block(block, {})
+    url = (block.get("image_props") or {}).get("url")
+
+    def escpos(data, out):
+        if url:
+            out.warn(f"Image block {block.get('id', 'unknown')} is not rasterised for ESC/POS")
+
+    return (lambda data: static), escpos
+
+
+def _compile_table_block(block: Dict):
+    props = block.get("table_props", {})
+    columns = props.get("columns", [])
+    access = compile_accessor(props.get("data_source", "order.items"))
+    show_totals = props.get("show_totals", True)
+    totals_row = props.get("totals_row") or {}
+
+    head = []
+    if props.get("show_header", True) and columns:
+        head.append("<thead><tr>")
+        for col in columns:
+            align = col.get("align", "left")
+            head.append(f'<th style="text-align: {align}; border-bottom: 1px solid #333; padding: 2px 4px;">{html_module.escape(col.get("label", ""))}</th>')
+        head.append("</tr></thead>")
+    cells = [(col.get("key", ""), f'<td style="text-align: {col.get("align", "left")}; padding: 2px 4px;">')
+             for col in columns]
+    has_totals = bool(show_totals and totals_row)
+    totals = [CompiledText(totals_row[key]) if key in totals_row else None for key, _ in cells] if has_totals else []
+    labels = [col.get("label", "") for col in columns] if head else None
+    aligns = [col.get("align", "left") for col in columns]
+
+    def rows_of(data):
+        rows = access(data)
+        return rows if isinstance(rows, list) else []
+
+    def html(data):
+        parts = ['<table class="template-table" style="width: 100%; border-collapse: collapse;">']
+        parts.extend(head)
+        parts.append("<tbody>")
+        for row in rows_of(data):
+            parts.append("<tr>")
+            is_dict = isinstance(row, dict)
+            for key, td in cells:
+                value = row.get(key, "") if is_dict else ""
+                parts.append(f"{td}{html_module.escape(str(value))}</td>")
+            parts.append("</tr>")
+        parts.append("</tbody>")
+        if has_totals:
+            parts.append("<tfoot><tr>")
+            for total in totals:
+                if total is not None:
+                    parts.append(f'<td style="font-weight: bold; border-top: 1px solid #333; padding: 2px 4px;">{total.render(data)}</td>')
+                else:
+                    parts.append("<td></td>")
+            parts.append("</tr></tfoot>")
+        parts.append("</table>")
+        return "\n".join(parts)
+
+    def escpos(data, out):
+        if not cells:
+            return
+        body = [[str(row.get(key, "")) if isinstance(row, dict) else "" for key, _ in cells]
+                for row in rows_of(data)]
+        footer = [t.render(data, plain=True) if t is not None else "" for t in totals] if has_totals else None
+        out.table(aligns, labels, body, footer)
+
+    return html, escpos
+
+
+def _compile_divider_block(block: Dict):
+    static = render_divider_block(block, {})
+    style = (block.get("divider_props") or {}).get("style", "solid")
+    pattern = ESCPOS_RULES.get(style, "-")
+    return (lambda data: static), (lambda data, out: out.rule(pattern))
+
+
+def _compile_barcode_block(block: Dict):
+    props = block.get("barcode_props", {})
+    access = compile_accessor(props.get("data_source", "order.id"))
+    barcode_format = props.get("format", "CODE128")
+    height = props.get("height", 60)
+    bar_width = props.get("width", 2)
+    show_text = props.get("show_text", True)
+    attrs = f'data-format="{barcode_format}" data-height="{height}" data-show-text="{str(show_text).lower()}"'
+
+    def html(data):
+        value = html_module.escape(str(access(data)))
+        return f'<div class="template-barcode" data-value="{value}" {attrs} style="text-align: center; padding: 4px 0;"><div style="font-family: monospace; font-size: 10px;">||||| {value} |||||</div></div>'
+
+    def escpos(data, out):
+        value = str(access(data))
+        if not value:
+            return
+        if str(barcode_format).upper() == "QR":
+            out.qr(value, size=max(50, height))
+        else:
+            out.barcode(value, barcode_format, height=height, width=bar_width, show_text=show_text)
+
+    return html, escpos
+
+
+def _compile_qr_block(block: Dict):
+    props = block.get("qr_props", {})
+    static_url = props.get("static_url")
+    access = compile_accessor(props.get("data_source", "order.payment_url"))
+    size = props.get("size", 150)
+    label = props.get("label", "")
+    error_correction = props.get("error_correction", "M")
+    tail = [f'<div style="width: {size}px; height: {size}px; border: 2px solid #333; display: inline-block; font-size: 10px; line-height: {size}px;">QR</div>']
+    if label:
+        tail.append(f'<div style="font-size: 10px; text-align: center;">{html_module.escape(label)}</div>')
+    tail.append("</div>")
+    tail = "\n" + "\n".join(tail)
+
+    def value_of(data):
+        return static_url or access(data)
+
+    def html(data):
+        return f'<div class="template-qr" data-value="{html_module.escape(str(value_of(data)))}" data-size="{size}" style="text-align: center; padding: 8px 0;">{tail}'
+
+    def escpos(data, out):
+        value = str(value_of(data))
+        if value:
+            out.qr(value, size=size, error_correction=error_correction)
+        if label:
+            out.text(label, align=1)
+
+    return html, escpos
+
+
+def _compile_fiscal_block(block: Dict):
+    props = block.get("fiscal_props", {})
+    fiscal_id_of = compile_accessor(props.get("fiscal_id_variable", "fiscal.receipt_id"))
+    fiscal_qr_of = compile_accessor(props.get("fiscal_qr_variable", "fiscal.qr_data"))
+    show_id = props.get("show_fiscal_id", True)
+    show_qr = props.get("show_fiscal_qr", True)
+
+    def html(data):
+        fiscal_id, fiscal_qr = fiscal_id_of(data), fiscal_qr_of(data)
+        parts = ['<div class="template-fiscal" style="border: 1px solid #333; padding: 4px; margin: 4px 0; font-size: 10px;">']
+        if show_id and fiscal_id:
+            parts.append(f'<div>Fiscal ID: {html_module.escape(str(fiscal_id))}</div>')
+        if show_qr and fiscal_qr:
+            parts.append(f'<div class="template-qr" data-value="{html_module.escape(str(fiscal_qr))}" data-size="80" style="text-align: center;">QR</div>')
+        parts.append("</div>")
+        return "\n".join(parts)
+
+    def escpos(data, out):
+        fiscal_id, fiscal_qr = fiscal_id_of(data), fiscal_qr_of(data)
+        if show_id and fiscal_id:
+            out.text(f"Fiscal ID: {fiscal_id}", align=1)
+        if show_qr and fiscal_qr:
+            out.qr(str(fiscal_qr), size=80)
+
+    return html, escpos
+
+
+# Block type → compiler mapping (mirrors BLOCK_RENDERERS)
+BLOCK_COMPILERS = {
+    "text": _compile_text_block,
+    "image": _compile_image_block,
+    "table": _compile_table_block,
+    "divider": _compile_divider_block,
+    "barcode": _compile_barcode_block,
+    "qr": _compile_qr_block,
+    "fiscal": _compile_fiscal_block,
+}
+
+
+def _failed_block(block: Dict, error: Exception):
+    """A block whose props cannot compile renders as the legacy error comment."""
+    def html(data):
+        raise error
+
+    def escpos(data, out):
+        raise error
+
+    return html, escpos
+
+
+class RenderPlan:
+    """A compiled template version; immutable and shared across renders."""
+
+    def __init__(self, blocks: List[Dict], content_hash: str):
+        self.content_hash = content_hash
+        self.total_blocks = len(blocks)
+        self.sections: List[Tuple[str, List[CompiledBlock]]] = []
+        # Blocks the renderers skip (other sections, unknown types) still count as visible in debug
+        self.unrendered: List[Optional[Callable]] = []
+
+        # Stable sort first: filtering a sorted list keeps the legacy filter-then-sort order
+        ordered = sorted(blocks, key=lambda b: b.get("order", 0))
+        grouped: Dict[str, List[CompiledBlock]] = {name: [] for name in PLAN_SECTIONS}
+        for block in ordered:
+            section = block.get("section", "body")
+            compiler = BLOCK_COMPILERS.get(block.get("type", "text"))
+            if section not in grouped or compiler is None:
+                self.unrendered.append(compile_condition(block.get("show_if")))
+                continue
+            try:
+                html, escpos = compiler(block)
+            except Exception as e:
+                html, escpos = _failed_block(block, e)
+            grouped[section].append(CompiledBlock(block, html, escpos))
+        self.sections = [(name, grouped[name]) for name in PLAN_SECTIONS if grouped[name]]
+
+    def _visible(self, data: Dict[str, Any]):
+        for name, blocks in self.sections:
+            shown = [b for b in blocks if b.condition is None or b.condition(data)]
+            if shown:
+                yield name, shown
+
+    def count_unrendered_visible(self, data: Dict[str, Any]) -> int:
+        return sum(1 for cond in self.unrendered if cond is None or cond(data))
+
+    def render_html(self, data: Dict[str, Any], paper: Dict, is_reprint: bool,
+                    reprint_count: int) -> Tuple[Dict[str, str], int]:
+        """Same document as render_to_html; returns (result, visible block count)."""
+        html_parts = [_html_document_head(paper)]
+        if is_reprint:
+            watermark = _reprint_watermark(reprint_count)
+            html_parts.append(watermark)
+
+        visible = 0
+        for name, blocks in self._visible(data):
+            visible += len(blocks)
+            html_parts.append(f'<div class="section section-{name}">')
+            for block in blocks:
+                try:
+                    rendered = block.html(data)
+                    html_parts.append(sanitize_html(rendered) if block.sanitize else rendered)
+                except Exception as e:
+                    logger.error(f"Block render error: {e}", exc_info=True)
+                    html_parts.append(f'<!-- Block render error: {block.id} -->')
+            html_parts.append("</div>")
+
+        if is_reprint:
+            html_parts.append(watermark)
+        html_parts.append("</body></html>")
+        return {"html": "\n".join(html_parts)}, visible
+
+    def render_escpos(self, data: Dict[str, Any], paper: Dict, is_reprint: bool,
+                      reprint_count: int) -> Tuple[bytes, int, List[str]]:
+        """Printer bytes for the visible blocks; returns (bytes, visible block count, warnings)."""
+        out = EscPosWriter(escpos_line_chars(paper))
+        if is_reprint:
+            out.reprint_banner(reprint_count)
+
+        visible = 0
+        for _, blocks in self._visible(data):
+            visible += len(blocks)
+            for block in blocks:
+                mark = len(out.buf)
+                try:
+                    block.escpos(data, out)
+                except Exception as e:
+                    logger.error(f"Block render error: {e}", exc_info=True)
+                    del out.buf[mark:]
+                    out.warn(f"Block render error: {block.id}")
+
+        if is_reprint:
+            out.reprint_banner(reprint_count)
+        out.cut(paper.get("cut_feed", 4))
+        return bytes(out.buf), visible, out.warnings
+
+
+class _PlanCache:
+    """content hash -> RenderPlan, LRU-bounded. Plans are content-addressed, so never stale."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, RenderPlan]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "compile_us": 0}
+
+    def get(self, blocks: List[Dict], content_hash: Optional[str] = None) -> RenderPlan:
+        key = content_hash or compute_content_hash(blocks)
+        plan = self.entries.get(key)
+        if plan is not None:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return plan
+        self.stats["misses"] += 1
+        started = time.perf_counter()
+        plan = RenderPlan(blocks, key)
+        self.stats["compile_us"] += int((time.perf_counter() - started) * 1_000_000)
+        self.entries[key] = plan
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return plan
+
+    def clear(self):
+        self.entries.clear()
+
+
+_plan_cache = _PlanCache(TEMPLATE_PLAN_CACHE_SIZE)
+register_cache_stats("template_plans", lambda: dict(_plan_cache.stats, entries=len(_plan_cache.entries)))
+
+
+def get_render_plan(blocks: List[Dict], content_hash: Optional[str] = None) -> RenderPlan:
+    """
+    Compiled plan for a block list. Pass the version's stored content_hash
+    when known to skip re-hashing the blocks.
+    """
+    return _plan_cache.get(blocks, content_hash)
+
+
+# ==================== ESC/POS RENDERER ====================
+
+ESC, GS = b"\x1b", b"\x1d"
+
+# Characters per line in font A (12x24 dots) by paper width
+ESCPOS_LINE_CHARS = {"58mm": 32, "80mm": 48, "112mm": 64}
+ESCPOS_ALIGN = {"left": 0, "center": 1, "right": 2}
+ESCPOS_RULES = {"solid": "-", "dashed": "- ", "dotted": ".", "double": "="}
+# PC858 = Latin-1 repertoire + €; selected with ESC t 19
+ESCPOS_ENCODING, ESCPOS_CODE_PAGE = "cp858", 19
+
+
+def escpos_line_chars(paper: Dict) -> int:
+    return int(paper.get("chars_per_line") or ESCPOS_LINE_CHARS.get(paper.get("width", "80mm"), 48))
+
+
+def escpos_char_size(font_size: Optional[int]) -> int:
+    """GS ! value for an authored font size: 2x width+height, 2x height, or normal."""
+    if not font_size:
+        return 0
+    if font_size >= 24:
+        return 0x11
+    if font_size >= 16:
+        return 0x01
+    return 0
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines = []
+    for raw in text.split("\n"):
+        while len(raw) > width:
+            cut = raw.rfind(" ", 0, width + 1)
+            if cut <= 0:
+                cut = width
+            lines.append(raw[:cut].rstrip(" "))
+            raw = raw[cut:].lstrip(" ")
+        lines.append(raw)
+    return lines
+
+
+def _fit(value: str, width: int, align: str) -> str:
+    value = value[:width]
+    if align == "right":
+        return value.rjust(width)
+    if align == "center":
+        return value.center(width)
+    return value.ljust(width)
+
+
+class EscPosWriter:
+    """Accumulates the ESC/POS byte stream for one ticket."""
+
+    def __init__(self, line_chars: int = 48):
+        self.line_chars = line_chars
+        self.buf = bytearray(ESC + b"@" + ESC + b"t" + bytes([ESCPOS_CODE_PAGE]))
+        self.warnings: List[str] = []
+
+    def warn(self, message: str):
+        self.warnings.append(message)
+
+    def _encode(self, text: str) -> bytes:
+        return text.encode(ESCPOS_ENCODING, "replace")
+
+    def _style(self, align: int = 0, bold: bool = False, underline: bool = False, size: int = 0):
+        self.buf += (ESC + b"a" + bytes([align]) + ESC + b"E" + bytes([bold])
+                     + ESC + b"-" + bytes([underline]) + GS + b"!" + bytes([size]))
+
+    def _reset(self):
+        self.buf += ESC + b"a\x00" + ESC + b"E\x00" + ESC + b"-\x00" + GS + b"!\x00"
+
+    def text(self, text: str, align: int = 0, bold: bool = False, underline: bool = False, size: int = 0):
+        width = self.line_chars // (2 if size & 0x10 else 1)
+        self._style(align, bold, underline, size)
+        self.buf += b"\n".join(self._encode(line) for line in _wrap(text, width)) + b"\n"
+        self._reset()
+
+    def rule(self, pattern: str = "-"):
+        self.buf += self._encode((pattern * self.line_chars)[:self.line_chars]) + b"\n"
+
+    def table(self, aligns: List[str], header: Optional[List[str]], rows: List[List[str]],
+              footer: Optional[List[str]] = None):
+        """Fixed columns sized to their content; the first column takes the rest and wraps."""
+        n = len(aligns)
+        every = ([header] if header else []) + rows + ([footer] if footer else [])
+        cap = max(1, self.line_chars // 3)
+        widths = [min(cap, max((len(r[i]) for r in every), default=0)) for i in range(n)]
+        widths[0] = self.line_chars - sum(widths[1:]) - (n - 1)
+        if widths[0] < 4:
+            widths = [max(1, (self.line_chars - (n - 1)) // n)] * n
+
+        def emit(cells: List[str]):
+            first = _wrap(cells[0], widths[0]) if cells[0] else [""]
+            rest = " ".join(_fit(cells[i], widths[i], aligns[i]) for i in range(1, n))
+            line = _fit(first[0], widths[0], aligns[0]) + (" " + rest if n > 1 else "")
+            self.buf += self._encode(line.rstrip()) + b"\n"
+            for more in first[1:]:
+                self.buf += self._encode(more) + b"\n"
+
+        if header:
+            self.buf += ESC + b"E\x01"
+            emit(header)
+            self.buf += ESC + b"E\x00"
+            self.rule("-")
+        for row in rows:
+            emit(row)
+        if footer:
+            self.rule("-")
+            self.buf += ESC + b"E\x01"
+            emit(footer)
+            self.buf += ESC + b"E\x00"
+
+    def barcode(self, value: str, barcode_format: str = "CODE128", height: int = 60,
+                width: int = 2, show_text: bool = True):
+        digits = value.isdigit()
+        if str(barcode_format).upper() == "EAN13" and digits and len(value) in (12, 13):
+            system, payload = 67, value.encode("ascii")
+        else:
+            system, payload = 73, b"{B" + value.encode("ascii", "replace")[:253]
+        self.buf += (ESC + b"a\x01" + GS + b"h" + bytes([max(1, min(255, height))])
+                     + GS + b"w" + bytes([max(2, min(6, width))]) + GS + b"H" + bytes([2 if show_text else 0])
+                     + GS + b"k" + bytes([system, len(payload)]) + payload + b"\n" + ESC + b"a\x00")
+
+    def qr(self, value: str, size: int = 150, error_correction: str = "M"):
+        """Model 2 QR via GS ( k; module size scaled from the authored pixel size."""
+        payload = value.encode("utf-8")[:7089]
+        module = max(1, min(16, size // 25))
+        level = 48 + ("LMQH".index(error_correction) if error_correction in ("L", "M", "Q", "H") else 1)
+        store = len(payload) + 3
+        self.buf += (ESC + b"a\x01"
+                     + GS + b"(k" + bytes([4, 0, 49, 65, 50, 0])
+                     + GS + b"(k" + bytes([3, 0, 49, 67, module])
+                     + GS + b"(k" + bytes([3, 0, 49, 69, level])
+                     + GS + b"(k" + bytes([store & 0xFF, store >> 8, 49, 80, 48]) + payload
+                     + GS + b"(k" + bytes([3, 0, 49, 81, 48])
+                     + b"\n" + ESC + b"a\x00")
+
+    def reprint_banner(self, reprint_count: int):
+        self.text("COPY / REPRINT", align=1, bold=True, size=0x11)
+        self.text(f"Print #{reprint_count} - {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M')}", align=1)
+
+    def cut(self, feed_lines: int = 4):
+        self.buf += ESC + b"d" + bytes([max(0, min(255, feed_lines))]) + GS + b"V\x01"
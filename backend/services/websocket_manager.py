@@ -1,112 +1,269 @@
-"""WebSocket Manager - Real-time Connection Management"""
+"""WebSocket Manager - Real-time Connection Management
+
+Every connection owns a bounded send queue drained by its own writer task, so
+a broadcast only enqueues and one slow tablet never delays the other screens.
+A broadcast is serialized to JSON once and the same text is queued for every
+socket. When a consumer falls behind, ``WS_SLOW_CONSUMER_POLICY`` decides
+whether the oldest or newest message is dropped or the socket is closed;
+messages sent with a ``coalesce_key`` replace a still-queued message with the
+same key instead of queueing behind it.
+"""
+import asyncio
+import json
 import logging
-from typing import Dict, List, Optional
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
 from fastapi import WebSocket, WebSocketDisconnect
-import json
+
+from core.metrics_collector import BUCKET_BOUNDS_MS, bucket_index, histogram_percentile
 
 logger = logging.getLogger(__name__)
 
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+# drop_oldest | drop_newest | disconnect
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest").lower()
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+# Close code for consumers cut off by the "disconnect" policy (RFC 6455: try again later)
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class _Outgoing:
+    """One queued message; mutable so coalescing can replace it in place."""
+    __slots__ = ("text", "enqueued_at", "coalesce_key")
+
+    def __init__(self, text: str, coalesce_key: Optional[str]):
+        self.text = text
+        self.enqueued_at = time.monotonic()
+        self.coalesce_key = coalesce_key
+
+
+class _FanoutStats:
+    """Per-venue delivery latency (enqueue -> sent) histogram and drop counters."""
+
+    def __init__(self):
+        self.broadcasts = 0
+        self.deliveries = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.max_ms = 0.0
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def observe(self, latency_ms: float) -> None:
+        self.deliveries += 1
+        self.counts[bucket_index(latency_ms)] += 1
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "broadcasts": self.broadcasts,
+            "deliveries": self.deliveries,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+            "p50_ms": round(histogram_percentile(self.counts, 50), 2),
+            "p99_ms": round(histogram_percentile(self.counts, 99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class _Connection:
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket,
+                 user_id: Optional[str], venue_id: Optional[str]):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.venue_id = venue_id
+        self.queue: Deque[_Outgoing] = deque()
+        self.pending: Dict[str, _Outgoing] = {}   # coalesce_key -> queued message
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.writer: Optional[asyncio.Task] = None
+
+    def enqueue(self, text: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a message without waiting; False when the socket was cut off."""
+        if self.closed:
+            return False
+        # Deliveries and drops are attributed to the venue the screen belongs to
+        stats = self.manager._stats_for(self.venue_id)
+
+        if coalesce_key is not None:
+            queued = self.pending.get(coalesce_key)
+            if queued is not None:
+                # Keep the queue position (and original enqueue time); send the newest state
+                queued.text = text
+                if stats:
+                    stats.coalesced += 1
+                return True
+
+        if len(self.queue) >= self.manager.queue_size:
+            policy = self.manager.policy
+            if policy == "disconnect":
+                if stats:
+                    stats.slow_disconnects += 1
+                logger.warning("🔌 WebSocket: closing slow consumer (user=%s, venue=%s)", self.user_id, self.venue_id)
+                self.manager._drop(self, close_code=WS_CLOSE_TRY_AGAIN_LATER)
+                return False
+            if stats:
+                stats.dropped += 1
+            if policy == "drop_newest":
+                return True
+            oldest = self.queue.popleft()
+            if oldest.coalesce_key is not None:
+                self.pending.pop(oldest.coalesce_key, None)
+
+        item = _Outgoing(text, coalesce_key)
+        self.queue.append(item)
+        if coalesce_key is not None:
+            self.pending[coalesce_key] = item
+        self.ready.set()
+        return True
+
+    async def run_writer(self) -> None:
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                item = self.queue.popleft()
+                if item.coalesce_key is not None and self.pending.get(item.coalesce_key) is item:
+                    del self.pending[item.coalesce_key]
+                await asyncio.wait_for(self.websocket.send_text(item.text), self.manager.send_timeout)
+                stats = self.manager._stats_for(self.venue_id)
+                if stats:
+                    stats.observe((time.monotonic() - item.enqueued_at) * 1000)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("🔌 WebSocket: send failed, dropping connection (user=%s): %s", self.user_id, e)
+            self.manager._drop(self)
+
 
 class ConnectionManager:
     """
     Manages WebSocket connections for real-time notifications.
     Supports per-user and per-venue connection grouping.
     """
-    
-    def __init__(self):
-        # user_id -> list of websockets
-        self.user_connections: Dict[str, List[WebSocket]] = {}
-        # venue_id -> list of websockets
-        self.venue_connections: Dict[str, List[WebSocket]] = {}
-        # All active connections
-        self.all_connections: List[WebSocket] = []
-    
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY,
+                 send_timeout: float = WS_SEND_TIMEOUT_SECONDS):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        # user_id -> connections
+        self.user_connections: Dict[str, Set[_Connection]] = {}
+        # venue_id -> connections
+        self.venue_connections: Dict[str, Set[_Connection]] = {}
+        # All active connections, by socket
+        self.all_connections: Dict[WebSocket, _Connection] = {}
+        # venue_id -> fan-out latency / drop stats
+        self.fanout_stats: Dict[str, _FanoutStats] = {}
+
+    def _stats_for(self, venue_id: Optional[str]) -> Optional[_FanoutStats]:
+        if venue_id is None:
+            return None
+        stats = self.fanout_stats.get(venue_id)
+        if stats is None:
+            stats = self.fanout_stats[venue_id] = _FanoutStats()
+        return stats
+
     async def connect(
-        self, 
-        websocket: WebSocket, 
+        self,
+        websocket: WebSocket,
         user_id: Optional[str] = None,
         venue_id: Optional[str] = None
     ):
         """Accept and register a WebSocket connection"""
         await websocket.accept()
-        self.all_connections.append(websocket)
-        
+        conn = _Connection(self, websocket, user_id, venue_id)
+        self.all_connections[websocket] = conn
+        conn.writer = asyncio.create_task(conn.run_writer())
+
         if user_id:
-            if user_id not in self.user_connections:
-                self.user_connections[user_id] = []
-            self.user_connections[user_id].append(websocket)
+            self.user_connections.setdefault(user_id, set()).add(conn)
             logger.info(f"🔌 WebSocket: User {user_id} connected")
-        
+
         if venue_id:
-            if venue_id not in self.venue_connections:
-                self.venue_connections[venue_id] = []
-            self.venue_connections[venue_id].append(websocket)
+            self.venue_connections.setdefault(venue_id, set()).add(conn)
             logger.info(f"🔌 WebSocket: Connected to venue {venue_id}")
-    
+
     def disconnect(
-        self, 
+        self,
         websocket: WebSocket,
         user_id: Optional[str] = None,
         venue_id: Optional[str] = None
     ):
         """Remove a WebSocket connection"""
-        if websocket in self.all_connections:
-            self.all_connections.remove(websocket)
-        
-        if user_id and user_id in self.user_connections:
-            if websocket in self.user_connections[user_id]:
-                self.user_connections[user_id].remove(websocket)
-                logger.info(f"🔌 WebSocket: User {user_id} disconnected")
-        
-        if venue_id and venue_id in self.venue_connections:
-            if websocket in self.venue_connections[venue_id]:
-                self.venue_connections[venue_id].remove(websocket)
-    
-    async def send_to_user(self, user_id: str, message: dict):
+        conn = self.all_connections.get(websocket)
+        if conn is not None:
+            self._drop(conn)
+            if conn.user_id:
+                logger.info(f"🔌 WebSocket: User {conn.user_id} disconnected")
+
+    def _drop(self, conn: _Connection, close_code: Optional[int] = None) -> None:
+        if conn.closed:
+            return
+        conn.closed = True
+        conn.queue.clear()
+        conn.pending.clear()
+        self.all_connections.pop(conn.websocket, None)
+        for registry, key in ((self.user_connections, conn.user_id), (self.venue_connections, conn.venue_id)):
+            if key and key in registry:
+                registry[key].discard(conn)
+                if not registry[key]:
+                    del registry[key]
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        if close_code is not None:
+            asyncio.ensure_future(self._close(conn.websocket, close_code))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _serialize(message: dict) -> str:
+        return json.dumps(message, default=str)
+
+    def _fan_out(self, conns, message: dict, coalesce_key: Optional[str], venue_id: Optional[str]) -> int:
+        if not conns:
+            return 0
+        text = self._serialize(message)  # once per broadcast, not per socket
+        stats = self._stats_for(venue_id)
+        if stats:
+            stats.broadcasts += 1
+        return sum(1 for conn in list(conns) if conn.enqueue(text, coalesce_key))
+
+    async def send_to_user(self, user_id: str, message: dict, coalesce_key: Optional[str] = None) -> int:
         """Send message to specific user"""
-        if user_id in self.user_connections:
-            disconnected = []
-            for ws in self.user_connections[user_id]:
-                try:
-                    await ws.send_json(message)
-                except Exception:
-                    disconnected.append(ws)
-            
-            # Clean up disconnected
-            for ws in disconnected:
-                self.disconnect(ws, user_id=user_id)
-    
-    async def send_to_venue(self, venue_id: str, message: dict):
+        return self._fan_out(self.user_connections.get(user_id), message, coalesce_key, None)
+
+    async def send_to_venue(self, venue_id: str, message: dict, coalesce_key: Optional[str] = None) -> int:
         """Broadcast message to all connections in a venue"""
-        if venue_id in self.venue_connections:
-            disconnected = []
-            for ws in self.venue_connections[venue_id]:
-                try:
-                    await ws.send_json(message)
-                except Exception:
-                    disconnected.append(ws)
-            
-            for ws in disconnected:
-                self.disconnect(ws, venue_id=venue_id)
-    
-    async def broadcast_all(self, message: dict):
+        return self._fan_out(self.venue_connections.get(venue_id), message, coalesce_key, venue_id)
+
+    async def broadcast_all(self, message: dict, coalesce_key: Optional[str] = None) -> int:
         """Broadcast message to all connected clients"""
-        disconnected = []
-        for ws in self.all_connections:
-            try:
-                await ws.send_json(message)
-            except Exception:
-                disconnected.append(ws)
-        
-        for ws in disconnected:
-            self.all_connections.remove(ws)
-    
+        return self._fan_out(self.all_connections.values(), message, coalesce_key, None)
+
     def get_connection_count(self) -> dict:
         """Get current connection statistics"""
         return {
             "total": len(self.all_connections),
             "users": {uid: len(conns) for uid, conns in self.user_connections.items()},
-            "venues": {vid: len(conns) for vid, conns in self.venue_connections.items()}
+            "venues": {vid: len(conns) for vid, conns in self.venue_connections.items()},
+            "queued": sum(len(c.queue) for c in self.all_connections.values()),
+            "policy": self.policy,
+            "fanout": {vid: stats.to_dict() for vid, stats in self.fanout_stats.items()},
         }
 
 
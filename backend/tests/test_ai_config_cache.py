@@ -0,0 +1,164 @@
+"""
+Tests for the cached AI config cascade and the router's compiled chains.
+"""
+
+import asyncio
+
+import pytest
+
+import services.ai_config_resolver as resolver
+import services.ai_router as ai_router
+from core.mock_database import MockDatabase
+from services.ai_providers import AIResponse
+
+
+class _CountingConfigs:
+    def __init__(self, col):
+        self._col = col
+        self.reads = 0
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return await self._col.find_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._col, name)
+
+
+class _Db:
+    def __init__(self, db):
+        self._db = db
+        self.ai_model_configs = _CountingConfigs(db.ai_model_configs)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    wrapped = _Db(MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal"))
+    monkeypatch.setattr(resolver, "db", wrapped)
+    monkeypatch.setattr(resolver, "_resolved_cache", {})
+    return wrapped
+
+
+class TestResolvedConfigCache:
+    """The cascade is read once per (venue, group) until a save invalidates it."""
+
+    def test_warm_resolution_does_no_reads(self, db):
+        async def _run():
+            await resolver.save_config("venue", "v1", {"routing": {"chat": "gpt-4o-mini"}})
+            first = await resolver.resolve_config("v1", "g1")
+            reads = db.ai_model_configs.reads
+            for _ in range(5):
+                cfg = await resolver.resolve_config("v1", "g1")
+            return first, cfg, db.ai_model_configs.reads - reads
+
+        first, cfg, extra_reads = asyncio.run(_run())
+        assert extra_reads == 0
+        assert cfg["routing"]["chat"] == "gpt-4o-mini"
+        assert cfg["routing"]["default"] == "gemini-2.0-flash"
+
+    def test_returned_config_is_private(self, db):
+        async def _run():
+            cfg = await resolver.resolve_config("v1")
+            cfg["routing"]["chat"] = "mutated"
+            return await resolver.resolve_config("v1")
+
+        assert asyncio.run(_run())["routing"]["chat"] != "mutated"
+        assert resolver.DEFAULT_SYSTEM_CONFIG["routing"]["chat"] == "llama-3.3-70b-versatile"
+
+    def test_group_save_invalidates_its_venues_only(self, db):
+        async def _run():
+            await resolver.get_resolved_config("v1", "g1")
+            await resolver.get_resolved_config("v2", "g1")
+            other = await resolver.get_resolved_config("v3", "g2")
+            await resolver.save_config("group", "g1", {"routing": {"chat": "group-model"}})
+            return (
+                await resolver.get_resolved_config("v1", "g1"),
+                await resolver.get_resolved_config("v2", "g1"),
+                other,
+                await resolver.get_resolved_config("v3", "g2"),
+            )
+
+        v1, v2, v3_before, v3_after = asyncio.run(_run())
+        assert v1.config["routing"]["chat"] == "group-model"
+        assert v2.config["routing"]["chat"] == "group-model"
+        assert v3_after is v3_before
+
+    def test_system_save_invalidates_everything(self, db):
+        async def _run():
+            before = await resolver.get_resolved_config("v1", "g1")
+            await resolver.save_config("system", "", {"limits": {"daily_token_limit": 5}})
+            return before, await resolver.get_resolved_config("v1", "g1")
+
+        before, after = asyncio.run(_run())
+        assert after is not before
+        assert after.config["limits"]["daily_token_limit"] == 5
+
+
+class _FakeProvider:
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, prompt, model, system_prompt="", temperature=0.7, max_tokens=1024):
+        self.calls.append(model)
+        return AIResponse(text="ok", provider="fake", model=model)
+
+
+class TestCompiledChains:
+    """Provider instances are resolved once per resolved config."""
+
+    def test_warm_completion_compiles_once(self, db, monkeypatch):
+        provider = _FakeProvider()
+        lookups = []
+
+        async def fake_instance(name, keys, extra_config=None):
+            lookups.append(name)
+            return provider
+
+        monkeypatch.setattr(ai_router, "_get_provider_instance", fake_instance)
+        monkeypatch.setattr(ai_router, "_rate_limiter", ai_router.RateLimiter())
+
+        async def _run():
+            for _ in range(3):
+                response = await ai_router.route_completion("hi", task_type="chat", venue_id="v1", use_cache=False)
+            return response
+
+        response = asyncio.run(_run())
+        assert response.text == "ok"
+        assert provider.calls == ["gemini-2.0-flash"] * 3
+        assert len(lookups) == len(ai_router.DEFAULT_FALLBACK_CHAINS["text"])
+
+        resolver.invalidate_ai_config("venue", "v1")
+        asyncio.run(ai_router.route_completion("hi", task_type="chat", venue_id="v1", use_cache=False))
+        assert len(lookups) == 2 * len(ai_router.DEFAULT_FALLBACK_CHAINS["text"])
+
+    def test_missing_provider_is_reported(self, db, monkeypatch):
+        async def no_instance(name, keys, extra_config=None):
+            return None
+
+        monkeypatch.setattr(ai_router, "_get_provider_instance", no_instance)
+        monkeypatch.setattr(ai_router, "_rate_limiter", ai_router.RateLimiter())
+        response = asyncio.run(ai_router.route_completion("hi", task_type="chat", venue_id="v9", use_cache=False))
+        assert "no API key" in response.error
+
+    def test_unresolved_default_chain_is_retried_after_ttl(self, db, monkeypatch):
+        for env_var in ("GROQ_API_KEY", "GOOGLE_API_KEYS", "GOOGLE_API_KEY"):
+            monkeypatch.delenv(env_var, raising=False)
+        monkeypatch.setattr(ai_router, "DEFAULT_FALLBACK_CHAINS",
+                            {"text": [{"provider": "groq", "model": "llama-3.1-8b-instant"}]})
+        monkeypatch.setattr(ai_router, "_env_keys_cache", None)
+        monkeypatch.setattr(ai_router, "_provider_cache", {})
+        monkeypatch.setattr(ai_router, "_default_compiled", {})
+        monkeypatch.setattr(ai_router, "_default_compiled_at", {})
+
+        (step,) = asyncio.run(ai_router._get_chain("text"))
+        assert step[2] is None
+        monkeypatch.setenv("GROQ_API_KEY", "gsk_test_key_123")  # key added after the first resolve
+        (step,) = asyncio.run(ai_router._get_chain("text"))
+        assert step[2] is None  # still within the TTL
+
+        monkeypatch.setattr(ai_router, "AI_CONFIG_CACHE_TTL_SECONDS", 0)
+        (step,) = asyncio.run(ai_router._get_chain("text"))
+        assert step[2] is not None and step[2].api_key == "gsk_test_key_123"
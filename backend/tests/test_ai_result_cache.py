@@ -0,0 +1,219 @@
+"""
+Tests for the AI result cache (completion / embedding hits, single-flight,
+LRU + TTL, shared Mongo tier) behind the AI router.
+"""
+
+import asyncio
+
+import pytest
+
+import services.ai_router as ai_router
+from core.mock_database import MockDatabase
+from services.ai_providers import AIResponse, EmbeddingResponse
+from services.ai_result_cache import AIResultCache, completion_key, embedding_key
+
+
+class _Stub:
+    """Provider stub counting upstream calls and embedded texts."""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.embedded = []
+
+    async def complete(self, prompt, model, system_prompt="", temperature=0.7, max_tokens=1024):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            return AIResponse(error=self.error, provider=self.name, model=model)
+        return AIResponse(text=f"answer to {prompt}", provider=self.name, model=model,
+                          tokens_in=10, tokens_out=20, cost_usd=0.002)
+
+    async def embed(self, texts, model):
+        self.calls += 1
+        self.embedded.extend(texts)
+        await asyncio.sleep(self.delay)
+        return EmbeddingResponse(vectors=[[float(len(t)), 1.0] for t in texts],
+                                 provider=self.name, model=model, dimensions=2, tokens_used=len(texts))
+
+
+@pytest.fixture
+def router(monkeypatch):
+    cache = AIResultCache(use_mongo=False)
+    monkeypatch.setattr(ai_router, "result_cache", cache)
+    monkeypatch.setattr(ai_router, "_provider_health", {})
+    monkeypatch.setattr(ai_router, "_rate_limiter", ai_router.RateLimiter())
+
+    def use(*providers):
+        chain = [p if isinstance(p, tuple) else (p.name, f"{p.name}-model", p) for p in providers]
+
+        async def fake_chain(chain_key, venue_id="", group_id="", api_keys=None):
+            return list(chain)
+
+        monkeypatch.setattr(ai_router, "_get_chain", fake_chain)
+        return cache
+
+    return use
+
+
+def _complete(prompt="hi", **kwargs):
+    return ai_router.route_completion(prompt, task_type="chat", system_prompt="x", **kwargs)
+
+
+class TestCompletionCache:
+    def test_repeat_request_served_from_cache(self, router):
+        stub = _Stub("p")
+        cache = router(stub)
+
+        async def _run():
+            return await _complete(), await _complete(), await _complete("hi", temperature=0.2)
+
+        first, second, other = asyncio.run(_run())
+        assert not first.cached and second.cached
+        assert second.text == first.text and second.provider == "p"
+        assert second.cache_saved_usd == pytest.approx(first.cost_usd)
+        # A hit is not billed again: usage logging records zero spend
+        assert (second.cost_usd, second.tokens_in, second.tokens_out) == (0.0, 0, 0)
+        assert stub.calls == 2  # the different temperature is a different request
+        assert cache.stats["hits"] == 1 and cache.stats["saved_tokens"] == 30
+        assert second.cache_hit_rate == pytest.approx(1 / 2)
+
+    def test_whitespace_insensitive_key(self):
+        assert completion_key("chat", "sys", "a  b\n", "", 0.7, 100) == completion_key("chat", "sys ", "a b", "", 0.70, 100)
+        assert completion_key("chat", "sys", "a b", "", 0.7, 100) != completion_key("chat", "sys", "a b", "", 0.7, 200)
+        # A forced provider never gets another provider's answer
+        assert completion_key("chat", "sys", "a b", "m", 0.7, 100, provider="openai") != completion_key(
+            "chat", "sys", "a b", "m", 0.7, 100, provider="groq")
+
+    def test_concurrent_identical_requests_share_one_call(self, router):
+        stub = _Stub("p", delay=0.05)
+        cache = router(stub)
+
+        async def _run():
+            return await asyncio.gather(*[_complete() for _ in range(5)])
+
+        responses = asyncio.run(_run())
+        assert stub.calls == 1
+        assert {r.text for r in responses} == {"answer to hi"}
+        assert sum(r.cached for r in responses) == 4
+        assert cache.stats["joins"] == 4
+
+    def test_errors_are_not_cached(self, router):
+        stub = _Stub("p", error="quota")
+        router(stub)
+        assert asyncio.run(_complete()).error
+        stub.error = None
+        response = asyncio.run(_complete())
+        assert response.text == "answer to hi" and not response.cached
+        assert stub.calls == 2
+
+    def test_use_cache_false_bypasses(self, router):
+        stub = _Stub("p")
+        router(stub)
+        asyncio.run(_complete())
+        assert not asyncio.run(_complete(use_cache=False)).cached
+        assert stub.calls == 2
+
+
+class TestLruAndTtl:
+    def test_lru_eviction(self):
+        cache = AIResultCache(max_entries=2, use_mongo=False)
+
+        async def _run():
+            await cache.put("a", {"v": 1})
+            await cache.put("b", {"v": 2})
+            cache.get_local("a")  # a is now most recent
+            await cache.put("c", {"v": 3})
+
+        asyncio.run(_run())
+        assert cache.get_local("b") is None
+        assert cache.get_local("a") == {"v": 1} and cache.get_local("c") == {"v": 3}
+
+    def test_expired_entry_is_a_miss(self):
+        cache = AIResultCache(use_mongo=False)
+        asyncio.run(cache.put("a", {"v": 1}, ttl=0.01))
+        asyncio.run(asyncio.sleep(0.02))
+        assert cache.get_local("a") is None
+
+
+class TestEmbeddingCache:
+    def test_only_misses_go_upstream(self, router):
+        stub = _Stub("p")
+        router(stub)
+
+        async def _run():
+            await ai_router.route_embedding(["alpha", "beta"])
+            return await ai_router.route_embedding(["beta", "gamma", "alpha", "gamma"])
+
+        result = asyncio.run(_run())
+        assert stub.embedded == ["alpha", "beta", "gamma"]
+        assert result.vectors == [[4.0, 1.0], [5.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+        assert result.cached_count == 2
+        assert result.model == "p-model"
+
+    def test_all_cached_makes_no_call(self, router):
+        stub = _Stub("p")
+        router(stub)
+        asyncio.run(ai_router.route_embedding(["alpha"]))
+        result = asyncio.run(ai_router.route_embedding(["alpha"]))
+        assert stub.calls == 1
+        assert result.cached_count == 1 and result.vectors == [[5.0, 1.0]]
+
+    def test_fallback_model_vectors_are_not_mixed(self, router):
+        primary = _Stub("primary")
+        backup = _Stub("backup")
+        cache = router(primary, backup)
+        asyncio.run(ai_router.route_embedding(["alpha"]))
+
+        primary.embed = _failing_embed
+        result = asyncio.run(ai_router.route_embedding(["alpha", "beta"]))
+        # The backup model answered: the whole batch comes from it, nothing cached under primary
+        assert result.model == "backup-model"
+        assert backup.embedded == ["beta", "alpha", "beta"]
+        assert cache.get_local(embedding_key("primary-model", "beta")) is None
+
+
+async def _failing_embed(texts, model):
+    raise RuntimeError("down")
+
+
+class TestSharedTier:
+    def test_second_worker_reads_mongo(self, tmp_path):
+        db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+        worker_a = AIResultCache(database=db, use_mongo=True)
+        worker_b = AIResultCache(database=db, use_mongo=True)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"text": "shared"}
+
+        async def _run():
+            await worker_a.get_or_compute("k", compute)
+            return await worker_b.get_or_compute("k", compute)
+
+        payload, cached = asyncio.run(_run())
+        assert payload == {"text": "shared"} and cached
+        assert len(calls) == 1
+        assert worker_b.stats["mongo_hits"] == 1
+
+    def test_promoted_entry_keeps_stored_expiry(self, tmp_path):
+        db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+        worker_a = AIResultCache(database=db, use_mongo=True)
+        worker_b = AIResultCache(database=db, use_mongo=True, ttl_seconds=3600)
+
+        async def compute_many(keys):
+            return {k: {"vector": [0.0]} for k in keys}
+
+        async def _run():
+            await worker_a.put("k", {"vector": [1.0]}, ttl=0.2)
+            results, served = await worker_b.get_many_or_compute(["k"], compute_many)
+            promoted = worker_b.get_local("k")
+            await asyncio.sleep(0.3)
+            return results, served, promoted
+
+        results, served, promoted = asyncio.run(_run())
+        assert served == 1 and promoted == {"vector": [1.0]}
+        assert worker_b.get_local("k") is None
@@ -0,0 +1,164 @@
+"""
+Tests for AI router circuit breakers, health ordering and hedging (local stub providers).
+"""
+
+import asyncio
+
+import pytest
+
+import services.ai_router as ai_router
+from services.ai_providers import AIResponse
+
+
+class _Stub:
+    """Provider stub: answers after ``delay`` seconds, or with an error."""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, prompt, model, system_prompt="", temperature=0.7, max_tokens=1024):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            return AIResponse(error=self.error, provider=self.name, model=model)
+        return AIResponse(text=f"from {self.name}", provider=self.name, model=model)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(ai_router, "_provider_health", {})
+    monkeypatch.setattr(ai_router, "_rate_limiter", ai_router.RateLimiter())
+    monkeypatch.setattr(ai_router, "AI_HEDGE_DEFAULT_DELAY_MS", 30.0)
+    monkeypatch.setattr(ai_router, "AI_HEDGE_MIN_DELAY_MS", 10.0)
+    stubs = {}
+
+    def use(*providers):
+        stubs["chain"] = [p if isinstance(p, tuple) else (p.name, f"{p.name}-model", p) for p in providers]
+
+        async def fake_chain(chain_key, venue_id="", group_id="", api_keys=None):
+            return list(stubs["chain"])
+
+        monkeypatch.setattr(ai_router, "_get_chain", fake_chain)
+
+    return use
+
+
+def _complete(**kwargs):
+    # Every call must reach the providers: bypass the result cache
+    return asyncio.run(ai_router.route_completion("hi", system_prompt="x", use_cache=False, **kwargs))
+
+
+class TestCircuitBreaker:
+    def test_failures_open_circuit_and_demote(self, router, monkeypatch):
+        monkeypatch.setattr(ai_router, "AI_BREAKER_FAILURES", 2)
+        bad, good = _Stub("bad", error="500"), _Stub("good")
+        router(bad, good)
+
+        for _ in range(2):
+            assert _complete(task_type="chat").text == "from good"
+        assert ai_router.get_provider_health()["bad"]["state"] == "open"
+
+        # Open circuit: skipped (and ordered last) until the cooldown passes
+        response = _complete(task_type="chat")
+        assert response.text == "from good"
+        assert bad.calls == 2
+
+    def test_breaker_is_per_api_key(self, router, monkeypatch):
+        monkeypatch.setattr(ai_router, "AI_BREAKER_FAILURES", 1)
+        revoked, tenant = _Stub("openai", error="401 invalid api key"), _Stub("openai")
+        revoked.api_key, tenant.api_key = "sk-revoked", "sk-tenant"
+        router(revoked)
+        _complete()
+        router(tenant)
+        # Another tenant's key keeps its own closed circuit
+        assert _complete().text == "from openai" and tenant.calls == 1
+        states = {key: h["state"] for key, h in ai_router.get_provider_health().items()}
+        assert sorted(states.values()) == ["closed", "open"]
+        assert all(key.startswith("openai:") for key in states)
+
+    def test_half_open_probe_closes_on_success(self, router, monkeypatch):
+        monkeypatch.setattr(ai_router, "AI_BREAKER_FAILURES", 1)
+        monkeypatch.setattr(ai_router, "AI_BREAKER_COOLDOWN_SECONDS", 0.0)
+        flaky = _Stub("flaky", error="boom")
+        router(flaky, _Stub("backup"))
+
+        _complete(task_type="chat")
+        health = ai_router._health("flaky")
+        assert health.opened_at is not None and health.state == "half_open"
+
+        flaky.error = None
+        assert _complete(task_type="chat").text == "from flaky"
+        assert health.state == "closed"
+
+    def test_timeout_counts_as_failure(self, router, monkeypatch):
+        monkeypatch.setattr(ai_router, "AI_PROVIDER_TIMEOUT_SECONDS", 0.02)
+        slow, fast = _Stub("slow", delay=1.0), _Stub("fast")
+        router(slow, fast)
+        assert _complete(task_type="chat", hedge=False).text == "from fast"
+        assert ai_router._health("slow").failures == 1
+
+    def test_all_failed_reports_each_reason(self, router):
+        router(_Stub("a", error="quota"), ("b", "b-model", None))
+        response = _complete(task_type="chat")
+        assert response.provider == "none"
+        assert "a/a-model: quota" in response.error
+        assert "b: no API key" in response.error
+
+    def test_error_rate_opens_circuit(self, router):
+        health = ai_router._health("noisy")
+        for i in range(20):
+            # Two failures in every three: never AI_BREAKER_FAILURES in a row
+            (health.record_failure if i % 3 else health.record_success)(10.0)
+        assert health.state == "open"
+
+    def test_slow_provider_ordered_after_healthy(self, router, monkeypatch):
+        monkeypatch.setattr(ai_router, "AI_SLOW_PROVIDER_MS", 100.0)
+        first, second = _Stub("first"), _Stub("second")
+        ai_router._health("first").record_success(500.0)
+        ai_router._health("second").record_success(20.0)
+        router(first, second)
+        assert _complete(task_type="chat", hedge=False).text == "from second"
+
+
+class TestHedging:
+    def test_hedge_takes_first_good_answer_and_cancels_loser(self, router):
+        slow, fast = _Stub("slow", delay=1.0), _Stub("fast", delay=0.0)
+        router(slow, fast)
+
+        response = _complete(task_type="voice")  # hedged by default
+        assert response.text == "from fast"
+        assert slow.cancelled == 1
+        # The cancelled loser is not charged a failure
+        assert ai_router._health("slow").failures == 0
+
+    def test_no_hedge_waits_for_primary(self, router):
+        primary, backup = _Stub("primary", delay=0.05), _Stub("backup")
+        router(primary, backup)
+        assert _complete(task_type="chat").text == "from primary"
+        assert backup.calls == 0
+
+    def test_hedge_delay_follows_p95(self, router, monkeypatch):
+        health = ai_router._health("p")
+        for _ in range(20):
+            health.record_success(400.0)
+        assert ai_router._hedge_delay_seconds("p") == pytest.approx(0.4, rel=0.05)
+        monkeypatch.setattr(ai_router, "AI_HEDGE_MAX_DELAY_MS", 100.0)
+        assert ai_router._hedge_delay_seconds("p") == pytest.approx(0.1)
+
+
+class TestRateLimiter:
+    def test_window_limit(self):
+        limiter = ai_router.RateLimiter()
+        assert all(limiter.can_proceed("x", rpm_limit=3) for _ in range(3))
+        assert not limiter.can_proceed("x", rpm_limit=3)
+        # Age the window out
+        limiter._windows["x"] = type(limiter._windows["x"])(t - 61 for t in limiter._windows["x"])
+        assert limiter.can_proceed("x", rpm_limit=3)
@@ -0,0 +1,179 @@
+"""
+Tests for services.catalog_snapshot (per-venue indexed catalog, version-bump
+rebuilds, single-flight loading, warmup and memory accounting).
+"""
+
+import asyncio
+
+import pytest
+
+import services.catalog_snapshot as catalog_mod
+from core.metrics_collector import cache_stats
+from core.mock_database import MockDatabase
+from services.catalog_snapshot import (
+    bump_catalog_version, catalog_memory_report, get_catalog, invalidate_catalog, warm_catalogs,
+)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_mod, "_cache", catalog_mod._CatalogCache())
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+    async def _seed():
+        await db.venues.delete_many({})  # drop the mock's seeded demo venues
+        await db.venues.insert_many([{"id": "v1"}, {"id": "v2"}])
+        await db.menu_categories.insert_many([
+            {"id": "mains", "venue_id": "v1", "name": "Mains", "sort_order": 2},
+            {"id": "drinks", "venue_id": "v1", "name": "Drinks", "sort_order": 1},
+        ])
+        await db.menu_items.insert_many([
+            {"id": "burger", "venue_id": "v1", "category_id": "mains", "name": "Burger", "price": 12,
+             "prep_area": "grill", "sort_order": 2},
+            {"id": "pasta", "venue_id": "v1", "category_id": "mains", "name": "Pasta", "price": 11, "sort_order": 1},
+            {"id": "cola", "venue_id": "v1", "category_id": "drinks", "name": "Cola", "price": 3, "prep_area": "bar"},
+            {"id": "wrap", "venue_id": "v2", "category_id": "x", "name": "Wrap", "price": 7},
+        ])
+        await db.recipes.insert_many([
+            {"id": "r-old", "venue_id": "v1", "menu_item_id": "burger", "deleted_at": "2026-01-01",
+             "components": [{"item_id": "old-patty", "qty": 1}]},
+            {"id": "r1", "venue_id": "v1", "menu_item_id": "burger", "components": [{"item_id": "patty", "qty": 1}],
+             "change_history": [{"note": "created"}]},
+            {"id": "r2", "venue_id": "v1", "menu_item_id": "burger", "components": []},
+            {"id": "engineered", "venue_id": "v1", "recipe_name": "Stock"},
+        ])
+        await db.menu_item_inventory.insert_one({"menu_item_id": "cola", "inventory_item_id": "can", "quantity": 1})
+        await db.modifier_groups.insert_one({"id": "size", "venue_id": "v1", "name": "Size"})
+        await db.modifier_options.insert_many([
+            {"id": "large", "group_id": "size", "name": "Large", "sort_order": 2},
+            {"id": "small", "group_id": "size", "name": "Small", "sort_order": 1},
+        ])
+        await db.menu_item_modifiers.insert_one({"menu_item_id": "cola", "modifier_group_id": "size"})
+
+    asyncio.run(_seed())
+    return db
+
+
+class TestVenueCatalog:
+    def test_indexes(self, db):
+        catalog = asyncio.run(get_catalog(db, "v1"))
+        assert set(catalog.items) == {"burger", "pasta", "cola"}
+        assert catalog.menu_item("wrap") is None
+        assert list(catalog.categories) == ["drinks", "mains"]
+        assert [i["id"] for i in catalog.items_by_category["mains"]] == ["pasta", "burger"]
+        assert [i["id"] for i in catalog.items_by_prep_area["kitchen"]] == ["pasta"]
+        assert catalog.recipe_for("burger")["id"] == "r1"  # first live recipe; trashed one skipped
+        assert catalog.recipe_for("cola") is None
+        assert [l["inventory_item_id"] for l in catalog.inventory_links("cola")] == ["can"]
+        assert [g["id"] for g in catalog.modifier_groups_for("cola")] == ["size"]
+        assert [o["id"] for o in catalog.modifier_options("size")] == ["small", "large"]
+        assert catalog.counts() == {"items": 3, "categories": 2, "recipes": 1, "modifier_groups": 1,
+                                    "modifier_options": 2, "inventory_links": 1}
+
+    def test_snapshot_is_read_only(self, db):
+        catalog = asyncio.run(get_catalog(db, "v1"))
+        with pytest.raises(TypeError):
+            catalog.menu_item("burger")["price"] = 0
+        with pytest.raises(TypeError):
+            catalog.items["new"] = {}
+        assert catalog.recipe_for("burger")["components"] == ({"item_id": "patty", "qty": 1},)
+
+
+class TestVersioning:
+    def test_shared_until_bumped(self, db):
+        async def _run():
+            first = await get_catalog(db, "v1")
+            again = await get_catalog(db, "v1")
+            await db.menu_items.update_one({"id": "burger"}, {"$set": {"price": 14}})
+            version = await bump_catalog_version(db, "v1")
+            return first, again, version, await get_catalog(db, "v1")
+
+        first, again, version, rebuilt = asyncio.run(_run())
+        assert again is first and version == 1
+        assert rebuilt is not first and rebuilt.version == 1
+        assert rebuilt.menu_item("burger")["price"] == 14
+        assert first.menu_item("burger")["price"] == 12  # readers holding the old snapshot are unaffected
+        assert catalog_mod._cache.stats["rebuilds"] == 2
+
+    def test_other_worker_bump_seen_after_poll_interval(self, db, monkeypatch):
+        first = asyncio.run(get_catalog(db, "v1"))
+        # Another worker's bump: only the shared counter moves
+        asyncio.run(db.catalog_versions.update_one({"venue_id": "v1"}, {"$inc": {"version": 1}}, upsert=True))
+        assert asyncio.run(get_catalog(db, "v1")) is first
+        monkeypatch.setattr(catalog_mod, "CATALOG_VERSION_POLL_SECONDS", 0)
+        assert asyncio.run(get_catalog(db, "v1")).version == 1
+
+    def test_max_age_rebuilds_without_bump(self, db, monkeypatch):
+        first = asyncio.run(get_catalog(db, "v1"))
+        monkeypatch.setattr(catalog_mod, "CATALOG_MAX_AGE_SECONDS", 0)
+        assert asyncio.run(get_catalog(db, "v1")) is not first
+
+    def test_concurrent_misses_build_once(self, db):
+        async def _run():
+            return await asyncio.gather(*(get_catalog(db, "v1") for _ in range(8)))
+
+        catalogs = asyncio.run(_run())
+        assert all(c is catalogs[0] for c in catalogs)
+        assert catalog_mod._cache.stats["rebuilds"] == 1
+
+    def test_invalidate_while_waiting_for_rebuild(self, db, monkeypatch):
+        first = asyncio.run(get_catalog(db, "v1"))
+        monkeypatch.setattr(catalog_mod, "CATALOG_MAX_AGE_SECONDS", 0)
+
+        async def _run():
+            lock = catalog_mod._cache.locks["v1"]
+            async with lock:
+                waiter = asyncio.ensure_future(get_catalog(db, "v1"))
+                await asyncio.sleep(0)
+                invalidate_catalog("v1")
+            return await waiter
+
+        rebuilt = asyncio.run(_run())
+        assert rebuilt is not None and rebuilt is not first
+
+    def test_invalidate(self, db):
+        first = asyncio.run(get_catalog(db, "v1"))
+        invalidate_catalog("v1")
+        assert asyncio.run(get_catalog(db, "v1")) is not first
+
+
+class TestMenuWriters:
+    """Every menu editor bumps the catalog, so orders never price off a stale snapshot."""
+
+    def test_menu_router_deactivate_bumps(self, db, monkeypatch):
+        import routes.menu_routes as menu_routes
+        monkeypatch.setattr(menu_routes, "db", db)
+
+        async def allow(user, venue_id):
+            return None
+
+        monkeypatch.setattr(menu_routes, "check_venue_access", allow)
+        router = menu_routes.create_menu_router()
+        endpoint = next(r.endpoint for r in router.routes
+                        if r.path == "/menu/items/{item_id}" and "DELETE" in r.methods)
+
+        async def _run():
+            first = await get_catalog(db, "v1")
+            await endpoint("burger", {"id": "u1"})
+            return first, await get_catalog(db, "v1")
+
+        first, latest = asyncio.run(_run())
+        assert first.menu_item("burger").get("is_active") is not False
+        assert latest.menu_item("burger")["is_active"] is False
+
+
+class TestWarmupAndMemory:
+    def test_warm_prefers_open_sessions(self, db):
+        asyncio.run(db.pos_sessions.insert_one({"id": "s1", "venue_id": "v2", "status": "OPEN"}))
+        assert asyncio.run(warm_catalogs(db)) == ["v2", "v1"]
+        assert asyncio.run(warm_catalogs(db, max_venues=1)) == ["v2"]
+
+    def test_memory_report(self, db):
+        asyncio.run(warm_catalogs(db))
+        report = catalog_memory_report()
+        assert [v["venue_id"] for v in report["venues"]] == ["v1", "v2"]
+        assert report["total_items"] == 4
+        assert report["total_bytes"] == sum(v["bytes"] for v in report["venues"]) > 0
+        stats = cache_stats()["catalog"]
+        assert stats["venues"] == 2 and stats["bytes"] == report["total_bytes"]
+        assert all(isinstance(v, int) for v in stats.values())
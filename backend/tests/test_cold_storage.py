@@ -0,0 +1,154 @@
+"""
+Tests for cold-storage segments in services.cold_storage (per collection/venue/
+month gzip parts, manifests with zone maps, pruned query-through, restore).
+"""
+
+import asyncio
+import gzip
+import json
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import services.cold_storage as cold_mod
+from core.mock_database import MockDatabase
+from services.cold_storage import (
+    archive_old_data, build_zone_maps, get_archival_stats, query_cold_storage, restore_from_segments,
+)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(cold_mod, "COLD_STORAGE_DIR", str(tmp_path / "cold"))
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+def _days_ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def _seed(db, orders):
+    async def _run():
+        for i, (venue, age, status) in enumerate(orders):
+            await db.orders.insert_one({"_id": f"o{i:03d}", "venue_id": venue, "created_at": _days_ago(age),
+                                        "status": status, "total": i})
+    asyncio.run(_run())
+
+
+def _archive(db, **kwargs):
+    return asyncio.run(archive_old_data(db, "orders", retention_days=30, **kwargs))
+
+
+class TestArchival:
+    def test_moves_old_docs_into_monthly_segments(self, db, tmp_path):
+        _seed(db, [("v1", 400, "closed"), ("v1", 400, "voided"), ("v2", 400, "closed"), ("v1", 1, "open")])
+        stats = _archive(db)
+        assert stats["documents_archived"] == stats["documents_deleted"] == 3
+        assert stats["segments_written"] == 2
+        assert asyncio.run(db.orders.count_documents({})) == 1
+        assert "orders_archive" not in db.data_store or not db.data_store["orders_archive"]
+
+        month = _days_ago(400)[:7]
+        segment = tmp_path / "cold" / "orders" / "v1" / month
+        manifest = json.loads((segment / "manifest.json").read_text())
+        assert manifest["count"] == 2 and manifest["venue_id"] == "v1"
+        part = manifest["parts"][0]
+        lines = gzip.decompress((segment / part["file"]).read_bytes()).decode().splitlines()
+        assert len(lines) == 2
+        assert part["zone_maps"]["status"]["values"] == ["closed", "voided"]
+
+    def test_batches_append_parts(self, db, tmp_path):
+        _seed(db, [("v1", 400, "closed")] * 5)
+        _archive(db, batch_size=2)
+        manifest = json.loads(next((tmp_path / "cold" / "orders" / "v1").glob("*/manifest.json")).read_text())
+        assert [p["count"] for p in manifest["parts"]] == [2, 2, 1] and manifest["count"] == 5
+
+    def test_mongo_backend_keeps_archive_collection(self, db):
+        _seed(db, [("v1", 400, "closed")])
+        stats = _archive(db, backend="mongo")
+        assert stats["archive_collection"] == "orders_archive"
+        assert asyncio.run(db.orders_archive.count_documents({})) == 1
+
+
+class TestZoneMaps:
+    def test_ranges_per_type_and_distinct_overflow(self, monkeypatch):
+        monkeypatch.setattr(cold_mod, "ZONE_MAP_MAX_DISTINCT", 2)
+        zones = build_zone_maps([{"n": 3, "s": "a"}, {"n": 1.5, "s": "b"}, {"n": "x", "s": "c", "tags": []}])
+        assert zones["n"]["ranges"] == {"num": [1.5, 3], "str": ["x", "x"]}
+        assert zones["s"]["values"] is None and zones["s"]["ranges"]["str"] == ["a", "c"]
+        assert zones["tags"]["other"]
+
+
+class TestQueryThrough:
+    def test_prunes_by_venue_month_and_zone_map(self, db):
+        _seed(db, [("v1", 400, "closed"), ("v1", 400, "voided"), ("v1", 120, "closed"), ("v2", 400, "closed")])
+        _archive(db)
+
+        start = _days_ago(130)
+        result = asyncio.run(query_cold_storage("orders", venue_id="v1", start=start))
+        assert [d["_id"] for d in result["documents"]] == ["o002"]
+        assert result["segments_scanned"] == 1 and result["segments_pruned"] >= 1
+
+        result = asyncio.run(query_cold_storage("orders", filters={"status": "voided"}))
+        assert [d["_id"] for d in result["documents"]] == ["o001"]
+        assert result["parts_pruned"] == 2  # v1 @120d and v2 hold no voided orders
+
+        result = asyncio.run(query_cold_storage("orders", filters={"total": {"$gte": 2}}))
+        assert sorted(d["_id"] for d in result["documents"]) == ["o002", "o003"]
+
+    def test_negative_operators_keep_parts_without_the_field(self, db):
+        _seed(db, [("v1", 400, "closed")])
+        _archive(db)
+        assert asyncio.run(query_cold_storage("orders", filters={"refund_of": {"$ne": "o9"}}))["count"] == 1
+        assert asyncio.run(query_cold_storage("orders", filters={"refund_of": {"$nin": ["o9"]}}))["count"] == 1
+        assert asyncio.run(query_cold_storage("orders", filters={"refund_of": {"$exists": False}}))["count"] == 1
+        result = asyncio.run(query_cold_storage("orders", filters={"refund_of": "o9"}))
+        assert result["count"] == 0 and result["parts_pruned"] == 1
+
+    def test_limit_and_missing_collection(self, db):
+        _seed(db, [("v1", 400, "closed")] * 4)
+        _archive(db)
+        assert asyncio.run(query_cold_storage("orders", limit=3))["count"] == 3
+        assert asyncio.run(query_cold_storage("call_logs"))["count"] == 0
+
+
+class TestStatsAndRestore:
+    def test_stats_from_manifests(self, db):
+        _seed(db, [("v1", 400, "closed"), ("v2", 400, "closed"), ("v1", 1, "open")])
+        _archive(db)
+        orders = next(s for s in asyncio.run(get_archival_stats(db)) if s["collection"] == "orders")
+        assert (orders["hot_count"], orders["cold_count"], orders["segments"]) == (1, 2, 2)
+
+    def test_restore_tombstones_document(self, db):
+        _seed(db, [("v1", 400, "closed"), ("v1", 400, "voided")])
+        _archive(db)
+        doc = asyncio.run(restore_from_segments(db, "orders", "o001", venue_id="v1"))
+        assert doc["status"] == "voided" and "archived_from" not in doc
+        assert asyncio.run(db.orders.count_documents({"_id": "o001"})) == 1
+        assert [d["_id"] for d in asyncio.run(query_cold_storage("orders"))["documents"]] == ["o000"]
+        assert asyncio.run(restore_from_segments(db, "orders", "o001")) is None
+
+    def test_restored_then_rearchived_doc_is_visible(self, db):
+        _seed(db, [("v1", 400, "closed"), ("v1", 400, "voided")])
+        _archive(db)
+        asyncio.run(restore_from_segments(db, "orders", "o001", venue_id="v1"))
+        # Still old: the next run moves it back into the same (venue, month) segment
+        stats = _archive(db)
+        assert stats["documents_archived"] == 1
+        assert asyncio.run(db.orders.count_documents({})) == 0
+        assert sorted(d["_id"] for d in asyncio.run(query_cold_storage("orders"))["documents"]) == ["o000", "o001"]
+        orders = next(s for s in asyncio.run(get_archival_stats(db)) if s["collection"] == "orders")
+        assert orders["cold_count"] == 2
+
+        # And it can be restored again, from the new part
+        assert asyncio.run(restore_from_segments(db, "orders", "o001"))["status"] == "voided"
+        assert [d["_id"] for d in asyncio.run(query_cold_storage("orders"))["documents"]] == ["o000"]
+
+
+class TestUnconfigured:
+    def test_segment_archival_fails_closed_without_dir(self, db, monkeypatch):
+        monkeypatch.setattr(cold_mod, "COLD_STORAGE_DIR", "")
+        _seed(db, [("v1", 400, "closed")])
+        assert "COLD_STORAGE_DIR" in _archive(db)["error"]
+        assert asyncio.run(db.orders.count_documents({})) == 1
+        assert asyncio.run(query_cold_storage("orders"))["count"] == 0
@@ -0,0 +1,173 @@
+"""
+Tests for the lease-based EventBus outbox dispatcher (runs against MockDatabase).
+"""
+
+import asyncio
+
+import pytest
+import services.event_bus as event_bus_module
+from core.mock_database import MockDatabase
+from services.event_bus import EventBus
+
+
+@pytest.fixture
+def mock_db(tmp_path, monkeypatch):
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+    monkeypatch.setattr(event_bus_module, "db", db)
+    monkeypatch.setattr(event_bus_module, "EVENT_BUS_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(event_bus_module, "EVENT_BUS_ACK_INTERVAL", 0.01)
+    return db
+
+
+async def _run_until(bus, predicate, timeout=2.0):
+    bus.start()
+    task = asyncio.create_task(bus.process_pending_events())
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    bus.stop()
+    await task
+
+
+class TestEventBusDispatcher:
+    """Test batched claiming, bounded concurrency and bulk acknowledgement."""
+
+    def test_two_dispatchers_never_run_the_same_event(self, mock_db):
+        seen = []
+
+        async def handler(event):
+            seen.append(event["id"])
+
+        async def _main():
+            a, b = EventBus(batch_size=5), EventBus(batch_size=5)
+            for bus in (a, b):
+                bus.subscribe("order.closed", handler)
+            for i in range(30):
+                await a.publish("order.closed", {"n": i})
+            await asyncio.gather(
+                _run_until(a, lambda: len(seen) >= 30),
+                _run_until(b, lambda: len(seen) >= 30),
+            )
+            return a, b
+
+        a, b = asyncio.run(_main())
+        assert len(seen) == 30
+        assert len(set(seen)) == 30
+        assert a.stats["claimed"] + b.stats["claimed"] == 30
+
+    def test_completions_are_acknowledged_in_bulk(self, mock_db):
+        async def handler(event):
+            return None
+
+        async def _main():
+            bus = EventBus(batch_size=20)
+            bus.subscribe("kds.ticket_bumped", handler)
+            for i in range(20):
+                await bus.publish("kds.ticket_bumped", {"n": i})
+            await _run_until(bus, lambda: bus.stats["completed"] >= 20)
+            return bus
+
+        bus = asyncio.run(_main())
+        assert bus.stats["completed"] == 20
+        assert bus.stats["ack_writes"] < 20
+        statuses = {e["status"] for e in mock_db.data_store["event_outbox"]}
+        assert statuses == {"COMPLETED"}
+
+    def test_per_event_type_concurrency_limit(self, mock_db):
+        running = 0
+        peak = 0
+        done = []
+
+        async def handler(event):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            done.append(event["id"])
+
+        async def _main():
+            bus = EventBus(batch_size=20, max_workers=20)
+            bus.subscribe("inventory.low_stock", handler)
+            bus.set_concurrency_limit("inventory.low_stock", 2)
+            for i in range(10):
+                await bus.publish("inventory.low_stock", {"n": i})
+            await _run_until(bus, lambda: len(done) >= 10)
+
+        asyncio.run(_main())
+        assert len(done) == 10
+        assert peak <= 2
+
+    def test_backoff_grows_exponentially(self):
+        bus = EventBus()
+        first = bus._backoff_seconds(1)
+        third = bus._backoff_seconds(3)
+        assert third > first * 2
+
+
+class TestLeases:
+    """Leases are renewed while a handler runs; reclaims count as retries."""
+
+    def test_slow_handler_keeps_its_lease(self, mock_db):
+        runs = []
+
+        async def slow(event):
+            runs.append(event["id"])
+            await asyncio.sleep(0.5)
+
+        async def _main():
+            a, b = EventBus(lease_seconds=0.15), EventBus(lease_seconds=0.15)
+            for bus in (a, b):
+                bus.subscribe("report.build", slow)
+            await a.publish("report.build", {})
+            # b polls for expired leases the whole time a is still handling the event
+            await asyncio.gather(
+                _run_until(a, lambda: a.stats["completed"] >= 1),
+                _run_until(b, lambda: a.stats["completed"] >= 1),
+            )
+            return a, b
+
+        a, b = asyncio.run(_main())
+        assert len(runs) == 1
+        assert b.stats["claimed"] == 0
+
+    def test_reclaim_counts_as_retry_and_dead_letters(self, mock_db):
+        handled = []
+
+        async def handler(event):
+            handled.append(event["id"])
+
+        async def _main():
+            bus = EventBus(lease_seconds=1)
+            bus.subscribe("order.closed", handler)
+            await mock_db.event_outbox.insert_many([
+                # Crashed its worker twice already; the owner died again mid-flight
+                {"id": "poison", "event_type": "order.closed", "data": {}, "status": "PROCESSING",
+                 "lease_owner": "dead:1", "lease_expires_at": "2000-01-01T00:00:00+00:00",
+                 "retry_count": 2, "max_retries": 3},
+                {"id": "orphan", "event_type": "order.closed", "data": {}, "status": "PROCESSING",
+                 "lease_owner": "dead:1", "lease_expires_at": "2000-01-01T00:00:00+00:00",
+                 "retry_count": 0, "max_retries": 3},
+            ])
+            await _run_until(bus, lambda: bus.stats["completed"] >= 1 and bus.stats["dead_lettered"] >= 1)
+
+        asyncio.run(_main())
+        assert handled == ["orphan"]
+        assert [e["id"] for e in mock_db.data_store["event_dlq"]] == ["poison"]
+        orphan = next(e for e in mock_db.data_store["event_outbox"] if e["id"] == "orphan")
+        assert orphan["status"] == "COMPLETED" and orphan["retry_count"] == 1
+
+    def test_reclaim_is_bounded_by_the_batch(self, mock_db):
+        async def _main():
+            bus = EventBus(lease_seconds=60)
+            await mock_db.event_outbox.insert_many([
+                {"id": f"e{i}", "event_type": "order.closed", "data": {}, "status": "PROCESSING",
+                 "lease_owner": "dead:1", "lease_expires_at": "2000-01-01T00:00:00+00:00",
+                 "retry_count": 0, "max_retries": 3}
+                for i in range(10)
+            ])
+            return [len(await bus._claim_batch(4)) for _ in range(4)]
+
+        # The backlog is drained over several polls, never all in one
+        assert asyncio.run(_main()) == [4, 4, 2, 0]
+        assert all(e["lease_owner"] != "dead:1" for e in mock_db.data_store["event_outbox"])
@@ -0,0 +1,126 @@
+"""
+Tests for the group-commit Outbox writer.
+"""
+
+import asyncio
+import json
+
+import core.events_outbox as outbox_mod
+from core.events_outbox import Outbox, OutboxWriter, _writers
+
+
+class _RecordingCollection:
+    """Counts round trips; optionally fails the first N insert_many calls."""
+
+    def __init__(self, fail_first=0, delay=0.0):
+        self.docs = []
+        self.insert_many_calls = 0
+        self.fail_first = fail_first
+        self.delay = delay
+
+    async def insert_many(self, docs, ordered=True):
+        self.insert_many_calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RuntimeError("connection reset")
+        self.docs.extend(docs)
+
+
+class _FakeDb:
+    def __init__(self, col):
+        self.outbox_events = col
+
+
+def _outbox(col, **writer_kwargs):
+    db = _FakeDb(col)
+    _writers[id(db)] = OutboxWriter(col, **writer_kwargs)
+    return db, Outbox(db)
+
+
+class TestOutboxGroupCommit:
+    """Test buffering, batching and backpressure."""
+
+    def test_burst_costs_one_round_trip(self):
+        col = _RecordingCollection()
+        _, outbox = _outbox(col, flush_ms=5)
+
+        async def _burst():
+            for i in range(100):
+                await outbox.publish("v1", "kds.ticket_status_changed", f"o{i}", {"n": i})
+            await asyncio.sleep(0.02)
+
+        asyncio.run(_burst())
+        assert len(col.docs) == 100
+        assert col.insert_many_calls == 1
+
+    def test_size_threshold_flushes_without_waiting(self):
+        col = _RecordingCollection()
+        _, outbox = _outbox(col, flush_ms=10_000, max_batch=10)
+
+        async def _burst():
+            for i in range(10):
+                outbox.emit("v1", "kds.ticket_created", f"o{i}", {})
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+
+        asyncio.run(_burst())
+        assert len(col.docs) == 10
+
+    def test_failed_flush_is_retried(self):
+        col = _RecordingCollection(fail_first=1)
+        db, outbox = _outbox(col, flush_ms=0)
+
+        async def _run():
+            outbox.emit("v1", "kds.ticket_created", "o1", {})
+            await _writers[id(db)].flush()
+
+        asyncio.run(_run())
+        assert [d["key"] for d in col.docs] == ["o1"]
+
+    def test_backpressure_waits_for_space(self):
+        col = _RecordingCollection(delay=0.01)
+        _, outbox = _outbox(col, flush_ms=1, max_batch=5, max_buffer=5)
+
+        async def _burst():
+            await asyncio.gather(*[
+                outbox.publish("v1", "kds.item_status_changed", f"i{i}", {}) for i in range(40)
+            ])
+            await outbox.writer.flush()
+
+        asyncio.run(_burst())
+        assert len(col.docs) == 40
+        assert outbox.writer.stats["max_buffered"] <= 5
+
+    def test_gives_up_after_max_retries_and_spills(self, tmp_path, monkeypatch):
+        spill = tmp_path / "outbox_spill.jsonl"
+        monkeypatch.setattr(outbox_mod, "OUTBOX_SPILL_FILE", str(spill))
+        col = _RecordingCollection(fail_first=2)
+        db, outbox = _outbox(col, flush_ms=0, max_retries=0)
+
+        async def _run():
+            outbox.emit("v1", "kds.ticket_created", "o1", {})
+            await _writers[id(db)].flush()
+            outbox.emit("v1", "kds.ticket_created", "o2", {})
+            await _writers[id(db)].flush()
+
+        asyncio.run(_run())
+        assert col.insert_many_calls == 2 and col.docs == []
+        assert [json.loads(line)["key"] for line in spill.read_text().splitlines()] == ["o1", "o2"]
+        assert outbox.writer.stats["dropped"] == 2
+
+    def test_flush_deadline_with_database_down(self, tmp_path, monkeypatch):
+        spill = tmp_path / "outbox_spill.jsonl"
+        monkeypatch.setattr(outbox_mod, "OUTBOX_SPILL_FILE", str(spill))
+        col = _RecordingCollection(fail_first=10**6)
+        db, outbox = _outbox(col, flush_ms=10_000)
+
+        async def _run():
+            for i in range(3):
+                outbox.emit("v1", "kds.ticket_created", f"o{i}", {})
+            await asyncio.wait_for(_writers[id(db)].flush(timeout=0.05), 5)
+
+        asyncio.run(_run())
+        assert len(spill.read_text().splitlines()) == 3
+        assert outbox.writer._buffer == []
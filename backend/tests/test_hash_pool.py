@@ -0,0 +1,134 @@
+"""
+Tests for password / PIN hashing on the bounded hash pool (async variants,
+batched PIN checks, load shedding, queue-time stats, loop responsiveness).
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+
+import pytest
+
+import core.security as security
+from core.metrics_collector import cache_stats, metrics
+from core.security import (
+    HashPoolBusy,
+    hash_password,
+    hash_password_async,
+    hash_pin,
+    hash_pin_async,
+    verify_password_async,
+    verify_pin_async,
+    verify_pins_async,
+)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    fresh = security._HashPool(workers=2, max_queue=8)
+    monkeypatch.setattr(security, "hash_pool", fresh)
+    return fresh
+
+
+class TestAsyncVariants:
+    def test_password_round_trip(self, pool):
+        async def _run():
+            stored = await hash_password_async("s3cret-pass")
+            return (await verify_password_async("s3cret-pass", stored),
+                    await verify_password_async("wrong", stored))
+
+        assert asyncio.run(_run()) == (True, False)
+        assert pool.stats["jobs"] == 3
+
+    def test_pin_round_trip_and_legacy(self, pool):
+        async def _run():
+            stored = await hash_pin_async("1234")
+            legacy = hashlib.sha256(b"1234").hexdigest()
+            return await verify_pin_async("1234", stored), await verify_pin_async("1234", legacy)
+
+        assert asyncio.run(_run()) == (True, True)
+
+    def test_batch_pin_check_is_one_job(self, pool):
+        hashes = [hash_pin("1111"), hash_pin("2222"), "", hashlib.sha256(b"2222").hexdigest()]
+        matches = asyncio.run(verify_pins_async("2222", hashes))
+        assert matches == [False, True, False, True]
+        assert pool.stats["jobs"] == 1
+        assert asyncio.run(verify_pins_async("2222", [])) == []
+
+    def test_first_match_stops_checking(self, pool, monkeypatch):
+        checked = []
+        real = security.verify_pin
+
+        def counting_verify(pin, stored_hash):
+            checked.append(stored_hash)
+            return real(pin, stored_hash)
+
+        monkeypatch.setattr(security, "verify_pin", counting_verify)
+        hashes = [hashlib.sha256(p.encode()).hexdigest() for p in ("1111", "2222", "2222", "3333")]
+        matches = asyncio.run(verify_pins_async("2222", hashes, first_match=True))
+        assert matches == [False, True, False, False]
+        assert checked == hashes[:2]
+
+
+class TestBoundedPool:
+    def test_saturated_pool_sheds_with_503(self, monkeypatch):
+        pool = security._HashPool(workers=1, max_queue=1)
+        monkeypatch.setattr(security, "hash_pool", pool)
+        release = threading.Event()
+
+        async def _run():
+            jobs = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            with pytest.raises(HashPoolBusy) as err:
+                await pool.run(release.wait, 5)
+            release.set()
+            await asyncio.gather(*jobs)
+            return err.value
+
+        err = asyncio.run(_run())
+        assert err.status == 503 and err.code == "AUTH_BUSY"
+        assert pool.stats["rejected"] == 1 and pool.stats["jobs"] == 2
+
+    def test_queue_time_recorded(self, pool):
+        async def _run():
+            # Four 50 ms jobs on two threads: the second pair waits ~50 ms
+            await asyncio.gather(*[pool.run(time.sleep, 0.05) for _ in range(4)])
+
+        asyncio.run(_run())
+        snap = pool.snapshot()
+        assert snap["jobs"] == 4 and snap["pending"] == 0
+        assert snap["queue_ms_total"] >= 60
+        assert snap["max_pending"] == 4
+
+    def test_event_loop_keeps_ticking_during_hashing(self, pool):
+        stored = hash_password("pw")
+        start = time.perf_counter()
+        hash_password("pw")
+        one_hash = time.perf_counter() - start
+
+        async def _run():
+            gaps = []
+            done = asyncio.Event()
+
+            async def ticker():
+                last = time.perf_counter()
+                while not done.is_set():
+                    await asyncio.sleep(0.002)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            tick = asyncio.ensure_future(ticker())
+            await asyncio.gather(*[verify_password_async("pw", stored) for _ in range(4)])
+            done.set()
+            await tick
+            return max(gaps)
+
+        assert asyncio.run(_run()) < one_hash / 2
+
+    def test_stats_exported(self):
+        assert "queue_p99_ms" in cache_stats()["hash_pool"]
+        state = metrics.export_state()
+        assert "queue_p99_ms" in state["cache_gauges"]["hash_pool"]
+        assert "jobs" in state["caches"]["hash_pool"] and "pending" not in state["caches"]["hash_pool"]
@@ -0,0 +1,91 @@
+"""
+Tests for the UNS block sequence allocator (runs against MockDatabase).
+"""
+
+import asyncio
+
+import pytest
+from core.mock_database import MockDatabase
+from services.id_service import SequenceAllocator, get_numbering_config, next_display_id
+
+
+@pytest.fixture
+def mock_db(tmp_path):
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+class TestSequenceAllocator:
+    """Test atomic block allocation over the counters collection."""
+
+    def test_block_costs_one_counter_write(self, mock_db):
+        alloc = SequenceAllocator()
+
+        async def _run():
+            return [await alloc.next(mock_db, "v1", "order", block_size=10) for _ in range(10)]
+
+        assert asyncio.run(_run()) == list(range(1, 11))
+        counters = mock_db.data_store["counters"]
+        assert len(counters) == 1
+        assert counters[0]["seq"] == 10
+
+    def test_concurrent_workers_never_collide(self, mock_db):
+        workers = [SequenceAllocator() for _ in range(3)]
+
+        async def _run():
+            return await asyncio.gather(*[
+                workers[i % 3].next(mock_db, "v1", "kds_ticket", block_size=4) for i in range(60)
+            ])
+
+        seqs = asyncio.run(_run())
+        assert len(set(seqs)) == 60
+
+    def test_venues_and_entities_are_independent(self, mock_db):
+        alloc = SequenceAllocator()
+
+        async def _run():
+            return (
+                await alloc.next(mock_db, "v1", "order"),
+                await alloc.next(mock_db, "v2", "order"),
+                await alloc.next(mock_db, "v1", "guest"),
+            )
+
+        assert asyncio.run(_run()) == (1, 1, 1)
+
+    def test_floor_skips_legacy_numbers(self, mock_db):
+        alloc = SequenceAllocator()
+
+        async def _run():
+            await alloc.ensure_floor(mock_db, "v1", "order", 41)
+            return await alloc.next(mock_db, "v1", "order", block_size=5)
+
+        assert asyncio.run(_run()) == 42
+
+    def test_display_id_format(self, mock_db):
+        assert asyncio.run(next_display_id(mock_db, "venue-x", "order")).startswith("ORD-0000")
+
+
+class TestNumberingConfigCache:
+    """Cached numbering config is dropped when venue settings are written."""
+
+    def test_settings_patch_invalidates(self, mock_db, monkeypatch):
+        import routes.venue_routes as venue_routes
+        monkeypatch.setattr(venue_routes, "db", mock_db)
+
+        async def no_audit(*args, **kwargs):
+            return None
+
+        monkeypatch.setattr(venue_routes, "create_audit_log", no_audit)
+        router = venue_routes.create_venue_router()
+        endpoint = next(r.endpoint for r in router.routes
+                        if r.path == "/venues/{venue_id}/settings" and "PATCH" in r.methods)
+        user = {"id": "u1", "name": "Owner", "role": "owner"}
+
+        async def _run():
+            await mock_db.venues.insert_one({"id": "v-num", "settings": {}})
+            before = await get_numbering_config(mock_db, "v-num", "order")
+            await endpoint("v-num", {"numbering": {"entities": {"order": {"prefix": "TKT"}}}}, user)
+            return before, await get_numbering_config(mock_db, "v-num", "order")
+
+        before, after = asyncio.run(_run())
+        assert before["prefix"] == "ORD"
+        assert after["prefix"] == "TKT"
@@ -0,0 +1,127 @@
+"""
+Tests for the ASGI idempotency middleware (single-flight + LRU over MockDatabase).
+"""
+
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import core.idempotency_middleware as idem_mod
+from core.idempotency_middleware import IdempotencyMiddleware, cleanup_expired_idempotency_keys
+from core.mock_database import MockDatabase
+
+
+@pytest.fixture
+def mock_db(tmp_path):
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+def _app(mock_db, calls, delay=0.0, cache_size=100):
+    app = FastAPI()
+
+    @app.post("/api/orders")
+    async def create_order():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"order": len(calls)}
+
+    @app.post("/api/exports", status_code=202)
+    async def queue_export():
+        calls.append(1)
+        return {"export": len(calls)}
+
+    app.add_middleware(IdempotencyMiddleware, cache_size=cache_size, database=mock_db)
+    return app
+
+
+async def _post(client, path="/api/orders", key="k1"):
+    return await client.post(path, headers={"X-Idempotency-Key": key})
+
+
+def _run(app, coro_fn):
+    async def _main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await coro_fn(client)
+    return asyncio.run(_main())
+
+
+class TestIdempotencyMiddleware:
+    """Replays never re-run the handler."""
+
+    def test_concurrent_duplicates_execute_once(self, mock_db):
+        calls = []
+        app = _app(mock_db, calls, delay=0.05)
+        responses = _run(app, lambda c: asyncio.gather(*[_post(c) for _ in range(5)]))
+        assert len(calls) == 1
+        assert {r.json()["order"] for r in responses} == {1}
+        assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+        assert len(mock_db.data_store["idempotency_keys"]) == 1
+
+    def test_sequential_replay_served_from_lru(self, mock_db):
+        calls = []
+        app = _app(mock_db, calls)
+
+        async def _seq(client):
+            first = await _post(client)
+            mock_db.data_store["idempotency_keys"].clear()  # LRU answers without Mongo
+            return first, await _post(client)
+
+        first, second = _run(app, _seq)
+        assert len(calls) == 1
+        assert second.json() == first.json()
+
+    def test_replay_after_lru_eviction_hits_store(self, mock_db):
+        calls = []
+        app = _app(mock_db, calls, cache_size=1)
+
+        async def _seq(client):
+            await _post(client, key="a")
+            await _post(client, key="b")   # evicts "a" from the LRU
+            return await _post(client, key="a")
+
+        replay = _run(app, _seq)
+        assert len(calls) == 2
+        assert replay.json() == {"order": 1}
+
+    def test_store_replays_same_statuses_as_lru(self, mock_db):
+        calls = []
+        app = _app(mock_db, calls, cache_size=1)
+
+        async def _seq(client):
+            await _post(client, path="/api/exports", key="a")
+            await _post(client, key="b")   # evicts "a": the retry is answered from the store
+            return await _post(client, path="/api/exports", key="a")
+
+        replay = _run(app, _seq)
+        assert len(calls) == 2
+        assert replay.status_code == 202 and replay.headers.get("idempotent-replayed") == "true"
+
+    def test_expiry_is_a_date_for_ttl(self, mock_db):
+        _run(_app(mock_db, []), _post)
+        record = mock_db.data_store["idempotency_keys"][0]
+        assert not isinstance(record["expires_at"], str)
+
+    def test_without_key_passes_through(self, mock_db):
+        calls = []
+        app = _app(mock_db, calls)
+        _run(app, lambda c: asyncio.gather(c.post("/api/orders"), c.post("/api/orders")))
+        assert len(calls) == 2
+        assert "idempotency_keys" not in mock_db.data_store or not mock_db.data_store["idempotency_keys"]
+
+
+class TestCleanup:
+    def test_sweeps_string_and_date_expiries(self, mock_db, monkeypatch):
+        monkeypatch.setattr(idem_mod, "db", mock_db)
+        now = datetime.now(timezone.utc)
+        mock_db.data_store["idempotency_keys"] = [
+            {"_id": "1", "key": "legacy-old", "expires_at": (now - timedelta(hours=1)).isoformat()},
+            {"_id": "2", "key": "legacy-live", "expires_at": (now + timedelta(hours=1)).isoformat()},
+            {"_id": "3", "key": "date-old", "expires_at": now - timedelta(hours=1)},
+            {"_id": "4", "key": "date-live", "expires_at": now + timedelta(hours=1)},
+        ]
+        assert asyncio.run(cleanup_expired_idempotency_keys()) == 2
+        assert sorted(k["key"] for k in mock_db.data_store["idempotency_keys"]) == ["date-live", "legacy-live"]
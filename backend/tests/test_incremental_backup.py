@@ -0,0 +1,158 @@
+"""
+Tests for incremental backups in BackupService (high-water marks, chunked
+gzip export, base + increment restore, chunk verification).
+"""
+
+import asyncio
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+import services.backup_service as backup_mod
+import services.segmented_audit_log as audit_mod
+from core.mock_database import MockDatabase
+from services.backup_service import BackupService
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_mod, "_logs", {})
+    monkeypatch.setattr(backup_mod, "BACKUP_CHUNK_DOCS", 3)
+    monkeypatch.setattr(backup_mod, "BACKUP_WATERMARK_OVERLAP_SECONDS", 0)
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+    return BackupService(db, {"local_backup_dir": str(tmp_path / "backups")})
+
+
+def _seed_orders(db, ids, venue_id="v1"):
+    async def _run():
+        for i in ids:
+            await db.orders.insert_one({"_id": f"o{i:03d}", "id": f"o{i}", "venue_id": venue_id,
+                                        "total": i, "updated_at": _now()})
+    asyncio.run(_run())
+
+
+class TestIncrementalBackup:
+    def test_base_then_only_changes(self, service):
+        db = service.db
+        _seed_orders(db, range(7))
+
+        base = asyncio.run(service.create_incremental_backup(collections=["orders"]))
+        assert base["type"] == "base" and base["collections"]["orders"]["docs"] == 7
+        assert len(base["collections"]["orders"]["chunks"]) == 3  # 3 + 3 + 1
+
+        asyncio.run(asyncio.sleep(0.001))
+        asyncio.run(db.orders.update_one({"_id": "o002"}, {"$set": {"total": 99, "updated_at": _now()}}))
+        _seed_orders(db, [7])
+        inc = asyncio.run(service.create_incremental_backup(collections=["orders"]))
+        assert inc["type"] == "incremental" and inc["parent_id"] == base["backup_id"]
+        assert inc["collections"]["orders"]["docs"] == 2
+
+        # Nothing changed since: an empty increment
+        empty = asyncio.run(service.create_incremental_backup(collections=["orders"]))
+        assert empty["docs"] == 0 and empty["base_id"] == base["backup_id"]
+
+    def test_docs_without_updated_at_follow_id_mark(self, service):
+        db = service.db
+
+        async def _run():
+            await db.tables.insert_one({"_id": "t001", "venue_id": "v1"})
+            await service.create_incremental_backup(collections=["tables"])
+            await db.tables.insert_one({"_id": "t002", "venue_id": "v1"})
+            return await service.create_incremental_backup(collections=["tables"])
+
+        inc = asyncio.run(_run())
+        assert inc["collections"]["tables"]["docs"] == 1
+
+    def test_venue_scope(self, service):
+        _seed_orders(service.db, range(3), venue_id="v1")
+        _seed_orders(service.db, range(10, 12), venue_id="v2")
+        manifest = asyncio.run(service.create_incremental_backup(venue_id="v2", collections=["orders"]))
+        assert manifest["scope"] == "v2" and manifest["docs"] == 2
+
+    def test_collections_discovered_without_bookkeeping(self, service):
+        _seed_orders(service.db, range(2))
+        manifest = asyncio.run(service.create_incremental_backup())
+        assert "orders" in manifest["collections"]
+        assert "backups" not in manifest["collections"]
+        assert "backup_watermarks" not in manifest["collections"]
+
+
+class TestRestore:
+    def test_replays_base_and_increments(self, service, tmp_path):
+        db = service.db
+        _seed_orders(db, range(5))
+        asyncio.run(service.create_incremental_backup(collections=["orders"]))
+        asyncio.run(asyncio.sleep(0.001))
+        asyncio.run(db.orders.update_one({"_id": "o001"}, {"$set": {"total": 42, "updated_at": _now()}}))
+        _seed_orders(db, [5, 6])
+        last = asyncio.run(service.create_incremental_backup(collections=["orders"]))
+
+        target = MockDatabase(db_file=str(tmp_path / "restore_db.json"), storage="journal")
+        result = asyncio.run(service.restore_incremental(last["backup_id"], target_db=target))
+        assert len(result["backups"]) == 2
+
+        async def _read():
+            return {d["_id"]: d["total"] async for d in target.orders.find({})}
+
+        restored = asyncio.run(_read())
+        assert len(restored) == 7 and restored["o001"] == 42
+
+    def test_corrupt_chunk_detected(self, service):
+        _seed_orders(service.db, range(4))
+        manifest = asyncio.run(service.create_incremental_backup(collections=["orders"]))
+        backup_dir = service.local_backup_dir / manifest["backup_id"]
+        assert asyncio.run(service.verify_backup(manifest["backup_id"]))["valid"]
+
+        chunk = backup_dir / manifest["collections"]["orders"]["chunks"][0]["file"]
+        chunk.write_bytes(gzip.compress(b'{"_id": "forged"}\n'))
+        result = asyncio.run(service.verify_backup(manifest["backup_id"]))
+        assert not result["valid"] and result["chunk"] == chunk.name
+        with pytest.raises(ValueError):
+            asyncio.run(service.restore_incremental(manifest["backup_id"]))
+
+
+class TestWatermarkBranches:
+    """Every change class is exported whichever marks the previous run set."""
+
+    def test_unmarked_branches_start_from_the_beginning(self, service):
+        db = service.db
+
+        async def _run():
+            # Base sees only docs with string updated_at: no _id mark, no datetime mark
+            await db.orders.insert_one({"_id": "o001", "venue_id": "v1", "updated_at": _now()})
+            await service.create_incremental_backup(collections=["orders"])
+            await db.orders.insert_one({"_id": "o002", "venue_id": "v1"})
+            await db.orders.insert_one({"_id": "o003", "venue_id": "v1", "updated_at": datetime.now(timezone.utc)})
+            inc = await service.create_incremental_backup(collections=["orders"])
+            # Next base sees only an unstamped doc: no updated_at marks at all
+            await db.tables.insert_one({"_id": "t001", "venue_id": "v1"})
+            await service.create_incremental_backup(collections=["tables"], full=True)
+            await db.tables.update_one({"_id": "t001"}, {"$set": {"updated_at": _now()}})
+            await db.tables.insert_one({"_id": "t000", "venue_id": "v1", "updated_at": _now()})
+            await db.tables.insert_one({"_id": "t002", "venue_id": "v1"})
+            return inc, await service.create_incremental_backup(collections=["tables"])
+
+        inc, tables = asyncio.run(_run())
+        assert inc["collections"]["orders"]["docs"] == 2
+        watermark = inc["collections"]["orders"]["watermark"]
+        assert watermark["last_id"] == "o002" and isinstance(watermark["updated_at_date"], datetime)
+        assert tables["collections"]["tables"]["docs"] == 3
+
+    def test_mixed_updated_at_types_keep_both_marks(self, service):
+        db = service.db
+
+        async def _run():
+            await db.orders.insert_one({"_id": "o001", "venue_id": "v1", "updated_at": _now()})
+            await db.orders.insert_one({"_id": "o002", "venue_id": "v1", "updated_at": datetime.now(timezone.utc)})
+            await service.create_incremental_backup(collections=["orders"])
+            await asyncio.sleep(0.001)
+            await db.orders.update_one({"_id": "o002"}, {"$set": {"updated_at": datetime.now(timezone.utc)}})
+            return await service.create_incremental_backup(collections=["orders"])
+
+        inc = asyncio.run(_run())
+        assert inc["collections"]["orders"]["docs"] == 1
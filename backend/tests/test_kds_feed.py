@@ -0,0 +1,93 @@
+"""
+Tests for the KDS station snapshot feed (runs against MockDatabase).
+"""
+
+import asyncio
+
+import pytest
+import kds.services.kds_feed_service as feed_module
+from core.events_outbox import get_outbox_writer
+from core.mock_database import MockDatabase
+from kds.models import KdsTicketStateCreate, TicketStatus
+from kds.services import KdsFeedService, KdsRuntimeService
+
+
+@pytest.fixture
+def mock_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_module, "SYNC_INTERVAL_SECONDS", 0)
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+class _CountingOrders:
+    def __init__(self, col):
+        self.col = col
+        self.find_calls = 0
+
+    def find(self, *args, **kwargs):
+        self.find_calls += 1
+        return self.col.find(*args, **kwargs)
+
+
+async def _seed(db, runtime, n):
+    tickets = []
+    for i in range(n):
+        await db.orders.insert_one({"id": f"o{i}", "table_name": f"T{i}", "items": []})
+        tickets.append(await runtime.create_ticket(
+            KdsTicketStateCreate(order_id=f"o{i}", station_key="GRILL", venue_id="v1"), actor_id="u1"
+        ))
+    await get_outbox_writer(db).flush()
+    return tickets
+
+
+class TestKdsFeed:
+    """Test snapshot build, batched order join and versioned deltas."""
+
+    def test_snapshot_joins_orders_in_one_query(self, mock_db):
+        runtime = KdsRuntimeService(mock_db)
+        feed = KdsFeedService(mock_db)
+
+        async def _run():
+            await _seed(mock_db, runtime, 12)
+            orders = _CountingOrders(mock_db.orders)
+            feed.db = type("Db", (), {"orders": orders, "outbox_events": mock_db.outbox_events})()
+            tickets = await feed.get_tickets("v1", "GRILL")
+            return tickets, orders.find_calls
+
+        tickets, calls = asyncio.run(_run())
+        assert len(tickets) == 12
+        assert calls == 1
+        assert tickets[0]["order_details"]["table_name"] == "T0"
+        assert tickets[0]["wait_time"]["visual_state"] == "normal"
+
+    def test_deltas_since_version(self, mock_db):
+        runtime = KdsRuntimeService(mock_db)
+        feed = KdsFeedService(mock_db)
+
+        async def _run():
+            tickets = await _seed(mock_db, runtime, 3)
+            first = await feed.get_feed("v1", "GRILL")
+            await runtime.bump_ticket(tickets[0].id, "v1", TicketStatus.PREPARING, "u1")
+            await runtime.bump_ticket(tickets[1].id, "v1", TicketStatus.COMPLETED, "u1")
+            await get_outbox_writer(mock_db).flush()
+            delta = await feed.get_feed("v1", "GRILL", since_version=first["version"], epoch=first["epoch"])
+            return tickets, first, delta
+
+        tickets, first, delta = asyncio.run(_run())
+        assert first["full"] is True
+        assert len(first["tickets"]) == 3
+        assert delta["full"] is False
+        assert [t["id"] for t in delta["upserts"]] == [tickets[0].id]
+        assert delta["upserts"][0]["status"] == TicketStatus.PREPARING
+        assert delta["removed"] == [tickets[1].id]
+
+    def test_unknown_epoch_gets_full_list(self, mock_db):
+        runtime = KdsRuntimeService(mock_db)
+        feed = KdsFeedService(mock_db)
+
+        async def _run():
+            await _seed(mock_db, runtime, 2)
+            return await feed.get_feed("v1", "GRILL", since_version=1, epoch="other-worker")
+
+        result = asyncio.run(_run())
+        assert result["full"] is True
+        assert len(result["tickets"]) == 2
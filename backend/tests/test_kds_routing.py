@@ -0,0 +1,78 @@
+"""
+Tests for the compiled, cached KDS routing table.
+"""
+
+import asyncio
+
+import pytest
+from core.mock_database import MockDatabase
+from kds.services import KdsRoutingService, KdsStationService
+from kds.services.kds_routing_service import _routing_cache
+
+
+@pytest.fixture
+def mock_db(tmp_path):
+    _routing_cache.clear()
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+    stations = [
+        {"station_key": "GRILL", "routing_rules": [{"type": "category", "values": ["Mains"]}]},
+        {"station_key": "BAR", "routing_rules": [{"type": "tag", "values": ["drink"]}]},
+        {"station_key": "PASTRY", "routing_rules": [{"type": "item_id", "values": ["mi-tiramisu"]}]},
+        {"station_key": "KITCHEN", "routing_rules": []},
+    ]
+    for st in stations:
+        asyncio.run(db.kds_stations.insert_one({"venue_id": "v1", "enabled": True, **st}))
+    return db
+
+
+class _CountingStations:
+    def __init__(self, col):
+        self.col = col
+        self.calls = 0
+
+    def find(self, *args, **kwargs):
+        self.calls += 1
+        return self.col.find(*args, **kwargs)
+
+
+class TestKdsRouting:
+    """Test rule compilation, whole-order routing and invalidation."""
+
+    def test_rule_types_and_default(self, mock_db):
+        routing = KdsRoutingService(mock_db)
+
+        async def _run():
+            return [
+                await routing.get_stations_for_item("v1", {"category": "Mains", "tags": ["drink"]}),
+                await routing.get_stations_for_item("v1", {"menu_item_id": "mi-tiramisu"}),
+                await routing.get_stations_for_item("v1", {"category": "Unknown"}),
+            ]
+
+        assert asyncio.run(_run()) == [["GRILL", "BAR"], ["PASTRY"], ["KITCHEN"]]
+
+    def test_route_order_warm_path_has_no_db_hits(self, mock_db):
+        routing = KdsRoutingService(mock_db)
+        counting = _CountingStations(mock_db.kds_stations)
+        routing.station_col = counting
+        items = [{"id": f"i{i}", "category": "Mains" if i % 2 else "Salads"} for i in range(20)]
+
+        async def _run():
+            await routing.route_order("v1", items)
+            return await routing.route_order("v1", items)
+
+        routed = asyncio.run(_run())
+        assert counting.calls == 1
+        assert len(routed["GRILL"]) == 10
+        assert len(routed["KITCHEN"]) == 10
+
+    def test_station_write_invalidates_cache(self, mock_db):
+        routing = KdsRoutingService(mock_db)
+        stations = KdsStationService(mock_db)
+
+        async def _run():
+            before = await routing.get_stations_for_item("v1", {"category": "Salads"})
+            await stations.update_routing("GRILL", "v1", [{"type": "category", "values": ["Salads"]}], "u1")
+            after = await routing.get_stations_for_item("v1", {"category": "Salads"})
+            return before, after
+
+        assert asyncio.run(_run()) == (["KITCHEN"], ["GRILL"])
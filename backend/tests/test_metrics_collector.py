@@ -2,8 +2,13 @@
 Tests for the Hyperscale Metrics API and MetricsCollector.
 """
 
+import asyncio
+import json
+import threading
+
 import pytest
-from core.metrics_collector import MetricsCollector
+import core.metrics_collector as metrics_mod
+from core.metrics_collector import MetricsCollector, merge_states, register_cache_stats, render_prometheus
 
 
 class TestMetricsCollector:
@@ -66,3 +71,104 @@ class TestMetricsCollector:
         snapshot = mc.get_snapshot()
         error_rate = snapshot["error_rate_5xx"]
         assert error_rate == pytest.approx(0.01, abs=0.001)
+
+
+class TestHistogramMetrics:
+    """Per-route histograms, lock-free shards and mergeable worker state."""
+
+    def test_per_route_percentiles(self):
+        mc = MetricsCollector()
+        for i in range(100):
+            mc.record_request(latency_ms=5.0, status_code=200, path="/api/fast")
+            mc.record_request(latency_ms=float(400 + i), status_code=200, path="/api/slow")
+        endpoints = {ep["path"]: ep for ep in mc.get_snapshot()["top_endpoints"]}
+        assert endpoints["/api/fast"]["p99_latency_ms"] <= 5
+        assert 400 <= endpoints["/api/slow"]["p99_latency_ms"] <= 500
+
+    def test_threads_record_into_own_shards(self):
+        mc = MetricsCollector()
+
+        def worker():
+            for _ in range(1000):
+                mc.record_request(latency_ms=10, status_code=200, path="/api/test")
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert mc.get_snapshot()["total_requests"] == 4000
+
+    def test_worker_states_merge(self):
+        a, b = MetricsCollector(), MetricsCollector()
+        a.record_request(latency_ms=10, status_code=200, path="/api/orders")
+        b.record_request(latency_ms=20, status_code=200, path="/api/orders")
+        b.record_request(latency_ms=20, status_code=503, path="/api/orders")
+        # States travel between workers as JSON
+        merged = merge_states([json.loads(json.dumps(a.export_state())), b.export_state()])
+        assert merged["workers"] == 2
+        by_status = {s["status"]: sum(s["counts"]) for s in merged["series"]}
+        assert by_status == {"2xx": 2, "5xx": 1}
+
+    def test_shared_dir_aggregation(self, tmp_path):
+        mc = MetricsCollector()
+        mc.record_request(latency_ms=10, status_code=200, path="/api/test")
+        # Our own file is skipped in favour of the live state
+        mc.write_shared_state(str(tmp_path))
+
+        other = MetricsCollector()
+        other.record_request(latency_ms=10, status_code=200, path="/api/test")
+        (tmp_path / "metrics-999999.json").write_text(json.dumps(other.export_state()))
+
+        merged = merge_states(mc.collect_states(str(tmp_path)))
+        assert merged["workers"] == 2
+        assert sum(sum(s["counts"]) for s in merged["series"]) == 2
+
+    def test_cache_gauges_are_not_summed(self, monkeypatch):
+        monkeypatch.setattr(metrics_mod, "_cache_stats_sources", {})
+        register_cache_stats("demo", lambda: {"hits": 3, "entries": 7})
+        state = MetricsCollector().export_state()
+        other = dict(json.loads(json.dumps(state)), pid=state["pid"] + 1)
+        merged = merge_states([state, other])
+        assert merged["caches"] == {"demo": {"hits": 6}}
+        assert [g["demo"]["entries"] for g in merged["cache_gauges"].values()] == [7, 7]
+
+        text = render_prometheus(merged)
+        assert "# TYPE app_cache_events_total counter" in text
+        assert 'app_cache_events_total{cache="demo",event="hits"} 6' in text
+        assert 'event="entries"' not in text
+        assert "# TYPE app_cache_gauge gauge" in text
+        assert f'app_cache_gauge{{cache="demo",stat="entries",pid="{state["pid"]}"}} 7' in text
+
+    def test_prometheus_exposition(self):
+        mc = MetricsCollector()
+        mc.record_request(latency_ms=3, status_code=200, path="/api/test")
+        mc.record_request(latency_ms=300, status_code=404, path="/api/test")
+        text = render_prometheus(merge_states([mc.export_state()]))
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert 'http_request_duration_seconds_bucket{route="/api/test",status="2xx",le="0.005"} 1' in text
+        assert 'http_request_duration_seconds_bucket{route="/api/test",status="4xx",le="0.2"} 0' in text
+        assert 'http_request_duration_seconds_count{route="/api/test",status="4xx"} 1' in text
+        assert 'le="+Inf"' in text
+
+
+class TestPrometheusEndpoint:
+    """/metrics is served only to scrapers holding METRICS_TOKEN."""
+
+    def test_denied_without_configured_token(self, monkeypatch):
+        import routes.hyperscale_routes as hyperscale_routes
+        from fastapi import HTTPException
+        monkeypatch.setattr(hyperscale_routes, "METRICS_TOKEN", "")
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(hyperscale_routes.prometheus_metrics(authorization=""))
+        assert exc.value.status_code == 403
+
+    def test_token_required(self, monkeypatch):
+        import routes.hyperscale_routes as hyperscale_routes
+        from fastapi import HTTPException
+        monkeypatch.setattr(hyperscale_routes, "METRICS_TOKEN", "s3cret")
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(hyperscale_routes.prometheus_metrics(authorization="Bearer nope"))
+        assert exc.value.status_code == 401
+        response = asyncio.run(hyperscale_routes.prometheus_metrics(authorization="Bearer s3cret"))
+        assert response.status_code == 200
@@ -0,0 +1,196 @@
+"""
+Tests for the journaled MockDatabase storage engine (WAL + snapshot recovery).
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+from core.mock_database import MockDatabase
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "local_db.json")
+
+
+def _open(path, **kwargs):
+    db = MockDatabase(db_file=path, storage="journal")
+    for k, v in kwargs.items():
+        setattr(db.journal, k, v)
+    return db
+
+
+class TestMockJournal:
+    """Test append-only persistence and crash recovery."""
+
+    def test_fresh_install_seeds_snapshot(self, db_path):
+        db = _open(db_path)
+        assert os.path.exists(db_path)
+        assert any(u["id"] == "admin_user" for u in db.data_store["users"])
+
+    def test_writes_append_to_wal_not_snapshot(self, db_path):
+        db = _open(db_path)
+        snap_before = open(db_path).read()
+        asyncio.run(db.orders.insert_one({"_id": "o1", "id": "o1", "total": 10}))
+        db.journal.flush()
+        assert open(db_path).read() == snap_before
+        lines = open(db.journal.wal_file).read().splitlines()
+        assert json.loads(lines[-1])["op"] == "i"
+
+    def test_recovery_replays_insert_update_delete(self, db_path):
+        db = _open(db_path)
+
+        async def _work():
+            await db.orders.insert_one({"_id": "o1", "id": "o1", "total": 10})
+            await db.orders.insert_one({"_id": "o2", "id": "o2", "total": 5})
+            await db.orders.update_one({"id": "o1"}, {"$inc": {"total": 2}})
+            await db.orders.delete_one({"id": "o2"})
+
+        asyncio.run(_work())
+        db.close()  # simulate crash: no checkpoint, only the WAL is on disk
+
+        recovered = _open(db_path)
+        orders = recovered.data_store["orders"]
+        assert [o["id"] for o in orders] == ["o1"]
+        assert orders[0]["total"] == 12
+
+    def test_generated_ids_survive_deletes_and_replay(self, db_path):
+        db = _open(db_path)
+
+        async def _work():
+            ids = [(await db.orders.insert_one({"id": f"o{i}"})).inserted_id for i in range(3)]
+            await db.orders.delete_one({"id": "o0"})
+            # Same collection size as before the delete, same second: must not reuse an id
+            ids.append((await db.orders.insert_one({"id": "o3"})).inserted_id)
+            await db.orders.update_one({"id": "o3"}, {"$set": {"total": 7}})
+            return ids
+
+        ids = asyncio.run(_work())
+        assert len(set(ids)) == 4 and ids == sorted(ids)
+        db.close()
+
+        orders = _open(db_path).data_store["orders"]
+        assert {o["id"]: o.get("total") for o in orders} == {"o1": None, "o2": None, "o3": 7}
+
+    def test_group_commit_batches_fsync(self, db_path):
+        db = _open(db_path, group_commit_s=0.01)
+
+        async def _burst():
+            for i in range(50):
+                await db.orders.insert_one({"_id": f"o{i}", "id": f"o{i}"})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(_burst())
+        assert db.journal.stats["appends"] == 50
+        assert db.journal.stats["flushes"] == 1
+
+    def test_snapshot_compacts_wal(self, db_path):
+        db = _open(db_path, snapshot_every=3)
+        for i in range(3):
+            asyncio.run(db.orders.insert_one({"_id": f"o{i}", "id": f"o{i}"}))
+        assert not os.path.exists(db.journal.wal_file)
+        db.close()
+
+        recovered = _open(db_path)
+        assert len(recovered.data_store["orders"]) == 3
+        assert recovered.journal.stats["replayed"] == 0
+
+    def test_torn_tail_record_is_ignored(self, db_path):
+        db = _open(db_path)
+        asyncio.run(db.orders.insert_one({"_id": "o1", "id": "o1"}))
+        db.close()
+        with open(db.journal.wal_file, "a") as f:
+            f.write('{"seq": 99, "c": "orders", "op": "i", "doc": {')
+
+        recovered = _open(db_path)
+        assert [o["id"] for o in recovered.data_store["orders"]] == ["o1"]
+
+
+class TestMockIndexes:
+    """Test the secondary indexes and query planner."""
+
+    def _seeded(self, db_path):
+        db = _open(db_path)
+
+        async def _seed():
+            for i in range(200):
+                await db.orders.insert_one({
+                    "_id": f"o{i}",
+                    "id": f"o{i}",
+                    "venue_id": f"v{i % 4}",
+                    "status": "open" if i % 2 else "closed",
+                    "created_at": f"2026-01-{(i % 28) + 1:02d}T12:00:00",
+                })
+
+        asyncio.run(_seed())
+        return db
+
+    def _scan(self, db, query):
+        coll = db.orders
+        return [d for d in coll.data if coll._matches_query(d, query)]
+
+    def test_equality_uses_most_selective_index(self, db_path):
+        db = self._seeded(db_path)
+        plan = db.orders.explain({"venue_id": "v1", "id": "o5"})
+        assert plan["index"] == "hash:id"
+        assert plan["estimate"] == 1
+
+    def test_index_results_match_full_scan(self, db_path):
+        db = self._seeded(db_path)
+        queries = [
+            {"venue_id": "v2", "status": "open"},
+            {"id": {"$in": ["o1", "o7", "o999"]}},
+            {"venue_id": "v3", "created_at": {"$gte": "2026-01-10", "$lt": "2026-01-15"}},
+            {"created_at": {"$gt": "2026-01-27T12:00:00"}},
+        ]
+        for q in queries:
+            got = asyncio.run(db.orders.find(q).to_list(None))
+            assert got == self._scan(db, q), q
+
+    def test_range_plan_for_timestamps(self, db_path):
+        db = self._seeded(db_path)
+        plan = db.orders.explain({"created_at": {"$gte": "2026-01-28"}})
+        assert plan["index"] == "range:created_at"
+
+    def test_update_and_delete_keep_indexes_consistent(self, db_path):
+        db = self._seeded(db_path)
+
+        async def _work():
+            await db.orders.update_one({"id": "o3"}, {"$set": {"venue_id": "v9"}})
+            await db.orders.delete_one({"id": "o4"})
+            return (
+                await db.orders.count_documents({"venue_id": "v9"}),
+                await db.orders.find_one({"venue_id": "v3", "id": "o3"}),
+                await db.orders.find_one({"id": "o4"}),
+            )
+
+        moved, stale, deleted = asyncio.run(_work())
+        assert moved == 1
+        assert stale is None
+        assert deleted is None
+
+    def test_doc_changed_in_place_is_unindexed_by_indexed_values(self, db_path):
+        db = self._seeded(db_path)
+        stored = {d["id"]: d for d in db.orders.data}
+        # Callers holding a stored doc may change it without going through update_one
+        stored["o5"]["created_at"] = "2026-02-01T00:00:00"
+        stored["o6"]["created_at"] = "2026-02-02T00:00:00"
+
+        async def _work():
+            await db.orders.delete_one({"id": "o5"})
+            await db.orders.update_one({"id": "o6"}, {"$set": {"status": "void"}})
+            return await db.orders.find({"created_at": {"$gte": "2026-01-06"}}).to_list(None)
+
+        got = asyncio.run(_work())
+        query = {"created_at": {"$gte": "2026-01-06"}}
+        assert got == self._scan(db, query)
+        assert sum(d["id"] == "o6" for d in got) == 1
+
+    def test_create_index_on_existing_data(self, db_path):
+        db = self._seeded(db_path)
+        assert db.orders.explain({"status": "open"})["index"] is None
+        asyncio.run(db.orders.create_index("status"))
+        assert db.orders.explain({"status": "open"})["index"] == "hash:status"
+        assert asyncio.run(db.orders.count_documents({"status": "open"})) == 100
@@ -0,0 +1,150 @@
+"""
+Tests for the set-based send-order pipeline in services.order_service
+(catalog snapshot lookups, per-SKU bulk stock decrement, batched inserts).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import services.catalog_snapshot as catalog_mod
+import services.id_service as id_mod
+from core.mock_database import MockDatabase
+from services.catalog_snapshot import get_catalog
+from services.id_service import SequenceAllocator, next_display_ids
+from services.order_service import process_send_order
+
+REQUEST = SimpleNamespace(state=SimpleNamespace(request_id="req-1"))
+USER = {"id": "u1"}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(id_mod, "sequence_allocator", SequenceAllocator())
+    monkeypatch.setattr(id_mod, "_config_cache", {})
+    monkeypatch.setattr(catalog_mod, "_cache", catalog_mod._CatalogCache())
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+    async def _seed():
+        await db.venues.insert_one({"id": "v1", "settings": {}})
+        await db.menu_items.insert_many([
+            {"id": "burger", "venue_id": "v1", "prep_area": "grill", "prep_time_seconds": 600},
+            {"id": "salad", "venue_id": "v1", "prep_area": "cold"},
+            {"id": "cola", "venue_id": "v1"},
+        ])
+        await db.recipes.insert_one({"menu_item_id": "burger", "venue_id": "v1", "components": [
+            {"item_id": "bun", "qty": 1}, {"item_id": "patty", "qty": 2}]})
+        await db.recipes.insert_one({"menu_item_id": "salad", "venue_id": "v1", "components": [
+            {"item_id": "lettuce", "qty": 0.5}, {"item_id": "bun", "qty": 1}]})
+        await db.menu_item_inventory.insert_one({"menu_item_id": "cola", "inventory_item_id": "cola-can", "quantity": 1})
+        for sku in ("bun", "patty", "lettuce", "cola-can"):
+            await db.inventory_items.insert_one({"id": sku, "venue_id": "v1", "quantity": 100})
+        await db.orders.insert_one({"id": "o1", "venue_id": "v1", "table_id": "t1", "table_name": "T1", "items": [
+            {"id": "i1", "menu_item_id": "burger", "menu_item_name": "Burger", "quantity": 2, "status": "pending",
+             "modifiers": [{"name": "No onion"}]},
+            {"id": "i2", "menu_item_id": "burger", "menu_item_name": "Burger", "quantity": 1, "status": "pending"},
+            {"id": "i3", "menu_item_id": "salad", "menu_item_name": "Salad", "quantity": 1, "status": "pending",
+             "course": 2, "notes": "dressing aside"},
+            {"id": "i4", "menu_item_id": "cola", "menu_item_name": "Cola", "quantity": 3, "status": "pending"},
+            {"id": "i0", "menu_item_id": "burger", "quantity": 5, "status": "sent"},
+        ]})
+
+    asyncio.run(_seed())
+    return db
+
+
+def _send(db, **kwargs):
+    args = dict(do_print=True, do_kds=True, do_stock=True, client_send_id=None)
+    args.update(kwargs)
+    return asyncio.run(process_send_order(db, "o1", REQUEST, current_user=USER, **args))
+
+
+def _stock(db):
+    return {d["id"]: d["quantity"] for d in db.data_store["inventory_items"]}
+
+
+class TestSendPipeline:
+    def test_tickets_jobs_and_stock(self, db):
+        ok, result = _send(db)
+        assert ok and result["code"] == "SEND_SUCCESS"
+
+        tickets = db.data_store["kds_tickets"]
+        assert sorted((t["station"], t["course"], len(t["items"])) for t in tickets) == [
+            ("COLD", 2, 1), ("GRILL", 1, 2), ("KITCHEN", 1, 1)]
+        assert sorted(t["display_id"] for t in tickets) == ["KDS-000001", "KDS-000002", "KDS-000003"]
+        assert [t["id"] for t in tickets] == result["created_tickets"]
+        grill = next(t for t in tickets if t["station"] == "GRILL")
+        assert grill["items"][0]["target_prep_seconds"] == 600
+
+        jobs = db.data_store["print_jobs"]
+        assert len(jobs) == 3 and [j["id"] for j in jobs] == result["created_print_jobs"]
+        grill_job = next(j for j in jobs if j["printer_zone"] == "grill")
+        assert "2x Burger\n   MOD: No onion\n   Seat: 1\n" in grill_job["content"]
+
+        # burger x3 -> bun 3, patty 6; salad x1 -> lettuce 0.5, bun 1; cola x3 via link
+        assert _stock(db) == {"bun": 96, "patty": 94, "lettuce": 99.5, "cola-can": 97}
+        assert len(db.data_store["inventory_transactions"]) == 1
+
+        order = db.data_store["orders"][0]
+        assert all(i["status"] == "sent" for i in order["items"]) and order["send_round_seq"] == 1
+
+    def test_one_round_trip_per_step(self, db, monkeypatch):
+        asyncio.run(get_catalog(db, "v1"))  # warm: menu and recipes come from the snapshot
+        calls, active = [], []
+        for name in ("kds_tickets", "print_jobs", "inventory_items", "menu_items", "recipes"):
+            coll = getattr(db, name)
+            for method in ("insert_one", "insert_many", "update_one", "bulk_write", "find_one"):
+                async def spy(*args, _original=getattr(coll, method), _key=(name, method), **kwargs):
+                    # Only the service's own calls (mock bulk ops call insert_one/update_one inside)
+                    if not active:
+                        calls.append(_key)
+                    active.append(_key)
+                    try:
+                        return await _original(*args, **kwargs)
+                    finally:
+                        active.pop()
+
+                monkeypatch.setattr(coll, method, spy)
+
+            def find_spy(*args, _original=coll.find, _key=(name, "find"), **kwargs):
+                calls.append(_key)
+                return _original(*args, **kwargs)
+
+            monkeypatch.setattr(coll, "find", find_spy)
+            monkeypatch.setattr(db, name, coll, raising=False)  # pin the spied handle
+
+        ok, _ = _send(db)
+        assert ok
+        assert sorted(calls) == sorted([
+            ("kds_tickets", "insert_many"), ("print_jobs", "insert_many"), ("inventory_items", "bulk_write")])
+
+    def test_items_outside_catalog_fall_back_to_db(self, db):
+        # Legacy docs without venue_id never make it into the snapshot
+        for doc in db.data_store["menu_items"]:
+            del doc["venue_id"]
+        ok, _ = _send(db)
+        assert ok
+        assert sorted(t["station"] for t in db.data_store["kds_tickets"]) == ["COLD", "GRILL", "KITCHEN"]
+        assert _stock(db) == {"bun": 96, "patty": 94, "lettuce": 99.5, "cola-can": 97}
+
+    def test_flags_and_dedupe(self, db):
+        ok, result = _send(db, do_print=False, do_stock=False, client_send_id="c1")
+        assert ok and result["created_print_jobs"] == [] and "print_jobs" not in db.data_store
+        assert _stock(db)["bun"] == 100
+        ok, again = _send(db, client_send_id="c1")
+        assert ok and again["code"] == "SEND_DEDUPED" and again["created_tickets"] == result["created_tickets"]
+
+
+class TestDisplayIdBatch:
+    def test_batch_reserves_once_and_continues_block(self, db):
+        async def _run():
+            first = await next_display_ids(db, "v1", "kds_ticket", 3)
+            second = await next_display_ids(db, "v1", "kds_ticket", 30)
+            return first, second
+
+        first, second = asyncio.run(_run())
+        assert first == ["KDS-000001", "KDS-000002", "KDS-000003"]
+        assert second[0] == "KDS-000004" and len(set(first + second)) == 33
+        counter = next(c for c in db.data_store["counters"] if c["entity_type"] == "kds_ticket")
+        assert counter["seq"] == 40  # one hot block, then one more block covering the shortfall
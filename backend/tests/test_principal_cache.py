@@ -0,0 +1,163 @@
+"""
+Tests for the principal cache behind get_current_user / check_venue_access
+and the memoized permission bitsets.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import core.dependencies as deps
+from core.mock_database import MockDatabase
+from core.principal_cache import PrincipalCache, invalidate_principal, principal_cache
+from services.permission_service import (
+    PERMISSION_KEYS,
+    effective_permissions,
+    has_permission,
+    permission_bits,
+)
+
+
+class _CountingDb:
+    """Forwards to MockDatabase and counts users.find_one calls."""
+
+    def __init__(self, db):
+        self._db = db
+        self.user_reads = 0
+
+    @property
+    def users(self):
+        outer = self
+
+        class _Users:
+            async def find_one(self, *args, **kwargs):
+                outer.user_reads += 1
+                return await outer._db.users.find_one(*args, **kwargs)
+
+        return _Users()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    mock_db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+    asyncio.run(mock_db.users.insert_one({
+        "id": "u1", "name": "Ana", "role": "manager",
+        "venue_id": "v1", "allowed_venue_ids": ["v2"],
+    }))
+    counting = _CountingDb(mock_db)
+    cache = PrincipalCache(ttl_seconds=60)
+    monkeypatch.setattr(deps, "principal_cache", cache)
+    monkeypatch.setattr(deps, "get_database", lambda: counting)
+    monkeypatch.setattr(deps, "verify_jwt_token", lambda token: {"user_id": "u1", "jti": token})
+    counting.cache = cache
+    counting.raw = mock_db
+    return counting
+
+
+def _current_user(token="t1"):
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(deps.get_current_user(creds))
+
+
+class TestPrincipalCache:
+    """One users read per (user, token) until a write invalidates it."""
+
+    def test_repeat_requests_hit_cache(self, db):
+        for _ in range(5):
+            user = _current_user()
+        assert user["name"] == "Ana"
+        assert db.user_reads == 1
+
+        _current_user("t2")  # new token, new entry
+        assert db.user_reads == 2
+
+    def test_returned_user_is_a_copy(self, db):
+        user = _current_user()
+        user["scratch"] = True
+        assert "scratch" not in _current_user()
+
+    def test_invalidation_reloads_user(self, db):
+        _current_user()
+        asyncio.run(db.raw.users.update_one({"id": "u1"}, {"$set": {"allowed_venue_ids": ["v3"]}}))
+        db.cache.invalidate("u1")
+
+        user = _current_user()
+        assert db.user_reads == 2
+        assert user["allowed_venue_ids"] == ["v3"]
+        asyncio.run(deps.check_venue_access(user, "v3"))
+        with pytest.raises(HTTPException):
+            asyncio.run(deps.check_venue_access(user, "v2"))
+
+    def test_global_invalidation(self, db):
+        _current_user()
+        db.cache.invalidate()
+        _current_user()
+        assert db.user_reads == 2
+
+    def test_module_invalidate_targets_shared_cache(self):
+        before = principal_cache.version("someone")
+        invalidate_principal("someone")
+        assert principal_cache.version("someone") == (before[0], before[1] + 1)
+
+
+class TestVenueAccess:
+    """Cached venue set agrees with the original rules."""
+
+    def test_cached_principal_allows_home_and_allowed_venues(self, db):
+        user = _current_user()
+        assert db.cache.for_user(user) is not None
+        for venue_id in ("v1", "v2", "all"):
+            asyncio.run(deps.check_venue_access(user, venue_id))
+        with pytest.raises(HTTPException):
+            asyncio.run(deps.check_venue_access(user, "v9"))
+
+    def test_foreign_user_dict_uses_full_rules(self, db):
+        _current_user()
+        # Same id but a different document (e.g. built by a route): cache must not apply
+        other = {"id": "u1", "role": "staff", "venue_id": "v7", "allowed_venue_ids": []}
+        assert db.cache.for_user(other) is None
+        asyncio.run(deps.check_venue_access(other, "v7"))
+        with pytest.raises(HTTPException):
+            asyncio.run(deps.check_venue_access(other, "v2"))
+
+    def test_superusers(self):
+        cache = PrincipalCache()
+        owner = cache.put("p", "j", {"id": "p", "role": "product_owner", "venue_id": "v1"}, cache.version("p"))
+        system = cache.put("s", "j", {"id": "s", "role": "staff", "venue_id": "system"}, cache.version("s"))
+        assert owner.can_access_venue("anything")
+        assert system.can_access_venue("anything")
+
+    def test_raced_invalidation_is_not_cached(self):
+        cache = PrincipalCache()
+        version = cache.version("u")
+        cache.invalidate("u")
+        cache.put("u", "j", {"id": "u", "role": "staff"}, version)
+        assert cache.get("u", "j") is None
+
+
+class TestPermissionBits:
+    def test_bits_match_sets(self):
+        perms = effective_permissions("manager")
+        bits = permission_bits("manager")
+        for key in PERMISSION_KEYS:
+            assert has_permission(bits, key) == (key in perms)
+
+    def test_overrides_deny_then_grant(self):
+        settings = {"policy": {"permissions_overrides": {"manager": {
+            "deny": ["FINANCE_VIEW"], "grant": ["PAYROLL_VIEW", "CUSTOM_KEY"]
+        }}}}
+        perms = effective_permissions("manager", settings)
+        assert "FINANCE_VIEW" not in perms
+        assert {"PAYROLL_VIEW", "CUSTOM_KEY"} <= perms
+        bits = permission_bits("manager", settings)
+        assert has_permission(bits, "CUSTOM_KEY")
+        assert not has_permission(bits, "FINANCE_VIEW")
+        # Defaults unaffected by the override result
+        assert "FINANCE_VIEW" in effective_permissions("manager")
+
+    def test_memoized_and_immutable(self):
+        assert effective_permissions("waiter") is effective_permissions("waiter")
+        with pytest.raises(AttributeError):
+            effective_permissions("waiter").add("FINANCE_VIEW")
@@ -0,0 +1,100 @@
+"""
+Tests for the ASGI sliding-window rate limiter.
+"""
+
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from core.mock_database import MockDatabase
+from core.security_middleware import MemoryRateLimitBackend, MongoRateLimitBackend, RateLimitMiddleware
+
+
+def _app(backend, requests_per_minute=5):
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/api/auth/login")
+    async def login():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=requests_per_minute, backend=backend)
+    return app
+
+
+async def _get_many(app, n, path="/api/ping", method="GET", headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.request(method, path, headers=headers) for _ in range(n)]
+
+
+class TestMemoryBackend:
+    """Constant state per key, LRU-bounded."""
+
+    def test_sliding_window_weights_previous_window(self):
+        backend = MemoryRateLimitBackend()
+
+        async def _run():
+            for _ in range(10):
+                await backend.hit("c", 10, now=59.0)
+            # 30s into the next window half of the previous 10 still count
+            return [(await backend.hit("c", 10, now=90.0))[0] for _ in range(6)]
+
+        assert asyncio.run(_run()) == [True] * 5 + [False]
+
+    def test_idle_keys_are_evicted(self):
+        backend = MemoryRateLimitBackend(max_keys=100)
+
+        async def _run():
+            for i in range(1000):
+                await backend.hit(f"client-{i}", 10)
+
+        asyncio.run(_run())
+        assert len(backend) == 100
+
+
+class TestRateLimitMiddleware:
+    """Raw ASGI middleware behaviour."""
+
+    def test_headers_and_429(self):
+        responses = asyncio.run(_get_many(_app(MemoryRateLimitBackend()), 6))
+        assert [r.status_code for r in responses] == [200] * 5 + [429]
+        assert responses[0].headers["ratelimit-limit"] == "5"
+        assert responses[0].headers["ratelimit-remaining"] == "4"
+        assert responses[0].headers["x-ratelimit-limit"] == "5"
+        assert "retry-after" in responses[-1].headers
+
+    def test_sensitive_path_limit_per_client(self):
+        app = _app(MemoryRateLimitBackend(), requests_per_minute=1000)
+        a = asyncio.run(_get_many(app, 21, "/api/auth/login", "POST", {"X-Device-Id": "a"}))
+        b = asyncio.run(_get_many(app, 1, "/api/auth/login", "POST", {"X-Device-Id": "b"}))
+        assert a[-1].status_code == 429 and a[-2].status_code == 200
+        assert a[0].headers["ratelimit-limit"] == "20"
+        assert b[0].status_code == 200
+
+    def test_sensitive_rejections_do_not_spend_global_quota(self):
+        app = _app(MemoryRateLimitBackend(), requests_per_minute=25)
+        headers = {"X-Device-Id": "a"}
+        logins = asyncio.run(_get_many(app, 30, "/api/auth/login", "POST", headers))
+        pings = asyncio.run(_get_many(app, 6, headers=headers))
+        assert [r.status_code for r in logins] == [200] * 20 + [429] * 10
+        assert [r.status_code for r in pings] == [200] * 5 + [429]
+        assert pings[-1].headers["ratelimit-limit"] == "25"
+
+    def test_shared_backend_spans_workers(self, tmp_path):
+        db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+        # Two "workers": separate middleware instances over one store
+        worker_a = _app(MongoRateLimitBackend(db))
+        worker_b = _app(MongoRateLimitBackend(db))
+
+        async def _run():
+            first = await _get_many(worker_a, 3)
+            second = await _get_many(worker_b, 3)
+            return first + second
+
+        codes = [r.status_code for r in asyncio.run(_run())]
+        assert codes == [200] * 5 + [429]
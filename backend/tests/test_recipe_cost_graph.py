@@ -0,0 +1,141 @@
+"""
+Tests for services.recipe_cost_graph (normalized-name resolution, children-first
+recosting, inventory price propagation, cycle detection, inherited allergens).
+"""
+
+import asyncio
+
+import pytest
+
+from core.mock_database import MockDatabase
+from services.recipe_cost_graph import (
+    RecipeCostGraph, load_cost_graph, normalize_name, recost_dependents, recost_for_inventory_change, recost_venue,
+)
+
+
+def _recipe(recipe_id, name, ingredients, servings=1, **extra):
+    doc = {"id": recipe_id, "venue_id": "v1", "recipe_name": name, "ingredients": ingredients,
+           "servings": servings, "sell_price": 0, "active": True, "deleted_at": None, "allergens": {},
+           "cost_analysis": {}}
+    doc.update(extra)
+    return doc
+
+
+def _ing(name, qty, **extra):
+    return {"name": name, "type": "ingredient", "net_qty": qty, **extra}
+
+
+def _sub(name, qty):
+    return {"name": name, "type": "sub_recipe", "net_qty": qty}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+    async def _seed():
+        await db.inventory_items.insert_many([
+            {"id": "tom", "venue_id": "v1", "name": "Tomato", "cost": 2.0, "allergens": []},
+            {"id": "flour", "venue_id": "v1", "item_name": "Flour 00", "cost": 1.0, "allergens": ["gluten"]},
+            {"id": "moz", "venue_id": "v1", "name": "Mozzarella", "cost": 10.0, "allergens": ["milk"]},
+            {"id": "salt", "venue_id": "v1", "name": "Salt (fine)", "cost": 0.5},
+            {"id": "oil", "venue_id": "v1", "name": "Olive oil", "cost": 8.0},
+            {"id": "tom-v2", "venue_id": "v2", "name": "Tomato", "cost": 99.0},
+        ])
+        await db.recipes.insert_many([
+            _recipe("sauce", "Tomato Sauce", [_ing("  tomato ", 2, waste_pct=10), _ing("SALT (FINE)", 0.1)], servings=2,
+                    allergens={"Celery": True, "Mustard": False}),
+            _recipe("dough", "Pizza Dough", [_ing("flour 00", 0.5), _ing("Olive oil", 0.05)]),
+            _recipe("pizza", "Margherita", [_sub("tomato  sauce", 1), _sub("Pizza dough", 1), _ing("Mozzarella", 0.2)],
+                    sell_price=12, cost_analysis={"labor_cost": 1.5}),
+            _recipe("salad", "Salad", [_ing("Olive oil", 0.02)]),
+            _recipe("old", "Tomato Sauce", [_ing("Tomato", 100)], active=False),
+            _recipe("trashed", "Trashed", [_sub("Tomato Sauce", 1)], deleted_at="2026-01-01"),
+        ])
+
+    asyncio.run(_seed())
+    return db
+
+
+def _stored(db, recipe_id):
+    return next(r for r in db.data_store["recipes"] if r["id"] == recipe_id)
+
+
+class TestCostGraph:
+    def test_normalize_name(self):
+        assert normalize_name("  Tomato\t SAUCE ") == normalize_name("tomato sauce") == "tomato sauce"
+        assert normalize_name(None) == ""
+
+    def test_children_first_costing(self, db):
+        graph = asyncio.run(load_cost_graph(db, "v1"))
+        assert graph.order.index("sauce") < graph.order.index("pizza")
+        assert graph.order.index("dough") < graph.order.index("pizza")
+        fresh = graph.recompute()
+        # sauce: tomato 2 * 1.1 * 2.0 + salt 0.1 * 0.5 = 4.45 over 2 servings; regex metachars resolve too
+        assert fresh["sauce"].total_cost == 4.45 and fresh["sauce"].cost_per_serving == 2.225
+        assert fresh["dough"].cost_per_serving == 0.9
+        # pizza uses the fresh sub-recipe costs (nothing stored yet) and keeps its labor cost
+        pizza = fresh["pizza"]
+        assert pizza.total_cost == round(2.225 + 0.9 + 2.0, 2) and pizza.labor_cost == 1.5
+        assert pizza.food_cost_pct == round(5.125 / 12 * 100, 2)
+        assert [line["unit_cost"] for line in pizza.ingredient_costs] == [2.225, 0.9, 10.0]
+        assert "trashed" not in fresh and "old" in fresh  # inactive recipes cost, but never as a sub-recipe
+
+    def test_inherited_allergens(self, db):
+        graph = asyncio.run(load_cost_graph(db, "v1"))
+        assert graph.inherited_allergens(_stored(db, "pizza")) == {"Celery", "gluten", "milk"}
+        assert graph.allergens["pizza"] == frozenset({"Celery", "gluten", "milk"})
+        assert graph.allergens["sauce"] == frozenset({"Celery"})
+
+    def test_cycles_detected_and_skipped(self):
+        graph = RecipeCostGraph([
+            _recipe("a", "A", [_sub("B", 1)], allergens={"Eggs": True}),
+            _recipe("b", "B", [_sub("A", 1), _ing("Tomato", 1)], cost_analysis={"cost_per_serving": 7}),
+            _recipe("c", "C", [_sub("B", 2)]),
+            _recipe("d", "D", [_sub("D", 1)]),
+        ], [{"id": "tom", "name": "Tomato", "cost": 2, "allergens": ["x"]}])
+        assert sorted(graph.cycles) == [["A", "B"], ["D"]]
+        assert graph.cyclic == {"a", "b", "d"}
+        fresh = graph.recompute()
+        assert set(fresh) == {"c"}
+        assert fresh["c"].total_cost == 14  # stored cost of the cycle member
+        assert graph.allergens["a"] == graph.allergens["b"] == graph.allergens["c"] == frozenset({"Eggs", "x"})
+
+
+class TestRecost:
+    def test_recost_venue_writes_only_changes(self, db, monkeypatch):
+        first = asyncio.run(recost_venue(db, "v1"))
+        assert first == {"recomputed": 4, "changed": 4, "cycles": []}
+        assert _stored(db, "pizza")["cost_analysis"]["total_cost"] == 5.12
+        assert _stored(db, "old")["cost_analysis"] == {}  # inactive: left alone, like the old bulk recalc
+
+        calls = []
+        coll = db.recipes
+        original = coll.bulk_write
+
+        async def spy(requests, **kwargs):
+            calls.append(len(requests))
+            return await original(requests, **kwargs)
+
+        monkeypatch.setattr(coll, "bulk_write", spy)
+        monkeypatch.setattr(db, "recipes", coll, raising=False)
+        assert asyncio.run(recost_venue(db, "v1"))["changed"] == 0
+        assert calls == []
+
+    def test_inventory_change_recosts_only_affected_subtree(self, db):
+        asyncio.run(recost_venue(db, "v1"))
+        salad_before = dict(_stored(db, "salad"))
+        asyncio.run(db.inventory_items.update_one({"id": "tom"}, {"$set": {"cost": 4.0}}))
+
+        result = asyncio.run(recost_for_inventory_change(db, "v1", ["tom"]))
+        assert result == {"recomputed": 2, "changed": 2, "cycles": []}
+        assert _stored(db, "sauce")["cost_analysis"]["cost_per_serving"] == round((2 * 1.1 * 4.0 + 0.05) / 2, 4)
+        assert _stored(db, "pizza")["cost_analysis"]["total_cost"] == round(4.425 + 0.9 + 2.0, 2)
+        assert _stored(db, "salad") == salad_before
+
+    def test_recipe_change_recosts_dependents(self, db):
+        asyncio.run(recost_venue(db, "v1"))
+        _stored(db, "dough")["cost_analysis"]["cost_per_serving"] = 3.0  # as written by the recipe update
+        result = asyncio.run(recost_dependents(db, "v1", ["dough"]))
+        assert result["recomputed"] == 1
+        assert _stored(db, "pizza")["cost_analysis"]["total_cost"] == round(2.225 + 3.0 + 2.0, 2)
@@ -0,0 +1,168 @@
+"""
+Tests for the segmented, hash-chained audit log behind BackupService
+(O(1) appends, segment sealing, tail recovery, incremental verification).
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import services.segmented_audit_log as audit_mod
+from services.backup_service import BackupService
+from services.segmented_audit_log import SegmentedAuditLog, entry_hash, merkle_root
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_mod, "_logs", {})
+    return tmp_path / "audit_log"
+
+
+def _log(log_dir, **kwargs):
+    kwargs.setdefault("fsync_ms", 0)
+    return SegmentedAuditLog(log_dir, **kwargs)
+
+
+def _append(log, n, start=0):
+    async def _run():
+        return [await log.append({"action": f"a{start + i}"}) for i in range(n)]
+    return asyncio.run(_run())
+
+
+class TestAppend:
+    def test_chain_and_sequence(self, log_dir):
+        log = _log(log_dir)
+        first, second = _append(log, 2)
+        assert (first["sequence"], second["sequence"]) == (1, 2)
+        assert first["prev_hash"] is None and second["prev_hash"] == first["hash"]
+        assert second["hash"] == entry_hash(second)
+
+    def test_group_commit_shares_one_fsync(self, log_dir):
+        log = _log(log_dir, fsync_ms=5)
+
+        async def _run():
+            return await asyncio.gather(*[log.append({"action": i}) for i in range(20)])
+
+        records = asyncio.run(_run())
+        assert [r["sequence"] for r in records] == list(range(1, 21))
+        assert log.stats["flushes"] == 1
+
+    def test_segments_roll_with_merkle_checkpoints(self, log_dir):
+        log = _log(log_dir, max_entries=4)
+        records = _append(log, 10)
+        log.close()
+        assert [cp["entries"] for cp in log.checkpoints] == [4, 4]
+        first = log.checkpoints[0]
+        assert first["merkle_root"] == merkle_root([r["hash"] for r in records[:4]])
+        assert log.checkpoints[1]["first_prev_hash"] == first["last_hash"] == records[3]["hash"]
+        assert len(list(log_dir.glob("segment_*.jsonl"))) == 3
+
+
+    def test_failed_flush_does_not_advance_tail(self, log_dir, monkeypatch):
+        log = _log(log_dir)
+        first, = _append(log, 1)
+        fsync = audit_mod._fsync_file
+
+        def failing_fsync(f):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(audit_mod, "_fsync_file", failing_fsync)
+        with pytest.raises(OSError):
+            _append(log, 1, start=1)
+        assert (log.last_hash, log.next_seq) == (first["hash"], 2)
+
+        monkeypatch.setattr(audit_mod, "_fsync_file", fsync)
+        retry, = _append(log, 1, start=1)
+        assert retry["prev_hash"] == first["hash"] and retry["sequence"] == 2
+        result = asyncio.run(log.verify())
+        assert result["valid"] and result["last_sequence"] == 2
+
+        log.close()
+        assert SegmentedAuditLog(log_dir).next_seq == 3
+
+
+class TestRecovery:
+    def test_tail_recovered_without_history(self, log_dir, monkeypatch):
+        log = _log(log_dir, max_entries=4)
+        records = _append(log, 10)
+        log.close()
+
+        scanned = []
+        monkeypatch.setattr(audit_mod, "_scan_segment", lambda *a, **k: scanned.append(a))
+        reopened = _log(log_dir, max_entries=4)
+        assert reopened.last_hash == records[-1]["hash"] and reopened.next_seq == 11
+        assert scanned == []
+
+    def test_torn_tail_is_dropped(self, log_dir):
+        log = _log(log_dir)
+        records = _append(log, 3)
+        log.close()
+        segment = next(log_dir.glob("segment_*.jsonl"))
+        with open(segment, "a") as f:
+            f.write('{"action": "half-writ')
+
+        reopened = _log(log_dir)
+        assert reopened.next_seq == 4 and reopened.last_hash == records[-1]["hash"]
+        (record,) = _append(reopened, 1)
+        assert record["prev_hash"] == records[-1]["hash"]
+        assert asyncio.run(reopened.verify(full=True))["valid"]
+
+    def test_legacy_single_file_is_adopted(self, tmp_path, log_dir):
+        prev = None
+        with open(tmp_path / "audit_log.jsonl", "w") as f:
+            for seq in (1, 2):
+                entry = {"action": "old", "prev_hash": prev, "sequence": seq}
+                entry["hash"] = prev = entry_hash(entry)
+                f.write(json.dumps(entry) + "\n")
+
+        log = _log(log_dir)
+        assert log.next_seq == 3 and log.checkpoints[0]["legacy"]
+        (record,) = _append(log, 1)
+        assert record["prev_hash"] == prev
+        assert not (tmp_path / "audit_log.jsonl").exists()
+
+
+class TestVerification:
+    def test_incremental_verify_reads_only_new_entries(self, log_dir):
+        log = _log(log_dir, max_entries=5)
+        _append(log, 12)
+        first = asyncio.run(log.verify())
+        assert first["valid"] and first["entries_checked"] == 12
+
+        _append(log, 2, start=12)
+        second = asyncio.run(log.verify())
+        assert second["valid"] and second["entries_checked"] == 2
+        assert second["last_sequence"] == 14
+
+    def test_tampered_sealed_segment_detected(self, log_dir):
+        log = _log(log_dir, max_entries=3)
+        _append(log, 7)
+        assert asyncio.run(log.verify())["valid"]
+
+        segment = log_dir / log.checkpoints[0]["segment"]
+        lines = segment.read_text().splitlines()
+        entry = json.loads(lines[1])
+        entry["action"] = "forged"
+        entry["hash"] = entry_hash(entry)
+        lines[1] = json.dumps(entry)
+        segment.write_text("\n".join(lines) + "\n")
+
+        result = asyncio.run(log.verify())
+        assert not result["valid"]
+        assert any("chain broken" in e for e in result["errors"])
+
+
+class TestBackupServiceIntegration:
+    def test_service_instances_share_tail(self, tmp_path, log_dir):
+        config = {"local_backup_dir": str(tmp_path)}
+        a, b = BackupService(None, config), BackupService(None, config)
+
+        async def _run():
+            first = await a.append_audit_entry({"action": "login"})
+            second = await b.append_audit_entry({"action": "void"})
+            return first, second, await b.get_next_audit_sequence(), await a.verify_audit_log()
+
+        first, second, next_seq, report = asyncio.run(_run())
+        assert second["prev_hash"] == first["hash"] and next_seq == 3
+        assert report["valid"] and report["last_sequence"] == 2
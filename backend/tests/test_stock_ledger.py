@@ -0,0 +1,128 @@
+"""
+Tests for incrementally maintained stock-on-hand balances (runs against MockDatabase).
+"""
+
+import asyncio
+
+import pytest
+from core.mock_database import MockDatabase
+from inventory.models import StockLedgerEntryCreate
+import inventory.services.stock_ledger_service as ledger_module
+from inventory.services.stock_ledger_service import StockLedgerService
+
+
+@pytest.fixture
+def mock_db(tmp_path):
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+def _movement(item_id, qty, venue_id="v1"):
+    return StockLedgerEntryCreate(venue_id=venue_id, item_id=item_id, qty_delta=qty, unit="kg", reason="TEST")
+
+
+class TestStockOnHand:
+    """Balances are moved by $inc with each movement and never re-aggregated."""
+
+    def test_movements_update_balance(self, mock_db):
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            for qty in (10, -3, 2.5):
+                await svc.record_movement(_movement("flour", qty), actor_id="u1")
+            await svc.record_movement(_movement("sugar", 4), actor_id="u1")
+            return await svc.get_current_stock("flour", "v1"), await svc.get_current_stock_many(
+                ["flour", "sugar", "salt"], "v1")
+
+        flour, many = asyncio.run(_run())
+        assert flour == 9.5
+        assert many == {"flour": 9.5, "sugar": 4, "salt": 0.0}
+        seqs = [r["seq"] for r in mock_db.data_store["stock_ledger"] if r["item_id"] == "flour"]
+        assert seqs == [1, 2, 3]
+
+    def test_seeds_from_legacy_ledger(self, mock_db):
+        mock_db.data_store["stock_ledger"] = [
+            {"venue_id": "v1", "item_id": "oil", "action": "in", "quantity": 20, "created_at": "2026-01-01T00:00:00"},
+            {"venue_id": "v1", "item_id": "oil", "action": "out", "quantity": 5, "created_at": "2026-01-02T00:00:00"},
+            {"venue_id": "v1", "item_id": "oil", "action": "adjust", "quantity": 12, "created_at": "2026-01-03T00:00:00"},
+            {"venue_id": "v1", "item_id": "oil", "action": "waste", "quantity": 2, "created_at": "2026-01-04T00:00:00"},
+        ]
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            before = await svc.get_current_stock("oil", "v1")
+            await svc.record_movement(_movement("oil", 3), actor_id="u1")
+            return before, await svc.get_current_stock("oil", "v1")
+
+        assert asyncio.run(_run()) == (10, 13)
+
+    def test_checkpoint_and_verify(self, mock_db, monkeypatch):
+        monkeypatch.setattr(ledger_module, "STOCK_CHECKPOINT_EVERY", 4)
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            for _ in range(10):
+                await svc.record_movement(_movement("eggs", 1), actor_id="u1")
+            return await svc.verify_balance("eggs", "v1")
+
+        report = asyncio.run(_run())
+        assert report["ok"]
+        assert report["from_checkpoint"] == 8
+        assert report["replayed"] == 2
+
+    def test_rebuild_repairs_drift(self, mock_db):
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            for qty in (5, 5):
+                await svc.record_movement(_movement("milk", qty), actor_id="u1")
+            await mock_db.rm_stock_on_hand.update_one({"venue_id": "v1", "sku_id": "milk"}, {"$set": {"balance": 99}})
+            report = await svc.rebuild_balance("milk", "v1", full=True)
+            return report, await svc.get_current_stock("milk", "v1"), await svc.verify_balance("milk", "v1")
+
+        report, stock, after = asyncio.run(_run())
+        assert report["drift"] == 89 and report["rebuilt"]
+        assert stock == 10
+        assert after["ok"]
+
+    def test_mixed_timestamp_types_sort_together(self, mock_db):
+        from datetime import datetime, timezone
+        mock_db.data_store["stock_ledger"] = [
+            {"venue_id": "v1", "item_id": "oil", "action": "in", "quantity": 20, "created_at": "2026-01-01T00:00:00"},
+            # Legacy WASTE row from the waste route: created_at is a datetime
+            {"venue_id": "v1", "item_id": "oil", "action": "WASTE", "quantity": 2,
+             "created_at": datetime(2026, 1, 3, tzinfo=timezone.utc)},
+            {"venue_id": "v1", "item_id": "oil", "action": "adjust", "quantity": 12,
+             "created_at": "2026-01-02T00:00:00+00:00"},
+            {"venue_id": "v1", "item_id": "oil", "qty_delta": 1, "occurred_at": "2026-01-04T00:00:00Z"},
+        ]
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            return await svc.get_current_stock_many(["oil"], "v1"), await svc.verify_balance("oil", "v1", full=True)
+
+        stock, report = asyncio.run(_run())
+        assert stock == {"oil": 11}
+        assert report["ok"]
+
+
+class TestLegacyWriters:
+    """Action/quantity rows written through append_entry keep the balance in step."""
+
+    def test_append_entry_moves_balance(self, mock_db, monkeypatch):
+        monkeypatch.setattr(ledger_module, "STOCK_CHECKPOINT_EVERY", 3)
+        svc = StockLedgerService(mock_db)
+
+        async def _run():
+            await svc.record_movement(_movement("rice", 10), actor_id="u1")
+            await svc.append_entry({"venue_id": "v1", "item_id": "rice", "action": "out", "quantity": 4})
+            await svc.append_entry({"venue_id": "v1", "item_id": "rice", "action": "adjust", "quantity": 7})
+            await svc.append_entry({"venue_id": "v1", "item_id": "rice", "action": "WASTE", "quantity": 1})
+            return (await svc.get_current_stock("rice", "v1"), await svc.verify_balance("rice", "v1"),
+                    await svc.verify_balance("rice", "v1", full=True))
+
+        stock, tail, full = asyncio.run(_run())
+        assert stock == 6
+        assert [r["seq"] for r in mock_db.data_store["stock_ledger"]] == [1, 2, 3, 4]
+        # Checkpoint at seq 3 (after the ADJUST) plus the WASTE tail agrees with the full replay
+        assert tail["ok"] and tail["from_checkpoint"] == 3 and tail["replayed"] == 1
+        assert full["ok"] and full["expected"] == tail["expected"] == 6
@@ -0,0 +1,139 @@
+"""
+Tests for compiled print templates in services.template_render_service
+(plan cache keyed by content hash, HTML parity with the legacy renderer,
+byte-level ESC/POS output).
+"""
+
+import asyncio
+
+import pytest
+
+import services.template_render_service as render_mod
+from services.template_render_service import (
+    EscPosWriter, compile_accessor, compute_content_hash, evaluate_condition, get_render_plan,
+    render_template, render_to_html, resolve_variable,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(render_mod, "_plan_cache", render_mod._PlanCache(8))
+
+
+def _blocks():
+    return [
+        {"id": "footer", "type": "text", "section": "footer", "order": 9,
+         "text_props": {"content": "Thanks, {{venue.name}}!", "alignment": "center"}},
+        {"id": "title", "type": "text", "section": "header", "order": 1,
+         "text_props": {"content": "{{venue.name}}", "font_size": 24, "bold": True, "alignment": "center"}},
+        {"id": "vip", "type": "text", "section": "header", "order": 2,
+         "show_if": {"field": "order.total", "operator": ">", "value": 100},
+         "text_props": {"content": "VIP <b>guest</b><script>alert(1)</script>"}},
+        {"id": "items", "type": "table", "section": "body", "order": 3, "table_props": {
+            "columns": [{"key": "name", "label": "Item"}, {"key": "total", "label": "Total", "align": "right"}],
+            "totals_row": {"total": "{{order.total}}"}}},
+        {"id": "rule", "type": "divider", "section": "body", "order": 4, "divider_props": {"style": "double"}},
+        {"id": "code", "type": "barcode", "section": "footer", "order": 5, "barcode_props": {"data_source": "order.id"}},
+        {"id": "pay", "type": "qr", "section": "footer", "order": 6,
+         "qr_props": {"data_source": "order.payment_url", "label": "Pay"}},
+        {"id": "fiscal", "type": "fiscal", "section": "footer", "order": 7, "fiscal_props": {}},
+        {"id": "logo", "type": "logo", "section": "header", "order": 0},
+        {"id": "broken", "type": "text", "section": "body", "order": 8, "text_props": None},
+    ]
+
+
+def _data(total=120):
+    return {
+        "venue": {"name": "Bistro <Blu> & Co"},
+        "order": {"id": "A-17", "total": total, "payment_url": "https://pay.example/A-17",
+                  "items": [{"name": "Ftira with a very long name that wraps", "total": "€9.50"},
+                            {"name": "Kinnie", "total": "€2.00"}]},
+        "fiscal": {"receipt_id": "FS-1", "qr_data": "MT|FS-1"},
+    }
+
+
+def _legacy_html(blocks, data, paper=None):
+    visible = sorted((b for b in blocks if evaluate_condition(b.get("show_if"), data)),
+                     key=lambda b: b.get("order", 0))
+    sections = {"header": [], "body": [], "footer": []}
+    for block in visible:
+        sections.setdefault(block.get("section", "body"), []).append(block)
+    return render_to_html(sections, data, paper or {}, False, 0)["html"]
+
+
+def _render(blocks, data, **kwargs):
+    return asyncio.run(render_template(None, {"blocks": blocks, "paper_profile": {}}, data, **kwargs))
+
+
+class TestCompiledPlan:
+    @pytest.mark.parametrize("total", [120, 50])
+    def test_html_matches_legacy_renderer(self, total):
+        blocks, data = _blocks(), _data(total)
+        assert _render(blocks, data)["html"] == _legacy_html(blocks, data)
+
+    def test_accessor_matches_resolve_variable(self):
+        data = {"a": {"b": [{"c": 0}, None]}, "s": "x"}
+        for path in ("a.b.0.c", "a.b.1.c", "a.b.5", "s.x", "missing", " a.b.0.c "):
+            assert compile_accessor(path)(data) == resolve_variable(path, data)
+
+    def test_plan_cached_by_content_hash(self):
+        blocks = _blocks()
+        plan = get_render_plan(blocks)
+        assert plan.content_hash == compute_content_hash(blocks)
+        assert get_render_plan([dict(b) for b in blocks]) is plan
+        assert render_mod._plan_cache.stats["misses"] == 1
+
+    def test_published_version_uses_stored_hash(self, monkeypatch):
+        blocks = _blocks()
+        template = {"blocks": [], "versions": [{"version": 3, "blocks": blocks, "content_hash": "v3-hash"}]}
+        monkeypatch.setattr(render_mod, "compute_content_hash", lambda b: pytest.fail("re-hashed"))
+        result = asyncio.run(render_template(None, template, _data(), version=3, debug=True))
+        assert result["debug"]["content_hash"] == "v3-hash"
+        assert result["debug"]["visible_blocks"] == 10
+
+    def test_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(render_mod, "_plan_cache", render_mod._PlanCache(2))
+        for i in range(3):
+            get_render_plan([{"id": str(i), "type": "divider"}])
+        assert len(render_mod._plan_cache.entries) == 2
+        assert render_mod._plan_cache.stats["evictions"] == 1
+
+
+class TestEscPos:
+    def test_ticket_bytes(self):
+        result = _render(_blocks(), _data(), output_format="escpos")
+        raw = bytes(result["escpos_commands"])
+        assert result["escpos_hex"] == raw.hex()
+        assert raw.startswith(b"\x1b@\x1bt\x13") and raw.endswith(b"\x1dV\x01")
+        assert "Bistro <Blu> & Co".encode("cp858") in raw  # printer text is not HTML-escaped
+        assert b"VIP guest" in raw and b"alert" not in raw
+        assert "€9.50".encode("cp858") in raw
+        assert b"\x1dk\x49\x06{BA-17" in raw  # CODE128 code set B
+        assert b"\x1d(k\x1b\x001P0https://pay.example/A-17" in raw  # QR store
+        assert b"=" * 48 in raw
+        assert result["warnings"] == ["Block render error: broken"]
+
+    def test_hidden_blocks_not_printed(self):
+        raw = bytes(_render(_blocks(), _data(50), output_format="escpos")["escpos_commands"])
+        assert b"VIP" not in raw
+
+    def test_table_layout(self):
+        out = EscPosWriter(line_chars=20)
+        out.table(["left", "right"], ["Item", "Total"], [["Ftira with tomatoes", "€9.50"]], ["", "€9.50"])
+        body = out.buf[len(EscPosWriter().buf):].replace(b"\x1bE\x01", b"").replace(b"\x1bE\x00", b"")
+        lines = body.split(b"\n")
+        assert lines[0] == b"Item           Total" and lines[1] == b"-" * 20
+        assert lines[2].startswith(b"Ftira with") and lines[2].endswith("€9.50".encode("cp858"))
+        assert all(len(line) <= 20 for line in lines)
+        assert lines[3] == b"tomatoes"
+
+    def test_narrow_paper_and_reprint(self):
+        out = EscPosWriter(line_chars=32)
+        out.rule()
+        assert out.buf.endswith(b"-" * 32 + b"\n")
+        result = asyncio.run(render_template(
+            None, {"blocks": [], "paper_profile": {"width": "58mm"}}, {}, output_format="escpos"))
+        assert bytes(result["escpos_commands"]).startswith(b"\x1b@")
+        banner = EscPosWriter()
+        banner.reprint_banner(2)
+        assert b"COPY / REPRINT" in banner.buf and b"Print #2" in banner.buf
@@ -0,0 +1,181 @@
+"""
+Tests for the venue config read-through cache (frozen merges, local and
+cross-worker invalidation, hit/miss counters).
+"""
+
+import asyncio
+
+import pytest
+
+import core.venue_config as venue_config
+from core.metrics_collector import cache_stats, merge_states, metrics, render_prometheus
+from core.mock_database import MockDatabase
+from core.venue_config import DEFAULTS, VenueConfigRepo
+
+
+@pytest.fixture
+def mock_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(venue_config, "_cache", venue_config._VenueConfigCache())
+    return MockDatabase(db_file=str(tmp_path / "local_db.json"), storage="journal")
+
+
+class _CountingCollection:
+    def __init__(self, col):
+        self._col = col
+        self.reads = 0
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return await self._col.find_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._col, name)
+
+
+def _repo(mock_db):
+    repo = VenueConfigRepo(mock_db)
+    repo.col = _CountingCollection(repo.col)
+    return repo
+
+
+class TestVenueConfigCache:
+    """One venue_config read per venue until something changes."""
+
+    def test_repeat_reads_hit_cache(self, mock_db):
+        repo = _repo(mock_db)
+
+        async def _run():
+            for _ in range(5):
+                cfg = await repo.get("v1")
+            return cfg
+
+        cfg = asyncio.run(_run())
+        assert cfg["features"]["KDS_ENABLED"] is True
+        assert repo.col.reads == 1
+        stats = venue_config._cache.stats
+        assert stats["hits"] == 4 and stats["misses"] == 1
+
+    def test_merged_sections_are_frozen_and_shared(self, mock_db):
+        repo = _repo(mock_db)
+
+        async def _run():
+            return await repo.get("v1"), await repo.get("v1")
+
+        first, second = asyncio.run(_run())
+        assert first["features"] is second["features"]
+        with pytest.raises(TypeError):
+            first["features"]["KDS_ENABLED"] = False
+        with pytest.raises(TypeError):
+            first["rules"]["approval"]["leave"]["requires_approval"] = False
+        # The outer dict is per call; DEFAULTS stay untouched
+        first["extra"] = 1
+        assert "extra" not in second
+        assert isinstance(DEFAULTS["rules"]["approval"]["leave"]["allowed_approvers"], list)
+
+    def test_approval_settings_update_edits_a_copy(self, mock_db):
+        from routes.approval_settings_routes import (
+            ApprovalSettingsPayload, GenericApprovalSettings, update_approval_settings,
+        )
+        payload = ApprovalSettingsPayload(leave=GenericApprovalSettings(requires_approval=False))
+
+        async def _run():
+            await VenueConfigRepo(mock_db).get("v1")  # warm the frozen cache entry
+            return await update_approval_settings("v1", payload, {"role": "owner", "id": "u1"}, mock_db)
+
+        result = asyncio.run(_run())
+        assert result["data"]["leave"]["requires_approval"] is False
+        cfg = asyncio.run(VenueConfigRepo(mock_db).get("v1"))
+        assert cfg["rules"]["approval"]["leave"]["requires_approval"] is False
+        assert DEFAULTS["rules"]["approval"]["leave"]["requires_approval"] is True
+
+    def test_upsert_invalidates(self, mock_db):
+        repo = _repo(mock_db)
+
+        async def _run():
+            await repo.get("v1")
+            updated = await repo.upsert("v1", features={"KDS_ENABLED": False}, user_id="u1")
+            return updated, await repo.get("v1")
+
+        updated, cfg = asyncio.run(_run())
+        assert updated["features"]["KDS_ENABLED"] is False
+        assert cfg["features"]["KDS_ENABLED"] is False
+
+    def test_change_from_other_worker_is_polled(self, mock_db):
+        repo = _repo(mock_db)
+
+        async def _run():
+            venue_config._cache.last_poll = 0
+            await repo.get("v1")
+            await repo.get("v2")
+            # Another worker upserts v1: bumps the shared sequence and stamps the doc
+            marker = await mock_db.cache_invalidations.find_one_and_update(
+                {"_id": venue_config.CHANGE_SEQ_ID}, {"$inc": {"seq": 1}},
+                upsert=True, return_document=True
+            )
+            await mock_db.venue_config.update_one(
+                {"venue_id": "v1"},
+                {"$set": {"features": {"POS_ENABLED": False}, "rules": {}, "change_seq": marker["seq"]}},
+                upsert=True
+            )
+            stale = await repo.get("v1")
+            venue_config._cache.last_poll = 0  # poll interval elapsed
+            return stale, await repo.get("v1"), await repo.get("v2")
+
+        reads_before = repo.col.reads
+        stale, fresh, other = asyncio.run(_run())
+        assert stale["features"]["POS_ENABLED"] is True
+        assert fresh["features"]["POS_ENABLED"] is False
+        assert other["features"]["POS_ENABLED"] is True
+        # v1 twice, v2 once, v1 again after the remote change
+        assert repo.col.reads - reads_before == 3
+        assert venue_config._cache.stats["remote_invalidations"] == 1
+
+    def test_poll_between_bump_and_stamp_sees_pending_doc(self, mock_db):
+        repo = _repo(mock_db)
+
+        async def _run():
+            venue_config._cache.last_poll = 0
+            await repo.get("v1")
+            # Another worker is mid-upsert: doc written and sequence bumped, not yet stamped
+            await mock_db.venue_config.update_one(
+                {"venue_id": "v1"},
+                {"$set": {"features": {"POS_ENABLED": False}, "rules": {}, "change_pending": True}},
+                upsert=True
+            )
+            await mock_db.cache_invalidations.update_one(
+                {"_id": venue_config.CHANGE_SEQ_ID}, {"$inc": {"seq": 1}}, upsert=True
+            )
+            venue_config._cache.last_poll = 0
+            return await repo.get("v1")
+
+        assert asyncio.run(_run())["features"]["POS_ENABLED"] is False
+
+    def test_poll_pages_through_changes(self, mock_db, monkeypatch):
+        monkeypatch.setattr(venue_config, "CHANGE_POLL_PAGE", 2)
+        repo = _repo(mock_db)
+        other = VenueConfigRepo(mock_db)
+        venues = [f"v{i}" for i in range(5)]
+
+        async def _run():
+            venue_config._cache.last_poll = 0
+            for v in venues:
+                await repo.get(v)
+            for v in venues:
+                await other.upsert(v, features={"POS_ENABLED": False})
+                venue_config._cache.entries.clear()  # as if upserted by another worker
+            for v in venues:
+                await repo.get(v)
+            venue_config._cache.last_poll = 0
+            before = venue_config._cache.stats["remote_invalidations"]
+            await repo.get("v0")
+            return venue_config._cache.stats["remote_invalidations"] - before
+
+        assert asyncio.run(_run()) == 5
+
+    def test_stats_exported_to_metrics(self, mock_db):
+        repo = _repo(mock_db)
+        asyncio.run(repo.get("v1"))
+        asyncio.run(repo.get("v1"))
+        assert cache_stats()["venue_config"]["hits"] == 1
+        text = render_prometheus(merge_states([metrics.export_state()]))
+        assert 'app_cache_events_total{cache="venue_config",event="hits"} 1' in text
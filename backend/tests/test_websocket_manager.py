@@ -0,0 +1,91 @@
+"""
+Tests for the queued, backpressured WebSocket fan-out.
+"""
+
+import asyncio
+import json
+
+from services.websocket_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class TestConnectionManager:
+    """Per-connection queues and slow-consumer policies."""
+
+    def test_slow_socket_does_not_delay_others(self):
+        async def _run():
+            mgr = ConnectionManager()
+            fast, slow = FakeSocket(), FakeSocket(delay=1.0)
+            await mgr.connect(fast, venue_id="v1")
+            await mgr.connect(slow, venue_id="v1")
+            started = asyncio.get_running_loop().time()
+            delivered = await mgr.send_to_venue("v1", {"type": "order", "n": 1})
+            await asyncio.sleep(0.05)
+            elapsed = asyncio.get_running_loop().time() - started
+            mgr.disconnect(slow)
+            return delivered, fast.sent, elapsed, mgr.get_connection_count()
+
+        delivered, fast_sent, elapsed, stats = asyncio.run(_run())
+        assert delivered == 2
+        assert fast_sent == [{"type": "order", "n": 1}]
+        assert elapsed < 0.5
+        assert stats["total"] == 1
+        assert stats["fanout"]["v1"]["deliveries"] == 1
+
+    def test_drop_oldest_keeps_latest(self):
+        async def _run():
+            mgr = ConnectionManager(queue_size=3, policy="drop_oldest")
+            ws = FakeSocket(delay=0.01)
+            await mgr.connect(ws, venue_id="v1")
+            for n in range(10):
+                await mgr.send_to_venue("v1", {"n": n})
+            await asyncio.sleep(0.2)
+            return ws.sent, mgr.get_connection_count()["fanout"]["v1"]
+
+        sent, stats = asyncio.run(_run())
+        assert [m["n"] for m in sent][-3:] == [7, 8, 9]
+        assert stats["dropped"] > 0
+
+    def test_coalesce_replaces_queued_message(self):
+        async def _run():
+            mgr = ConnectionManager()
+            ws = FakeSocket(delay=0.05)
+            await mgr.connect(ws, venue_id="v1")
+            await mgr.send_to_venue("v1", {"type": "other"})
+            for n in range(5):
+                await mgr.send_to_venue("v1", {"type": "kds_board", "n": n}, coalesce_key="kds_board")
+            await asyncio.sleep(0.3)
+            return ws.sent
+
+        sent = asyncio.run(_run())
+        assert sent == [{"type": "other"}, {"type": "kds_board", "n": 4}]
+
+    def test_disconnect_policy_closes_slow_consumer(self):
+        async def _run():
+            mgr = ConnectionManager(queue_size=2, policy="disconnect")
+            ws = FakeSocket(delay=1.0)
+            await mgr.connect(ws, user_id="u1", venue_id="v1")
+            for n in range(5):
+                await mgr.send_to_user("u1", {"n": n})
+            await asyncio.sleep(0)
+            return ws.closed_with, mgr.get_connection_count()
+
+        closed_with, stats = asyncio.run(_run())
+        assert closed_with == 1013
+        assert stats["total"] == 0 and stats["users"] == {} and stats["venues"] == {}
@@ -3,6 +3,7 @@ import asyncio
 from datetime import datetime, timezone
 
 from core.database import db
+from inventory.services.stock_ledger_service import StockLedgerService
 
 
 class OutboxConsumer:
@@ -52,33 +53,10 @@ class OutboxConsumer:
         venue_id = payload.get("venue_id")
         
         if topic == "inventory.ledger.movement.created":
-            # Rebuild stock on hand
+            # Balances are moved in-line by StockLedgerService.record_movement;
+            # here we only make sure the item has a (seeded) balance doc.
             sku_id = payload.get("sku_id")
-            balance = await self._compute_stock_balance(venue_id, sku_id)
-            
-            await db.rm_stock_on_hand.update_one(
-                {"venue_id": venue_id, "sku_id": sku_id},
-                {"$set": {"balance": balance, "updated_at": datetime.now(timezone.utc).isoformat()}},
-                upsert=True
-            )
-    
-    async def _compute_stock_balance(self, venue_id: str, sku_id: str) -> float:
-        """Compute stock balance from ledger"""
-        entries = await db.stock_ledger.find(
-            {"venue_id": venue_id, "item_id": sku_id},
-            {"_id": 0}
-        ).to_list(2000)
-        
-        balance = 0.0
-        for entry in entries:
-            if entry["action"] == "IN":
-                balance += entry["quantity"]
-            elif entry["action"] == "OUT":
-                balance -= entry["quantity"]
-            elif entry["action"] == "ADJUST":
-                balance = entry["quantity"]
-        
-        return balance
+            await StockLedgerService(db).get_current_stock_many([sku_id], venue_id)
     
     async def _build_accounting_read_models(self, topic: str, payload: dict):
         """Build accounting read models"""